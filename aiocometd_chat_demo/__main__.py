@@ -4,35 +4,68 @@ import asyncio
 import logging
 import os.path
 
+# imported first to measure the import time of the other modules
+# pylint: disable=wrong-import-order
+from aiocometd_chat_demo.startup import StartupProfiler, IMPORT_TIME
+# pylint: enable=wrong-import-order
 from quamash import QEventLoop  # type: ignore
-# pylint: disable=no-name-in-module
+# pylint: disable=no-name-in-module,unused-import
+from PyQt5.QtCore import QStandardPaths  # type: ignore
 from PyQt5.QtGui import QGuiApplication  # type: ignore
+# the root window of the QML engine is only wrapped as a QQuickWindow, which
+# has the frameSwapped signal, if the QtQuick module is imported
+from PyQt5.QtQuick import QQuickWindow  # type: ignore # noqa: F401
 from PyQt5.QtQml import (  # type: ignore
     QQmlApplicationEngine,
     qmlRegisterType,
     qmlRegisterUncreatableType
 )
-# pylint: enable=no-name-in-module
+# pylint: enable=no-name-in-module,unused-import
 
+# pylint: disable=ungrouped-imports
+from aiocometd_chat_demo.bundle import build_bundle
 from aiocometd_chat_demo.chat_service import ChatService
 from aiocometd_chat_demo.channels import ChannelsModel
+from aiocometd_chat_demo.channels_filter import ChannelsFilterModel
 from aiocometd_chat_demo.conversation import ConversationModel
+from aiocometd_chat_demo.search import SearchResultsModel
 from aiocometd_chat_demo._metadata import AUTHOR, AUTHOR_EMAIL, VERSION, URL
+# pylint: enable=ungrouped-imports
 
 
+LOGGER = logging.getLogger(__name__)
 #: Name of the main QML file
 MAIN_QML_FILE = "main.qml"
 #: Directory path of file
 HERE = os.path.dirname(os.path.abspath(__file__))
+#: Directory of the QML files
+QML_DIR = os.path.join(HERE, "qml")
 #: Path of the main QML file
-MAIN_QML_PATH = os.path.join(HERE, "qml", MAIN_QML_FILE)
+MAIN_QML_PATH = os.path.join(QML_DIR, MAIN_QML_FILE)
+#: Directory of the bundle of the QML files with compiled caches
+QML_BUNDLE_DIR = os.path.join(HERE, "qml_bundle")
+#: Command line option which enables the logging of the startup time
+PROFILE_STARTUP_OPTION = "--profile-startup"
+#: Command line option which builds the QML bundle and exits
+BUILD_QML_BUNDLE_OPTION = "--build-qml-bundle"
+#: Command line option which loads the QML files from the QML directory even
+#: if the QML bundle is built
+NO_QML_BUNDLE_OPTION = "--no-qml-bundle"
+#: Command line options handled by the application instead of Qt
+APPLICATION_OPTIONS = (PROFILE_STARTUP_OPTION, BUILD_QML_BUNDLE_OPTION,
+                       NO_QML_BUNDLE_OPTION)
 #: QML application control style
 QUICK_CONTROLS2_STYLE = "imagine"
+#: Name of the file where the outgoing messages are queued
+OUTBOX_FILE = "outbox.jsonl"
+#: Name of the file where the snapshot of the chat rooms is saved
+SNAPSHOT_FILE = "snapshot.bin"
 
 
 def register_types() -> None:
     """Register custom QML types"""
     qmlRegisterType(ConversationModel, "ChatDemo", 1, 0, "Conversation")
+    qmlRegisterType(ChannelsFilterModel, "ChatDemo", 1, 0, "ChannelsFilter")
     qmlRegisterType(ChatService, "ChatService", 1, 0, "ChatService")
     qmlRegisterUncreatableType(ChannelsModel, "ChannelsModel", 1, 0,
                                "ChannelsModel",
@@ -40,35 +73,99 @@ def register_types() -> None:
     qmlRegisterUncreatableType(ConversationModel, "ConversationModel", 1, 0,
                                "ConversationModel",
                                "ConversationModel can't be created in QML!")
+    qmlRegisterUncreatableType(SearchResultsModel, "SearchResultsModel", 1, 0,
+                               "SearchResultsModel",
+                               "SearchResultsModel can't be created in QML!")
 
 
-def main() -> None:
-    """Application entry point"""
+def get_data_path(file_name: str) -> str:
+    """Get the path of the file named *file_name* in the application's data
+    directory, which is created if it doesn't exist"""
+    data_dir = QStandardPaths.writableLocation(
+        QStandardPaths.AppDataLocation
+    )
+    os.makedirs(data_dir, exist_ok=True)
+    return os.path.join(data_dir, file_name)
+
+
+def get_outbox_path() -> str:
+    """Get the path of the outbox file in the application's data
+    directory"""
+    return get_data_path(OUTBOX_FILE)
+
+
+def get_snapshot_path() -> str:
+    """Get the path of the snapshot file in the application's data
+    directory"""
+    return get_data_path(SNAPSHOT_FILE)
+
+
+def get_main_qml_path(use_bundle: bool = True) -> str:
+    """Get the path of the main QML file
+
+    :param use_bundle: Whether to load the main QML file from the QML \
+    bundle if it's built
+    :return: Path of the main QML file in the QML bundle or in the QML \
+    directory
+    """
+    bundled_path = os.path.join(QML_BUNDLE_DIR, MAIN_QML_FILE)
+    if use_bundle and os.path.isfile(bundled_path):
+        return bundled_path
+    return MAIN_QML_PATH
+
+
+def main() -> int:
+    """Application entry point
+
+    :return: The exit status of the application
+    """
+    profiler = StartupProfiler(IMPORT_TIME)
+    profiler.mark("imports")
+    argv = [arg for arg in sys.argv if arg not in APPLICATION_OPTIONS]
+
     # configure logging
     logging.basicConfig(level=logging.INFO)
 
     # create the App ant the event loop
-    app = QGuiApplication(sys.argv + ["--style", QUICK_CONTROLS2_STYLE])
+    app = QGuiApplication(argv + ["--style", QUICK_CONTROLS2_STYLE])
     loop = QEventLoop(app)
     asyncio.set_event_loop(loop)
+    profiler.mark("application")
 
     # register custom types
     register_types()
+    profiler.mark("register_types")
 
     # create the QML engine
     engine = QQmlApplicationEngine()
+    if BUILD_QML_BUNDLE_OPTION in sys.argv:
+        build_bundle(engine, QML_DIR, QML_BUNDLE_DIR)
+        return 0
     # set context properties
     engine.rootContext().setContextProperty("version", VERSION)
     engine.rootContext().setContextProperty("author", AUTHOR)
     engine.rootContext().setContextProperty("authorEmail", AUTHOR_EMAIL)
     engine.rootContext().setContextProperty("projectUrl", URL)
+    engine.rootContext().setContextProperty("outboxPath", get_outbox_path())
+    engine.rootContext().setContextProperty("snapshotPath",
+                                            get_snapshot_path())
     # load the main QML file
-    engine.load(MAIN_QML_PATH)
+    main_qml_path = get_main_qml_path(NO_QML_BUNDLE_OPTION not in sys.argv)
+    engine.load(main_qml_path)
+    profiler.mark("qml")
+    # the errors of the QML files are already logged by the engine
+    root_objects = engine.rootObjects()
+    if not root_objects:
+        LOGGER.error("Failed to load %s.", main_qml_path)
+        return 1
+    if PROFILE_STARTUP_OPTION in sys.argv:
+        profiler.report_first_frame(root_objects[0])
 
     # start the event loop
     with loop:
         loop.run_forever()
+    return 0
 
 
 if __name__ == "__main__":  # pragma: no cover
-    main()
+    sys.exit(main())
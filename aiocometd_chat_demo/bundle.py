@@ -0,0 +1,127 @@
+"""Bundle of the QML files with ahead-of-time compiled caches
+
+The QML engine compiles every QML file it loads, and saves the compilation
+units to a cache in the user's cache directory. Without a writable cache
+directory, like on kiosks with read-only home directories, the files are
+compiled again on every start.
+
+The bundle is a copy of the QML files and images, where every QML file is
+accompanied by its compiled ``.qmlc`` cache file. The engine reads these
+caches from the bundle without writing anything, as long as the bundle is
+used with the same Qt version that built it, and the modification times of
+the QML files are preserved. Otherwise the engine falls back to compiling
+the QML files.
+
+Qt can only load the caches of QML files in a resource file if they're
+linked into a C++ executable with ``qmlcachegen``, which is not available
+with PyQt5, so the bundle is a directory instead of a Qt resource file.
+"""
+import fnmatch
+import hashlib
+import logging
+import os
+import shutil
+from typing import List
+
+# pylint: disable=no-name-in-module
+from PyQt5.QtCore import QStandardPaths, QUrl  # type: ignore
+from PyQt5.QtQml import QQmlComponent, QQmlEngine  # type: ignore
+# pylint: enable=no-name-in-module
+
+from aiocometd_chat_demo.exceptions import QmlCompilationError
+
+
+LOGGER = logging.getLogger(__name__)
+#: Patterns of the names of the files copied into the bundle
+BUNDLED_FILE_PATTERNS = ("*.qml", "*.svg")
+#: File name extension of the compiled QML files
+QML_CACHE_SUFFIX = "c"
+
+
+def _source_path(path: str) -> str:
+    """Get the path of the QML file at *path* as the QML engine sees it"""
+    return QUrl.fromLocalFile(os.path.abspath(path)).toLocalFile()
+
+
+def engine_cache_path(path: str) -> str:
+    """Get the path where the QML engine caches the compiled QML file at
+    *path*
+
+    :param path: Path of a QML file
+    :return: Path of the cache file in the user's cache directory
+    """
+    name = hashlib.sha1(_source_path(path).encode("utf-8")).hexdigest()
+    cache_dir = QStandardPaths.writableLocation(QStandardPaths.CacheLocation)
+    return os.path.join(cache_dir, "qmlcache", name + ".qmlc")
+
+
+def _ignore_unbundled(directory: str, names: List[str]) -> List[str]:
+    """Get the names of the files in *directory* which are not bundled"""
+    return [name for name in names
+            if not os.path.isdir(os.path.join(directory, name)) and
+            not any(fnmatch.fnmatch(name, pattern)
+                    for pattern in BUNDLED_FILE_PATTERNS)]
+
+
+def copy_sources(source_dir: str, bundle_dir: str) -> List[str]:
+    """Copy the QML files and the images from *source_dir* into
+    *bundle_dir*, preserving their modification times
+
+    :param source_dir: Directory of the QML files
+    :param bundle_dir: Directory of the bundle, which is replaced if it \
+    exists
+    :return: The paths of the copied QML files
+    """
+    if os.path.isdir(bundle_dir):
+        shutil.rmtree(bundle_dir)
+    # the compiled caches are only valid for the modification time of their
+    # source, so the times are copied as well
+    shutil.copytree(source_dir, bundle_dir, copy_function=shutil.copy2,
+                    ignore=_ignore_unbundled)
+    qml_paths: List[str] = []
+    for directory, _, file_names in os.walk(bundle_dir):
+        qml_paths.extend(os.path.join(directory, file_name)
+                         for file_name in sorted(file_names)
+                         if file_name.endswith(".qml"))
+    return qml_paths
+
+
+def compile_qml(engine: QQmlEngine, path: str) -> bool:
+    """Compile the QML file at *path* and store its compiled cache next to
+    it
+
+    :param engine: The QML engine, with the application's QML types \
+    registered
+    :param path: Path of a QML file
+    :return: ``True`` if the cache is stored, or ``False`` if the engine's \
+    disk cache is disabled
+    :raise QmlCompilationError: If the QML file can't be compiled
+    """
+    component = QQmlComponent(engine, QUrl.fromLocalFile(path))
+    if component.isError():
+        raise QmlCompilationError(
+            "\n".join(error.toString() for error in component.errors())
+        )
+    cache_path = engine_cache_path(path)
+    if not os.path.isfile(cache_path):
+        return False
+    shutil.copyfile(cache_path, path + QML_CACHE_SUFFIX)
+    return True
+
+
+def build_bundle(engine: QQmlEngine, source_dir: str,
+                 bundle_dir: str) -> None:
+    """Build the bundle of the QML files in *source_dir* in *bundle_dir*
+
+    :param engine: The QML engine, with the application's QML types \
+    registered
+    :param source_dir: Directory of the QML files
+    :param bundle_dir: Directory of the bundle, which is replaced if it \
+    exists
+    :raise QmlCompilationError: If a QML file can't be compiled
+    """
+    for path in copy_sources(source_dir, bundle_dir):
+        if not compile_qml(engine, path):
+            LOGGER.warning("The compiled cache of %s is not available, "
+                           "the QML disk cache might be disabled.", path)
+    LOGGER.info("QML bundle built in %s", bundle_dir)
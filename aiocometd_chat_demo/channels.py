@@ -1,7 +1,13 @@
 """Chat channels related type definitions"""
-from typing import List, ClassVar, Dict, Any, Optional, Set
+import asyncio
+from itertools import chain
+from operator import itemgetter
+from typing import List, ClassVar, Dict, Any, Optional, Set, Deque, Tuple, \
+    Iterator, Iterable, Callable
 from enum import IntEnum, Enum, unique
-from bisect import bisect
+from bisect import bisect, bisect_left
+from collections import deque
+from datetime import datetime, timedelta
 from dataclasses import dataclass, field
 
 # pylint: disable=no-name-in-module,wrong-import-order
@@ -10,11 +16,28 @@ from PyQt5.QtCore import (  # type: ignore
     Qt,
     QByteArray,
     QModelIndex,
-    pyqtSignal
+    QDateTime,
+    pyqtSignal,
+    pyqtSlot,
+    pyqtProperty
 )
 # pylint: enable=no-name-in-module,wrong-import-order
 
+from .coalescer import UpdateCoalescer
 from .conversation import ConversationModel, ChatMessage
+from .search import SearchIndex, SearchResultsModel
+
+
+#: The time window in which the message rate of the channels is measured
+MESSAGE_RATE_WINDOW = timedelta(minutes=1)
+#: The time between the updates of the message rates of the channels in
+#: seconds, which drop while no messages arrive
+MESSAGE_RATE_UPDATE_INTERVAL = 1.0
+#: The maximum length of the last message preview of the channels
+PREVIEW_LENGTH = 100
+#: The number of user channels stored together in the buckets of a
+#: :obj:`ChannelsModel`, the buckets are split at twice this size
+CHANNEL_BUCKET_SIZE = 500
 
 
 @unique
@@ -26,6 +49,15 @@ class ChannelType(str, Enum):
     USER = "user"
 
 
+@unique
+class ChannelOrder(Enum):
+    """The order of the user channels in a :obj:`ChannelsModel`"""
+    #: Alphabetical order by the channel names
+    NAME = "name"
+    #: The most recently active channel first
+    ACTIVITY = "activity"
+
+
 @dataclass()
 class ChannelItem:
     """Represents a chat channel"""
@@ -35,6 +67,17 @@ class ChannelItem:
     type: ChannelType
     #: The conversation model containing the messages on the channel
     conversation: ConversationModel = field(init=False)
+    #: Sequence number of the latest message of the channel among the
+    #: messages of all channels, 0 if the channel has no messages
+    activity: int = field(default=0, init=False)
+    #: Number of messages which arrived since the channel was last read
+    unread_count: int = field(default=0, init=False)
+    #: The most recent message of the channel
+    last_message: Optional[ChatMessage] = field(default=None, init=False)
+    #: Times of the messages inside the message rate window in increasing
+    #: order
+    _message_times: Deque[datetime] = field(default_factory=deque,
+                                            init=False, repr=False)
 
     def __post_init__(self) -> None:
         self.conversation = ConversationModel(self.name)
@@ -42,6 +85,57 @@ class ChannelItem:
     def __lt__(self, other: "ChannelItem") -> bool:
         return self.name < other.name
 
+    def record_message(self, message: ChatMessage, unread: bool) -> None:
+        """Update the summary of the channel with a new *message*
+
+        :param message: A message added to the channel's conversation
+        :param unread: Whether the message should be counted as unread
+        """
+        if self.last_message is None or \
+                message.time >= self.last_message.time:
+            self.last_message = message
+        if unread:
+            self.unread_count += 1
+        start = datetime.now() - MESSAGE_RATE_WINDOW
+        if message.time > start:
+            times = self._message_times
+            # the late messages, like the ones fetched from the backlog, are
+            # inserted in order, so the oldest time stays in front
+            if times and message.time < times[-1]:
+                times.insert(bisect(times, message.time), message.time)
+            else:
+                times.append(message.time)
+        self.expire_message_times(start)
+
+    def expire_message_times(self, start: Optional[datetime] = None) -> bool:
+        """Drop the message times which are out of the message rate window
+
+        :param start: The start of the message rate window, if not specified \
+        the window ends at the current time
+        :return: Whether any message times were dropped, which changes the \
+        :obj:`messages_per_minute`
+        """
+        if start is None:
+            start = datetime.now() - MESSAGE_RATE_WINDOW
+        times = self._message_times
+        count = len(times)
+        while times and times[0] <= start:
+            times.popleft()
+        return len(times) != count
+
+    @property
+    def messages_per_minute(self) -> int:
+        """Number of messages in the last minute"""
+        self.expire_message_times()
+        return len(self._message_times)
+
+    @property
+    def last_message_preview(self) -> str:
+        """The beginning of the first line of the last message"""
+        if self.last_message is None:
+            return ""
+        return self.last_message.contents.split("\n", 1)[0][:PREVIEW_LENGTH]
+
 
 @unique
 class ChannelItemRole(IntEnum):
@@ -52,8 +146,250 @@ class ChannelItemRole(IntEnum):
     CONVERSATION = Qt.UserRole + 1
     #: Channel type role
     CHANNEL_TYPE = Qt.UserRole + 2
+    #: Number of unread messages role
+    UNREAD_COUNT = Qt.UserRole + 3
+    #: The preview of the last message role
+    LAST_MESSAGE = Qt.UserRole + 4
+    #: The time of the last message role
+    LAST_ACTIVITY = Qt.UserRole + 5
+    #: Number of messages in the last minute role
+    MESSAGES_PER_MINUTE = Qt.UserRole + 6
+
+
+#: The roles of the channel summary, which change with every incoming message
+SUMMARY_ROLES = [
+    ChannelItemRole.UNREAD_COUNT,
+    ChannelItemRole.LAST_MESSAGE,
+    ChannelItemRole.LAST_ACTIVITY,
+    ChannelItemRole.MESSAGES_PER_MINUTE
+]
+#: The names of the channel item roles, shared by the models which list the
+#: channels
+CHANNEL_ROLE_NAMES: Dict[int, QByteArray] = {
+    ChannelItemRole.NAME: QByteArray(b"name"),
+    ChannelItemRole.CONVERSATION: QByteArray(b"conversation"),
+    ChannelItemRole.CHANNEL_TYPE: QByteArray(b"type"),
+    ChannelItemRole.UNREAD_COUNT: QByteArray(b"unreadCount"),
+    ChannelItemRole.LAST_MESSAGE: QByteArray(b"lastMessage"),
+    ChannelItemRole.LAST_ACTIVITY: QByteArray(b"lastActivity"),
+    ChannelItemRole.MESSAGES_PER_MINUTE: QByteArray(b"messagesPerMinute"),
+}
+
+
+class _ChannelList:
+    """The user channels of a :obj:`ChannelsModel` sorted by their unique
+    sort keys, which can be accessed by their positions
+
+    The channels are stored in consecutive buckets of limited size, and the
+    sizes of the buckets are summed up by a Fenwick tree. A channel is
+    found by its key or by its position, inserted or removed in logarithmic
+    time, plus the shift of the channels inside a single bucket. So moving
+    a channel to the front, which happens with every incoming message in
+    activity order, takes the same time wherever the channel was.
+    """
 
+    def __init__(self, bucket_size: int = CHANNEL_BUCKET_SIZE) -> None:
+        """
+        :param bucket_size: The number of channels stored together
+        """
+        self._bucket_size = bucket_size
+        #: The sort keys of the channels in every bucket
+        self._keys: List[List[Any]] = []
+        #: The channels in every bucket
+        self._channels: List[List[ChannelItem]] = []
+        #: The greatest sort key of every bucket
+        self._maxes: List[Any] = []
+        #: Fenwick tree of the sizes of the buckets, indexed from 1
+        self._tree: List[int] = [0]
+        #: The number of channels
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[ChannelItem]:
+        return chain.from_iterable(self._channels)
+
+    def __getitem__(self, position: int) -> ChannelItem:
+        if not 0 <= position < self._length:
+            raise IndexError("Channel position out of range.")
+        bucket, offset = self._locate(position)
+        return self._channels[bucket][offset]
+
+    def reset(self, channels: Iterable[ChannelItem],
+              sort_key: Callable[[ChannelItem], Any]) -> None:
+        """Replace the stored channels
+
+        :param channels: The new channels in any order
+        :param sort_key: Returns the sort key of a channel
+        """
+        items = sorted(((sort_key(channel), channel) for channel in channels),
+                       key=itemgetter(0))
+        size = self._bucket_size
+        self._keys = [[key for key, _ in items[start:start + size]]
+                      for start in range(0, len(items), size)]
+        self._channels = [[channel for _, channel in items[start:start + size]]
+                          for start in range(0, len(items), size)]
+        self._maxes = [keys[-1] for keys in self._keys]
+        self._length = len(items)
+        self._build_tree()
+
+    def index(self, key: Any) -> int:
+        """Find the position of the channel with the given sort *key*, or
+        the position where it would be inserted
+
+        :param key: A sort key
+        :return: The number of channels whose sort key is less than *key*
+        """
+        bucket = bisect_left(self._maxes, key)
+        if bucket == len(self._maxes):
+            return self._length
+        return self._prefix(bucket) + bisect_left(self._keys[bucket], key)
+
+    def insert(self, key: Any, channel: ChannelItem) -> int:
+        """Insert the *channel* with the given sort *key*
+
+        :param key: The sort key of the channel
+        :param channel: A channel
+        :return: The position of the inserted channel
+        """
+        if not self._maxes:
+            self.reset([channel], lambda _: key)
+            return 0
+        bucket = min(bisect(self._maxes, key), len(self._maxes) - 1)
+        keys = self._keys[bucket]
+        offset = bisect(keys, key)
+        keys.insert(offset, key)
+        self._channels[bucket].insert(offset, channel)
+        self._maxes[bucket] = keys[-1]
+        self._length += 1
+        position = self._prefix(bucket) + offset
+        if len(keys) > 2 * self._bucket_size:
+            self._split(bucket)
+        else:
+            self._add(bucket, 1)
+        return position
+
+    def pop(self, position: int) -> ChannelItem:
+        """Remove the channel at the given *position*
 
+        :param position: The position of the channel
+        :return: The removed channel
+        """
+        if not 0 <= position < self._length:
+            raise IndexError("Channel position out of range.")
+        bucket, offset = self._locate(position)
+        keys = self._keys[bucket]
+        del keys[offset]
+        channel = self._channels[bucket].pop(offset)
+        self._length -= 1
+        if len(keys) < self._bucket_size // 2 and len(self._keys) > 1:
+            # merge the small buckets to keep their number low
+            self._join(bucket)
+        elif keys:
+            self._maxes[bucket] = keys[-1]
+            self._add(bucket, -1)
+        else:
+            del self._keys[bucket]
+            del self._channels[bucket]
+            del self._maxes[bucket]
+            self._build_tree()
+        return channel
+
+    def move_to_front(self, position: int, key: Any) -> None:
+        """Move the channel at the given *position* in front of the other
+        channels
+
+        :param position: The position of the channel
+        :param key: The new sort key of the channel, less than the sort key \
+        of any other channel
+        """
+        if not 0 <= position < self._length:
+            raise IndexError("Channel position out of range.")
+        bucket, offset = self._locate(position)
+        if bucket > 0:
+            self.insert(key, self.pop(position))
+            return
+        # moving inside the first bucket doesn't change the bucket sizes
+        keys = self._keys[0]
+        channels = self._channels[0]
+        del keys[offset]
+        keys.insert(0, key)
+        channels.insert(0, channels.pop(offset))
+        self._maxes[0] = keys[-1]
+
+    def _split(self, bucket: int) -> None:
+        """Split the *bucket* into two halves"""
+        keys = self._keys[bucket]
+        channels = self._channels[bucket]
+        half = len(keys) // 2
+        self._keys[bucket:bucket + 1] = [keys[:half], keys[half:]]
+        self._channels[bucket:bucket + 1] = [channels[:half],
+                                             channels[half:]]
+        self._maxes[bucket:bucket + 1] = [keys[half - 1], keys[-1]]
+        self._build_tree()
+
+    def _join(self, bucket: int) -> None:
+        """Merge the *bucket* with its next bucket, or with its previous
+        bucket if it's the last one"""
+        if bucket == len(self._keys) - 1:
+            bucket -= 1
+        self._keys[bucket:bucket + 2] = [self._keys[bucket] +
+                                         self._keys[bucket + 1]]
+        self._channels[bucket:bucket + 2] = [self._channels[bucket] +
+                                             self._channels[bucket + 1]]
+        self._maxes[bucket:bucket + 2] = [self._keys[bucket][-1]]
+        if len(self._keys[bucket]) > 2 * self._bucket_size:
+            self._split(bucket)
+        else:
+            self._build_tree()
+
+    def _build_tree(self) -> None:
+        """Build the Fenwick tree from the sizes of the buckets"""
+        tree = [0] + [len(keys) for keys in self._keys]
+        for index in range(1, len(tree)):
+            parent = index + (index & -index)
+            if parent < len(tree):
+                tree[parent] += tree[index]
+        self._tree = tree
+
+    def _add(self, bucket: int, delta: int) -> None:
+        """Change the size of the *bucket* in the Fenwick tree by *delta*"""
+        index = bucket + 1
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def _prefix(self, bucket: int) -> int:
+        """Get the number of channels in the buckets before the *bucket*"""
+        total = 0
+        index = bucket
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def _locate(self, position: int) -> Tuple[int, int]:
+        """Find the bucket of the channel at the given *position*
+
+        :return: The index of the bucket and the offset of the channel in \
+        the bucket
+        """
+        # the recently active channels are usually in the first bucket
+        if position < len(self._keys[0]):
+            return 0, position
+        bucket = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            index = bucket + step
+            if index < len(self._tree) and self._tree[index] <= position:
+                bucket = index
+                position -= self._tree[index]
+            step >>= 1
+        return bucket, position
+
+
+# pylint: disable=too-many-instance-attributes
 @dataclass()
 class ChannelsModel(QAbstractListModel):  # type: ignore
     """Represents all the channels available inside a chat service and inserts
@@ -65,21 +401,57 @@ class ChannelsModel(QAbstractListModel):  # type: ignore
     group_channel_name: str
     #: Group channel item
     group_channel: ChannelItem = field(init=False, repr=False)
-    #: List of user channel items
-    _channels: List[ChannelItem] = field(default_factory=list, init=False,
-                                         repr=False)
+    #: The user channel items in their current order
+    _channels: _ChannelList = field(default_factory=_ChannelList,
+                                    init=False, repr=False)
+    #: User channel items by their names
+    _channels_by_name: Dict[str, ChannelItem] = field(default_factory=dict,
+                                                      init=False, repr=False)
+    #: The order of the user channels
+    _order: ChannelOrder = field(default=ChannelOrder.NAME, init=False)
+    #: Sequence number of the latest incoming message
+    _last_activity: int = field(default=0, init=False)
+    #: Handle of the scheduled update of the message rates of the channels
+    _rate_update_handle: Optional[asyncio.TimerHandle] = field(
+        default=None, init=False, repr=False
+    )
+    #: The channels which have messages inside the message rate window by
+    #: their ids
+    _rate_channels: Dict[int, ChannelItem] = field(default_factory=dict,
+                                                   init=False, repr=False)
+    #: Full-text index of the messages of all conversations
+    search_index: SearchIndex = field(default_factory=SearchIndex,
+                                      init=False, repr=False)
+    #: The results of the current search query
+    _search_results: SearchResultsModel = field(init=False, repr=False)
+    #: The name of the channel which is currently read by the user, its
+    #: incoming messages are not counted as unread
+    _active_channel: str = field(default="", init=False)
+    #: Whether the history of the conversations can be fetched
+    _history_enabled: bool = field(default=False, init=False)
+    #: The name of the local user, whose messages are displayed as own
+    _username: str = field(default="", init=False)
+    #: Coalesces the incoming messages into per-frame updates of the
+    #: conversations, or ``None`` to add them right away
+    coalescer: Optional[UpdateCoalescer] = field(default=None, repr=False)
     #: Custom item role names
-    _role_names: ClassVar[Dict[int, QByteArray]] = {
-        ChannelItemRole.NAME: QByteArray(b"name"),
-        ChannelItemRole.CONVERSATION: QByteArray(b"conversation"),
-        ChannelItemRole.CHANNEL_TYPE: QByteArray(b"type")
-    }
+    _role_names: ClassVar[Dict[int, QByteArray]] = CHANNEL_ROLE_NAMES
     #: Sending of a message was requested to the specified
     #: (channel_name, channel_type and contents)
     message_sending_requested: ClassVar[pyqtSignal] = pyqtSignal(str, str, str)
+    #: Fetching the next older page of the history of a conversation was
+    #: requested for the specified (channel_name, channel_type)
+    history_requested: ClassVar[pyqtSignal] = pyqtSignal(str, str)
+    #: Signal emitted when the active channel changes
+    active_channel_changed: ClassVar[pyqtSignal] = pyqtSignal(str)
+    #: Signal emitted when the order of the user channels changes
+    order_changed: ClassVar[pyqtSignal] = pyqtSignal(str)
 
     def __post_init__(self) -> None:
         super().__init__()
+        self._search_results = SearchResultsModel(
+            self.search_index, flush_conversation=self._flush_conversation
+        )
         # create the single group channel
         self.group_channel = ChannelItem(
             name=self.group_channel_name,
@@ -93,6 +465,110 @@ class ChannelsModel(QAbstractListModel):  # type: ignore
                 contents
             )
         )
+        # forward history requests
+        self.group_channel.conversation.history_requested.connect(
+            lambda: self.history_requested.emit(self.group_channel.name,
+                                                self.group_channel.type)
+        )
+
+    @property
+    def username(self) -> str:
+        """The name of the local user, whose messages are displayed as own
+        in the conversations of the channels"""
+        return self._username
+
+    @username.setter
+    def username(self, username: str) -> None:
+        """Set the name of the local user in the conversations of all the
+        channels, including the ones added later
+
+        :param username: The name of the local user
+        """
+        self._username = username
+        self.group_channel.conversation.username = username
+        for channel in self._channels:
+            channel.conversation.username = username
+
+    def _flush_conversation(self, conversation: ConversationModel) -> None:
+        """Add the buffered incoming messages of the *conversation* to it"""
+        if self.coalescer is not None:
+            self.coalescer.flush_conversation(conversation)
+
+    def discard_buffered_messages(self) -> None:
+        """Drop the incoming messages of the conversations of the channels
+        which are buffered by the coalescer"""
+        if self.coalescer is None:
+            return
+        self.coalescer.discard(self.group_channel.conversation)
+        for channel in self._channels:
+            self.coalescer.discard(channel.conversation)
+
+    @pyqtProperty(SearchResultsModel, constant=True)  # type: ignore
+    def search_results(self) -> SearchResultsModel:
+        """The results of the current search query of the messages of all
+        conversations"""
+        return self._search_results
+
+    @pyqtProperty(str, notify=active_channel_changed)  # type: ignore
+    def active_channel(self) -> str:
+        """The name of the channel which is currently read by the user"""
+        return self._active_channel
+
+    @active_channel.setter  # type: ignore
+    def active_channel(self, name: str) -> None:
+        """Set the active channel and mark it as read
+
+        :param name: The name of the channel
+        """
+        if name != self._active_channel:
+            self._active_channel = name
+            self.mark_read(name)
+            self.active_channel_changed.emit(name)
+
+    @pyqtProperty(str, notify=order_changed)  # type: ignore
+    def order(self) -> str:
+        """The order of the user channels, the value of a
+        :obj:`ChannelOrder`"""
+        return self._order.value
+
+    @order.setter  # type: ignore
+    def order(self, value: str) -> None:
+        """Set the order of the user channels and sort the channels
+
+        :param value: The value of a :obj:`ChannelOrder`
+        """
+        order = ChannelOrder(value)
+        if order != self._order:
+            self.beginResetModel()
+            self._order = order
+            self._channels.reset(list(self._channels), self._sort_key)
+            self.endResetModel()
+            self.order_changed.emit(value)
+
+    def _sort_key(self, channel: ChannelItem) -> Any:
+        """Get the key which determines the position of the *channel* among
+        the user channels in the current order
+
+        :param channel: A user channel
+        :return: The name of the channel in alphabetical order, or the \
+        negated activity and the name of the channel in activity order
+        """
+        if self._order == ChannelOrder.ACTIVITY:
+            return -channel.activity, channel.name
+        return channel.name
+
+    @pyqtSlot(str, name="markRead")  # type: ignore
+    def mark_read(self, name: str) -> None:
+        """Clear the unread count of the channel with the given *name*
+
+        :param name: The name of the channel
+        """
+        row = self.channel_row(name)
+        channel = self._channel_at(row)
+        if channel is not None and channel.unread_count:
+            channel.unread_count = 0
+            index = self.index(row, 0)
+            self.dataChanged.emit(index, index, [ChannelItemRole.UNREAD_COUNT])
 
     # pylint: disable=invalid-name,unused-argument
     def rowCount(self, parent: Optional[QModelIndex] = None) -> int:
@@ -113,6 +589,7 @@ class ChannelsModel(QAbstractListModel):  # type: ignore
 
     # pylint: enable=invalid-name,unused-argument
 
+    # pylint: disable=too-many-return-statements
     def data(self, index: QModelIndex, role: Optional[int] = None) -> Any:
         """Return the data at the row of the given *index* and for the
         specified *role*
@@ -123,16 +600,7 @@ class ChannelsModel(QAbstractListModel):  # type: ignore
         :return: The data the view requested at the specified *row* for the \
         given *role*
         """
-        channel = None
-        # the first channel is the group channel
-        if index.row() == 0:
-            channel = self.group_channel
-        # beyond the 0th index return one of the user channels if the requested
-        # row is not out of range
-        elif 1 <= index.row() < len(self._channels)+1:
-            # pylint: disable=unsubscriptable-object
-            channel = self._channels[index.row()-1]
-            # pylint: enable=unsubscriptable-object
+        channel = self._channel_at(index.row())
 
         # if the requested row wasn't out of range and a channel was found
         if channel is not None:
@@ -142,6 +610,32 @@ class ChannelsModel(QAbstractListModel):  # type: ignore
                 return channel.conversation
             if role == ChannelItemRole.CHANNEL_TYPE:
                 return channel.type.value
+            if role == ChannelItemRole.UNREAD_COUNT:
+                return channel.unread_count
+            if role == ChannelItemRole.LAST_MESSAGE:
+                return channel.last_message_preview
+            if role == ChannelItemRole.LAST_ACTIVITY:
+                if channel.last_message is None:
+                    return QDateTime()
+                return QDateTime(channel.last_message.time)
+            if role == ChannelItemRole.MESSAGES_PER_MINUTE:
+                return channel.messages_per_minute
+        return None
+
+    # pylint: enable=too-many-return-statements
+
+    def _channel_at(self, row: int) -> Optional[ChannelItem]:
+        """Get the channel at the given *row*, or ``None`` if the *row* is out
+        of range"""
+        # the first channel is the group channel
+        if row == 0:
+            return self.group_channel
+        # beyond the 0th index return one of the user channels if the requested
+        # row is not out of range
+        if 1 <= row < len(self._channels)+1:
+            # pylint: disable=unsubscriptable-object
+            return self._channels[row-1]
+            # pylint: enable=unsubscriptable-object
         return None
 
     def _add_channel(self, name: str) -> None:
@@ -156,16 +650,24 @@ class ChannelsModel(QAbstractListModel):  # type: ignore
                 contents
             )
         )
+        # forward history requests
+        channel_item.conversation.history_requested.connect(
+            lambda: self.history_requested.emit(channel_item.name,
+                                                channel_item.type)
+        )
+        if self._history_enabled:
+            channel_item.conversation.enable_history()
+        channel_item.conversation.username = self._username
 
         # find the index where the new channel should be inserted to maintain
         # sorted channel order
-        index = bisect(self._channels, channel_item)
+        key = self._sort_key(channel_item)
+        index = self._channels.index(key)
 
         # insert the channel
         self.beginInsertRows(QModelIndex(), index+1, index+1)
-        # pylint: disable=no-member
-        self._channels.insert(index, channel_item)
-        # pylint: enable=no-member
+        self._channels.insert(key, channel_item)
+        self._channels_by_name[name] = channel_item
         self.endInsertRows()
 
     def _remove_channel(self, name: str) -> None:
@@ -178,35 +680,95 @@ class ChannelsModel(QAbstractListModel):  # type: ignore
             # remove the channel
             # pylint: disable=no-member
             channel_item = self._channels.pop(index)
+            del self._channels_by_name[name]
+            self._rate_channels.pop(id(channel_item), None)
             # pylint: enable=no-member
             # disconnect all signals of the channel
             channel_item.conversation.disconnect()
+            if self.coalescer is not None:
+                self.coalescer.discard(channel_item.conversation)
             self.endRemoveRows()
+            # drop the channel's messages from the search results
+            self.search_index.remove_conversation(channel_item.conversation)
+            if self._search_results.query:
+                self._search_results.refresh()
+
+    def _find_channel(self, channel_name: str, channel_type: ChannelType) \
+            -> Tuple[Optional[ChannelItem], int]:
+        """Find the channel with the given name and type
+
+        :param channel_name: The name of the channel
+        :param channel_type: The channel's type
+        :return: The channel and its row, or ``None`` and -1 if not found
+        """
+        # the group channel is found by its type
+        if channel_type == ChannelType.GROUP:
+            return self.group_channel, 0
+        # otherwise find the user channel by name
+        index = self._channel_index(channel_name)
+        if index >= 0:
+            # pylint: disable=unsubscriptable-object
+            return self._channels[index], index + 1
+            # pylint: enable=unsubscriptable-object
+        return None, -1
+
+    def conversation(self, channel_name: str, channel_type: ChannelType) \
+            -> Optional[ConversationModel]:
+        """Get the conversation of the channel with the given name and type
+
+        :param channel_name: The name of the channel
+        :param channel_type: The channel's type
+        :return: The conversation, or ``None`` if the channel is not found
+        """
+        channel, _ = self._find_channel(channel_name, channel_type)
+        return channel.conversation if channel is not None else None
+
+    @pyqtSlot(str, result=int, name="channelRow")  # type: ignore
+    def channel_row(self, name: str) -> int:
+        """Find the row of the channel with the given *name*
+
+        :param name: The name of the channel
+        :return: The row of the channel or -1 if not found
+        """
+        if name == self.group_channel.name:
+            return 0
+        index = self._channel_index(name)
+        return index + 1 if index >= 0 else -1
 
     def _channel_index(self, name: str) -> int:
         """Find the index of channel with the given *name*
 
-        It would be great to use bisect for this task but unfortunately it
-        doesn't takes a key predicate, so we can only use it to find
-        comparable items, and it seems wasteful to instantiate a dummy channel
-        just for this purpose.
+        The channel is looked up by its name, and its index is found by its
+        sort key, since the sort keys of the channels are unique.
         :param name: The name of the channel
         :return: The index of the channel or -1 if not found
         """
-        # standard binary search algorithm
-        left = 0
-        right = len(self._channels) - 1
-        while left <= right:
-            # pylint: disable=unsubscriptable-object
-            mid = left + (right - left) // 2
-            if name < self._channels[mid].name:
-                right = mid - 1
-            elif name > self._channels[mid].name:
-                left = mid + 1
-            else:
-                return mid
-            # pylint: enable=unsubscriptable-object
-        return -1
+        # pylint: disable=no-member
+        channel = self._channels_by_name.get(name)
+        # pylint: enable=no-member
+        if channel is None:
+            return -1
+        return self._channels.index(self._sort_key(channel))
+
+    def _move_channel_to_front(self, index: int, activity: int) -> None:
+        """Set the *activity* of the user channel at *index* and move it in
+        front of the other user channels
+
+        The channel is moved in the indexed channel list, which takes
+        logarithmic time wherever the channel was.
+        :param index: The index of the channel
+        :param activity: The new activity of the channel, greater than the \
+        activity of any other channel
+        """
+        channel = self._channels[index]
+        moved = index > 0
+        if moved:
+            self.beginMoveRows(QModelIndex(), index+1, index+1,
+                               QModelIndex(), 1)
+        channel.activity = activity
+        self._channels.move_to_front(index, self._sort_key(channel))
+        if moved:
+            self.endMoveRows()
 
     def update_available_channels(self, channel_names: Set[str]) -> None:
         """Update the list of channels to be the same as specified by
@@ -218,9 +780,9 @@ class ChannelsModel(QAbstractListModel):  # type: ignore
         :param channel_names: The current set of channel names
         """
         # create sets of new and dropped channel names
-        # pylint: disable=not-an-iterable
-        current_names = set(item.name for item in self._channels)
-        # pylint: enable=not-an-iterable
+        # pylint: disable=no-member
+        current_names = self._channels_by_name.keys()
+        # pylint: enable=no-member
         dropped_channels = current_names - channel_names
         new_channels = channel_names - current_names
 
@@ -243,19 +805,141 @@ class ChannelsModel(QAbstractListModel):  # type: ignore
         :param channel_type: The channel's type
         :param message: An incoming chat message
         """
-        # add the message to the group channel if it has the right type
-        if channel_type == ChannelType.GROUP:
-            self.group_channel.conversation.add_incoming_message(message)
-
-        # otherwise add a user channel
-        else:
-            # find the channel by name
-            index = self._channel_index(channel_name)
-            # if found
-            if index >= 0:
-                # pylint: disable=unsubscriptable-object
-                channel = self._channels[index]
-                # pylint: enable=unsubscriptable-object
+        channel, row = self._find_channel(channel_name, channel_type)
+        if channel is not None:
+            if self.coalescer is not None:
+                self.coalescer.add(channel.conversation, message)
+            else:
                 channel.conversation.add_incoming_message(message)
+            self._last_activity += 1
+            # move the user channel to the top in activity order
+            if row > 0 and self._order == ChannelOrder.ACTIVITY:
+                self._move_channel_to_front(row - 1, self._last_activity)
+                row = 1
+            else:
+                channel.activity = self._last_activity
+            # update the summary of the channel and notify the views about
+            # the changes of its single row
+            unread = channel.name != self._active_channel
+            channel.record_message(message, unread)
+            # the row is known to be valid, so the index can be created
+            # without the range checks of index()
+            model_index = self.createIndex(row, 0)
+            self.dataChanged.emit(model_index, model_index, SUMMARY_ROLES)
+            if channel.messages_per_minute:
+                self._rate_channels[id(channel)] = channel
+                self._schedule_rate_update()
+            # index the message and update the search results
+            document_id = self.search_index.add(
+                channel.name, channel.type.value, channel.conversation,
+                message
+            )
+            self._search_results.document_added(document_id)
 
     # pylint: enable=too-many-arguments
+
+    def _schedule_rate_update(self) -> None:
+        """Schedule the update of the message rates of the channels, since
+        they drop without incoming messages"""
+        if self._rate_update_handle is None:
+            self._rate_update_handle = asyncio.get_event_loop().call_later(
+                MESSAGE_RATE_UPDATE_INTERVAL, self._update_rates
+            )
+
+    def _update_rates(self) -> None:
+        """Notify the views about the channels whose message rate dropped,
+        and keep updating the rates while any channel has recent messages
+
+        Only the channels with recent messages are visited, instead of all
+        the channels of the model.
+        """
+        self._rate_update_handle = None
+        for key, channel in list(self._rate_channels.items()):
+            if channel.expire_message_times():
+                _, row = self._find_channel(channel.name, channel.type)
+                model_index = self.createIndex(row, 0)
+                self.dataChanged.emit(model_index, model_index,
+                                      [ChannelItemRole.MESSAGES_PER_MINUTE])
+            if not channel.messages_per_minute:
+                del self._rate_channels[key]
+        if self._rate_channels:
+            self._schedule_rate_update()
+
+    @property
+    def user_channels(self) -> List[ChannelItem]:
+        """The user channels in their current order"""
+        return list(self._channels)
+
+    def enable_history(self) -> None:
+        """Allow fetching the history of the conversations of all the
+        channels, including the ones added later"""
+        self._history_enabled = True
+        self.group_channel.conversation.enable_history()
+        for channel in self._channels:
+            channel.conversation.enable_history()
+
+    def add_history_page(self, channel_name: str, channel_type: ChannelType,
+                         messages: List[ChatMessage], cursor: Any) -> None:
+        """Add a fetched page of the history to the conversation of the
+        appropriate channel
+
+        The messages of the history are not counted as unread and they don't
+        change the activity order of the channels.
+        :param channel_name: The name of the channel
+        :param channel_type: The channel's type
+        :param messages: The messages of the page
+        :param cursor: The position of the next older page, or ``None`` if \
+        there are no older messages
+        """
+        channel, row = self._find_channel(channel_name, channel_type)
+        if channel is not None:
+            channel.conversation.add_history_page(messages, cursor)
+            self._messages_added(channel, row, messages)
+
+    def add_messages(self, channel_name: str, channel_type: ChannelType,
+                     messages: List[ChatMessage]) -> None:
+        """Add several earlier *messages* to the conversation of the
+        appropriate channel, like the messages restored from a snapshot
+
+        The messages are not counted as unread and they don't change the
+        activity order of the channels.
+        :param channel_name: The name of the channel
+        :param channel_type: The channel's type
+        :param messages: The added messages
+        """
+        channel, row = self._find_channel(channel_name, channel_type)
+        if channel is not None:
+            channel.conversation.add_messages(messages)
+            self._messages_added(channel, row, messages)
+
+    def _messages_added(self, channel: ChannelItem, row: int,
+                        messages: List[ChatMessage]) -> None:
+        """Update the summary of the *channel* at *row* and the search index
+        after earlier *messages* were added to its conversation"""
+        if not messages:
+            return
+        newest = max(messages, key=lambda message: message.time)
+        if channel.last_message is None or \
+                newest.time > channel.last_message.time:
+            channel.last_message = newest
+            model_index = self.createIndex(row, 0)
+            self.dataChanged.emit(model_index, model_index, SUMMARY_ROLES)
+        for message in messages:
+            self.search_index.add(channel.name, channel.type.value,
+                                  channel.conversation, message)
+        if self._search_results.query:
+            self._search_results.refresh()
+
+    def history_page_failed(self, channel_name: str,
+                            channel_type: ChannelType) -> None:
+        """Allow fetching the history page of the appropriate channel again
+        after it failed to be fetched
+
+        :param channel_name: The name of the channel
+        :param channel_type: The channel's type
+        """
+        channel, _ = self._find_channel(channel_name, channel_type)
+        if channel is not None:
+            channel.conversation.history_page_failed()
+
+# pylint: enable=too-many-instance-attributes
@@ -0,0 +1,349 @@
+"""Filtering of the chat channels by name"""
+from bisect import bisect_left, insort
+from typing import Optional, List, Tuple, Dict, Any
+
+# pylint: disable=no-name-in-module,wrong-import-order
+from PyQt5.QtCore import (  # type: ignore
+    QAbstractListModel,
+    QByteArray,
+    QModelIndex,
+    QObject,
+    pyqtSlot,
+    pyqtSignal,
+    pyqtProperty
+)
+# pylint: enable=no-name-in-module,wrong-import-order
+
+from .channels import ChannelsModel, ChannelItemRole, CHANNEL_ROLE_NAMES
+from .search import MAX_CHARACTER
+
+
+# pylint: disable=too-few-public-methods
+class _SourceRows:
+    """The rows of the matching channels in the source model, as a sequence
+    which can be searched with bisection
+
+    The rows are looked up on access, since the rows of the source model
+    shift whenever its channels are added, removed or moved.
+    """
+
+    def __init__(self, source_model: ChannelsModel,
+                 matches: List[str]) -> None:
+        """
+        :param source_model: The filtered model
+        :param matches: Names of the matching user channels in the order of \
+        the source model
+        """
+        self._source_model = source_model
+        self._matches = matches
+
+    def __len__(self) -> int:
+        return len(self._matches)
+
+    def __getitem__(self, position: int) -> int:
+        return self._source_model.channel_row(self._matches[position])
+
+# pylint: enable=too-few-public-methods
+
+
+class ChannelsFilterModel(QAbstractListModel):  # type: ignore
+    """A list model of the channels of a :obj:`ChannelsModel` whose name
+    starts with the filter text
+
+    The group channel is always listed as the first row, followed by the
+    matching user channels in the order of the source model. The matching is
+    case insensitive.
+
+    Instead of testing every row of the source model like
+    ``QSortFilterProxyModel`` does, the model maintains a sorted index of the
+    case folded channel names, so the matching channels are found by
+    bisection in time proportional to the number of matches. The index and the
+    matching rows are updated incrementally as channels are added to,
+    removed from or moved inside the source model. The matching rows are
+    mapped to the source model by the names of the channels.
+    """
+    #: Signal emitted when the source model changes
+    source_model_changed = pyqtSignal(ChannelsModel)
+    #: Signal emitted when the filter text changes
+    filter_changed = pyqtSignal(str)
+
+    def __init__(self, parent: Optional[QObject] = None) -> None:
+        """
+        :param parent: Parent object
+        """
+        super().__init__(parent)
+        #: The filtered model
+        self._source_model: Optional[ChannelsModel] = None
+        #: The filter text
+        self._filter = ""
+        #: The case folded filter text
+        self._folded_filter = ""
+        #: Sorted list of the case folded names and the names of the user
+        #: channels of the source model
+        self._name_index: List[Tuple[str, str]] = []
+        #: Names of the matching user channels in the order of the source
+        #: model
+        self._matches: List[str] = []
+
+    @pyqtProperty(ChannelsModel, notify=source_model_changed)
+    def source_model(self) -> Optional[ChannelsModel]:
+        """The filtered model"""
+        return self._source_model
+
+    @source_model.setter  # type: ignore
+    def source_model(self, model: Optional[ChannelsModel]) -> None:
+        """Set the filtered model
+
+        :param model: New source model
+        """
+        if model is self._source_model:
+            return
+        if self._source_model is not None:
+            self._source_model.rowsInserted.disconnect(self._on_rows_inserted)
+            self._source_model.rowsAboutToBeRemoved.disconnect(
+                self._on_rows_about_to_be_removed
+            )
+            self._source_model.rowsAboutToBeMoved.disconnect(
+                self._on_rows_about_to_be_moved
+            )
+            self._source_model.rowsMoved.disconnect(self._on_rows_moved)
+            self._source_model.dataChanged.disconnect(self._on_data_changed)
+            self._source_model.modelReset.disconnect(self._rebuild)
+        self._source_model = model
+        if model is not None:
+            model.rowsInserted.connect(self._on_rows_inserted)
+            model.rowsAboutToBeRemoved.connect(
+                self._on_rows_about_to_be_removed
+            )
+            model.rowsAboutToBeMoved.connect(self._on_rows_about_to_be_moved)
+            model.rowsMoved.connect(self._on_rows_moved)
+            model.dataChanged.connect(self._on_data_changed)
+            model.modelReset.connect(self._rebuild)
+        self._rebuild()
+        self.source_model_changed.emit(model)
+
+    @pyqtProperty(str, notify=filter_changed)
+    def filter(self) -> str:
+        """The prefix of the names of the listed channels"""
+        return self._filter
+
+    @filter.setter  # type: ignore
+    def filter(self, text: str) -> None:
+        """Set the filter text
+
+        :param text: New filter text
+        """
+        if text == self._filter:
+            return
+        self._filter = text
+        self._folded_filter = text.casefold()
+        self.beginResetModel()
+        self._matches = self._find_matches()
+        self.endResetModel()
+        self.filter_changed.emit(text)
+
+    def _source_name(self, row: int) -> str:
+        """Get the name of the channel at the *row* of the source model"""
+        assert self._source_model is not None
+        return str(self._source_model.data(self._source_model.index(row, 0),
+                                           ChannelItemRole.NAME))
+
+    def _is_match(self, name: str) -> bool:
+        """Check whether the channel *name* matches the filter"""
+        return name.casefold().startswith(self._folded_filter)
+
+    def _find_matches(self) -> List[str]:
+        """Find the names of the matching user channels"""
+        if self._source_model is None:
+            return []
+        # every channel matches an empty filter
+        if not self._folded_filter:
+            return [self._source_name(row)
+                    for row in range(1, self._source_model.rowCount())]
+        start = bisect_left(self._name_index, (self._folded_filter,))
+        end = bisect_left(self._name_index,
+                          (self._folded_filter + MAX_CHARACTER,), start)
+        # order the matches like the source model
+        return sorted((name for _, name in self._name_index[start:end]),
+                      key=self._source_model.channel_row)
+
+    def _rebuild(self) -> None:
+        """Rebuild the name index and the matches from the source model"""
+        self.beginResetModel()
+        self._name_index = []
+        if self._source_model is not None:
+            self._name_index = sorted(
+                (name.casefold(), name)
+                for name in (self._source_name(row)
+                             for row in range(1,
+                                              self._source_model.rowCount()))
+            )
+        self._matches = self._find_matches()
+        self.endResetModel()
+
+    # pylint: disable=unused-argument
+    def _on_rows_inserted(self, parent: QModelIndex, first: int,
+                          last: int) -> None:
+        """Add the inserted user channels of the source model"""
+        for row in range(max(first, 1), last + 1):
+            name = self._source_name(row)
+            insort(self._name_index, (name.casefold(), name))
+            if self._is_match(name):
+                position = self._insert_position(row)
+                self.beginInsertRows(QModelIndex(), position + 1,
+                                     position + 1)
+                self._matches.insert(position, name)
+                self.endInsertRows()
+
+    def _on_rows_about_to_be_removed(self, parent: QModelIndex, first: int,
+                                     last: int) -> None:
+        """Remove the user channels which are about to be removed from the
+        source model"""
+        for row in range(max(first, 1), last + 1):
+            name = self._source_name(row)
+            item = (name.casefold(), name)
+            index = bisect_left(self._name_index, item)
+            if (index < len(self._name_index) and
+                    self._name_index[index] == item):
+                del self._name_index[index]
+            position = self._match_position(name)
+            if position >= 0:
+                self.beginRemoveRows(QModelIndex(), position + 1,
+                                     position + 1)
+                del self._matches[position]
+                self.endRemoveRows()
+
+    # pylint: disable=too-many-arguments
+    def _on_rows_about_to_be_moved(self, parent: QModelIndex, first: int,
+                                   last: int, destination_parent: QModelIndex,
+                                   destination: int) -> None:
+        """Move the matching channel which is about to be moved inside the
+        source model
+
+        While the source model still has its previous order, the new position
+        of the channel can be found by bisection.
+        """
+        if first != last:
+            return
+        name = self._source_name(first)
+        position = self._match_position(name)
+        if position < 0:
+            return
+        target = self._insert_position(destination)
+        # the channel stays at the same position among the matches
+        if target in (position, position + 1):
+            return
+        self.beginMoveRows(QModelIndex(), position + 1, position + 1,
+                           QModelIndex(), target + 1)
+        del self._matches[position]
+        self._matches.insert(target if target < position else target - 1,
+                             name)
+        self.endMoveRows()
+
+    def _on_rows_moved(self, parent: QModelIndex, first: int, last: int,
+                       destination_parent: QModelIndex,
+                       destination: int) -> None:
+        """Rebuild the matches if multiple rows were moved inside the source
+        model"""
+        if first != last:
+            self._rebuild()
+    # pylint: enable=too-many-arguments
+
+    def _on_data_changed(self, top_left: QModelIndex,
+                         bottom_right: QModelIndex,
+                         roles: Optional[List[int]] = None) -> None:
+        """Forward the data changes of the visible rows"""
+        for source_row in range(top_left.row(), bottom_right.row() + 1):
+            row = 0
+            if source_row > 0:
+                row = self.channel_row(self._source_name(source_row))
+            if row >= 0:
+                index = self.index(row, 0)
+                self.dataChanged.emit(index, index, roles or [])
+    # pylint: enable=unused-argument
+
+    def _insert_position(self, source_row: int) -> int:
+        """Find the position among the matches where a channel at the
+        *source_row* of the source model belongs
+
+        :param source_row: A row of the source model
+        :return: The position of the first match whose row in the source \
+        model is not less than *source_row*
+        """
+        assert self._source_model is not None
+        # the matches are in the order of the source model, so their rows
+        # in the source model are increasing
+        return bisect_left(_SourceRows(self._source_model, self._matches),
+                           source_row)
+
+    def _match_position(self, name: str) -> int:
+        """Find the position of the channel *name* among the matches
+
+        :return: The position of the name or -1 if it's not a match
+        """
+        if self._source_model is None:
+            return -1
+        source_row = self._source_model.channel_row(name)
+        if source_row < 1:
+            return -1
+        position = self._insert_position(source_row)
+        if (position < len(self._matches) and
+                self._matches[position] == name):
+            return position
+        return -1
+
+    @pyqtSlot(str, result=int, name="channelRow")  # type: ignore
+    def channel_row(self, name: str) -> int:
+        """Find the row of the channel with the given *name*
+
+        :param name: The name of the channel
+        :return: The row of the channel or -1 if it's not listed
+        """
+        if (self._source_model is not None and
+                name == self._source_model.group_channel.name):
+            return 0
+        position = self._match_position(name)
+        return position + 1 if position >= 0 else -1
+
+    # pylint: disable=invalid-name,unused-argument
+    def rowCount(self, parent: Optional[QModelIndex] = None) -> int:
+        """Returns the number of rows in the model
+
+        :param parent: Unused since this not a hierarchical model
+        :return: The number of rows in the model
+        """
+        if self._source_model is None:
+            return 0
+        # the matching user channels + the single group channel
+        return len(self._matches) + 1
+
+    def roleNames(self) -> Dict[int, QByteArray]:
+        """Returns the mapping between the custom item roles and their names
+
+        :return: Mapping between the custom item roles and their names
+        """
+        return CHANNEL_ROLE_NAMES
+
+    # pylint: enable=invalid-name,unused-argument
+
+    def data(self, index: QModelIndex, role: Optional[int] = None) -> Any:
+        """Return the data at the row of the given *index* and for the
+        specified *role*
+
+        :param index: Used for specifying the model's row, the column is \
+        ignored
+        :param role: Indicates which type of data the view requested
+        :return: The data the view requested at the specified *row* for the \
+        given *role*
+        """
+        if self._source_model is None or \
+                not 0 <= index.row() < len(self._matches) + 1:
+            return None
+        source_row = 0
+        if index.row() > 0:
+            source_row = self._source_model.channel_row(
+                self._matches[index.row() - 1]
+            )
+        return self._source_model.data(self._source_model.index(source_row,
+                                                                0),
+                                       role)
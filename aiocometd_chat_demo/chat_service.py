@@ -1,11 +1,17 @@
 """Chat service class definition"""
-from typing import Optional, Deque
+# pylint: disable=too-many-lines
+from typing import Optional, Deque, Dict, List, Tuple, Set, TYPE_CHECKING
 from datetime import datetime
 from collections import deque
+from functools import partial
+from contextlib import suppress
+from dataclasses import dataclass, field, replace
+import asyncio
 import logging
 
 # pylint: disable=no-name-in-module,wrong-import-order
 from PyQt5.QtCore import (  # type: ignore
+    QCoreApplication,
     QObject,
     pyqtSlot,
     pyqtSignal,
@@ -13,9 +19,23 @@ from PyQt5.QtCore import (  # type: ignore
 )
 # pylint: enable=no-name-in-module,wrong-import-order
 
-from aiocometd_chat_demo.cometd import CometdClient, JsonObject
+from aiocometd_chat_demo.coalescer import UpdateCoalescer
+from aiocometd_chat_demo.cometd import CometdClient, ClientState, \
+    JsonObject, MessageResponse
 from aiocometd_chat_demo.channels import ChannelsModel, ChannelType, \
     ChatMessage
+from aiocometd_chat_demo.exceptions import OutboxFullError
+from aiocometd_chat_demo.json_codec import JsonCodec, get_codec
+from aiocometd_chat_demo.outbox import Outbox, DeliveryState
+from aiocometd_chat_demo.rate_limit import RateLimiter
+from aiocometd_chat_demo.sequence import SequenceTracker, message_sequence
+from aiocometd_chat_demo.snapshot import Snapshot, RoomSnapshot, \
+    save_snapshot, load_snapshot
+from aiocometd_chat_demo.transport_options import TransportOptions, \
+    TransportType
+if TYPE_CHECKING:  # pragma: no cover
+    # imported by the CometD client on the first connection
+    from aiocometd_chat_demo.connection_pool import ConnectionPool
 
 
 LOGGER = logging.getLogger(__name__)
@@ -23,28 +43,114 @@ LOGGER = logging.getLogger(__name__)
 CHAT_ROOM_NAME = "demo"
 
 
+def room_channel_name(room_name: str) -> str:
+    """Get the CometD broadcast channel where the messages of the chat room
+    named *room_name* are published"""
+    return "/chat/" + room_name
+
+
+@dataclass()
+class ChatRoom:
+    """A chat room joined by the chat service"""
+    #: Name of the chat room
+    name: str
+    #: Model object managing the existing channels inside the chat room
+    channels_model: ChannelsModel = field(init=False)
+    #: A queue that contains the usernames to which we most recently sent
+    #: a private message, but the messages doesn't yet arrived as incoming
+    #: messages (when private messages come back from the service they
+    #: doesn't contain the recipient of the message)
+    last_private_message_users: Deque[str] = field(default_factory=deque,
+                                                   init=False)
+    #: The sequence numbers of the messages received on the room channel
+    sequence_tracker: SequenceTracker = field(default_factory=SequenceTracker,
+                                              init=False)
+    #: The ranges of missing sequence numbers waiting to be requested from
+    #: the backlog service
+    backlog_ranges: List[Tuple[int, int]] = field(default_factory=list,
+                                                  init=False)
+    #: The channels whose history was requested while the service wasn't
+    #: connected, as (channel_name, channel_type) pairs
+    deferred_history: Set[Tuple[str, ChannelType]] = field(
+        default_factory=set, init=False
+    )
+
+    def __post_init__(self) -> None:
+        self.channels_model = ChannelsModel(self.name)
+
+    @property
+    def room_channel(self) -> str:
+        """CometD broadcast channel where new messages are published"""
+        return room_channel_name(self.name)
+
+    @property
+    def members_channel(self) -> str:
+        """CometD broadcast channel where the new membership states are
+        published
+        """
+        return "/members/" + self.name
+
+
+# pylint: disable=too-many-instance-attributes,too-many-public-methods
 class ChatService(QObject):  # type: ignore
-    """CometD demo chat service"""
+    """CometD demo chat service
+
+    The service can join several chat rooms, and all of them share the same
+    CometD client connection. The channels model of the default room is
+    available as :obj:`channels_model`, the models of the other rooms can be
+    retrieved with :obj:`room_channels_model`.
+
+    Several services can run side by side in one process and event loop,
+    each of them has its own chat rooms and models. The services created with
+    the same :obj:`~aiocometd_chat_demo.connection_pool.ConnectionPool` share
+    their connections and JSON setup.
+
+    If the server numbers the messages of the chat rooms, the duplicate
+    messages are dropped, and the missing ones are fetched from the
+    ``/service/backlog`` service and inserted into the conversations by
+    their time of publishing.
+
+    If a *history_channel* is specified, the conversations fetch their
+    history from the service on that channel, one page at a time, as the
+    views ask for more messages with the ``canFetchMore``/``fetchMore``
+    protocol of the models. When the service connects, the most recent page
+    of the group conversation of every chat room is requested at once.
+    """
     #: Url of the service
     _url: str = ""
-    #: Name of the chat room
+    #: Name of the default chat room
     _room_name: str = CHAT_ROOM_NAME
     #: Username of the peer/member
     _username: str = ""
     #: CometD client object
     _client: Optional[CometdClient] = None
-    #: Model object managing the existing channels inside the chat service
+    #: Model object managing the existing channels inside the default chat
+    #: room
     _channels_model: Optional[ChannelsModel] = None
-    #: A queue that contains the usernames to which we most recently sent
-    #: a private message, but the messages doesn't yet arrived as incoming
-    #: messages (when private messages come back from the service they doesn't
-    #: contain the recipient of the message)
-    _last_private_message_users: Deque[str] = deque()
     #: The string representation of the last error that occurred
     _last_error: str = ""
+    #: Queue of the outgoing messages
+    _outbox: Optional[Outbox] = None
+    #: Path of the file where the snapshot of the chat rooms is saved
+    _snapshot_path: str = ""
+    #: Handle of the next periodic save of the snapshot
+    _snapshot_handle: Optional[asyncio.TimerHandle] = None
+    #: Time in seconds between the periodic saves of the snapshot
+    snapshot_interval = 60.0
+    #: The maximum number of messages saved from every conversation
+    snapshot_tail_size = 50
+    #: Username of the member whose chat rooms were restored from a
+    #: snapshot or kept after disconnecting, until the service connects
+    _rooms_username: Optional[str] = None
     #: Name of the CometD service channel on which new members advertise
     #: themselves
     _members_service_channel = "/service/members"
+    #: Name of the CometD service channel where the private messages are
+    #: published
+    _private_chat_service_channel = "/service/privatechat"
+    #: Name of the CometD service channel which delivers the missed messages
+    #: of a chat room
+    _backlog_service_channel = "/service/backlog"
     #: Signal emitted when the url changes
     url_changed = pyqtSignal(str)
     #: Signal emitted when the username changes
@@ -53,6 +159,21 @@ class ChatService(QObject):  # type: ignore
     channels_model_changed = pyqtSignal(ChannelsModel)
     #: Signal emitted when the last_error changes
     last_error_changed = pyqtSignal(str)
+    #: Signal emitted when the outbox_path changes
+    outbox_path_changed = pyqtSignal(str)
+    #: Signal emitted when the json_codec changes
+    json_codec_changed = pyqtSignal(str)
+    #: Signal emitted when any of the transport options change
+    transport_options_changed = pyqtSignal()
+    #: Signal emitted when the coalesce_updates changes
+    coalesce_updates_changed = pyqtSignal(bool)
+    #: Signal emitted when the snapshot_path changes
+    snapshot_path_changed = pyqtSignal(str)
+    #: Signal emitted when the chat rooms are restored from a snapshot, with
+    #: the username and the url of the snapshot
+    snapshot_restored = pyqtSignal(str, str, arguments=["username", "url"])
+    #: Signal emitted when a chat room is joined or left
+    rooms_changed = pyqtSignal()
     #: Signal emitted when a connection is established with the service
     connected = pyqtSignal()
     #: Signal emitted when the client disconnects from the service
@@ -61,6 +182,52 @@ class ChatService(QObject):  # type: ignore
     #: last_error)
     error = pyqtSignal()
 
+    def __init__(self, parent: Optional[QObject] = None, *,
+                 room_name: str = CHAT_ROOM_NAME,
+                 connection_pool: Optional["ConnectionPool"] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 history_channel: Optional[str] = None,
+                 history_page_size: int = 50,
+                 update_coalescer: Optional[UpdateCoalescer] = None,
+                 json_codec: Optional[JsonCodec] = None,
+                 transport_options: Optional[TransportOptions] = None) \
+            -> None:
+        """
+        :param parent: Parent object
+        :param room_name: Name of the default chat room
+        :param connection_pool: The connection pool shared with other \
+        services, or ``None`` to use connections of the service's own
+        :param rate_limiter: The rate limiter of the published messages, or \
+        ``None`` to publish the messages right away
+        :param history_channel: The CometD service channel of the history \
+        service, or ``None`` if the history shouldn't be fetched
+        :param history_page_size: The number of messages in a page of the \
+        history
+        :param update_coalescer: Coalesces the incoming messages into \
+        per-frame updates of the conversations, or ``None`` to add them \
+        right away
+        :param json_codec: The JSON codec of the CometD messages, or \
+        ``None`` to use the default codec
+        :param transport_options: The transport selection and tuning \
+        options, or ``None`` to use the default options
+        """
+        super().__init__(parent)
+        self._room_name = room_name
+        self._connection_pool = connection_pool
+        self._rate_limiter = rate_limiter
+        self._history_channel = history_channel
+        self._history_page_size = history_page_size
+        self._update_coalescer = update_coalescer
+        self._json_codec = json_codec
+        self._transport_options = transport_options or TransportOptions()
+        #: The joined chat rooms by their names, in the order of joining
+        self._rooms: Dict[str, ChatRoom] = {}
+        #: The joined chat rooms by the names of their CometD channels
+        self._rooms_by_channel: Dict[str, ChatRoom] = {}
+        #: The chat rooms and the peers of the private messages being sent
+        #: by the outbox, by the ids of the outbox messages
+        self._sending_private_messages: Dict[int, Tuple[ChatRoom, str]] = {}
+
     @pyqtProperty(str, notify=url_changed)
     def url(self) -> str:
         """Url of the service"""
@@ -87,11 +254,14 @@ class ChatService(QObject):  # type: ignore
         :param username: New username
         """
         self._username = username
+        for room in self._rooms.values():
+            room.channels_model.username = username
         self.username_changed.emit(username)
 
     @pyqtProperty(ChannelsModel, notify=channels_model_changed)
     def channels_model(self) -> Optional[ChannelsModel]:
-        """Model object managing the existing channels inside the chat service
+        """Model object managing the existing channels inside the default chat
+        room
         """
         return self._channels_model
 
@@ -120,6 +290,374 @@ class ChatService(QObject):  # type: ignore
         # notify listeners that some error have occurred
         self.error.emit()
 
+    @property
+    def outbox(self) -> Optional[Outbox]:
+        """Queue of the outgoing messages
+
+        If it's set, the sent messages are enqueued in the outbox, which
+        delivers them while the service is connected.
+        """
+        return self._outbox
+
+    @outbox.setter
+    def outbox(self, outbox: Optional[Outbox]) -> None:
+        """Set the queue of the outgoing messages
+
+        :param outbox: New outbox or ``None`` to send the messages directly
+        """
+        if self._outbox is not None:
+            self._outbox.detach()
+            self._outbox.message_state_changed.disconnect(
+                self._on_outbox_message_state_changed
+            )
+        self._outbox = outbox
+        if outbox is not None:
+            outbox.message_state_changed.connect(
+                self._on_outbox_message_state_changed
+            )
+        if (outbox is not None and self._client is not None and
+                self._client.state == ClientState.CONNECTED):
+            outbox.attach(self._client)
+
+    def _on_outbox_message_state_changed(self, message_id: int,
+                                         state: DeliveryState) -> None:
+        """Track the peers of the private messages sent by the outbox
+
+        The private messages come back from the service without their
+        recipients, so the peer is recorded when the message is actually
+        sent, which also covers the messages restored from a persisted
+        outbox and the messages sent again.
+        :param message_id: The id of the outbox message
+        :param state: The new delivery state of the message
+        """
+        if state == DeliveryState.SENDING:
+            message = (self._outbox.message(message_id)
+                       if self._outbox is not None else None)
+            if (message is None or
+                    message.channel != self._private_chat_service_channel):
+                return
+            room = self._rooms_by_channel.get(message.data.get("room", ""))
+            if room is None:
+                return
+            peer = message.data["peer"]
+            room.last_private_message_users.appendleft(peer)
+            self._sending_private_messages[message_id] = (room, peer)
+            return
+        sent = self._sending_private_messages.pop(message_id, None)
+        if sent is not None and state != DeliveryState.DELIVERED:
+            # the message is sent again or given up, its first attempt
+            # isn't expected to come back
+            room, peer = sent
+            with suppress(ValueError):
+                room.last_private_message_users.remove(peer)
+
+    @pyqtProperty(str, notify=outbox_path_changed)
+    def outbox_path(self) -> str:
+        """Path of the file where the outbox is persisted, or an empty string
+        if there is no persisted outbox"""
+        if self._outbox is None or self._outbox.path is None:
+            return ""
+        return self._outbox.path
+
+    @outbox_path.setter  # type: ignore
+    def outbox_path(self, path: str) -> None:
+        """Replace the outbox with one persisted to the file at *path*
+
+        :param path: Path of the outbox file, or an empty string to send \
+        the messages directly
+        """
+        if self._outbox is not None:
+            if path == (self._outbox.path or ""):
+                return
+            self._outbox.close()
+        elif not path:
+            return
+        self.outbox = Outbox(path) if path else None
+        self.outbox_path_changed.emit(path)
+
+    @property
+    def update_coalescer(self) -> Optional[UpdateCoalescer]:
+        """Coalesces the incoming messages into per-frame updates of the
+        conversations of the chat rooms"""
+        return self._update_coalescer
+
+    @update_coalescer.setter
+    def update_coalescer(self, coalescer: Optional[UpdateCoalescer]) -> None:
+        """Set the coalescer of the updates of the conversations
+
+        :param coalescer: New coalescer or ``None`` to add the incoming \
+        messages right away
+        """
+        if self._update_coalescer is not None:
+            self._update_coalescer.flush()
+        self._update_coalescer = coalescer
+        for room in self._rooms.values():
+            room.channels_model.coalescer = coalescer
+
+    @pyqtProperty(str, notify=json_codec_changed)
+    def json_codec(self) -> str:
+        """Name of the JSON codec of the CometD messages, or an empty string
+        for the default codec"""
+        if self._json_codec is None:
+            return ""
+        return self._json_codec.name
+
+    @json_codec.setter  # type: ignore
+    def json_codec(self, name: str) -> None:
+        """Select the JSON codec used from the next connection
+
+        :param name: Name of a codec, ``"auto"`` for the fastest installed \
+        codec, or an empty string for the default codec
+        """
+        codec = get_codec(name) if name else None
+        current = self._json_codec
+        if (codec and codec.name) != (current and current.name):
+            self._json_codec = codec
+            self.json_codec_changed.emit(codec.name if codec else "")
+
+    @property
+    def transport_options(self) -> TransportOptions:
+        """The transport selection and tuning options used from the next
+        connection"""
+        return self._transport_options
+
+    @transport_options.setter
+    def transport_options(self, options: TransportOptions) -> None:
+        """Set the transport options used from the next connection
+
+        :param options: New transport options
+        """
+        if options != self._transport_options:
+            self._transport_options = options
+            self.transport_options_changed.emit()
+
+    @pyqtProperty(str, notify=transport_options_changed)
+    def transport(self) -> str:
+        """The transport of the CometD client, ``"auto"``, ``"websocket"``
+        or ``"long-polling"``"""
+        return self._transport_options.transport_type.value
+
+    @transport.setter  # type: ignore
+    def transport(self, name: str) -> None:
+        """Select the transport used from the next connection
+
+        :param name: Name of the transport
+        :raise ValueError: If *name* is not the name of a transport
+        """
+        self.transport_options = replace(self._transport_options,
+                                         transport_type=TransportType(name))
+
+    @pyqtProperty(float, notify=transport_options_changed)
+    def connect_timeout(self) -> float:
+        """The maximum time of establishing a connection in seconds"""
+        return self._transport_options.connect_timeout
+
+    @connect_timeout.setter  # type: ignore
+    def connect_timeout(self, timeout: float) -> None:
+        """Set the maximum time of establishing a connection
+
+        :param timeout: New timeout in seconds
+        """
+        self.transport_options = replace(self._transport_options,
+                                         connect_timeout=timeout)
+
+    @pyqtProperty(float, notify=transport_options_changed)
+    def connection_timeout(self) -> float:
+        """The time in seconds while the client tries to restore a lost
+        connection"""
+        return self._transport_options.connection_timeout
+
+    @connection_timeout.setter  # type: ignore
+    def connection_timeout(self, timeout: float) -> None:
+        """Set the time while the client tries to restore a lost connection
+
+        :param timeout: New timeout in seconds
+        """
+        self.transport_options = replace(self._transport_options,
+                                         connection_timeout=timeout)
+
+    @pyqtProperty(int, notify=transport_options_changed)
+    def max_message_size(self) -> int:
+        """The maximum size of a received websocket message in bytes, or
+        ``0`` for no limit"""
+        return self._transport_options.max_message_size
+
+    @max_message_size.setter  # type: ignore
+    def max_message_size(self, size: int) -> None:
+        """Set the maximum size of a received websocket message
+
+        :param size: New size in bytes, or ``0`` for no limit
+        """
+        self.transport_options = replace(self._transport_options,
+                                         max_message_size=size)
+
+    @pyqtProperty(bool, notify=transport_options_changed)
+    def compression(self) -> bool:
+        """Whether the websocket messages are compressed"""
+        return self._transport_options.compression
+
+    @compression.setter  # type: ignore
+    def compression(self, enabled: bool) -> None:
+        """Enable or disable the compression of the websocket messages
+
+        :param enabled: Whether to compress the messages
+        """
+        self.transport_options = replace(self._transport_options,
+                                         compression=enabled)
+
+    @pyqtProperty(bool, notify=transport_options_changed)
+    def websocket_fallback(self) -> bool:
+        """Whether the client falls back to long-polling if it fails to
+        connect with the websocket transport"""
+        return self._transport_options.websocket_fallback
+
+    @websocket_fallback.setter  # type: ignore
+    def websocket_fallback(self, enabled: bool) -> None:
+        """Enable or disable the fallback to the long-polling transport
+
+        :param enabled: Whether to fall back to long-polling
+        """
+        self.transport_options = replace(self._transport_options,
+                                         websocket_fallback=enabled)
+
+    @pyqtProperty(bool, notify=coalesce_updates_changed)
+    def coalesce_updates(self) -> bool:
+        """Whether the incoming messages are added to the conversations at
+        most once per frame"""
+        return self._update_coalescer is not None
+
+    @coalesce_updates.setter  # type: ignore
+    def coalesce_updates(self, enabled: bool) -> None:
+        """Enable or disable the coalescing of the incoming messages with
+        the default frame rate
+
+        :param enabled: Whether to coalesce the incoming messages
+        """
+        if enabled == (self._update_coalescer is not None):
+            return
+        self.update_coalescer = UpdateCoalescer() if enabled else None
+        self.coalesce_updates_changed.emit(enabled)
+
+    @pyqtProperty(str, notify=snapshot_path_changed)
+    def snapshot_path(self) -> str:
+        """Path of the file where the snapshot of the chat rooms is saved,
+        or an empty string if no snapshots are saved"""
+        return self._snapshot_path
+
+    @snapshot_path.setter  # type: ignore
+    def snapshot_path(self, path: str) -> None:
+        """Set the path of the snapshot file
+
+        The snapshot is restored from the file on the next iteration of the
+        event loop, if no chat rooms are joined yet. After that the snapshot
+        is saved periodically, when the service disconnects and when the
+        application quits.
+        :param path: Path of the snapshot file, or an empty string to stop \
+        saving snapshots
+        """
+        if path == self._snapshot_path:
+            return
+        if self._snapshot_handle is not None:
+            self._snapshot_handle.cancel()
+            self._snapshot_handle = None
+        application = QCoreApplication.instance()
+        if self._snapshot_path and application is not None:
+            application.aboutToQuit.disconnect(self.save_snapshot)
+        self._snapshot_path = path
+        if path:
+            if application is not None:
+                application.aboutToQuit.connect(self.save_snapshot)
+            # restore the snapshot lazily, to not delay the loading of the
+            # user interface
+            loop = asyncio.get_event_loop()
+            loop.call_soon(self._restore_snapshot)
+            self._snapshot_handle = loop.call_later(self.snapshot_interval,
+                                                    self._save_periodically)
+        self.snapshot_path_changed.emit(path)
+
+    def _restore_snapshot(self) -> None:
+        """Restore the chat rooms from the snapshot file"""
+        if not self._snapshot_path or self._rooms:
+            return
+        snapshot = load_snapshot(self._snapshot_path)
+        if snapshot is not None:
+            self.restore_snapshot(snapshot)
+
+    def restore_snapshot(self, snapshot: Snapshot) -> None:
+        """Join the chat rooms of the *snapshot* and fill their models with
+        the saved members and messages
+
+        The restored models are displayed until the service connects, then
+        the member lists are updated by the membership broadcasts of the
+        service, while the saved messages are kept.
+        :param snapshot: A snapshot of the chat rooms
+        """
+        for room_snapshot in snapshot.rooms:
+            room = self.join_room(room_snapshot.name)
+            # the restored messages are skipped when the history is fetched
+            for sequence in room_snapshot.sequences:
+                room.sequence_tracker.remember(sequence)
+            model = room.channels_model
+            model.update_available_channels(set(room_snapshot.members))
+            for conversation in room_snapshot.conversations:
+                model.add_messages(conversation.channel_name,
+                                   conversation.channel_type,
+                                   conversation.messages)
+        default_room = self._rooms.get(self._room_name)
+        if default_room is not None:
+            self.channels_model = default_room.channels_model
+        self._rooms_username = snapshot.username
+        self.snapshot_restored.emit(snapshot.username, snapshot.url)
+
+    def take_snapshot(self) -> Snapshot:
+        """Take a snapshot of the joined chat rooms"""
+        # include the messages waiting for the next frame
+        if self._update_coalescer is not None:
+            self._update_coalescer.flush()
+        return Snapshot(username=self._username, url=self._url, rooms=[
+            RoomSnapshot.from_model(room.name, room.channels_model,
+                                    self.snapshot_tail_size,
+                                    room.sequence_tracker.recent)
+            for room in self._rooms.values()
+        ])
+
+    @pyqtSlot()  # type: ignore
+    def save_snapshot(self) -> None:
+        """Save the snapshot of the joined chat rooms to the snapshot file
+
+        Nothing is saved if no chat rooms are joined, so the last snapshot
+        is kept after disconnecting.
+        """
+        if not self._snapshot_path or not self._rooms:
+            return
+        try:
+            save_snapshot(self.take_snapshot(), self._snapshot_path)
+        except OSError as error:
+            LOGGER.error("Failed to save the snapshot: %r", error)
+
+    def _save_periodically(self) -> None:
+        """Save the snapshot and schedule the next save"""
+        self.save_snapshot()
+        self._snapshot_handle = asyncio.get_event_loop().call_later(
+            self.snapshot_interval, self._save_periodically
+        )
+
+    @property
+    def client(self) -> Optional[CometdClient]:
+        """The CometD client of the service, or ``None`` if it's not
+        connected"""
+        return self._client
+
+    @property
+    def connection_pool(self) -> Optional["ConnectionPool"]:
+        """The connection pool shared with other services"""
+        return self._connection_pool
+
+    @property
+    def rate_limiter(self) -> Optional[RateLimiter]:
+        """The rate limiter of the published messages"""
+        return self._rate_limiter
+
     @property
     def _room_channel(self) -> str:
         """CometD broadcast channel where new messages are published"""
@@ -132,20 +670,128 @@ class ChatService(QObject):  # type: ignore
         """
         return "/members/" + self._room_name
 
+    @pyqtProperty("QStringList", notify=rooms_changed)
+    def rooms(self) -> List[str]:
+        """The names of the joined chat rooms"""
+        return list(self._rooms)
+
+    def room(self, name: str) -> Optional[ChatRoom]:
+        """Get the joined chat room with the given *name*
+
+        :param name: The name of the chat room
+        :return: The chat room or ``None`` if it's not joined
+        """
+        return self._rooms.get(name)
+
+    @pyqtSlot(str, result=ChannelsModel,  # type: ignore
+              name="roomChannelsModel")
+    def room_channels_model(self, name: str) -> Optional[ChannelsModel]:
+        """Get the channels model of the joined chat room with the given
+        *name*
+
+        :param name: The name of the chat room
+        :return: The channels model or ``None`` if the room is not joined
+        """
+        room = self._rooms.get(name)
+        return room.channels_model if room is not None else None
+
+    @pyqtSlot(str, name="joinRoom")  # type: ignore
+    def join_room(self, name: str) -> ChatRoom:
+        """Join the chat room with the given *name*
+
+        The CometD channels of the room are subscribed on the existing
+        connection, or when the service connects if it's not connected yet.
+        :param name: The name of the chat room
+        :return: The joined chat room
+        """
+        room = self._rooms.get(name)
+        if room is not None:
+            return room
+        room = ChatRoom(name)
+        room.channels_model.username = self._username
+        room.channels_model.coalescer = self._update_coalescer
+        # forward the message sending requests of the room
+        room.channels_model.message_sending_requested.connect(
+            partial(self.send_message, room_name=name)
+        )
+        if self._history_channel is not None:
+            room.channels_model.history_requested.connect(
+                partial(self._fetch_history, room)
+            )
+            room.channels_model.enable_history()
+        self._rooms[name] = room
+        self._rooms_by_channel[room.room_channel] = room
+        self._rooms_by_channel[room.members_channel] = room
+
+        if self._client is not None:
+            self._client.subscribe(room.members_channel)
+            response = self._client.subscribe(room.room_channel)
+            # advertise the membership once the subscriptions are in place,
+            # if the client isn't connected yet it will be advertised in
+            # on_connected
+            if self._client.state == ClientState.CONNECTED:
+                response.finished.connect(partial(self._join_members, room))
+        self.rooms_changed.emit()
+        return room
+
+    @pyqtSlot(str, name="leaveRoom")  # type: ignore
+    def leave_room(self, name: str) -> None:
+        """Leave the chat room with the given *name*
+
+        :param name: The name of the chat room
+        """
+        if name == self._room_name:
+            message = "Can't leave the default chat room."
+            LOGGER.error(message)
+            self.last_error = message
+            return
+        room = self._rooms.pop(name, None)
+        if room is None:
+            return
+        del self._rooms_by_channel[room.room_channel]
+        del self._rooms_by_channel[room.members_channel]
+        if self._client is not None:
+            self._client.unsubscribe(room.room_channel)
+            self._client.unsubscribe(room.members_channel)
+        room.channels_model.discard_buffered_messages()
+        room.channels_model.disconnect()
+        self.rooms_changed.emit()
+
+    def _join_members(self, room: ChatRoom) -> None:
+        """Notify the service that a new peer/member has joined the chat
+        *room*"""
+        if self._client is not None:
+            self._client.publish(self._members_service_channel, {
+                "user": self._username,
+                "room": room.room_channel
+            })
+
     @pyqtSlot()  # type: ignore
     def connect_(self) -> None:
         """Connect to the chat service and start listening for messages"""
-        # create new channels model and connect its signals
-        self.channels_model = ChannelsModel(self._room_name)
-        self.channels_model.message_sending_requested.connect(
-            self.send_message
-        )
+        # the restored or kept chat rooms of another member can't be reused
+        if self._rooms_username not in (None, self._username):
+            self._clear_rooms()
+        self._rooms_username = None
+        # the messages queued for a replaced client can't be sent anymore
+        if self._client is not None:
+            self._client.clear_queued_messages()
 
-        # create a new CometD client and connect its signals
-        self._client = CometdClient(
-            self.url,
-            (self._members_channel, self._room_channel)
-        )
+        # join the default room and display its channels
+        room = self.join_room(self._room_name)
+        self.channels_model = room.channels_model
+
+        # create a new CometD client subscribed to the channels of all the
+        # joined rooms and connect its signals
+        subscriptions: List[str] = []
+        for joined_room in self._rooms.values():
+            subscriptions.extend((joined_room.members_channel,
+                                  joined_room.room_channel))
+        self._client = CometdClient(self.url, subscriptions,
+                                    connection_pool=self._connection_pool,
+                                    rate_limiter=self._rate_limiter,
+                                    json_codec=self._json_codec,
+                                    transport_options=self._transport_options)
         self._client.connected.connect(self.on_connected)
         self._client.disconnected.connect(self.on_disconnected)
         self._client.error.connect(self.on_error)
@@ -161,10 +807,18 @@ class ChatService(QObject):  # type: ignore
         and notify the service that a new peer/member has joined the chat
         """
         if self._client is not None:
-            self._client.publish(self._members_service_channel, {
-                "user": self._username,
-                "room": self._room_channel
-            })
+            for room in self._rooms.values():
+                self._join_members(room)
+                # fetch the most recent history page of every room at once,
+                # and the pages requested while connecting
+                room.channels_model.group_channel.conversation.fetchMore()
+                deferred_history = room.deferred_history
+                room.deferred_history = set()
+                for channel_name, channel_type in deferred_history:
+                    self._fetch_history(room, channel_name, channel_type)
+            # deliver the messages sent while the service wasn't connected
+            if self._outbox is not None:
+                self._outbox.attach(self._client)
             self.connected.emit()
         else:
             message = "Uninitialized _client attribute."
@@ -180,20 +834,39 @@ class ChatService(QObject):  # type: ignore
     def on_disconnected(self) -> None:
         """Notify observers that the connection has been terminated"""
         if self._client is not None:
+            # keep the state of the chat rooms for the next start
+            self.save_snapshot()
             # destroy the CometD client
+            if self._outbox is not None:
+                self._outbox.detach()
+            self._client.clear_queued_messages()
             self._client.disconnect()
             self._client = None
 
-            # destroy the channels model
-            self.channels_model.disconnect()
-            self.channels_model = None  # type: ignore
-
+            # keep the chat rooms and their models, they're subscribed again
+            # by the next connection, only the state of this connection is
+            # dropped
+            for room in self._rooms.values():
+                room.last_private_message_users.clear()
+                room.backlog_ranges = []
+            self._rooms_username = self._username
             self.disconnected.emit()
         else:
             message = "Uninitialized _client attribute."
             LOGGER.error(message)
             self.last_error = message
 
+    def _clear_rooms(self) -> None:
+        """Destroy the chat rooms and their channels models"""
+        for room in self._rooms.values():
+            room.channels_model.disconnect()
+        if self._update_coalescer is not None:
+            self._update_coalescer.clear()
+        self._rooms.clear()
+        self._rooms_by_channel.clear()
+        self.channels_model = None  # type: ignore
+        self.rooms_changed.emit()
+
     @pyqtSlot(Exception)  # type: ignore
     def on_error(self, error: Exception) -> None:
         """Update the value of the last error message with *error*
@@ -204,24 +877,29 @@ class ChatService(QObject):  # type: ignore
         LOGGER.error("CometD client error: %s", message)
         self.last_error = message
 
-    @pyqtSlot(dict)  # type: ignore
+    @pyqtSlot(object)  # type: ignore
     def message_received(self, message: JsonObject) -> None:
-        """Add the incoming *message* to the channels model
+        """Add the incoming *message* to the channels model of its chat room
 
         :param message: An incoming message
         """
-        if self.channels_model is not None:
+        if self._rooms:
+            # find the room of the message by its channel
+            room = self._rooms_by_channel.get(message["channel"])
             # add a new incoming chat message
-            if message["channel"] == self._room_channel:
+            if room is not None and message["channel"] == room.room_channel:
+                # drop the messages received more than once
+                if not self._track_sequence(room, message):
+                    return
                 # create a message object
                 data = message["data"]
                 chat_message = ChatMessage(
                     sender=data["user"],
                     contents=data["chat"],
-                    time=datetime.now()
+                    time=self._message_time(message)
                 )
                 # by default use the group channel
-                channel_name = self._room_name
+                channel_name = room.name
                 channel_type = ChannelType.GROUP
                 # if it's a private message
                 if data.get("scope") == "private":
@@ -233,59 +911,232 @@ class ChatService(QObject):  # type: ignore
                     # back from the service
                     # pylint: disable=comparison-with-callable
                     if channel_name == self.username:
+                        if not room.last_private_message_users:
+                            LOGGER.warning("Dropping a private message "
+                                           "with an unknown recipient.")
+                            return
                         # get the name of the recipient to who we sent the
                         # message from the queue (we're expecting that private
                         # messages we sent come back in the same order from
                         # the service)
-                        channel_name = self._last_private_message_users.pop()
+                        channel_name = room.last_private_message_users.pop()
                     # pylint: enable=comparison-with-callable
 
-                self.channels_model.add_incoming_message(
+                room.channels_model.add_incoming_message(
                     channel_name=channel_name,
                     channel_type=channel_type,
                     message=chat_message
                 )
-            # update the members of the chat
-            elif message["channel"] == self._members_channel:
+            # update the members of the chat room
+            elif room is not None:
                 # avoid listing ourseves as a member, we don't need to send
                 # messages to ourselves
                 current_members = set(message["data"])
-                current_members.remove(self.username)
-                self.channels_model.update_available_channels(current_members)
+                current_members.discard(self.username)
+                room.channels_model.update_available_channels(
+                    current_members
+                )
         else:
-            message = "Uninitialized channels_model attribute."
+            message = "No joined chat rooms."
             LOGGER.error(message)
             self.last_error = message
 
+    def _track_sequence(self, room: ChatRoom, message: JsonObject) -> bool:
+        """Record the sequence number of a *message* of the *room* and
+        request the missing messages from the backlog service if the
+        sequence number reveals a gap
+
+        :return: False if the message is a duplicate, otherwise True
+        """
+        sequence = message_sequence(message)
+        if sequence is None:
+            return True
+        if room.sequence_tracker.is_duplicate(sequence):
+            LOGGER.debug("Dropping duplicate message %d of %r", sequence,
+                         room.name)
+            return False
+        gaps = room.sequence_tracker.add(sequence)
+        if gaps:
+            # the gaps found during the same iteration of the event loop are
+            # requested together
+            if not room.backlog_ranges:
+                asyncio.get_event_loop().call_soon(
+                    self._request_backlog, room
+                )
+            room.backlog_ranges.extend(gaps)
+        return True
+
+    def _request_backlog(self, room: ChatRoom) -> None:
+        """Request the messages of the *room* which are still missing from
+        the backlog service"""
+        ranges = room.sequence_tracker.missing_ranges(room.backlog_ranges)
+        room.backlog_ranges = []
+        if (not ranges or self._client is None or
+                self._client.state != ClientState.CONNECTED or
+                self._rooms.get(room.name) is not room):
+            return
+        LOGGER.info("Requesting missing messages %r of %r", ranges,
+                    room.name)
+        self._client.publish(self._backlog_service_channel, {
+            "room": room.room_channel,
+            "ranges": [list(sequence_range) for sequence_range in ranges]
+        })
+
+    def _fetch_history(self, room: ChatRoom, channel_name: str,
+                       channel_type: ChannelType) -> None:
+        """Request the next older page of the history of a channel of the
+        *room*
+
+        :param room: The chat room of the channel
+        :param channel_name: The name of the channel
+        :param channel_type: The channel's type
+        """
+        if self._history_channel is None or \
+                self._rooms.get(room.name) is not room:
+            return
+        if self._client is None or \
+                self._client.state != ClientState.CONNECTED:
+            # the page is requested when the service connects
+            room.deferred_history.add((channel_name,
+                                       ChannelType(channel_type)))
+            return
+        conversation = room.channels_model.conversation(channel_name,
+                                                        channel_type)
+        if conversation is None:
+            return
+        data: JsonObject = {
+            "room": room.room_channel,
+            "limit": self._history_page_size,
+            "before": conversation.history_cursor
+        }
+        if channel_type == ChannelType.USER:
+            data.update(user=self.username, peer=channel_name)
+        response = self._client.publish(self._history_channel, data)
+        response.finished.connect(partial(
+            self._on_history_page, room, channel_name,
+            ChannelType(channel_type), response
+        ))
+
+    def _on_history_page(self, room: ChatRoom, channel_name: str,
+                         channel_type: ChannelType,
+                         response: MessageResponse) -> None:
+        """Add the fetched history page in the *response* to the
+        conversation of the channel"""
+        if self._rooms.get(room.name) is not room:
+            return
+        if response.error is not None:
+            LOGGER.error("Failed to fetch the history of %r: %r",
+                         channel_name, response.error)
+            room.channels_model.history_page_failed(channel_name,
+                                                    channel_type)
+            return
+        page = (response.result or {}).get("data")
+        if not isinstance(page, dict):
+            # the server doesn't provide a history
+            room.channels_model.add_history_page(channel_name, channel_type,
+                                                 [], None)
+            return
+        messages = []
+        for message in page.get("messages", []):
+            # skip the messages which already arrived, and remember the
+            # others so they're skipped if they arrive again
+            sequence = message_sequence(message)
+            if sequence is not None:
+                if sequence in room.sequence_tracker:
+                    continue
+                room.sequence_tracker.remember(sequence)
+            data = message["data"]
+            messages.append(ChatMessage(
+                sender=data["user"],
+                contents=data["chat"],
+                time=self._message_time(message)
+            ))
+        room.channels_model.add_history_page(channel_name, channel_type,
+                                             messages, page.get("cursor"))
+
+    @staticmethod
+    def _message_time(message: JsonObject) -> datetime:
+        """Get the publishing time of the *message* from its ``timestamp``
+        extension field, or the current time if it doesn't have one"""
+        ext = message.get("ext")
+        if isinstance(ext, dict):
+            timestamp = ext.get("timestamp")
+            if isinstance(timestamp, (int, float)) and \
+                    not isinstance(timestamp, bool):
+                return datetime.fromtimestamp(timestamp / 1000)
+        return datetime.now()
+
     @pyqtSlot(str, str, str)  # type: ignore
     def send_message(self, channel_name: str, channel_type: ChannelType,
-                     contents: str) -> None:
+                     contents: str, room_name: Optional[str] = None) \
+            -> Optional[MessageResponse]:
         """Send a chat message with the given *contents* to the channel named
         *channel_type* with the type *channel_type*
 
         :param channel_name: The name of the chat service channel
         :param channel_type: The type of the chat service channel
         :param contents: The contents of the chat message
+        :param room_name: The name of the chat room of the channel, or \
+        ``None`` for the default room
+        :return: The response associated with the sent message, or ``None`` \
+        if the message is enqueued in the :obj:`outbox` or it couldn't be \
+        sent
         """
-        if self._client is not None:
+        if room_name is None:
+            room_name = self._room_name
+        room = self._rooms.get(room_name)
+        # the outbox accepts the messages even while the service is not
+        # connected, or after its chat rooms were cleared by a disconnect
+        if self._outbox is None and self._client is None:
+            message = "Uninitialized _client attribute."
+        elif self._outbox is None and room is None:
+            message = f"Not a joined chat room: {room_name!r}."
+        else:
             # send a message on the group channel to the single group
             # chat channel
             if channel_type == ChannelType.GROUP:
-                self._client.publish(self._room_channel, {
+                channel = room_channel_name(room_name)
+                data = {
                     "user": self.username,
                     "chat": contents
-                })
+                }
             # otherwise send a private message
             else:
-                # store username of the peer to who we're sending the message
-                self._last_private_message_users.appendleft(channel_name)
-                self._client.publish("/service/privatechat", {
-                    "room": self._room_channel,
+                channel = self._private_chat_service_channel
+                data = {
+                    "room": room_channel_name(room_name),
                     "user": self.username,
                     "chat": contents,
                     "peer": channel_name
-                })
-        else:
-            message = "Uninitialized _client attribute."
-            LOGGER.error(message)
-            self.last_error = message
+                }
+            try:
+                response = self._send(channel, data)
+            except OutboxFullError as error:
+                message = str(error)
+            else:
+                # store username of the peer to who we're sending the
+                # message, the outbox stores them when it sends the messages
+                if (channel_type != ChannelType.GROUP and room is not None and
+                        self._outbox is None):
+                    room.last_private_message_users.appendleft(channel_name)
+                return response
+        LOGGER.error(message)
+        self.last_error = message
+        return None
+
+    def _send(self, channel: str, data: JsonObject) \
+            -> Optional[MessageResponse]:
+        """Enqueue the message in the :obj:`outbox` if there is one,
+        otherwise publish it right away
+
+        :return: The response associated with the published message, or \
+        ``None`` if the message is enqueued
+        :raise OutboxFullError: If the outbox is full
+        """
+        if self._outbox is not None:
+            self._outbox.enqueue(channel, data)
+            return None
+        assert self._client is not None
+        return self._client.publish(channel, data)
+
+# pylint: enable=too-many-instance-attributes,too-many-public-methods
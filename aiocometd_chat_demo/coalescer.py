@@ -0,0 +1,196 @@
+"""Coalescing of the incoming messages into per-frame updates of the
+conversations"""
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional, Dict, List, Deque, Tuple
+
+from aiocometd_chat_demo.conversation import ConversationModel, ChatMessage
+
+
+#: The time between the frames of a 60 fps display in seconds
+FRAME_INTERVAL = 1 / 60
+
+
+@dataclass()
+class _ConversationLoad:
+    """The pending messages and the recent load of a conversation"""
+    #: The conversation receiving the messages
+    conversation: ConversationModel
+    #: The messages waiting for the next release in the order of arrival
+    pending: List[ChatMessage] = field(default_factory=list)
+    #: The times and the sizes of the recent releases
+    releases: Deque[Tuple[float, int]] = field(default_factory=deque)
+
+    def rate(self, now: float, window: float) -> float:
+        """The number of messages released per second during the last
+        *window* seconds"""
+        while self.releases and self.releases[0][0] <= now - window:
+            self.releases.popleft()
+        return sum(size for _, size in self.releases) / window
+
+
+# pylint: disable=too-many-instance-attributes
+class UpdateCoalescer:
+    """Buffers the incoming messages of the conversations and adds them to
+    the conversations at most once per frame
+
+    Every release adds the buffered messages of a conversation with a single
+    insertion of rows, so the views of the conversation lay out and scroll
+    once per frame instead of once per message, no matter how fast the
+    messages arrive.
+
+    A conversation which receives at least *degraded_rate* messages per
+    second during the last *load_window* seconds is switched to the
+    :obj:`~ConversationModel.degraded` mode, in which its views skip the
+    animations of the new rows. It's switched back once its rate drops
+    below half of the *degraded_rate*.
+    """
+
+    def __init__(self, frame_interval: float = FRAME_INTERVAL,
+                 degraded_rate: float = 20.0, load_window: float = 1.0,
+                 loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        :param frame_interval: The minimum time between the releases of \
+        the buffered messages in seconds
+        :param degraded_rate: The number of messages per second above \
+        which a conversation is switched to the degraded mode
+        :param load_window: The time window in which the message rate of \
+        the conversations is measured in seconds
+        :param loop: Event :obj:`loop <asyncio.BaseEventLoop>` used to
+                     schedule the releases. If *loop* is ``None`` then
+                     :func:`asyncio.get_event_loop` is used to get the
+                     default event loop.
+        """
+        self._loop = loop or asyncio.get_event_loop()
+        self.frame_interval = frame_interval
+        self.degraded_rate = degraded_rate
+        self.load_window = load_window
+        #: The buffers and the loads of the conversations by the id of the
+        #: conversation objects
+        self._loads: Dict[int, _ConversationLoad] = {}
+        #: The time of the last release
+        self._last_release: Optional[float] = None
+        #: Handle of the scheduled release of the buffered messages
+        self._release_handle: Optional[asyncio.TimerHandle] = None
+        #: Handle of the scheduled check of the degraded conversations
+        self._load_check_handle: Optional[asyncio.TimerHandle] = None
+
+    def __len__(self) -> int:
+        """The number of buffered messages"""
+        return sum(len(load.pending) for load in self._loads.values())
+
+    def add(self, conversation: ConversationModel,
+            message: ChatMessage) -> None:
+        """Add the incoming *message* to the *conversation* with the next
+        release
+
+        :param conversation: The conversation of the message
+        :param message: An incoming chat message
+        """
+        load = self._loads.get(id(conversation))
+        if load is None:
+            load = _ConversationLoad(conversation)
+            self._loads[id(conversation)] = load
+        load.pending.append(message)
+        self._schedule()
+
+    def flush(self) -> None:
+        """Add the buffered messages to their conversations right away"""
+        if self._release_handle is not None:
+            self._release_handle.cancel()
+        self._release()
+
+    def flush_conversation(self, conversation: ConversationModel) -> None:
+        """Add the buffered messages of the *conversation* to it right away
+
+        :param conversation: A conversation which was passed to :obj:`add`
+        """
+        load = self._loads.get(id(conversation))
+        if load is not None and load.pending:
+            self._release_load(load, self._loop.time())
+            self._schedule_load_check()
+
+    def discard(self, conversation: ConversationModel) -> None:
+        """Drop the buffered messages and the load of the *conversation*,
+        which is no longer displayed
+
+        :param conversation: A conversation which was passed to :obj:`add`
+        """
+        self._loads.pop(id(conversation), None)
+
+    def clear(self) -> None:
+        """Drop the buffered messages and the loads of all the
+        conversations"""
+        for handle in (self._release_handle, self._load_check_handle):
+            if handle is not None:
+                handle.cancel()
+        self._release_handle = None
+        self._load_check_handle = None
+        self._loads.clear()
+
+    def _schedule(self) -> None:
+        """Schedule the release of the buffered messages for the start of
+        the next frame"""
+        if self._release_handle is not None:
+            return
+        delay = 0.0
+        if self._last_release is not None:
+            delay = max(0.0, self._last_release + self.frame_interval -
+                        self._loop.time())
+        self._release_handle = self._loop.call_later(delay, self._release)
+
+    def _release(self) -> None:
+        """Add the buffered messages to their conversations and update
+        their modes"""
+        self._release_handle = None
+        now = self._loop.time()
+        self._last_release = now
+        for load in list(self._loads.values()):
+            if load.pending:
+                self._release_load(load, now)
+        self._schedule_load_check()
+
+    def _release_load(self, load: _ConversationLoad, now: float) -> None:
+        """Add the buffered messages of the *load* to its conversation and
+        update its mode"""
+        messages = load.pending
+        load.pending = []
+        load.releases.append((now, len(messages)))
+        # the mode is updated first, so the new rows are already added
+        # in the new mode
+        self._update_mode(load, now)
+        load.conversation.add_messages(messages)
+
+    def _update_mode(self, load: _ConversationLoad, now: float) -> None:
+        """Switch the conversation of the *load* to or from the degraded
+        mode depending on its message rate"""
+        rate = load.rate(now, self.load_window)
+        conversation = load.conversation
+        if rate >= self.degraded_rate:
+            conversation.degraded = True
+        elif rate < self.degraded_rate / 2:
+            conversation.degraded = False
+
+    def _schedule_load_check(self) -> None:
+        """Schedule the check of the degraded conversations, since they
+        don't get released without messages"""
+        if self._load_check_handle is not None:
+            return
+        if any(load.conversation.degraded for load in self._loads.values()):
+            self._load_check_handle = self._loop.call_later(
+                self.load_window, self._check_load
+            )
+
+    def _check_load(self) -> None:
+        """Switch the degraded conversations whose load dropped back to the
+        normal mode, and forget the idle conversations"""
+        self._load_check_handle = None
+        now = self._loop.time()
+        for key, load in list(self._loads.items()):
+            self._update_mode(load, now)
+            if not load.releases and not load.pending:
+                del self._loads[key]
+        self._schedule_load_check()
+
+# pylint: enable=too-many-instance-attributes
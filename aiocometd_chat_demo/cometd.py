@@ -1,21 +1,34 @@
 """Synchronous CometD client"""
 from enum import IntEnum, unique, auto
 import asyncio
+import logging
 from functools import partial
-from typing import Optional, Iterable, TypeVar, Awaitable, Callable, Any
+from typing import Optional, Iterable, TypeVar, Awaitable, Callable, Any, \
+    Dict, List, TYPE_CHECKING
 import concurrent.futures as futures
-from contextlib import suppress
+from contextlib import suppress, AsyncExitStack
 
-import aiocometd
-from aiocometd.typing import JsonObject
 # pylint: disable=no-name-in-module
 from PyQt5.QtCore import pyqtSignal, pyqtProperty, QObject  # type: ignore
 # pylint: enable=no-name-in-module
 
 from aiocometd_chat_demo.exceptions import InvalidStateError
-
-
+from aiocometd_chat_demo.transport_options import TransportOptions, \
+    TransportType
+if TYPE_CHECKING:  # pragma: no cover
+    # aiocometd and the connection pool import aiohttp, which takes a large
+    # part of the startup time, so they're imported on the first connection
+    import aiocometd
+    from aiocometd_chat_demo.connection_pool import ConnectionPool
+    # the rate limiter depends on the MessageResponse type of this module
+    from aiocometd_chat_demo.rate_limit import RateLimiter
+    from aiocometd_chat_demo.json_codec import JsonCodec
+
+
+LOGGER = logging.getLogger(__name__)
 T_co = TypeVar("T_co", covariant=True)  # pylint: disable=invalid-name
+#: JSON object type, the same as ``aiocometd.typing.JsonObject``
+JsonObject = Dict[str, Any]
 
 
 def run_coro(coro: Awaitable[T_co],
@@ -89,11 +102,18 @@ class CometdClient(QObject):  # type: ignore
     disconnected = pyqtSignal()
     #: Signal emited when the client enters the :obj:`~ClientState.ERROR` state
     error = pyqtSignal(Exception)
-    #: Signal emited when a message has been received from the server
-    message_received = pyqtSignal(dict)
+    #: Signal emited when a message has been received from the server, the
+    #: message is passed on as the same Python object, without the
+    #: conversion of the whole message to a QVariantMap on every emission
+    message_received = pyqtSignal(object)
 
     def __init__(self, url: str, subscriptions: Iterable[str],
-                 loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+                 loop: Optional[asyncio.AbstractEventLoop] = None, *,
+                 connection_pool: Optional["ConnectionPool"] = None,
+                 rate_limiter: Optional["RateLimiter"] = None,
+                 json_codec: Optional["JsonCodec"] = None,
+                 transport_options: Optional[TransportOptions] = None) \
+            -> None:
         """
         :param url: CometD service url
         :param subscriptions: A list of channels to which the client should \
@@ -102,18 +122,37 @@ class CometdClient(QObject):  # type: ignore
                      schedule tasks. If *loop* is ``None`` then
                      :func:`asyncio.get_event_loop` is used to get the default
                      event loop.
+        :param connection_pool: The connection pool shared with other \
+        clients, or ``None`` to use connections of the client's own
+        :param rate_limiter: The rate limiter of the published messages, or \
+        ``None`` to publish the messages right away
+        :param json_codec: The JSON codec of the messages, or ``None`` to \
+        use the codec of the connection pool, or the default codec of \
+        aiocometd without a connection pool
+        :param transport_options: The transport selection and tuning \
+        options, or ``None`` to use the default options
         """
         super().__init__()
         self._url = url
         self._subscriptions = list(subscriptions)
         self._loop = loop or asyncio.get_event_loop()
-        self._client: Optional[aiocometd.Client] = None
+        self._client: Optional["aiocometd.Client"] = None
         self._state = ClientState.DISCONNECTED
         self._state_signals = {
             ClientState.CONNECTED: self.connected,
             ClientState.DISCONNECTED: self.disconnected,
         }
         self._connect_task: Optional["futures.Future[None]"] = None
+        #: Responses of the subscribe requests made while the client is
+        #: not connected by the names of the channels
+        self._pending_responses: Dict[str, List[MessageResponse]] = {}
+        self._connection_pool = connection_pool
+        self._rate_limiter = rate_limiter
+        self._json_codec = json_codec
+        self._transport_options = transport_options or TransportOptions()
+        #: Set when the client falls back to the long-polling transport,
+        #: so it doesn't wait for the failing websocket connection again
+        self._websocket_failed = False
 
     @pyqtProperty(ClientState, notify=state_changed)
     def state(self) -> ClientState:
@@ -153,29 +192,130 @@ class CometdClient(QObject):  # type: ignore
         """Connect to the CometD service and retreive the messages sent by
         the service as long as the client is open
         """
-        # connect to the service
-        async with aiocometd.Client(self._url, loop=self._loop) as client:
-            # set the asynchronous client attribute
-            self._client = client
-            # subscribe to all the channels
-            for subscription in self._subscriptions:
-                await client.subscribe(subscription)
-
-            # put the client into a connected state
-            self.state = ClientState.CONNECTED
-            # listen for incoming messages
-
-            with suppress(futures.CancelledError):
-                async for message in client:
-                    # emit signal about received messages
-                    self._loop.call_soon_threadsafe(self.message_received.emit,
-                                                    message)
-
-        # clear the asynchronous client attribute
-        self._client = None
+        # pylint: disable=import-outside-toplevel,redefined-outer-name
+        from aiocometd_chat_demo.connection_pool import CURRENT_POOL, \
+            CURRENT_TRANSPORT_OPTIONS, POOLED_TRANSPORT_CLASSES
+        # pylint: enable=import-outside-toplevel,redefined-outer-name
+
+        # connect to the service, with the transports which support the
+        # connection pool and the transport options
+        options: Dict[str, Any] = {
+            "transport_classes": POOLED_TRANSPORT_CLASSES
+        }
+        # the task of the coroutine runs in a context of its own, the
+        # transports of the client and their tasks inherit the options
+        CURRENT_TRANSPORT_OPTIONS.set(self._transport_options)
+        if self._connection_pool is not None:
+            CURRENT_POOL.set(self._connection_pool)
+            options.update(json_dumps=self._connection_pool.json_dumps,
+                           json_loads=self._connection_pool.json_loads)
+        if self._json_codec is not None:
+            options.update(json_dumps=self._json_codec.dumps,
+                           json_loads=self._json_codec.loads)
+        try:
+            async with AsyncExitStack() as stack:
+                client = await self._open_client(stack, options)
+                # set the asynchronous client attribute, from now on the
+                # subscription changes are sent to the server right away
+                self._client = client
+                # restore the tracked subscriptions, skipping the channels
+                # which get unsubscribed while the previous ones are
+                # subscribed
+                for subscription in list(self._subscriptions):
+                    if subscription in self._subscriptions:
+                        await client.subscribe(subscription)
+                        for response in self._pending_responses.pop(
+                                subscription, []):
+                            response.finished.emit()
+
+                # put the client into a connected state
+                self.state = ClientState.CONNECTED
+                # listen for incoming messages
+
+                with suppress(futures.CancelledError):
+                    async for message in client:
+                        # emit signal about received messages
+                        self._loop.call_soon_threadsafe(
+                            self.message_received.emit,
+                            message
+                        )
+        finally:
+            # clear the asynchronous client attribute
+            self._client = None
         # put the client into a disconnected state
         self.state = ClientState.DISCONNECTED
 
+    async def _open_client(self, stack: AsyncExitStack,
+                           options: Dict[str, Any]) -> "aiocometd.Client":
+        """Open an aiocometd client with the transports selected by the
+        transport options
+
+        If the client fails to connect with the websocket transport, and
+        the options allow it, it's opened again with the long-polling
+        transport.
+        :param stack: The exit stack which closes the client
+        :param options: Keyword arguments of the aiocometd client
+        :return: The opened client
+        """
+        # pylint: disable=import-outside-toplevel,redefined-outer-name
+        import aiocometd
+        # pylint: enable=import-outside-toplevel,redefined-outer-name
+
+        transport_types = self._transport_options.transport_types
+        if self._websocket_failed:
+            transport_types = [TransportType.LONG_POLLING]
+        try:
+            return await self._enter_client(stack, transport_types, options)
+        except (aiocometd.exceptions.TransportError,
+                asyncio.TimeoutError) as error:
+            if not self._transport_options.can_fall_back(transport_types):
+                raise
+            LOGGER.warning("Failed to connect with the websocket transport: "
+                           "%r, falling back to long-polling.", error)
+        client = await self._enter_client(
+            stack, [TransportType.LONG_POLLING], options
+        )
+        self._websocket_failed = True
+        return client
+
+    async def _enter_client(self, stack: AsyncExitStack,
+                            transport_types: List[TransportType],
+                            options: Dict[str, Any]) -> "aiocometd.Client":
+        """Open an aiocometd client with the given *transport_types* within
+        the connect timeout
+
+        The aiocometd client closes itself only if it fails to open, or
+        once it's opened, so the transport of a client which times out while
+        opening is closed here.
+        :param stack: The exit stack which closes the client
+        :param transport_types: The transports the client may use in the \
+        order of preference
+        :param options: Keyword arguments of the aiocometd client
+        :return: The opened client
+        """
+        # pylint: disable=import-outside-toplevel,redefined-outer-name
+        from aiocometd.constants import ConnectionType
+        from aiocometd_chat_demo.connection_pool import PooledClient
+        # pylint: enable=import-outside-toplevel,redefined-outer-name
+
+        client = PooledClient(
+            self._url,
+            [ConnectionType(item.value) for item in transport_types],
+            connection_timeout=self._transport_options.connection_timeout,
+            loop=self._loop,
+            **options
+        )
+        try:
+            return await asyncio.wait_for(
+                stack.enter_async_context(client),
+                self._transport_options.connect_timeout
+            )
+        except asyncio.TimeoutError:
+            transport = client._transport  # pylint: disable=protected-access
+            if transport is not None:
+                await transport.close()
+            raise
+
     def _on_connect_done(self, future: "futures.Future[None]") -> None:
         """Evaluate the result of an asynchronous task
 
@@ -188,6 +328,13 @@ class CometdClient(QObject):  # type: ignore
         with suppress(futures.CancelledError):
             error = future.exception()
         if error is not None:
+            # the deferred subscriptions failed along with the connection
+            pending_responses = self._pending_responses
+            self._pending_responses = {}
+            for responses in pending_responses.values():
+                for response in responses:
+                    response.error = error
+                    response.finished.emit()
             self.state = ClientState.ERROR
             self.error.emit(error)
 
@@ -203,19 +350,153 @@ class CometdClient(QObject):  # type: ignore
                                         "attribute.")
             self._connect_task.cancel()
 
+    @property
+    def subscriptions(self) -> List[str]:
+        """The channels to which the client is subscribed, or will subscribe
+        when it connects"""
+        return list(self._subscriptions)
+
+    def subscribe(self, channel: str) -> MessageResponse:
+        """Subscribe to the given *channel*
+
+        The channel is tracked by the client, and it's subscribed again every
+        time the client connects. If the client is not connected, then the
+        returned response finishes when the client connects and the *channel*
+        gets subscribed.
+        :param channel: Name of the channel
+        :return: The response associated with the subscribe request
+        """
+        if channel in self._subscriptions:
+            return self._finished_response()
+        self._subscriptions.append(channel)
+        if self._client is None:
+            response = MessageResponse()
+            self._pending_responses.setdefault(channel, []).append(response)
+            return response
+        return self._send_subscription_request(channel, subscribe=True)
+
+    def unsubscribe(self, channel: str) -> MessageResponse:
+        """Unsubscribe from the given *channel*
+
+        If the client is not connected, then the *channel* is only removed
+        from the tracked subscriptions and the returned response finishes
+        without sending any requests.
+        :param channel: Name of the channel
+        :return: The response associated with the unsubscribe request
+        """
+        if channel not in self._subscriptions:
+            return self._finished_response()
+        self._subscriptions.remove(channel)
+        if self._client is None:
+            # the pending subscribe requests of the channel are cancelled
+            for response in self._pending_responses.pop(channel, []):
+                self._loop.call_soon(self._emit_finished, response)
+            return self._finished_response()
+        return self._send_subscription_request(channel, subscribe=False)
+
+    def _finished_response(self) -> MessageResponse:
+        """Create a response which finishes without sending any requests
+
+        The :obj:`~MessageResponse.finished` signal is emited on the next
+        iteration of the event loop, so the caller can connect to it first.
+        """
+        response = MessageResponse()
+        self._loop.call_soon(self._emit_finished, response)
+        return response
+
+    @staticmethod
+    def _emit_finished(response: MessageResponse) -> None:
+        """Emit the :obj:`~MessageResponse.finished` signal of the *response*
+
+        Scheduling this function instead of the signal's emit method keeps a
+        reference to the *response*, so it's not destroyed if the caller
+        discards it.
+        """
+        response.finished.emit()
+
+    def _send_subscription_request(self, channel: str, subscribe: bool) \
+            -> MessageResponse:
+        """Send a subscribe or unsubscribe request for the *channel*
+
+        :param channel: Name of the channel
+        :param subscribe: Send a subscribe request if true, otherwise an \
+        unsubscribe request
+        :return: The response associated with the request
+        """
+        if self._client is None:
+            raise InvalidStateError("Uninitialized _client attribute.")
+        if subscribe:
+            coro = self._client.subscribe(channel)
+        else:
+            coro = self._client.unsubscribe(channel)
+        response = MessageResponse()
+        run_coro(coro, partial(self._on_publish_done, response), self._loop)
+        return response
+
+    @property
+    def transport_options(self) -> TransportOptions:
+        """The transport selection and tuning options"""
+        return self._transport_options
+
+    @property
+    def json_codec(self) -> Optional["JsonCodec"]:
+        """The JSON codec of the messages"""
+        return self._json_codec
+
+    @property
+    def rate_limiter(self) -> Optional["RateLimiter"]:
+        """The rate limiter of the published messages"""
+        return self._rate_limiter
+
     def publish(self, channel: str, data: JsonObject) -> MessageResponse:
         """Publish *data* to the given *channel*
 
+        If the client has a rate limiter, the message might be queued until
+        the rate limits allow its sending.
         :param channel: Name of the channel
         :param data: Data to send to the server
         :return: Return the response associated with the message
         """
+        self._check_publishable()
+        if self._rate_limiter is not None:
+            return self._rate_limiter.publish(channel, data, self._publish)
+        return self._publish(channel, data)
+
+    def clear_queued_messages(self) -> None:
+        """Drop the messages of the client which wait for the rate limits to
+        allow their sending, and finish their responses with an error
+
+        The queued messages can't be sent once the client is disconnected.
+        If the client has no rate limiter it does nothing.
+        """
+        if self._rate_limiter is not None:
+            self._rate_limiter.clear(
+                InvalidStateError("The client disconnected before the "
+                                  "message was sent."),
+                self._publish
+            )
+
+    def _check_publishable(self) -> None:
+        """Check that the client is able to send messages
+
+        :raise InvalidStateError: If the client is not connected
+        """
         # check that the client has been initialized
         if self.state != ClientState.CONNECTED:
             raise InvalidStateError("Can't send messages in a non-connected "
                                     "state.")
         if self._client is None:
             raise InvalidStateError("Uninitialized _client attribute.")
+
+    def _publish(self, channel: str, data: JsonObject) -> MessageResponse:
+        """Send the message publishing *data* to the given *channel*
+
+        :param channel: Name of the channel
+        :param data: Data to send to the server
+        :return: Return the response associated with the message
+        """
+        self._check_publishable()
+        assert self._client is not None
         response = MessageResponse()
         run_coro(self._client.publish(channel, data),
                  partial(self._on_publish_done, response),
@@ -0,0 +1,254 @@
+"""HTTP connection pool shared by the CometD clients of a process
+
+The pooled transports and :obj:`PooledClient` override private methods of
+aiocometd, so they depend on the exact aiocometd version pinned in the
+Pipfile, and they should be checked against the changes of aiocometd when
+it's upgraded.
+"""
+import asyncio
+from contextvars import ContextVar
+from typing import Optional, Any, Dict, Mapping, Type
+
+import aiohttp
+import aiocometd
+from aiocometd.constants import ConnectionType, DEFAULT_CONNECTION_TYPE
+from aiocometd.exceptions import ClientError
+from aiocometd.transports.registry import create_transport
+from aiocometd.transports.abc import Transport
+from aiocometd.transports.long_polling import LongPollingTransport
+from aiocometd.transports.websocket import WebSocketTransport, WebSocket
+from aiocometd.typing import JsonObject, Headers
+
+from aiocometd_chat_demo.json_codec import JsonCodec, stdlib_codec
+from aiocometd_chat_demo.transport_options import TransportOptions
+
+
+#: The connection pool used by the transports created in the current context
+CURRENT_POOL: "ContextVar[Optional[ConnectionPool]]" = ContextVar(
+    "current_connection_pool", default=None
+)
+#: The options of the transports created in the current context
+CURRENT_TRANSPORT_OPTIONS: "ContextVar[Optional[TransportOptions]]" = \
+    ContextVar("current_transport_options", default=None)
+
+
+class ConnectionPool:
+    """A pool of HTTP and WebSocket connections with a JSON setup, which can
+    be shared by several CometD clients running on the same event loop
+
+    Every aiocometd transport creates its own ``aiohttp.ClientSession`` with
+    a connector of its own, so every client keeps a separate set of
+    connections, DNS cache and SSL contexts. The transports of the clients
+    using a pool create their sessions on top of the pool's connector
+    instead. These sessions don't own the connector, so when a client
+    disconnects only its lightweight session is closed, and the connections
+    are kept until the pool is closed.
+    """
+
+    def __init__(self, limit: int = 0, limit_per_host: int = 0,
+                 json_codec: Optional[JsonCodec] = None) -> None:
+        """
+        :param limit: The maximum number of simultaneous connections, or \
+        ``0`` for no limit. Every connected client using a WebSocket \
+        transport occupies a connection, so a limit also limits the number \
+        of clients that can connect.
+        :param limit_per_host: The maximum number of simultaneous \
+        connections to the same endpoint, or ``0`` for no limit
+        :param json_codec: The JSON codec shared by the clients, or ``None`` \
+        to use the codec of the standard library
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        #: The connector shared by the sessions, created on first use since
+        #: it requires a running event loop
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        #: JSON codec shared by the clients
+        self.json_codec = json_codec or stdlib_codec()
+        #: Number of sessions created by the pool
+        self.session_count = 0
+
+    def json_dumps(self, obj: Any) -> str:
+        """Serialize *obj* to a JSON string"""
+        return self.json_codec.dumps(obj)
+
+    def json_loads(self, text: str) -> JsonObject:
+        """Deserialize the JSON *text*"""
+        return self.json_codec.loads(text)  # type: ignore
+
+    @property
+    def closed(self) -> bool:
+        """Whether the pool's connections have been closed"""
+        return self._connector is not None and self._connector.closed
+
+    def create_session(self) -> aiohttp.ClientSession:
+        """Create a new HTTP client session using the pooled connections
+
+        Must be called while the event loop is running.
+        """
+        if self._connector is None or self._connector.closed:
+            self._connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host
+            )
+        self.session_count += 1
+        return aiohttp.ClientSession(connector=self._connector,
+                                     connector_owner=False,
+                                     json_serialize=self.json_dumps)
+
+    async def close(self) -> None:
+        """Close all the pooled connections"""
+        if self._connector is not None:
+            await self._connector.close()
+
+
+# pylint: disable=too-few-public-methods
+class _PooledSessionMixin:
+    """Transport mixin which takes its HTTP session from the
+    :obj:`CURRENT_POOL` if there is one"""
+    _http_session: Optional[aiohttp.ClientSession]
+
+    async def _get_http_session(self) -> aiohttp.ClientSession:
+        pool = CURRENT_POOL.get()
+        if self._http_session is None and pool is not None:
+            self._http_session = pool.create_session()
+        return await super()._get_http_session()  # type: ignore
+
+    async def _close_http_session(self) -> None:
+        # a pooled session doesn't own its connections, so it can be closed
+        # without waiting for the graceful shutdown of the connections
+        session = self._http_session
+        if session is not None and not session.connector_owner:
+            await session.close()
+        else:
+            await super()._close_http_session()  # type: ignore
+
+# pylint: enable=too-few-public-methods
+
+
+class PooledLongPollingTransport(_PooledSessionMixin,
+                                 LongPollingTransport):  # type: ignore
+    """Long-polling type transport supporting connection pools"""
+
+
+class PooledWebSocketTransport(_PooledSessionMixin,
+                               WebSocketTransport):  # type: ignore
+    """WebSocket type transport supporting connection pools, and the
+    compression and message size options of the
+    :obj:`CURRENT_TRANSPORT_OPTIONS`"""
+
+    async def _get_socket(self, headers: Headers) -> WebSocket:
+        options = CURRENT_TRANSPORT_OPTIONS.get()
+        if options is None:
+            return await super()._get_socket(headers)
+        return await self._socket_factory(
+            self.endpoint,
+            ssl=self.ssl,
+            headers=headers,
+            receive_timeout=self.request_timeout,
+            autoping=True,
+            compress=options.compression_window_bits,
+            max_msg_size=options.max_message_size
+        )
+
+
+#: The transports supporting connection pools and transport options by their
+#: connection types
+POOLED_TRANSPORT_CLASSES: Mapping[ConnectionType, Type[Transport]] = {
+    ConnectionType.LONG_POLLING: PooledLongPollingTransport,
+    ConnectionType.WEBSOCKET: PooledWebSocketTransport,
+}
+
+
+class PooledClient(aiocometd.Client):  # type: ignore
+    """An aiocometd client which creates its transports from the given
+    *transport_classes*
+
+    aiocometd creates the transports of every client from a single global
+    registry of transport classes. Registering the pooled transports there
+    would replace the transports of every client in the process, so the
+    transport classes are passed to the clients which use them instead.
+    """
+
+    def __init__(self, *args: Any,
+                 transport_classes: Optional[
+                     Mapping[ConnectionType, Type[Transport]]] = None,
+                 **kwargs: Any) -> None:
+        """
+        :param args: Positional arguments of the aiocometd client
+        :param transport_classes: The transport classes by their connection \
+        types, the connection types which are missing use the transports \
+        registered in aiocometd
+        :param kwargs: Keyword arguments of the aiocometd client
+        """
+        super().__init__(*args, **kwargs)
+        #: The transport classes by their connection types
+        self.transport_classes: Dict[ConnectionType, Type[Transport]] = \
+            dict(transport_classes or {})
+
+    def _create_transport(self, connection_type: ConnectionType,
+                          **kwargs: Any) -> Transport:
+        """Create a transport for the given *connection_type*
+
+        :param connection_type: A connection type
+        :param kwargs: Keyword arguments of the transport
+        :return: A transport object
+        """
+        transport_class = self.transport_classes.get(connection_type)
+        if transport_class is None:
+            return create_transport(connection_type, **kwargs)
+        return transport_class(**kwargs)
+
+    async def _negotiate_transport(self) -> Transport:
+        """Negotiate the transport type to use with the server and create the
+        transport object
+
+        The same as the negotiation of the aiocometd client, except that the
+        transports are created by :obj:`_create_transport`.
+        :return: Transport object
+        :raise ClientError: If none of the connection types offered by the \
+        server are supported
+        """
+        # pylint: disable=attribute-defined-outside-init
+        self._incoming_queue: "asyncio.Queue[JsonObject]" = \
+            asyncio.Queue(maxsize=self._max_pending_count)
+        # pylint: enable=attribute-defined-outside-init
+        options = {
+            "url": self.url,
+            "incoming_queue": self._incoming_queue,
+            "ssl": self.ssl,
+            "extensions": self.extensions,
+            "auth": self.auth,
+            "json_dumps": self._json_dumps,
+            "json_loads": self._json_loads,
+            "loop": self._loop,
+        }
+        transport = self._create_transport(DEFAULT_CONNECTION_TYPE, **options)
+        try:
+            response = await transport.handshake(self._connection_types)
+            self._verify_response(response)
+            connection_type = self._pick_connection_type(
+                response["supportedConnectionTypes"]
+            )
+            if not connection_type:
+                raise ClientError("None of the connection types offered by "
+                                  "the server are supported.")
+            if transport.connection_type != connection_type:
+                # reuse the client id, the reconnect advice and the http
+                # session of the handshake in the negotiated transport
+                client_id = transport.client_id
+                advice = transport.reconnect_advice
+                session = transport.http_session
+                # keep the session open when the transport is closed
+                transport.http_session = None
+                await transport.close()
+                transport = self._create_transport(
+                    connection_type,
+                    client_id=client_id,
+                    reconnect_advice=advice,
+                    http_session=session,
+                    **options
+                )
+            return transport
+        except Exception:
+            await transport.close()
+            raise
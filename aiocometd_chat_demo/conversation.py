@@ -1,4 +1,7 @@
 """Chat conversation related types"""
+import math
+import re
+from bisect import bisect, bisect_left
 from typing import NamedTuple, List, ClassVar, Dict, Any, Optional
 from datetime import datetime
 from enum import IntEnum, unique
@@ -11,6 +14,7 @@ from PyQt5.QtCore import (  # type: ignore
     QByteArray,
     QModelIndex,
     QDateTime,
+    QLocale,
     pyqtSlot,
     pyqtSignal,
     pyqtProperty
@@ -18,6 +22,17 @@ from PyQt5.QtCore import (  # type: ignore
 # pylint: enable=no-name-in-module,wrong-import-order
 
 
+#: Characters removed from the displayed text of the messages: the control
+#: characters except tabs and line breaks, and the bidirectional overrides
+#: which could reorder the text around the message
+UNSAFE_CHARACTERS = re.compile(
+    "[\x00-\x08\x0b-\x1f\x7f-\x9f\u202a-\u202e\u2066-\u2069]"
+)
+#: The height of the bubble of a message in pixels besides the lines of its
+#: header and its text, as laid out by MessageDelegate.qml
+BUBBLE_PADDING = 23.0
+
+
 class ChatMessage(NamedTuple):
     """Represents a message received from the service"""
     #: Message arrival time
@@ -37,8 +52,61 @@ class ItemRole(IntEnum):
     SENDER = Qt.UserRole + 1
     #: Message contents role
     CONTENTS = Qt.UserRole + 2
+    #: Whether the message was sent by the local user role
+    IS_OWN = Qt.UserRole + 3
+    #: Message arrival time formatted for display role
+    TIME_TEXT = Qt.UserRole + 4
+    #: Message contents sanitized for display as plain text role
+    DISPLAY_TEXT = Qt.UserRole + 5
+    #: The estimated or the measured height of the message's delegate role
+    ESTIMATED_HEIGHT = Qt.UserRole + 6
+
+
+class MessageDisplay(NamedTuple):
+    """The display data of a message, which is computed once per message"""
+    #: Message arrival time formatted with the short time format of the
+    #: locale
+    time_text: str
+    #: Message contents sanitized for display as plain text
+    text: str
+
+    @classmethod
+    def from_message(cls, message: ChatMessage) -> "MessageDisplay":
+        """Compute the display data of the *message*"""
+        time = QDateTime(message.time).time()
+        contents = (message.contents or "").replace("\r\n", "\n")
+        return cls(
+            time_text=QLocale().toString(time, QLocale.ShortFormat),
+            text=UNSAFE_CHARACTERS.sub("", contents)
+        )
+
 
+class MessageLayout(NamedTuple):
+    """The metrics of the layout of the messages in the views"""
+    #: The width available for the text of the messages in pixels
+    width: float = 300.0
+    #: The height of a line of text in pixels
+    line_height: float = 17.0
+    #: The average width of a character in pixels
+    character_width: float = 7.0
 
+    def estimated_height(self, text: str) -> float:
+        """Estimate the height of the delegate of a message from the length
+        of the lines of its displayed *text*
+
+        The words wrapped to the next line are not taken into account, so
+        the estimate can be a bit lower than the actual height.
+        :param text: The displayed text of the message
+        :return: The estimated height in pixels
+        """
+        line_length = max(1, int(self.width // self.character_width))
+        line_count = sum(max(1, math.ceil(len(line) / line_length))
+                         for line in text.split("\n"))
+        # the header of the message takes a line as well
+        return (line_count + 1) * self.line_height + BUBBLE_PADDING
+
+
+# pylint: disable=too-many-instance-attributes,too-many-public-methods
 @dataclass()
 class ConversationModel(QAbstractListModel):  # type: ignore
     """A chat conversation or a timeline of messages between two or more users
@@ -50,16 +118,53 @@ class ConversationModel(QAbstractListModel):  # type: ignore
     #: List of chat messages in the conversation in chronological order
     _messages: List[ChatMessage] = field(default_factory=list,
                                          init=False, repr=False)
+    #: The times of the messages, in the same order as the messages, so the
+    #: rows can be found by bisection
+    _times: List[datetime] = field(default_factory=list, init=False,
+                                   repr=False)
+    #: Whether older messages can be fetched from the history service
+    _has_more_history: bool = field(default=False, init=False, repr=False)
+    #: Whether a page of the history is being fetched
+    _history_loading: bool = field(default=False, init=False, repr=False)
+    #: The position of the next older page in the history, ``None`` for the
+    #: most recent page
+    _history_cursor: Any = field(default=None, init=False, repr=False)
+    #: The name of the local user, whose messages are displayed as own
+    _username: str = field(default="", init=False, repr=False)
+    #: Whether the views should skip the animations of the new rows, since
+    #: the messages arrive too fast
+    _degraded: bool = field(default=False, init=False, repr=False)
+    #: The display data of the messages which were displayed
+    _displays: Dict[ChatMessage, MessageDisplay] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    #: The metrics of the layout of the messages in the views
+    _layout: MessageLayout = field(default=MessageLayout(), init=False,
+                                   repr=False)
+    #: The heights of the delegates of the messages which were displayed,
+    #: measured by the views or estimated until they're measured
+    _heights: Dict[ChatMessage, float] = field(default_factory=dict,
+                                               init=False, repr=False)
     #: Custom item role names
     _role_names: ClassVar[Dict[int, QByteArray]] = {
         ItemRole.TIME: QByteArray(b"time"),
         ItemRole.SENDER: QByteArray(b"sender"),
         ItemRole.CONTENTS: QByteArray(b"contents"),
+        ItemRole.IS_OWN: QByteArray(b"isOwn"),
+        ItemRole.TIME_TEXT: QByteArray(b"timeText"),
+        ItemRole.DISPLAY_TEXT: QByteArray(b"displayText"),
+        ItemRole.ESTIMATED_HEIGHT: QByteArray(b"estimatedHeight"),
     }
     #: Signal emitted when the channel name changes
     channel_changed: ClassVar[pyqtSignal] = pyqtSignal(str)
+    #: Signal emitted when the username of the local user changes
+    username_changed: ClassVar[pyqtSignal] = pyqtSignal(str)
+    #: Signal emitted when the degraded mode is switched on or off
+    degraded_changed: ClassVar[pyqtSignal] = pyqtSignal(bool)
     #: Sending of a message to this conversation was requested
     message_sending_requested: ClassVar[pyqtSignal] = pyqtSignal(str)
+    #: Fetching the next older page of the history was requested
+    history_requested: ClassVar[pyqtSignal] = pyqtSignal()
 
     def __post_init__(self) -> None:
         super().__init__()
@@ -69,6 +174,43 @@ class ConversationModel(QAbstractListModel):  # type: ignore
         """The name of the conversation's channel"""
         return self._channel
 
+    @pyqtProperty(str, notify=username_changed)  # type: ignore
+    def username(self) -> str:
+        """The name of the local user, whose messages are displayed as
+        own"""
+        return self._username
+
+    @username.setter  # type: ignore
+    def username(self, username: str) -> None:
+        """Set the name of the local user
+
+        :param username: The name of the local user
+        """
+        if username == self._username:
+            return
+        self._username = username
+        if self._messages:
+            self.dataChanged.emit(self.index(0),
+                                  self.index(len(self._messages) - 1),
+                                  [ItemRole.IS_OWN])
+        self.username_changed.emit(username)
+
+    @pyqtProperty(bool, notify=degraded_changed)  # type: ignore
+    def degraded(self) -> bool:
+        """Whether the messages arrive too fast to animate the new rows, in
+        which case the views should display them without animations"""
+        return self._degraded
+
+    @degraded.setter  # type: ignore
+    def degraded(self, degraded: bool) -> None:
+        """Switch the degraded mode on or off
+
+        :param degraded: Whether the degraded mode is on
+        """
+        if degraded != self._degraded:
+            self._degraded = degraded
+            self.degraded_changed.emit(degraded)
+
     # pylint: disable=invalid-name,unused-argument
     def rowCount(self, parent: Optional[QModelIndex] = None) -> int:
         """Returns the number of rows in the model
@@ -85,8 +227,29 @@ class ConversationModel(QAbstractListModel):  # type: ignore
         """
         return self._role_names
 
+    def canFetchMore(self, parent: Optional[QModelIndex] = None) -> bool:
+        """Returns whether older messages can be fetched from the history
+
+        :param parent: Unused since this not a hierarchical model
+        :return: True if there is more history and it's not being fetched
+        """
+        return self._has_more_history and not self._history_loading
+
+    def fetchMore(self, parent: Optional[QModelIndex] = None) -> None:
+        """Request the next older page of the history
+
+        The page is fetched asynchronously by the listener of the
+        :obj:`history_requested` signal, which passes it to
+        :obj:`add_history_page`.
+        :param parent: Unused since this not a hierarchical model
+        """
+        if self.canFetchMore():
+            self._history_loading = True
+            self.history_requested.emit()
+
     # pylint: enable=invalid-name,unused-argument
 
+    # pylint: disable=too-many-return-statements
     def data(self, index: QModelIndex, role: Optional[int] = None) -> Any:
         """Return the data at the row of the given *index* and for the
         specified *role*
@@ -108,8 +271,177 @@ class ConversationModel(QAbstractListModel):  # type: ignore
                 return message.sender
             if role == ItemRole.CONTENTS:
                 return message.contents
+            if role == ItemRole.IS_OWN:
+                return message.sender == self._username
+            if role == ItemRole.TIME_TEXT:
+                return self.message_display(message).time_text
+            if role == ItemRole.DISPLAY_TEXT:
+                return self.message_display(message).text
+            if role == ItemRole.ESTIMATED_HEIGHT:
+                return self.message_height(message)
         return None
 
+    # pylint: enable=too-many-return-statements
+
+    def message_display(self, message: ChatMessage) -> MessageDisplay:
+        """Get the display data of the *message*, which is computed on the
+        first request and cached
+
+        :param message: A message of the conversation
+        :return: The display data of the message
+        """
+        display = self._displays.get(message)
+        if display is None:
+            display = MessageDisplay.from_message(message)
+            self._displays[message] = display
+        return display
+
+    def message_height(self, message: ChatMessage) -> float:
+        """Get the height of the delegate of the *message*
+
+        :param message: A message of the conversation
+        :return: The height measured by the views, or the estimated height \
+        if the message wasn't displayed yet with the current layout
+        """
+        height = self._heights.get(message)
+        if height is None:
+            height = self._layout.estimated_height(
+                self.message_display(message).text
+            )
+            self._heights[message] = height
+        return height
+
+    @pyqtSlot(float, float, float, name="setLayoutMetrics")  # type: ignore
+    def set_layout_metrics(self, width: float, line_height: float,
+                           character_width: float) -> None:
+        """Set the metrics of the layout of the messages in the views, which
+        invalidates the heights of the messages
+
+        :param width: The width available for the text of the messages
+        :param line_height: The height of a line of text
+        :param character_width: The average width of a character
+        """
+        layout = MessageLayout(width=width, line_height=line_height,
+                               character_width=character_width)
+        if width <= 0 or layout == self._layout:
+            return
+        self._layout = layout
+        self._heights.clear()
+        if self._messages:
+            self.dataChanged.emit(self.index(0),
+                                  self.index(len(self._messages) - 1),
+                                  [ItemRole.ESTIMATED_HEIGHT])
+
+    @pyqtSlot(int, float, name="setMeasuredHeight")  # type: ignore
+    def set_measured_height(self, row: int, height: float) -> None:
+        """Store the *height* of the delegate of the message at *row* as
+        laid out by a view, so the delegates created later for the message
+        get the right height without laying it out first
+
+        :param row: The row of the message
+        :param height: The measured height in pixels
+        """
+        if not 0 <= row < len(self._messages):
+            return
+        # pylint: disable=unsubscriptable-object
+        message = self._messages[row]
+        # pylint: enable=unsubscriptable-object
+        if self._heights.get(message) != height:
+            self._heights[message] = height
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [ItemRole.ESTIMATED_HEIGHT])
+
+    def message_row(self, message: ChatMessage) -> int:
+        """Find the row of the given *message*
+
+        The messages are stored in chronological order, so the message is
+        looked up by its time with bisection.
+        :param message: A message of the conversation
+        :return: The row of the message or -1 if not found
+        """
+        # check the messages with the same time
+        for row in range(bisect_left(self._times, message.time),
+                         bisect(self._times, message.time)):
+            # pylint: disable=unsubscriptable-object
+            if self._messages[row] is message:
+                return row
+            # pylint: enable=unsubscriptable-object
+        return -1
+
+    @property
+    def history_cursor(self) -> Any:
+        """The position of the next older page in the history, ``None`` for
+        the most recent page"""
+        return self._history_cursor
+
+    def tail(self, count: int) -> List[ChatMessage]:
+        """Get the most recent messages of the conversation
+
+        :param count: The maximum number of messages
+        :return: The last *count* messages in chronological order
+        """
+        if count <= 0:
+            return []
+        # pylint: disable=unsubscriptable-object
+        return self._messages[-count:]
+        # pylint: enable=unsubscriptable-object
+
+    def enable_history(self) -> None:
+        """Allow fetching the history of the conversation, starting with the
+        most recent page"""
+        self._has_more_history = True
+        self._history_cursor = None
+
+    @pyqtSlot(name="loadHistory")  # type: ignore
+    def load_history(self) -> None:
+        """Request the next older page of the history if there is one"""
+        self.fetchMore()
+
+    def add_history_page(self, messages: List[ChatMessage],
+                         cursor: Any) -> None:
+        """Add a fetched page of the history to the conversation
+
+        :param messages: The messages of the page
+        :param cursor: The position of the next older page, or ``None`` if \
+        there are no older messages
+        """
+        self._history_loading = False
+        self._history_cursor = cursor
+        self._has_more_history = cursor is not None
+        self.add_messages(messages)
+
+    def history_page_failed(self) -> None:
+        """Allow fetching the page again after it failed to be fetched"""
+        self._history_loading = False
+
+    def add_messages(self, messages: List[ChatMessage]) -> None:
+        """Add several *messages* to the conversation
+
+        If the messages are all older or all newer than the messages of the
+        conversation, like the pages of the history, then they're inserted
+        with a single insertion of rows, otherwise they're added one by one.
+        Messages with the same time as the first message of the conversation
+        are considered to be older.
+        """
+        messages = sorted(messages, key=lambda message: message.time)
+        if not messages:
+            return
+        # pylint: disable=unsubscriptable-object
+        if not self._messages or \
+                messages[-1].time <= self._messages[0].time:
+            row = 0
+        elif messages[0].time >= self._messages[-1].time:
+            row = len(self._messages)
+        else:
+            for message in messages:
+                self.add_incoming_message(message)
+            return
+        # pylint: enable=unsubscriptable-object
+        self.beginInsertRows(QModelIndex(), row, row + len(messages) - 1)
+        self._messages[row:row] = messages
+        self._times[row:row] = [message.time for message in messages]
+        self.endInsertRows()
+
     @pyqtSlot(str, name="sendMessage")  # type: ignore
     def send_message(self, contents: str) -> None:
         """Send a new message with the specified *contents* to this
@@ -121,11 +453,19 @@ class ConversationModel(QAbstractListModel):  # type: ignore
     def add_incoming_message(self, message: ChatMessage) -> None:
         """Add an incoming *message* to the list of messages of the
         conversation
+
+        The messages usually arrive in chronological order and they're
+        appended to the list, while a late *message* is inserted after the
+        messages which aren't newer than it.
         """
-        self.beginInsertRows(
-            QModelIndex(),
-            len(self._messages),
-            len(self._messages)
-        )
-        self._messages.append(message)  # pylint: disable=no-member
+        row = len(self._messages)
+        # pylint: disable=unsubscriptable-object
+        if row and message.time < self._times[-1]:
+            row = bisect(self._times, message.time)
+        # pylint: enable=unsubscriptable-object
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._messages.insert(row, message)  # pylint: disable=no-member
+        self._times.insert(row, message.time)  # pylint: disable=no-member
         self.endInsertRows()
+
+# pylint: enable=too-many-instance-attributes,too-many-public-methods
@@ -4,6 +4,9 @@ Exception hierarchy::
 
     ApplicationException
         InvalidStateError
+        OutboxFullError
+        RateLimiterFullError
+        QmlCompilationError
 """
 
 
@@ -13,3 +16,15 @@ class ApplicationException(Exception):
 
 class InvalidStateError(ApplicationException):
     """The internal state or class invariant is violated"""
+
+
+class OutboxFullError(ApplicationException):
+    """The outbox can't accept any more messages"""
+
+
+class RateLimiterFullError(ApplicationException):
+    """The rate limiter can't queue any more messages"""
+
+
+class QmlCompilationError(ApplicationException):
+    """A QML file can't be compiled"""
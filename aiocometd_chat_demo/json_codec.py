@@ -0,0 +1,117 @@
+"""JSON codecs of the CometD transports
+
+The messages exchanged with the CometD service are encoded and decoded with
+the standard library's :mod:`json` module by default. If one of the optional
+`orjson <https://pypi.org/project/orjson/>`_ or
+`ujson <https://pypi.org/project/ujson/>`_ packages is installed, it can be
+used instead, which cuts the time spent with the JSON processing of every
+message.
+"""
+import json
+import logging
+from typing import NamedTuple, Callable, Any, Dict
+
+
+LOGGER = logging.getLogger(__name__)
+#: Name of the codec of the standard library
+STDLIB_CODEC = "json"
+#: Name which selects the fastest installed codec
+AUTO_CODEC = "auto"
+
+
+class JsonCodec(NamedTuple):
+    """A pair of JSON serialization and deserialization functions"""
+    #: Name of the codec
+    name: str
+    #: Function serializing an object to a JSON string
+    dumps: Callable[[Any], str]
+    #: Function deserializing a JSON string
+    loads: Callable[[str], Any]
+
+
+def stdlib_codec() -> JsonCodec:
+    """Create the codec of the standard library's :mod:`json` module"""
+    # the encoder and decoder objects are reused, instead of looking up the
+    # default ones on every call
+    encoder = json.JSONEncoder(separators=(",", ":"))
+    decoder = json.JSONDecoder()
+    return JsonCodec(name=STDLIB_CODEC, dumps=encoder.encode,
+                     loads=decoder.decode)
+
+
+def orjson_codec() -> JsonCodec:
+    """Create the codec of the ``orjson`` package
+
+    :raise ImportError: If ``orjson`` is not installed
+    """
+    # pylint: disable=import-outside-toplevel,import-error
+    import orjson  # type: ignore
+    # pylint: enable=import-outside-toplevel,import-error
+    orjson_dumps = orjson.dumps
+
+    def dumps(obj: Any) -> str:
+        # orjson serializes to bytes, while the transports send text
+        return orjson_dumps(obj).decode("utf-8")  # type: ignore
+    return JsonCodec(name="orjson", dumps=dumps, loads=orjson.loads)
+
+
+def ujson_codec() -> JsonCodec:
+    """Create the codec of the ``ujson`` package
+
+    :raise ImportError: If ``ujson`` is not installed
+    """
+    # pylint: disable=import-outside-toplevel,import-error
+    import ujson  # type: ignore
+    # pylint: enable=import-outside-toplevel,import-error
+    ujson_dumps = ujson.dumps
+
+    def dumps(obj: Any) -> str:
+        # keep the non-ASCII characters, like the other codecs
+        return ujson_dumps(obj, ensure_ascii=False)  # type: ignore
+    return JsonCodec(name="ujson", dumps=dumps, loads=ujson.loads)
+
+
+#: The factories of the codecs by their names from the fastest to the slowest
+CODEC_FACTORIES: Dict[str, Callable[[], JsonCodec]] = {
+    "orjson": orjson_codec,
+    "ujson": ujson_codec,
+    STDLIB_CODEC: stdlib_codec,
+}
+
+
+def available_codecs() -> Dict[str, JsonCodec]:
+    """Create the codecs of the installed packages
+
+    :return: The installed codecs by their names from the fastest to the \
+    slowest
+    """
+    codecs = {}
+    for name, factory in CODEC_FACTORIES.items():
+        try:
+            codecs[name] = factory()
+        except ImportError:
+            continue
+    return codecs
+
+
+def get_codec(name: str = AUTO_CODEC) -> JsonCodec:
+    """Get the JSON codec called *name*
+
+    If the package of the codec is not installed, the codec of the standard
+    library is returned instead.
+    :param name: Name of a codec in :obj:`CODEC_FACTORIES`, or \
+    :obj:`AUTO_CODEC` for the fastest installed codec
+    :return: The selected codec
+    :raise ValueError: If the *name* is not the name of a known codec
+    """
+    if name == AUTO_CODEC:
+        return next(iter(available_codecs().values()))
+    factory = CODEC_FACTORIES.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown JSON codec {name!r}.")
+    try:
+        return factory()
+    except ImportError:
+        LOGGER.warning("The %s JSON codec is not installed, falling back "
+                       "to %s.", name, STDLIB_CODEC)
+        return stdlib_codec()
@@ -0,0 +1,2 @@
+"""Tools for testing and benchmarking the chat client without external
+services"""
@@ -0,0 +1,200 @@
+"""Multi-process load driver
+
+A single process running simulated users saturates one CPU core long before
+the server does. The driver forks a pool of worker processes, each running a
+shard of the simulated users with a
+:obj:`~aiocometd_chat_demo.loadtest.generator.LoadGenerator` on its own event
+loop, and combines the statistics sent back by the workers over pipes into
+a single report::
+
+    $ python -m aiocometd_chat_demo.loadtest.driver --workers 8 \\
+        --users 20000 --join-rate 500
+
+If no url is specified then a local server is started in a separate process
+and shared by all the workers.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from dataclasses import replace
+from multiprocessing.connection import Connection, wait
+from typing import List, Optional, Iterable, Tuple, Any
+
+from aiocometd_chat_demo.loadtest.generator import LoadScenario, \
+    LoadStatistics, LoadGenerator, create_argument_parser, \
+    scenario_from_arguments
+from aiocometd_chat_demo.loadtest.server import LocalChatServer
+
+
+LOGGER = logging.getLogger(__name__)
+#: Multiprocessing start method of the workers
+START_METHOD = "fork"
+
+
+def split_scenario(scenario: LoadScenario, workers: int) \
+        -> List[LoadScenario]:
+    """Split the *scenario* into shards for the given number of *workers*
+
+    The users and the join rate are distributed evenly between the shards,
+    and every shard gets a distinct username prefix and random seed.
+    :param scenario: The scenario of the whole test
+    :param workers: Number of worker processes
+    :return: List of scenarios, one for each worker which has any users
+    """
+    workers = max(min(workers, scenario.users), 1)
+    shards = []
+    for index in range(workers):
+        users = scenario.users // workers
+        if index < scenario.users % workers:
+            users += 1
+        shards.append(replace(
+            scenario,
+            users=users,
+            join_rate=scenario.join_rate * users / max(scenario.users, 1),
+            username_prefix=f"{scenario.username_prefix}{index}-",
+            seed=None if scenario.seed is None else scenario.seed + index
+        ))
+    return shards
+
+
+def _raise_file_limit() -> None:
+    """Raise the soft limit of open file descriptors to the hard limit,
+    since every simulated user holds at least one connection"""
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:  # pragma: no cover
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def _run_worker(scenario: LoadScenario, connection: Connection) -> None:
+    """Run the shard *scenario* of a worker process and send the collected
+    statistics back on the *connection*"""
+    _raise_file_limit()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        statistics = loop.run_until_complete(LoadGenerator(scenario).run())
+    except Exception as error:  # pylint: disable=broad-except
+        LOGGER.exception("Worker failed")
+        statistics = LoadStatistics(users=scenario.users, error_count=1)
+        statistics.errors[repr(error)] += 1
+    finally:
+        loop.close()
+    connection.send(statistics)
+    connection.close()
+
+
+def _run_server(connection: Connection) -> None:
+    """Run a local server in a separate process, send its url on the
+    *connection* and keep serving until the process is terminated"""
+    _raise_file_limit()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = LocalChatServer()
+    loop.run_until_complete(server.start())
+    connection.send(server.url)
+    connection.close()
+    loop.run_forever()
+
+
+# pylint: disable=too-few-public-methods
+class LoadDriver:
+    """Coordinates a load test running in multiple worker processes"""
+
+    def __init__(self, scenario: LoadScenario,
+                 workers: Optional[int] = None) -> None:
+        """
+        :param scenario: Parameters of the whole test
+        :param workers: Number of worker processes, by default the number \
+        of CPUs
+        """
+        self.scenario = scenario
+        self.workers = workers or os.cpu_count() or 1
+        self._context: Any = multiprocessing.get_context(START_METHOD)
+
+    def run(self) -> LoadStatistics:
+        """Run the test in the worker processes and return the combined
+        statistics"""
+        server_process = None
+        scenario = self.scenario
+        if scenario.url is None:
+            server_process, url = self._start_server()
+            scenario = replace(scenario, url=url)
+        try:
+            return self._run_workers(split_scenario(scenario, self.workers))
+        finally:
+            if server_process is not None:
+                server_process.terminate()
+                server_process.join()
+
+    def _start_server(self) -> Tuple[Any, str]:
+        """Start a local server in a separate process
+
+        :return: The server process and the url of the server
+        """
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(target=_run_server, args=(sender,),
+                                        daemon=True)
+        process.start()
+        sender.close()
+        url = receiver.recv()
+        receiver.close()
+        return process, url
+
+    def _run_workers(self, shards: Iterable[LoadScenario]) \
+            -> LoadStatistics:
+        """Run every shard scenario in a worker process and combine the
+        statistics they send back"""
+        processes = []
+        receivers = {}
+        for shard in shards:
+            receiver, sender = self._context.Pipe(duplex=False)
+            process = self._context.Process(target=_run_worker,
+                                            args=(shard, sender))
+            process.start()
+            sender.close()
+            processes.append(process)
+            receivers[receiver] = shard
+
+        statistics = LoadStatistics()
+        while receivers:
+            for receiver in wait(list(receivers)):
+                shard = receivers.pop(receiver)
+                try:
+                    result = receiver.recv()
+                except EOFError:
+                    # the worker died without sending its results
+                    result = LoadStatistics(users=shard.users, error_count=1)
+                    result.errors["Worker process exited unexpectedly"] += 1
+                receiver.close()
+                statistics.merge(result)
+
+        for process in processes:
+            process.join()
+        return statistics
+
+# pylint: enable=too-few-public-methods
+
+
+def main(args: Optional[Iterable[str]] = None) -> None:
+    """Run a multi-process load test and print its combined report"""
+    parser = create_argument_parser()
+    parser.description = "Generate load with simulated chat users running " \
+                         "in multiple processes"
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (default: number "
+                             "of CPUs)")
+    options = parser.parse_args(None if args is None else list(args))
+    logging.basicConfig(level=logging.WARNING)
+
+    driver = LoadDriver(scenario_from_arguments(options), options.workers)
+    statistics = driver.run()
+    print(f"workers:          {min(driver.workers, statistics.users)}")
+    print(statistics.format_report())
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
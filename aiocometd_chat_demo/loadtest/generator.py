@@ -0,0 +1,411 @@
+"""Load generator simulating the users of the chat service
+
+Every simulated user is a :obj:`~aiocometd_chat_demo.chat_service.ChatService`
+running on a shared event loop, so the load is generated with the same client
+side logic that the application uses. Run it from the command line with::
+
+    $ python -m aiocometd_chat_demo.loadtest.generator --users 100
+
+If no url is specified then the users connect to an in-process
+:obj:`~aiocometd_chat_demo.loadtest.server.LocalChatServer`.
+"""
+import argparse
+import asyncio
+import logging
+import random
+from array import array
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import count
+from typing import Optional, Dict, List, Iterable
+
+# pylint: disable=no-name-in-module,wrong-import-order
+from PyQt5.QtCore import QObject  # type: ignore
+# pylint: enable=no-name-in-module,wrong-import-order
+
+from aiocometd_chat_demo.chat_service import ChatService
+from aiocometd_chat_demo.channels import ChannelType, ChannelItemRole
+from aiocometd_chat_demo.cometd import JsonObject, MessageResponse
+from aiocometd_chat_demo.exceptions import ApplicationException
+from aiocometd_chat_demo.loadtest.server import LocalChatServer
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+# pylint: disable=too-many-instance-attributes
+@dataclass()
+class LoadScenario:
+    """Parameters of a load test"""
+    #: Url of the CometD service, if it's ``None`` then a local server is
+    #: started
+    url: Optional[str] = None
+    #: Number of simulated users
+    users: int = 10
+    #: Number of users joining the chat per second
+    join_rate: float = 10.0
+    #: Average number of messages sent per second by every user
+    message_rate: float = 1.0
+    #: The ratio of private messages among all sent messages
+    private_ratio: float = 0.1
+    #: Size of the sent messages in characters
+    message_size: int = 64
+    #: Duration of the test in seconds (including the joining of the users)
+    duration: float = 10.0
+    #: The maximum amount of time in seconds to wait for the sent messages to
+    #: arrive back at the end of the test
+    drain_timeout: float = 5.0
+    #: Prefix of the simulated usernames
+    username_prefix: str = "user"
+    #: Seed of the random number generator
+    seed: Optional[int] = None
+
+
+@dataclass()
+class LoadStatistics:
+    """Statistics collected during a load test"""
+    #: Number of simulated users
+    users: int = 0
+    #: Number of users who managed to connect
+    connected_users: int = 0
+    #: Number of sent chat messages
+    sent_count: int = 0
+    #: Number of chat messages received by all the users
+    received_count: int = 0
+    #: Number of sent messages which never arrived back to their sender
+    lost_count: int = 0
+    #: Number of errors
+    error_count: int = 0
+    #: Duration of the test in seconds
+    duration: float = 0.0
+    #: Round trip times of the sent messages in seconds
+    latencies: "array[float]" = field(default_factory=lambda: array("d"))
+    #: Number of the occurrences of every error message
+    errors: Counter = field(default_factory=Counter)  # type: ignore
+
+    def merge(self, other: "LoadStatistics") -> None:
+        """Add the statistics collected in *other* to this object
+
+        The two tests are considered to be run concurrently, so the longer
+        duration is kept.
+        """
+        self.users += other.users
+        self.connected_users += other.connected_users
+        self.sent_count += other.sent_count
+        self.received_count += other.received_count
+        self.lost_count += other.lost_count
+        self.error_count += other.error_count
+        self.duration = max(self.duration, other.duration)
+        self.latencies.extend(other.latencies)
+        self.errors.update(other.errors)
+
+    @property
+    def send_rate(self) -> float:
+        """Number of sent messages per second"""
+        return self.sent_count / self.duration if self.duration else 0.0
+
+    @property
+    def receive_rate(self) -> float:
+        """Number of received messages per second"""
+        return self.received_count / self.duration if self.duration else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        """The ratio of failed messages among all sent messages"""
+        failed = self.error_count + self.lost_count
+        return failed / self.sent_count if self.sent_count else 0.0
+
+    def latency_percentiles(self, percents: Iterable[float]) \
+            -> Dict[float, float]:
+        """Get the latencies at the given *percents*
+
+        :param percents: Percentile ranks between 0 and 100
+        :return: Latencies in seconds mapped to the percentile ranks, or an \
+        empty dictionary if there are no measurements
+        """
+        values = sorted(self.latencies)
+        if not values:
+            return {}
+        result = {}
+        for percent in percents:
+            # nearest-rank method
+            rank = max(int(round(percent / 100 * len(values))), 1)
+            result[percent] = values[min(rank, len(values)) - 1]
+        return result
+
+    def format_report(self) -> str:
+        """Create a human readable report of the statistics"""
+        lines = [
+            f"users:            {self.connected_users}/{self.users} "
+            f"connected",
+            f"duration:         {self.duration:.2f} s",
+            f"sent:             {self.sent_count} "
+            f"({self.send_rate:.1f} msg/s)",
+            f"received:         {self.received_count} "
+            f"({self.receive_rate:.1f} msg/s)",
+            f"errors:           {self.error_count}",
+            f"lost:             {self.lost_count}",
+            f"error rate:       {self.error_rate:.2%}",
+        ]
+        percentiles = self.latency_percentiles((50, 90, 99, 99.9, 100))
+        for percent, latency in percentiles.items():
+            lines.append(f"latency p{percent:<6}  {latency * 1000:.2f} ms")
+        for message, occurrences in self.errors.most_common(5):
+            lines.append(f"error ({occurrences}x): {message}")
+        return "\n".join(lines)
+
+
+# pylint: enable=too-many-instance-attributes
+
+
+class SimulatedUser(ChatService):
+    """Chat service of a simulated user which measures the round trip time
+    of its own messages"""
+
+    def __init__(self, username: str, url: str,
+                 statistics: LoadStatistics,
+                 parent: Optional[QObject] = None) -> None:
+        """
+        :param username: Username of the user
+        :param url: CometD service url
+        :param statistics: Statistics object where the measurements are \
+        collected
+        :param parent: Parent object
+        """
+        super().__init__(parent)
+        self.username = username
+        self.url = url
+        self._statistics = statistics
+        self._loop = asyncio.get_event_loop()
+        #: Send times of the messages which didn't arrive back yet, mapped to
+        #: the tokens identifying the messages
+        self._pending: Dict[str, float] = {}
+        self._tokens = count()
+        #: Set while the user is connected
+        self.is_connected = asyncio.Event()
+        self.connected.connect(self.is_connected.set)
+        self.disconnected.connect(self.is_connected.clear)
+        self.error.connect(self._on_service_error)
+
+    @property
+    def pending_count(self) -> int:
+        """Number of sent messages which didn't arrive back yet"""
+        return len(self._pending)
+
+    def _on_service_error(self) -> None:
+        """Record the last error of the service"""
+        self._statistics.error_count += 1
+        self._statistics.errors[self.last_error] += 1
+
+    def message_received(self, message: JsonObject) -> None:
+        """Measure the round trip time of the user's own messages and pass
+        the *message* to the chat service"""
+        if message.get("channel") == self._room_channel:
+            self._statistics.received_count += 1
+            data = message["data"]
+            if data.get("user") == self.username:
+                token = data["chat"].split(" ", 1)[0]
+                send_time = self._pending.pop(token, None)
+                if send_time is not None:
+                    self._statistics.latencies.append(
+                        self._loop.time() - send_time
+                    )
+        super().message_received(message)
+
+    def peers(self) -> List[str]:
+        """Get the usernames of the other members of the chat"""
+        model = self.channels_model
+        if model is None:
+            return []
+        return [model.data(model.index(row, 0), ChannelItemRole.NAME)
+                for row in range(1, model.rowCount())]
+
+    def send_chat_message(self, peer: Optional[str], size: int) -> None:
+        """Send a message to the group channel or to the *peer*
+
+        :param peer: Username of the recipient of a private message, or \
+        ``None`` to send a message to the group channel
+        :param size: Size of the message in characters
+        """
+        token = str(next(self._tokens))
+        contents = token + " " + "x" * max(size - len(token) - 1, 0)
+        if peer is None:
+            channel_name, channel_type = self._room_name, ChannelType.GROUP
+        else:
+            channel_name, channel_type = peer, ChannelType.USER
+        try:
+            response = self.send_message(channel_name, channel_type,
+                                         contents)
+        except ApplicationException as error:
+            self._statistics.error_count += 1
+            self._statistics.errors[repr(error)] += 1
+            return
+        self._statistics.sent_count += 1
+        if response is not None:
+            self._pending[token] = self._loop.time()
+            response.finished.connect(
+                partial(self._on_publish_finished, response, token)
+            )
+
+    def _on_publish_finished(self, response: MessageResponse,
+                             token: str) -> None:
+        """Record the publishing error of a message"""
+        if response.error is not None:
+            self._pending.pop(token, None)
+            self._statistics.error_count += 1
+            self._statistics.errors[repr(response.error)] += 1
+
+
+# pylint: disable=too-few-public-methods
+class LoadGenerator:
+    """Runs a load test with simulated users"""
+
+    def __init__(self, scenario: LoadScenario) -> None:
+        """
+        :param scenario: Parameters of the test
+        """
+        self.scenario = scenario
+        self.statistics = LoadStatistics(users=scenario.users)
+        self._random = random.Random(scenario.seed)
+        self._users: List[SimulatedUser] = []
+        self._running = False
+
+    async def run(self) -> LoadStatistics:
+        """Run the load test and return the collected statistics"""
+        if self.scenario.url is None:
+            async with LocalChatServer() as server:
+                await self._run(server.url)
+        else:
+            await self._run(self.scenario.url)
+        return self.statistics
+
+    async def _run(self, url: str) -> None:
+        """Run the load test against the service at *url*"""
+        loop = asyncio.get_event_loop()
+        self._running = True
+        start_time = loop.time()
+        join_task = asyncio.ensure_future(self._join_users(url))
+        await asyncio.sleep(self.scenario.duration)
+        self._running = False
+        join_task.cancel()
+        await asyncio.gather(join_task, return_exceptions=True)
+        self.statistics.duration = loop.time() - start_time
+
+        # wait for the messages still in flight
+        deadline = loop.time() + self.scenario.drain_timeout
+        while (loop.time() < deadline and
+               any(user.pending_count for user in self._users)):
+            await asyncio.sleep(0.05)
+        self.statistics.lost_count = sum(user.pending_count
+                                         for user in self._users)
+        await self._disconnect_users()
+
+    async def _join_users(self, url: str) -> None:
+        """Connect the simulated users at the scenario's join rate"""
+        senders = []
+        try:
+            for index in range(self.scenario.users):
+                user = SimulatedUser(
+                    f"{self.scenario.username_prefix}{index}",
+                    url,
+                    self.statistics
+                )
+                self._users.append(user)
+                user.connect_()
+                senders.append(asyncio.ensure_future(self._send(user)))
+                await asyncio.sleep(1 / self.scenario.join_rate)
+            await asyncio.gather(*senders)
+        finally:
+            for sender in senders:
+                sender.cancel()
+
+    async def _send(self, user: SimulatedUser) -> None:
+        """Send messages with the *user* at the scenario's message rate"""
+        await user.is_connected.wait()
+        self.statistics.connected_users += 1
+        while self._running:
+            await asyncio.sleep(
+                self._random.expovariate(self.scenario.message_rate)
+            )
+            if not self._running or not user.is_connected.is_set():
+                continue
+            peer = None
+            if self._random.random() < self.scenario.private_ratio:
+                peers = user.peers()
+                if peers:
+                    peer = self._random.choice(peers)
+            user.send_chat_message(peer, self.scenario.message_size)
+
+    async def _disconnect_users(self, timeout: float = 5.0) -> None:
+        """Disconnect all the simulated users"""
+        for user in self._users:
+            user.disconnect_()
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        while (loop.time() < deadline and
+               any(user.client is not None for user in self._users)):
+            await asyncio.sleep(0.05)
+
+
+# pylint: enable=too-few-public-methods
+
+
+def create_argument_parser() -> argparse.ArgumentParser:
+    """Create the command line argument parser of the load generator"""
+    defaults = LoadScenario()
+    parser = argparse.ArgumentParser(
+        description="Generate load with simulated chat users"
+    )
+    parser.add_argument("--url", default=defaults.url,
+                        help="CometD service url, if omitted a local server "
+                             "is used")
+    parser.add_argument("--users", type=int, default=defaults.users,
+                        help="number of simulated users")
+    parser.add_argument("--join-rate", type=float,
+                        default=defaults.join_rate,
+                        help="number of users joining per second")
+    parser.add_argument("--message-rate", type=float,
+                        default=defaults.message_rate,
+                        help="messages sent per second by every user")
+    parser.add_argument("--private-ratio", type=float,
+                        default=defaults.private_ratio,
+                        help="ratio of private messages")
+    parser.add_argument("--message-size", type=int,
+                        default=defaults.message_size,
+                        help="size of the messages in characters")
+    parser.add_argument("--duration", type=float, default=defaults.duration,
+                        help="duration of the test in seconds")
+    parser.add_argument("--seed", type=int, default=defaults.seed,
+                        help="seed of the random number generator")
+    return parser
+
+
+def scenario_from_arguments(options: argparse.Namespace) -> LoadScenario:
+    """Create a scenario from the parsed command line *options*"""
+    return LoadScenario(
+        url=options.url,
+        users=options.users,
+        join_rate=options.join_rate,
+        message_rate=options.message_rate,
+        private_ratio=options.private_ratio,
+        message_size=options.message_size,
+        duration=options.duration,
+        seed=options.seed
+    )
+
+
+def main(args: Optional[Iterable[str]] = None) -> None:
+    """Run a load test and print its report"""
+    parser = create_argument_parser()
+    options = parser.parse_args(None if args is None else list(args))
+    logging.basicConfig(level=logging.WARNING)
+
+    generator = LoadGenerator(scenario_from_arguments(options))
+    loop = asyncio.get_event_loop()
+    statistics = loop.run_until_complete(generator.run())
+    print(statistics.format_report())
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,661 @@
+"""In-process CometD server implementing the demo chat service
+
+The server is a stand-in for the chat service of the CometD demos, so the
+client can be tested and benchmarked end to end on a machine without network
+access or a running CometD server. It implements the parts of the Bayeux
+protocol used by aiocometd (handshake, connect, disconnect, subscribe,
+unsubscribe, publish and batched payloads) over both the long-polling and the
+websocket transports, and the ``/service/members`` and
+``/service/privatechat`` services of the demo chat.
+
+The messages broadcasted to the chat rooms are numbered consecutively per
+room. The sequence number and the time of publishing are sent in the ``seq``
+and ``timestamp`` (milliseconds since the epoch) fields of the messages'
+``ext`` object. The recent messages of every room are kept, and a client can
+fetch the ones it missed with the ``/service/backlog`` service, by
+publishing the room channel and a list of inclusive sequence number ranges::
+
+    {"room": "/chat/demo", "ranges": [[12, 15], [20, 20]]}
+
+The ``/service/history`` service returns pages of the kept messages of a
+room, or of the private messages between a user and a peer, in the ``data``
+field of its reply. The most recent page is requested without a ``before``
+field, and the older pages with the ``cursor`` of the previous page::
+
+    {"room": "/chat/demo", "limit": 50, "before": 120}
+    {"room": "/chat/demo", "limit": 50, "user": "john", "peer": "jane"}
+
+The reply contains the messages of the page in chronological order, and the
+cursor of the next older page, which is ``null`` if there are no older
+messages::
+
+    {"messages": [...], "cursor": 70}
+"""
+import argparse
+import asyncio
+import json
+import logging
+import socket
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import suppress
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Set, List, Tuple, Any, Type, Iterable, \
+    Deque, FrozenSet
+from types import TracebackType
+
+import aiohttp
+from aiohttp import web
+from aiocometd.typing import JsonObject
+
+
+LOGGER = logging.getLogger(__name__)
+#: Connection types supported by the server
+CONNECTION_TYPES = ["websocket", "long-polling"]
+#: Prefix of the meta channels
+META_CHANNEL_PREFIX = "/meta/"
+#: Prefix of the service channels
+SERVICE_CHANNEL_PREFIX = "/service/"
+#: Prefix of the chat room channels
+ROOM_CHANNEL_PREFIX = "/chat/"
+#: Prefix of the channels where the members of the rooms are broadcasted
+MEMBERS_CHANNEL_PREFIX = "/members/"
+
+
+# pylint: disable=too-many-instance-attributes
+@dataclass()
+class _Session:
+    """State of a client connected to the server"""
+    #: The id assigned to the client during the handshake
+    client_id: str
+    #: Time of the last request of the client
+    last_seen: float
+    #: Set when there are messages waiting to be delivered to the client
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+    #: Set when the session is removed from the server
+    terminated: asyncio.Event = field(default_factory=asyncio.Event)
+    #: Channels to which the client is subscribed
+    subscriptions: Set[str] = field(default_factory=set)
+    #: Messages waiting to be delivered to the client
+    queue: List[JsonObject] = field(default_factory=list)
+    #: The (room, user) pairs that the client joined
+    memberships: Set[Tuple[str, str]] = field(default_factory=set)
+    #: The websocket of the client if it uses the websocket transport
+    socket: Optional[web.WebSocketResponse] = None
+    #: Whether the client already sent a connect message
+    connected: bool = False
+    #: Whether a flush of the queue on the socket is already scheduled
+    flush_scheduled: bool = False
+    #: Number of connect requests currently held by the server
+    pending_connects: int = 0
+
+
+class LocalChatServer:
+    """CometD demo chat server running on the current event loop
+
+    The server listens on the loopback interface and by default picks a free
+    port, which can be found out after the server is started from the
+    :obj:`url` property. It can be used as an asynchronous context manager::
+
+        async with LocalChatServer() as server:
+            async with aiocometd.Client(server.url) as client:
+                ...
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, *,
+                 path: str = "/cometd",
+                 connect_timeout: float = 5.0,
+                 max_interval: float = 10.0,
+                 history_size: int = 1000) -> None:
+        """
+        :param host: Host address on which the server listens
+        :param port: Port number on which the server listens, if it's ``0`` \
+        then a free port is picked
+        :param path: Path of the CometD service
+        :param connect_timeout: The maximum amount of time in seconds for \
+        which connect requests are held when there are no messages to deliver
+        :param max_interval: The amount of time in seconds after which \
+        a client is considered to be gone if it doesn't send a new connect \
+        request
+        :param history_size: The number of recent messages kept for every \
+        chat room
+        """
+        self._host = host
+        self._port = port
+        self._path = path
+        self._connect_timeout = connect_timeout
+        self._max_interval = max_interval
+        self._history_size = history_size
+        self._runner: Optional[web.AppRunner] = None
+        self._sweep_task: Optional["asyncio.Future[None]"] = None
+        #: Sessions of the connected clients by their client ids
+        self._sessions: Dict[str, _Session] = {}
+        #: The client ids subscribed to each channel pattern
+        self._subscribers: Dict[str, Set[str]] = defaultdict(set)
+        #: The members of each room (user names mapped to client ids)
+        self._rooms: Dict[str, Dict[str, str]] = defaultdict(dict)
+        #: The last sequence number of each room channel
+        self._sequences: Dict[str, int] = defaultdict(int)
+        #: The recent messages of each room channel
+        self._history: Dict[str, Deque[JsonObject]] = {}
+        #: The recent private messages and their numbers by the room
+        #: channels and the pairs of users
+        self._private_history: Dict[Tuple[str, FrozenSet[str]],
+                                    Deque[Tuple[int, JsonObject]]] = {}
+        #: The number of the last private message
+        self._private_count = 0
+        #: Number of messages received from the clients
+        self.received_count = 0
+        #: Number of messages delivered to the clients
+        self.delivered_count = 0
+
+    @property
+    def url(self) -> str:
+        """CometD service url"""
+        return f"http://{self._host}:{self._port}{self._path}"
+
+    @property
+    def client_count(self) -> int:
+        """Number of the connected clients"""
+        return len(self._sessions)
+
+    def members(self, room: str) -> List[str]:
+        """Get the names of the members of the *room*
+
+        :param room: The name of the room's channel, like ``/chat/demo``
+        :return: List of user names
+        """
+        return list(self._rooms.get(room, {}))
+
+    async def start(self) -> None:
+        """Start listening for incoming connections"""
+        app = web.Application()
+        app.router.add_post(self._path, self._handle_long_polling)
+        app.router.add_get(self._path, self._handle_websocket)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+
+        # bind the socket in advance, to find out the port number if it's
+        # picked by the OS
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self._host, self._port))
+        self._port = sock.getsockname()[1]
+        site = web.SockSite(self._runner, sock)
+        await site.start()
+
+        self._sweep_task = asyncio.ensure_future(self._sweep())
+        LOGGER.info("Local chat server listening on %s", self.url)
+
+    async def stop(self) -> None:
+        """Disconnect all clients and stop the server"""
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._sweep_task
+            self._sweep_task = None
+        for client_id in list(self._sessions):
+            self._remove_session(client_id)
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        LOGGER.info("Local chat server stopped")
+
+    async def __aenter__(self) -> "LocalChatServer":
+        """Start the server"""
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type: Optional[Type[BaseException]],
+                        exc_val: Optional[BaseException],
+                        exc_tb: Optional[TracebackType]) -> None:
+        """Stop the server"""
+        await self.stop()
+
+    def publish(self, channel: str, data: Any) -> None:
+        """Publish a message with the given *data* to all the subscribers of
+        the *channel* from the server side
+
+        :param channel: Name of the channel
+        :param data: Data to deliver
+        """
+        self._broadcast({"channel": channel, "data": data})
+
+    async def _handle_long_polling(self, request: web.Request) \
+            -> web.Response:
+        """Process the payload sent by a long-polling client"""
+        try:
+            payload = await request.json()
+        except ValueError:
+            return web.Response(status=400, text="Invalid JSON payload")
+        replies = await self._process_payload(payload, None)
+        return web.json_response(replies)
+
+    async def _handle_websocket(self, request: web.Request) \
+            -> web.WebSocketResponse:
+        """Process the payloads sent by a websocket client"""
+        sock = web.WebSocketResponse()
+        await sock.prepare(request)
+        tasks: Set["asyncio.Future[None]"] = set()
+        try:
+            async for frame in sock:
+                if frame.type != aiohttp.WSMsgType.TEXT:
+                    break
+                # process every payload in a separate task, since a held
+                # connect request shouldn't block the rest of the messages
+                task: "asyncio.Future[None]" = asyncio.ensure_future(
+                    self._process_socket_payload(sock, json.loads(frame.data))
+                )
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # the sessions of the client will expire unless it reconnects
+            # with a new socket
+            for session in self._sessions.values():
+                if session.socket is sock:
+                    session.socket = None
+        return sock
+
+    async def _process_socket_payload(self, sock: web.WebSocketResponse,
+                                      payload: Any) -> None:
+        """Process a *payload* received on the *sock* and send the replies"""
+        replies = await self._process_payload(payload, sock)
+        if not sock.closed:
+            await sock.send_str(json.dumps(replies))
+
+    async def _process_payload(self, payload: Any,
+                               sock: Optional[web.WebSocketResponse]) \
+            -> List[JsonObject]:
+        """Process the messages of a *payload* and return their replies
+
+        :param payload: A message or a list of messages
+        :param sock: The websocket on which the *payload* was received, or \
+        ``None`` if it was received with the long-polling transport
+        :return: The list of reply messages
+        """
+        if isinstance(payload, dict):
+            payload = [payload]
+        replies = []
+        connect_message = None
+        for message in payload:
+            self.received_count += 1
+            # the connect message is processed last since it might be held
+            # by the server
+            if message.get("channel") == "/meta/connect":
+                connect_message = message
+            else:
+                replies.append(self._process_message(message))
+        if connect_message is not None:
+            replies.extend(await self._connect(connect_message, sock))
+        return replies
+
+    # pylint: disable=too-many-return-statements
+    def _process_message(self, message: JsonObject) -> JsonObject:
+        """Process a non connect *message* and return its reply"""
+        channel = message.get("channel", "")
+        if channel == "/meta/handshake":
+            return self._handshake(message)
+
+        session = self._sessions.get(message.get("clientId", ""))
+        if session is None:
+            return self._unknown_client_reply(message)
+        if channel == "/meta/disconnect":
+            self._remove_session(session.client_id)
+            return self._reply(message, successful=True)
+        if channel == "/meta/subscribe":
+            return self._subscribe(session, message)
+        if channel == "/meta/unsubscribe":
+            return self._unsubscribe(session, message)
+        if channel.startswith(META_CHANNEL_PREFIX):
+            return self._reply(message, successful=False,
+                               error="400::Unknown meta channel")
+        if channel == "/service/members":
+            self._join(session, message["data"])
+        elif channel == "/service/privatechat":
+            self._private_chat(session, message["data"])
+        elif channel == "/service/backlog":
+            self._backlog(session, message["data"])
+        elif channel == "/service/history":
+            return self._reply(message, successful=True,
+                               data=self._history_page(message["data"]))
+        elif not channel.startswith(SERVICE_CHANNEL_PREFIX):
+            self._broadcast({"channel": channel, "data": message.get("data")})
+        return self._reply(message, successful=True)
+
+    # pylint: enable=too-many-return-statements
+
+    @staticmethod
+    def _reply(message: JsonObject, **fields: Any) -> JsonObject:
+        """Create a reply for the *message* with the given *fields*"""
+        reply = {"channel": message.get("channel")}
+        if "id" in message:
+            reply["id"] = message["id"]
+        if "clientId" in message:
+            reply["clientId"] = message["clientId"]
+        reply.update(fields)
+        return reply
+
+    def _unknown_client_reply(self, message: JsonObject) -> JsonObject:
+        """Create an error reply to a *message* sent with an unknown
+        client id"""
+        return self._reply(message, successful=False,
+                           error="402::Unknown client",
+                           advice={"reconnect": "handshake", "interval": 0})
+
+    @property
+    def _advice(self) -> JsonObject:
+        """Reconnect advice sent to the clients"""
+        return {
+            "reconnect": "retry",
+            "interval": 0,
+            "timeout": int(self._connect_timeout * 1000)
+        }
+
+    def _handshake(self, message: JsonObject) -> JsonObject:
+        """Create a new session for a client"""
+        loop = asyncio.get_event_loop()
+        session = _Session(client_id=uuid.uuid4().hex,
+                           last_seen=loop.time())
+        self._sessions[session.client_id] = session
+        return self._reply(message,
+                           version="1.0",
+                           supportedConnectionTypes=CONNECTION_TYPES,
+                           clientId=session.client_id,
+                           successful=True,
+                           advice=self._advice)
+
+    async def _connect(self, message: JsonObject,
+                       sock: Optional[web.WebSocketResponse]) \
+            -> List[JsonObject]:
+        """Hold the connect *message* until there are messages to deliver to
+        the client or until the connect timeout expires
+
+        :return: The connect reply preceded by the messages delivered to the \
+        client if it uses the long-polling transport
+        """
+        session = self._sessions.get(message.get("clientId", ""))
+        if session is None:
+            return [self._unknown_client_reply(message)]
+
+        loop = asyncio.get_event_loop()
+        session.last_seen = loop.time()
+        if sock is not None:
+            session.socket = sock
+            self._schedule_flush(session)
+
+        # the first connect request is never held
+        if not session.connected:
+            session.connected = True
+        else:
+            session.pending_connects += 1
+            # websocket clients receive their messages immediately, so their
+            # connect requests are held until they time out
+            event = session.wakeup if sock is None else session.terminated
+            try:
+                if sock is not None or not session.queue:
+                    with suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(event.wait(),
+                                               self._connect_timeout)
+            finally:
+                session.pending_connects -= 1
+                session.last_seen = loop.time()
+
+        if session.terminated.is_set():
+            reply = self._reply(message, successful=False,
+                                error="402::Unknown client",
+                                advice={"reconnect": "none"})
+        else:
+            reply = self._reply(message, successful=True,
+                                advice=self._advice)
+        if sock is not None:
+            return [reply]
+        deliveries = session.queue
+        session.queue = []
+        session.wakeup.clear()
+        self.delivered_count += len(deliveries)
+        return deliveries + [reply]
+
+    def _subscribe(self, session: _Session, message: JsonObject) \
+            -> JsonObject:
+        """Subscribe the client of the *session* to the channels in the
+        *message*
+
+        If any of the channels is forbidden, then the client isn't subscribed
+        to any of them.
+        """
+        channels = self._subscription_list(message)
+        if any(channel.startswith(META_CHANNEL_PREFIX)
+               for channel in channels):
+            return self._reply(message, successful=False,
+                               subscription=message.get("subscription"),
+                               error="403::Forbidden channel")
+        for channel in channels:
+            session.subscriptions.add(channel)
+            self._subscribers[channel].add(session.client_id)
+        return self._reply(message, successful=True,
+                           subscription=message.get("subscription"))
+
+    def _unsubscribe(self, session: _Session, message: JsonObject) \
+            -> JsonObject:
+        """Unsubscribe the client of the *session* from the channels in the
+        *message*"""
+        for channel in self._subscription_list(message):
+            session.subscriptions.discard(channel)
+            self._subscribers[channel].discard(session.client_id)
+        return self._reply(message, successful=True,
+                           subscription=message.get("subscription"))
+
+    @staticmethod
+    def _subscription_list(message: JsonObject) -> List[str]:
+        """Get the list of channels from the *subscription* field of the
+        *message*"""
+        subscription = message.get("subscription", [])
+        if isinstance(subscription, str):
+            return [subscription]
+        return list(subscription)
+
+    def _remove_session(self, client_id: str) -> None:
+        """Remove the session of the client with the given *client_id* and
+        remove it from every room it joined"""
+        session = self._sessions.pop(client_id, None)
+        if session is None:
+            return
+        session.terminated.set()
+        # answer the held connect requests of long-polling clients right away
+        session.wakeup.set()
+        for channel in session.subscriptions:
+            self._subscribers[channel].discard(client_id)
+        rooms = set()
+        for room, user in session.memberships:
+            if self._rooms[room].get(user) == client_id:
+                del self._rooms[room][user]
+                rooms.add(room)
+        for room in rooms:
+            self._broadcast_members(room)
+
+    def _join(self, session: _Session, data: JsonObject) -> None:
+        """Add the user to the room specified in the *data* of a
+        ``/service/members`` message"""
+        room, user = data["room"], data["user"]
+        self._rooms[room][user] = session.client_id
+        session.memberships.add((room, user))
+        self._broadcast_members(room)
+
+    def _broadcast_members(self, room: str) -> None:
+        """Publish the list of members of the *room*"""
+        name = room[len(ROOM_CHANNEL_PREFIX):]
+        self._broadcast({
+            "channel": MEMBERS_CHANNEL_PREFIX + name,
+            "data": self.members(room)
+        })
+
+    def _private_chat(self, session: _Session, data: JsonObject) -> None:
+        """Deliver a private message specified by the *data* of a
+        ``/service/privatechat`` message to the peer and send it back to the
+        sender"""
+        room = data["room"]
+        peer_id = self._rooms.get(room, {}).get(data["peer"])
+        if peer_id is None or peer_id not in self._sessions:
+            return
+        message = {
+            "channel": room,
+            "data": {
+                "user": data["user"],
+                "chat": data["chat"],
+                "scope": "private"
+            }
+        }
+        self._deliver(self._sessions[peer_id], message)
+        if peer_id != session.client_id:
+            self._deliver(session, message)
+        key = (room, frozenset((data["user"], data["peer"])))
+        history = self._private_history.get(key)
+        if history is None:
+            history = self._private_history[key] = deque(
+                maxlen=self._history_size
+            )
+        self._private_count += 1
+        history.append((self._private_count, message))
+
+    def _history_page(self, data: JsonObject) -> JsonObject:
+        """Create a page of the kept messages specified by the *data* of a
+        ``/service/history`` message"""
+        room = data["room"]
+        limit = int(data.get("limit", 50))
+        before = data.get("before")
+        entries: List[Tuple[int, JsonObject]]
+        if data.get("peer") is not None:
+            key = (room, frozenset((data["user"], data["peer"])))
+            entries = list(self._private_history.get(key, ()))
+        else:
+            entries = [(message["ext"]["seq"], message)
+                       for message in self._history.get(room, ())]
+        if before is not None:
+            entries = [entry for entry in entries if entry[0] < before]
+        page = entries[-limit:] if limit > 0 else []
+        cursor = page[0][0] if page and len(page) < len(entries) else None
+        return {"messages": [message for _, message in page],
+                "cursor": cursor}
+
+    def _backlog(self, session: _Session, data: JsonObject) -> None:
+        """Deliver the kept messages of the room specified by the *data* of a
+        ``/service/backlog`` message whose sequence numbers are in the
+        requested ranges"""
+        history = self._history.get(data["room"], ())
+        ranges = [(int(first), int(last)) for first, last in data["ranges"]]
+        for message in history:
+            sequence = message["ext"]["seq"]
+            if any(first <= sequence <= last for first, last in ranges):
+                self._deliver(session, message)
+
+    def _find_subscribers(self, channel: str) -> Set[str]:
+        """Find the client ids subscribed to the *channel* either directly or
+        with a wildcard pattern"""
+        subscribers = set(self._subscribers.get(channel, ()))
+        segments = channel.split("/")
+        for index in range(1, len(segments)):
+            prefix = "/".join(segments[:index])
+            subscribers.update(self._subscribers.get(prefix + "/**", ()))
+        subscribers.update(self._subscribers.get(
+            "/".join(segments[:-1]) + "/*", ()
+        ))
+        return subscribers
+
+    def _broadcast(self, message: JsonObject) -> None:
+        """Deliver the *message* to every subscriber of its channel
+
+        The messages of the chat rooms are numbered and kept in the history
+        of the room.
+        """
+        channel = message["channel"]
+        if channel.startswith(ROOM_CHANNEL_PREFIX):
+            self._sequences[channel] += 1
+            message["ext"] = {"seq": self._sequences[channel],
+                              "timestamp": int(time.time() * 1000)}
+            history = self._history.get(channel)
+            if history is None:
+                history = self._history[channel] = deque(
+                    maxlen=self._history_size
+                )
+            history.append(message)
+        for client_id in self._find_subscribers(message["channel"]):
+            self._deliver(self._sessions[client_id], message)
+
+    def _deliver(self, session: _Session, message: JsonObject) -> None:
+        """Enqueue the *message* for delivery to the client of the
+        *session*"""
+        session.queue.append(message)
+        session.wakeup.set()
+        if session.socket is not None:
+            self._schedule_flush(session)
+
+    def _schedule_flush(self, session: _Session) -> None:
+        """Schedule the delivery of the queued messages of a websocket client
+
+        Messages delivered during the same iteration of the event loop are
+        sent in a single payload.
+        """
+        if not session.flush_scheduled and session.queue:
+            session.flush_scheduled = True
+            asyncio.get_event_loop().call_soon(self._flush, session)
+
+    def _flush(self, session: _Session) -> None:
+        """Send the queued messages of a websocket client"""
+        session.flush_scheduled = False
+        sock = session.socket
+        if sock is None or sock.closed or not session.queue:
+            return
+        deliveries = session.queue
+        session.queue = []
+        session.wakeup.clear()
+        self.delivered_count += len(deliveries)
+        asyncio.ensure_future(sock.send_str(json.dumps(deliveries)))
+
+    async def _sweep(self) -> None:
+        """Periodically remove the sessions of the clients that are gone"""
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(self._max_interval / 2)
+            deadline = loop.time() - self._max_interval
+            expired = [
+                session.client_id for session in self._sessions.values()
+                if (session.pending_connects == 0 and
+                    session.socket is None and
+                    session.last_seen < deadline)
+            ]
+            for client_id in expired:
+                LOGGER.debug("Session of client %r expired", client_id)
+                self._remove_session(client_id)
+
+
+# pylint: enable=too-many-instance-attributes
+
+
+def main(args: Optional[Iterable[str]] = None) -> None:
+    """Run a standalone local chat server until it's interrupted"""
+    parser = argparse.ArgumentParser(
+        description="Run the local CometD demo chat server"
+    )
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="host address to listen on")
+    parser.add_argument("--port", type=int, default=8080,
+                        help="port number to listen on")
+    options = parser.parse_args(None if args is None else list(args))
+    logging.basicConfig(level=logging.INFO)
+
+    loop = asyncio.get_event_loop()
+    server = LocalChatServer(options.host, options.port)
+    loop.run_until_complete(server.start())
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(server.stop())
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
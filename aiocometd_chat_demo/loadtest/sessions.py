@@ -0,0 +1,228 @@
+"""Measurement of the memory overhead of chat sessions sharing a process
+
+A number of :obj:`~aiocometd_chat_demo.chat_service.ChatService` sessions
+with different usernames are connected to the same server from a single
+process and event loop, either sharing a
+:obj:`~aiocometd_chat_demo.connection_pool.ConnectionPool`, or each of them
+using connections of its own. The memory traced by Python and the number of
+live QObjects are sampled before and after the sessions connect, and the
+growth is reported per session::
+
+    $ python -m aiocometd_chat_demo.loadtest.sessions --sessions 50
+
+Every session keeps the member list of its chat room, so the sessions are
+spread over rooms of ``--room-size`` members to keep the measured overhead
+independent of the number of sessions.
+
+If ``--url`` is omitted, the sessions connect to an in-process server, whose
+per-client state is included in the measurement.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from typing import Optional, List, Iterable
+
+# pylint: disable=no-name-in-module,wrong-import-order
+from PyQt5.QtCore import QCoreApplication  # type: ignore
+# pylint: enable=no-name-in-module,wrong-import-order
+
+from aiocometd_chat_demo.chat_service import ChatService
+from aiocometd_chat_demo.connection_pool import ConnectionPool
+from aiocometd_chat_demo.exceptions import ApplicationException
+from aiocometd_chat_demo.loadtest.server import LocalChatServer
+from aiocometd_chat_demo.loadtest.soak import MemorySample, take_sample
+
+
+LOGGER = logging.getLogger(__name__)
+#: Maximum number of sessions connecting at the same time
+CONNECT_BATCH_SIZE = 50
+
+
+@dataclass()
+class SessionsReport:
+    """Memory usage of a number of chat sessions"""
+    #: Number of measured sessions
+    session_count: int
+    #: Whether the sessions shared a connection pool
+    shared_pool: bool
+    #: Memory sample taken before the measured sessions connected
+    baseline: MemorySample
+    #: Memory sample taken after the measured sessions connected
+    connected: MemorySample
+
+    @property
+    def memory_per_session(self) -> float:
+        """Growth of the traced memory per session in bytes"""
+        if not self.session_count:
+            return 0.0
+        return ((self.connected.traced_memory - self.baseline.traced_memory) /
+                self.session_count)
+
+    @property
+    def qobjects_per_session(self) -> float:
+        """Growth of the number of live QObjects per session"""
+        if not self.session_count:
+            return 0.0
+        return ((self.connected.qobject_count - self.baseline.qobject_count) /
+                self.session_count)
+
+    def format_report(self) -> str:
+        """Create a human readable report of the results"""
+        connections = ("shared connection pool" if self.shared_pool
+                       else "separate connections")
+        return "\n".join([
+            f"{self.session_count} sessions, {connections}:",
+            f"  memory per session:   "
+            f"{self.memory_per_session / 1024:.1f} KiB",
+            f"  QObjects per session: {self.qobjects_per_session:.1f}",
+        ])
+
+
+async def _connect_sessions(url: str, indexes: Iterable[int],
+                            room_size: int, pool: Optional[ConnectionPool],
+                            timeout: float) -> List[ChatService]:
+    """Create and connect a session for every index
+
+    :raise ApplicationException: If the sessions fail to connect in time
+    """
+    services = []
+    events = []
+    for index in indexes:
+        service = ChatService(room_name=f"room{index // room_size}",
+                              connection_pool=pool)
+        service.url = url
+        service.username = f"operator{index}"
+        event = asyncio.Event()
+        service.connected.connect(event.set)
+        service.connect_()
+        services.append(service)
+        events.append(event)
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(*(event.wait() for event in events)), timeout
+        )
+    except asyncio.TimeoutError:
+        raise ApplicationException("The sessions failed to connect in "
+                                   "time.") from None
+    return services
+
+
+async def _disconnect_sessions(services: List[ChatService],
+                               timeout: float) -> None:
+    """Disconnect the *services* and wait until their clients are
+    destroyed"""
+    for service in services:
+        service.disconnect_()
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + timeout
+    while (loop.time() < deadline and
+           any(service.client is not None for service in services)):
+        await asyncio.sleep(0.05)
+
+
+# pylint: disable=too-many-arguments
+async def _measure(url: str, session_count: int, room_size: int,
+                   shared_pool: bool, timeout: float) -> SessionsReport:
+    """Measure the memory usage of *session_count* sessions connected to
+    the service at *url*"""
+    pool = ConnectionPool() if shared_pool else None
+    # the first session pays for the one-time costs like imports and caches,
+    # so it's not part of the measurement
+    services = await _connect_sessions(url, [0], room_size, pool, timeout)
+    try:
+        baseline = take_sample(0.0)
+        loop = asyncio.get_event_loop()
+        start_time = loop.time()
+        # connect the sessions in batches to stay below the listen backlog
+        # of the server
+        for first in range(1, session_count + 1, CONNECT_BATCH_SIZE):
+            last = min(first + CONNECT_BATCH_SIZE, session_count + 1)
+            services.extend(await _connect_sessions(
+                url, range(first, last), room_size, pool, timeout
+            ))
+        connected = take_sample(loop.time() - start_time)
+    finally:
+        await _disconnect_sessions(services, timeout)
+        if pool is not None:
+            await pool.close()
+    return SessionsReport(session_count=session_count,
+                          shared_pool=shared_pool,
+                          baseline=baseline,
+                          connected=connected)
+
+
+async def measure_sessions(session_count: int, shared_pool: bool,
+                           url: Optional[str] = None, room_size: int = 10,
+                           timeout: float = 30.0) -> SessionsReport:
+    """Measure the memory overhead of chat sessions running in the same
+    process
+
+    :param session_count: Number of measured sessions
+    :param shared_pool: Whether the sessions should share a connection pool
+    :param url: CometD service url, or ``None`` to connect to an \
+    in-process server
+    :param room_size: Number of sessions joining the same chat room
+    :param timeout: The maximum amount of time in seconds to wait for the \
+    sessions to connect or disconnect
+    :return: The measured memory usage
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        if url is not None:
+            return await _measure(url, session_count, room_size,
+                                  shared_pool, timeout)
+        async with LocalChatServer() as server:
+            return await _measure(server.url, session_count, room_size,
+                                  shared_pool, timeout)
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+# pylint: enable=too-many-arguments
+
+
+def create_argument_parser() -> argparse.ArgumentParser:
+    """Create the command line argument parser of the measurement"""
+    parser = argparse.ArgumentParser(
+        description="Measure the memory overhead of chat sessions running "
+                    "in the same process"
+    )
+    parser.add_argument("--sessions", type=int, default=20,
+                        help="number of measured sessions")
+    parser.add_argument("--room-size", type=int, default=10,
+                        help="number of sessions joining the same chat room")
+    parser.add_argument("--url", default=None,
+                        help="CometD service url, an in-process server is "
+                             "used if omitted")
+    parser.add_argument("--timeout", type=float, default=30.0,
+                        help="seconds to wait for the sessions to connect")
+    return parser
+
+
+def main(args: Optional[Iterable[str]] = None) -> None:
+    """Measure the sessions with and without a shared connection pool and
+    print the reports"""
+    parser = create_argument_parser()
+    options = parser.parse_args(None if args is None else list(args))
+    logging.basicConfig(level=logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(message)s")
+
+    # deferred deletion requires an application object
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv[:1])
+    loop = asyncio.get_event_loop()
+    for shared_pool in (False, True):
+        report = loop.run_until_complete(measure_sessions(
+            options.sessions, shared_pool, options.url, options.room_size,
+            options.timeout
+        ))
+        print(report.format_report())
+    del app
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,458 @@
+"""Long-running soak test tracking the memory usage of the chat service
+
+A single :obj:`~aiocometd_chat_demo.chat_service.ChatService` is connected to
+an in-process :obj:`~aiocometd_chat_demo.loadtest.server.LocalChatServer` and
+exposed to synthetic traffic: group and private messages of simulated peers,
+outgoing messages, membership churn and periodic disconnect/reconnect cycles,
+which recreate the service's client and its subscriptions. The memory allocated
+by Python and the number of live QObjects are sampled periodically, and the
+allocation sites with the largest growth since the end of the warmup are
+reported at the end::
+
+    $ python -m aiocometd_chat_demo.loadtest.soak --duration 3600
+"""
+import argparse
+import asyncio
+import gc
+import logging
+import random
+import sys
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional, List, Callable, Iterable
+
+# pylint: disable=no-name-in-module,wrong-import-order
+from PyQt5.QtCore import QObject, QCoreApplication, QEvent  # type: ignore
+# pylint: enable=no-name-in-module,wrong-import-order
+
+from aiocometd_chat_demo.chat_service import ChatService, CHAT_ROOM_NAME
+from aiocometd_chat_demo.channels import ChannelType
+from aiocometd_chat_demo.exceptions import ApplicationException
+from aiocometd_chat_demo.loadtest.server import LocalChatServer, \
+    ROOM_CHANNEL_PREFIX, MEMBERS_CHANNEL_PREFIX
+
+
+LOGGER = logging.getLogger(__name__)
+#: Allocations ignored when comparing snapshots
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+# pylint: disable=too-many-instance-attributes
+@dataclass()
+class SoakScenario:
+    """Parameters of a soak test"""
+    #: Duration of the test in seconds
+    duration: float = 60.0
+    #: Duration of the warmup in seconds, the growth of the memory usage is
+    #: measured from the end of the warmup
+    warmup: float = 5.0
+    #: Number of simulated peers in the chat room
+    peers: int = 100
+    #: Number of group messages published by the peers per second
+    group_message_rate: float = 20.0
+    #: Number of private messages sent by the peers per second
+    private_message_rate: float = 5.0
+    #: Number of messages sent by the tested service per second
+    send_rate: float = 2.0
+    #: The ratio of private messages among the messages sent by the service
+    private_ratio: float = 0.5
+    #: Number of membership changes per second
+    churn_rate: float = 1.0
+    #: Time in seconds between disconnect/reconnect cycles, or ``0`` to stay
+    #: connected
+    reconnect_interval: float = 10.0
+    #: Time in seconds between memory samples
+    sample_interval: float = 5.0
+    #: Number of frames stored in the traceback of allocations
+    traceback_limit: int = 1
+    #: Number of reported allocation sites
+    top: int = 10
+    #: Seed of the random number generator
+    seed: Optional[int] = None
+
+
+# pylint: enable=too-many-instance-attributes
+
+
+@dataclass()
+class MemorySample:
+    """Memory usage at a given moment of a soak test"""
+    #: Time in seconds since the start of the test
+    elapsed: float
+    #: Size of the memory blocks traced by tracemalloc in bytes
+    traced_memory: int
+    #: Number of live QObjects by class name
+    qobjects: Counter = field(default_factory=Counter)  # type: ignore
+
+    @property
+    def qobject_count(self) -> int:
+        """Total number of live QObjects"""
+        return sum(self.qobjects.values())
+
+
+def count_qobjects() -> Counter:  # type: ignore
+    """Count the live QObjects referenced from Python by class name"""
+    return Counter(type(obj).__name__ for obj in gc.get_objects()
+                   if isinstance(obj, QObject))
+
+
+def take_sample(elapsed: float) -> MemorySample:
+    """Collect garbage and measure the memory usage
+
+    Objects scheduled for deferred deletion are deleted first, without a
+    running Qt event loop they would only be deleted at exit (PyQt disposes
+    of the proxies of disconnected slots this way).
+    :param elapsed: Time in seconds since the start of the test
+    """
+    QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    return MemorySample(elapsed=elapsed, traced_memory=current,
+                        qobjects=count_qobjects())
+
+
+# pylint: disable=too-many-instance-attributes
+@dataclass()
+class SoakReport:
+    """Results of a soak test"""
+    #: Number of messages published by the simulated peers
+    published_count: int = 0
+    #: Number of messages sent by the tested service
+    sent_count: int = 0
+    #: Number of membership changes
+    churn_count: int = 0
+    #: Number of completed disconnect/reconnect cycles
+    reconnect_count: int = 0
+    #: Number of errors reported by the tested service
+    error_count: int = 0
+    #: Memory samples in chronological order, the first one is taken at the
+    #: end of the warmup
+    samples: List[MemorySample] = field(default_factory=list)
+    #: The allocation sites with the largest growth since the end of the
+    #: warmup
+    growth: List[tracemalloc.StatisticDiff] = field(default_factory=list)
+
+    @property
+    def memory_growth(self) -> int:
+        """Growth of the traced memory since the end of the warmup in bytes
+        """
+        if not self.samples:
+            return 0
+        return self.samples[-1].traced_memory - self.samples[0].traced_memory
+
+    @property
+    def qobject_growth(self) -> Counter:  # type: ignore
+        """Growth of the number of live QObjects since the end of the warmup
+        by class name (only the classes whose count increased)"""
+        if not self.samples:
+            return Counter()
+        return self.samples[-1].qobjects - self.samples[0].qobjects
+
+    def format_report(self) -> str:
+        """Create a human readable report of the results"""
+        lines = [
+            f"published:        {self.published_count}",
+            f"sent:             {self.sent_count}",
+            f"membership churn: {self.churn_count}",
+            f"reconnects:       {self.reconnect_count}",
+            f"errors:           {self.error_count}",
+            f"memory growth:    {self.memory_growth / 1024:.1f} KiB",
+            "",
+            f"{'elapsed':>10} {'traced KiB':>12} {'QObjects':>10}",
+        ]
+        for sample in self.samples:
+            lines.append(f"{sample.elapsed:>9.0f}s "
+                         f"{sample.traced_memory / 1024:>12.1f} "
+                         f"{sample.qobject_count:>10}")
+        growth = self.qobject_growth
+        if growth:
+            lines.append("")
+            lines.append("QObject growth:")
+            for name, increase in growth.most_common():
+                lines.append(f"  {name}: +{increase}")
+        if self.growth:
+            lines.append("")
+            lines.append("top allocation growth sites:")
+            for statistic in self.growth:
+                lines.append(f"  {statistic}")
+        return "\n".join(lines)
+
+
+# pylint: enable=too-many-instance-attributes
+
+
+# pylint: disable=too-many-instance-attributes,too-few-public-methods
+class SoakTest:
+    """Runs a soak test against a chat service"""
+
+    def __init__(self, scenario: SoakScenario,
+                 service: Optional[ChatService] = None) -> None:
+        """
+        :param scenario: Parameters of the test
+        :param service: The tested service, if it's ``None`` then a new \
+        :obj:`~aiocometd_chat_demo.chat_service.ChatService` is created
+        """
+        self.scenario = scenario
+        self.report = SoakReport()
+        self.service = service or ChatService()
+        self.service.username = "soak"
+        self._random = random.Random(scenario.seed)
+        self._peers = [f"peer{index}" for index in range(scenario.peers)]
+        #: Connected peer which can receive the private messages of the
+        #: tested service
+        self._companion = ChatService()
+        self._companion.username = "companion"
+        self._server: Optional[LocalChatServer] = None
+        self._is_connected = asyncio.Event()
+        self._running = False
+        self._start_time = 0.0
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+
+        self.service.connected.connect(self._on_connected)
+        self.service.disconnected.connect(self._on_disconnected)
+        self.service.error.connect(self._on_error)
+
+    def _on_connected(self) -> None:
+        """Record that the tested service is connected"""
+        self._is_connected.set()
+
+    def _on_disconnected(self) -> None:
+        """Record that the tested service is disconnected"""
+        self._is_connected.clear()
+
+    def _on_error(self) -> None:
+        """Count and log the errors of the tested service"""
+        self.report.error_count += 1
+        LOGGER.warning("Service error: %s", self.service.last_error)
+
+    async def run(self) -> SoakReport:
+        """Run the soak test and return its report"""
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start(self.scenario.traceback_limit)
+        try:
+            async with LocalChatServer() as server:
+                self._server = server
+                await self._run(server.url)
+        finally:
+            self._server = None
+            if not was_tracing:
+                tracemalloc.stop()
+        return self.report
+
+    async def _run(self, url: str) -> None:
+        """Run the soak test against the service at *url*"""
+        loop = asyncio.get_event_loop()
+        self._start_time = loop.time()
+        self._running = True
+        self.service.url = url
+        self._companion.url = url
+        self._companion.connect_()
+        self.service.connect_()
+        await self._is_connected.wait()
+
+        tasks = [
+            self._repeat(self.scenario.group_message_rate,
+                         self._publish_group_message),
+            self._repeat(self.scenario.private_message_rate,
+                         self._publish_private_message),
+            self._repeat(self.scenario.send_rate, self._send_message),
+            self._repeat(self.scenario.churn_rate, self._churn_members),
+            self._reconnect(),
+            self._sample(),
+        ]
+        futures = [asyncio.ensure_future(task) for task in tasks]
+        try:
+            await asyncio.sleep(self.scenario.duration)
+        finally:
+            self._running = False
+            for future in futures:
+                future.cancel()
+            await asyncio.gather(*futures, return_exceptions=True)
+
+        self._take_sample()
+        if self._baseline is not None:
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                SNAPSHOT_FILTERS
+            )
+            key_type = ("traceback" if self.scenario.traceback_limit > 1
+                        else "lineno")
+            statistics = snapshot.compare_to(self._baseline, key_type)
+            self.report.growth = [statistic for statistic in statistics
+                                  if statistic.size_diff > 0]
+            self.report.growth = self.report.growth[:self.scenario.top]
+
+        await self._disconnect(self.service)
+        await self._disconnect(self._companion)
+
+    @staticmethod
+    async def _disconnect(service: ChatService, timeout: float = 5.0) \
+            -> None:
+        """Disconnect the *service* and wait until its client is
+        destroyed"""
+        service.disconnect_()
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        while loop.time() < deadline and service.client is not None:
+            await asyncio.sleep(0.05)
+
+    async def _repeat(self, rate: float, action: Callable[[], None]) -> None:
+        """Execute the *action* at random intervals with the average *rate*
+        per second while the tested service is connected"""
+        if rate <= 0:
+            return
+        while self._running:
+            await asyncio.sleep(self._random.expovariate(rate))
+            if self._is_connected.is_set():
+                action()
+
+    def _publish_group_message(self) -> None:
+        """Publish a message of a random peer on the group channel"""
+        assert self._server is not None
+        self._server.publish(ROOM_CHANNEL_PREFIX + CHAT_ROOM_NAME, {
+            "user": self._random.choice(self._peers),
+            "chat": "group message"
+        })
+        self.report.published_count += 1
+
+    def _publish_private_message(self) -> None:
+        """Send a private message of a random peer to the tested service"""
+        assert self._server is not None
+        self._server.publish(ROOM_CHANNEL_PREFIX + CHAT_ROOM_NAME, {
+            "user": self._random.choice(self._peers),
+            "chat": "private message",
+            "scope": "private"
+        })
+        self.report.published_count += 1
+
+    def _send_message(self) -> None:
+        """Send a group message or a private message to the companion peer
+        with the tested service"""
+        if self._random.random() < self.scenario.private_ratio:
+            channel_name = self._companion.username
+            channel_type = ChannelType.USER
+        else:
+            channel_name = CHAT_ROOM_NAME
+            channel_type = ChannelType.GROUP
+        try:
+            self.service.send_message(channel_name, channel_type,
+                                      "outgoing message")
+        except ApplicationException as error:
+            self.report.error_count += 1
+            LOGGER.warning("Failed to send message: %r", error)
+        else:
+            self.report.sent_count += 1
+
+    def _churn_members(self) -> None:
+        """Publish a random subset of the peers as the members of the room
+        """
+        assert self._server is not None
+        members = self._random.sample(
+            self._peers, self._random.randint(0, len(self._peers))
+        )
+        members.extend((self.service.username, self._companion.username))
+        self._server.publish(MEMBERS_CHANNEL_PREFIX + CHAT_ROOM_NAME, members)
+        self.report.churn_count += 1
+
+    async def _reconnect(self) -> None:
+        """Disconnect and reconnect the tested service periodically"""
+        if self.scenario.reconnect_interval <= 0:
+            return
+        while self._running:
+            await asyncio.sleep(self.scenario.reconnect_interval)
+            await self._disconnect(self.service)
+            self.service.connect_()
+            await self._is_connected.wait()
+            self.report.reconnect_count += 1
+
+    async def _sample(self) -> None:
+        """Sample the memory usage periodically after the warmup"""
+        await asyncio.sleep(self.scenario.warmup)
+        self._take_sample()
+        self._baseline = tracemalloc.take_snapshot().filter_traces(
+            SNAPSHOT_FILTERS
+        )
+        while self._running:
+            await asyncio.sleep(self.scenario.sample_interval)
+            self._take_sample()
+
+    def _take_sample(self) -> None:
+        """Add a new memory sample to the report"""
+        loop = asyncio.get_event_loop()
+        sample = take_sample(loop.time() - self._start_time)
+        self.report.samples.append(sample)
+        LOGGER.info("%.0fs: %d bytes traced, %d QObjects", sample.elapsed,
+                    sample.traced_memory, sample.qobject_count)
+
+
+# pylint: enable=too-many-instance-attributes,too-few-public-methods
+
+
+def create_argument_parser() -> argparse.ArgumentParser:
+    """Create the command line argument parser of the soak test"""
+    defaults = SoakScenario()
+    parser = argparse.ArgumentParser(
+        description="Run a soak test tracking the memory usage of the chat "
+                    "service"
+    )
+    parser.add_argument("--duration", type=float, default=defaults.duration,
+                        help="duration of the test in seconds")
+    parser.add_argument("--warmup", type=float, default=defaults.warmup,
+                        help="duration of the warmup in seconds")
+    parser.add_argument("--peers", type=int, default=defaults.peers,
+                        help="number of simulated peers")
+    parser.add_argument("--group-message-rate", type=float,
+                        default=defaults.group_message_rate,
+                        help="group messages published by the peers per "
+                             "second")
+    parser.add_argument("--private-message-rate", type=float,
+                        default=defaults.private_message_rate,
+                        help="private messages sent by the peers per second")
+    parser.add_argument("--send-rate", type=float,
+                        default=defaults.send_rate,
+                        help="messages sent by the tested service per second")
+    parser.add_argument("--churn-rate", type=float,
+                        default=defaults.churn_rate,
+                        help="membership changes per second")
+    parser.add_argument("--reconnect-interval", type=float,
+                        default=defaults.reconnect_interval,
+                        help="seconds between disconnect/reconnect cycles, "
+                             "0 to stay connected")
+    parser.add_argument("--sample-interval", type=float,
+                        default=defaults.sample_interval,
+                        help="seconds between memory samples")
+    parser.add_argument("--traceback-limit", type=int,
+                        default=defaults.traceback_limit,
+                        help="number of frames stored for every allocation")
+    parser.add_argument("--top", type=int, default=defaults.top,
+                        help="number of reported allocation sites")
+    parser.add_argument("--seed", type=int, default=defaults.seed,
+                        help="seed of the random number generator")
+    return parser
+
+
+def main(args: Optional[Iterable[str]] = None) -> None:
+    """Run a soak test and print its report"""
+    parser = create_argument_parser()
+    options = parser.parse_args(None if args is None else list(args))
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    scenario = SoakScenario(**vars(options))
+
+    # deferred deletion requires an application object
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv[:1])
+    soak_test = SoakTest(scenario)
+    loop = asyncio.get_event_loop()
+    report = loop.run_until_complete(soak_test.run())
+    print(report.format_report())
+    del app
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,368 @@
+"""Durable queue of the outgoing chat messages"""
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from enum import IntEnum, unique, auto
+from functools import partial
+from typing import Optional, Dict, List, Set, TextIO
+
+# pylint: disable=no-name-in-module
+from PyQt5.QtCore import pyqtSignal, QObject  # type: ignore
+# pylint: enable=no-name-in-module
+
+from aiocometd_chat_demo.cometd import CometdClient, ClientState, \
+    MessageResponse, JsonObject
+from aiocometd_chat_demo.exceptions import OutboxFullError
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+@unique
+class DeliveryState(IntEnum):
+    """Delivery states of the outgoing messages"""
+    #: Waiting to be sent
+    QUEUED = auto()
+    #: Sent, but the response of the server didn't arrive yet
+    SENDING = auto()
+    #: Accepted by the server
+    DELIVERED = auto()
+    #: Failed to deliver in the allowed number of attempts
+    FAILED = auto()
+
+
+@dataclass()
+class OutboxMessage:
+    """An outgoing message"""
+    #: Identifier of the message, in the order of enqueueing
+    id: int  # pylint: disable=invalid-name
+    #: The CometD channel where the message is published
+    channel: str
+    #: The published data
+    data: JsonObject
+    #: Delivery state of the message
+    state: DeliveryState = DeliveryState.QUEUED
+    #: The number of times the message was sent
+    attempts: int = 0
+    #: The string representation of the last delivery error
+    error: Optional[str] = None
+
+
+# pylint: disable=too-many-instance-attributes
+class Outbox(QObject):  # type: ignore
+    """Queue of outgoing messages, which are delivered in order when a
+    connected client is attached
+
+    The messages can be enqueued at any time, regardless of the state of the
+    connection. While a connected :obj:`CometdClient` is attached, the
+    queued messages are published in the order of enqueueing, in batches of
+    at most :obj:`batch_size` messages, and the next batch is sent when all
+    the responses of the previous one have arrived. The failed messages are
+    sent again after :obj:`retry_interval` seconds, until they run out of
+    their :obj:`max_attempts`. To keep the order of the messages, the
+    messages of a batch which were sent after a failed message are sent
+    again after it, even if they were already delivered. Messages are
+    delivered at least once: a message whose response didn't arrive before
+    the client got detached is sent again.
+
+    If a *path* is given, the queue is persisted to an append-only file of
+    JSON lines. Every enqueued message and every final delivery state is
+    appended to the file, so the undelivered messages are restored when a
+    new outbox is created with the same file. The file is rewritten with
+    only the undelivered messages when it's loaded, or when the number of its
+    records reaches twice the :obj:`max_messages`.
+    """
+    #: Signal emited when the delivery state of a message changes, with the
+    #: id and the new state of the message
+    message_state_changed = pyqtSignal(int, DeliveryState)
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, path: Optional[str] = None, *,
+                 max_messages: int = 1000,
+                 batch_size: int = 10,
+                 max_attempts: int = 5,
+                 retry_interval: float = 5.0,
+                 sync: bool = False,
+                 loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        :param path: Path of the file where the queue is persisted, or \
+        ``None`` to keep the queue only in memory
+        :param max_messages: The maximum number of undelivered messages
+        :param batch_size: The maximum number of messages sent without \
+        waiting for their responses
+        :param max_attempts: The number of times a message is sent before \
+        it's considered to be failed
+        :param retry_interval: Time in seconds to wait before the failed \
+        messages are sent again
+        :param sync: Whether the writes of the file should be flushed to the \
+        disk with :func:`os.fsync`
+        :param loop: Event :obj:`loop <asyncio.BaseEventLoop>` used to
+                     schedule the retries. If *loop* is ``None`` then
+                     :func:`asyncio.get_event_loop` is used to get the
+                     default event loop.
+        """
+        super().__init__()
+        self.path = path
+        self.max_messages = max_messages
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_interval = retry_interval
+        self.sync = sync
+        self._loop = loop or asyncio.get_event_loop()
+        #: The undelivered messages by their ids, in the order of enqueueing
+        self._messages: Dict[int, OutboxMessage] = OrderedDict()
+        #: The responses of the messages being sent by the ids of the
+        #: messages, in the order of sending
+        self._in_flight: Dict[int, MessageResponse] = OrderedDict()
+        #: The ids of the messages being sent whose responses have arrived,
+        #: but which wait for the responses of the messages sent before them
+        self._arrived: Set[int] = set()
+        self._next_id = 1
+        self._client: Optional[CometdClient] = None
+        self._retry_handle: Optional[asyncio.Handle] = None
+        self._file: Optional[TextIO] = None
+        #: Number of records in the file
+        self._record_count = 0
+        if path is not None:
+            self._load(path)
+    # pylint: enable=too-many-arguments
+
+    def __len__(self) -> int:
+        """The number of undelivered messages"""
+        return len(self._messages)
+
+    @property
+    def messages(self) -> List[OutboxMessage]:
+        """The undelivered messages in the order of enqueueing"""
+        return list(self._messages.values())
+
+    def message(self, message_id: int) -> Optional[OutboxMessage]:
+        """Get the undelivered message with the given *message_id*"""
+        return self._messages.get(message_id)
+
+    def _load(self, path: str) -> None:
+        """Restore the undelivered messages from the file at *path*"""
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as file:
+            for line_number, line in enumerate(file, 1):
+                try:
+                    record = json.loads(line)
+                    message_id = record["id"]
+                    if "channel" in record:
+                        self._messages[message_id] = OutboxMessage(
+                            id=message_id,
+                            channel=record["channel"],
+                            data=record["data"]
+                        )
+                    else:
+                        self._messages.pop(message_id, None)
+                    self._next_id = max(self._next_id, message_id + 1)
+                except (ValueError, KeyError, TypeError):
+                    # the last line is incomplete if the application
+                    # crashed while writing it
+                    LOGGER.warning("Skipping invalid outbox record at "
+                                   "%s:%d.", path, line_number)
+        self._compact()
+
+    def _write(self, file: TextIO, records: List[JsonObject]) -> None:
+        """Write the *records* to the *file* and flush it"""
+        for record in records:
+            file.write(json.dumps(record) + "\n")
+        file.flush()
+        if self.sync:
+            os.fsync(file.fileno())
+
+    def _append(self, record: JsonObject) -> None:
+        """Append a *record* to the file if the queue is persisted"""
+        if self.path is None:
+            return
+        if self._file is None:
+            # the file is kept open between the writes
+            # pylint: disable=consider-using-with
+            self._file = open(self.path, "a", encoding="utf-8")
+            # pylint: enable=consider-using-with
+        self._write(self._file, [record])
+        self._record_count += 1
+        # the file contains at most two records for every message
+        if self._record_count >= 2 * self.max_messages:
+            self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite the file with only the undelivered messages
+
+        The new contents are written to a temporary file first, which then
+        replaces the file, so the queue survives a crash during the rewrite.
+        """
+        if self.path is None:
+            return
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            self._write(file, [{"id": message.id, "channel": message.channel,
+                                "data": message.data}
+                               for message in self._messages.values()])
+        os.replace(temporary_path, self.path)
+        self._record_count = len(self._messages)
+
+    def close(self) -> None:
+        """Detach the client and close the file"""
+        self.detach()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def enqueue(self, channel: str, data: JsonObject) -> OutboxMessage:
+        """Add a message to the end of the queue
+
+        If a connected client is attached, then the message is sent as soon
+        as the previous messages are sent.
+        :param channel: The CometD channel where the message is published
+        :param data: The published data
+        :return: The enqueued message
+        :raise OutboxFullError: If the queue already contains the maximum \
+        number of undelivered messages
+        """
+        if len(self._messages) >= self.max_messages:
+            raise OutboxFullError(f"The outbox is full, "
+                                  f"{len(self._messages)} messages are "
+                                  f"waiting to be delivered.")
+        message = OutboxMessage(id=self._next_id, channel=channel, data=data)
+        self._next_id += 1
+        self._messages[message.id] = message
+        self._append({"id": message.id, "channel": channel, "data": data})
+        self._send_batch()
+        return message
+
+    def attach(self, client: CometdClient) -> None:
+        """Start sending the queued messages with the *client*
+
+        :param client: A connected CometD client
+        """
+        self.detach()
+        self._client = client
+        self._send_batch()
+
+    def detach(self) -> None:
+        """Stop sending the queued messages
+
+        The messages whose responses didn't arrive yet are queued again.
+        """
+        self._client = None
+        if self._retry_handle is not None:
+            self._retry_handle.cancel()
+            self._retry_handle = None
+        in_flight = self._in_flight
+        self._in_flight = OrderedDict()
+        self._arrived.clear()
+        for message_id in in_flight:
+            message = self._messages.get(message_id)
+            if message is not None:
+                self._set_state(message, DeliveryState.QUEUED)
+
+    def _set_state(self, message: OutboxMessage,
+                   state: DeliveryState) -> None:
+        """Change the delivery *state* of the *message*"""
+        message.state = state
+        self.message_state_changed.emit(message.id, state)
+
+    def _retry(self) -> None:
+        """Send the queued messages after the retry interval elapsed"""
+        self._retry_handle = None
+        self._send_batch()
+
+    def _send_batch(self) -> None:
+        """Send the next batch of queued messages if the previous batch is
+        finished"""
+        if (self._client is None or self._in_flight or
+                self._retry_handle is not None or
+                self._client.state != ClientState.CONNECTED):
+            return
+        for message in self._messages.values():
+            if len(self._in_flight) >= self.batch_size:
+                break
+            if message.state != DeliveryState.QUEUED:
+                continue
+            message.attempts += 1
+            response = self._client.publish(message.channel, message.data)
+            self._in_flight[message.id] = response
+            response.finished.connect(
+                partial(self._on_response, message, response)
+            )
+            self._set_state(message, DeliveryState.SENDING)
+
+    def _on_response(self, message: OutboxMessage,
+                     response: MessageResponse) -> None:
+        """Update the delivery states of the messages with the responses
+        which arrived in the order of sending, up to the first *response*
+        that is still missing
+        """
+        # ignore the responses of the messages which were queued again
+        if self._in_flight.get(message.id) is not response:
+            return
+        self._arrived.add(message.id)
+        while self._in_flight:
+            message_id, response = next(iter(self._in_flight.items()))
+            if message_id not in self._arrived:
+                return
+            del self._in_flight[message_id]
+            self._arrived.discard(message_id)
+            message = self._messages[message_id]
+            if response.error is None:
+                self._deliver(message)
+            elif not self._fail(message, str(response.error)):
+                self._requeue_in_flight()
+                self._retry_handle = self._loop.call_later(
+                    self.retry_interval, self._retry
+                )
+                return
+        self._send_batch()
+
+    def _deliver(self, message: OutboxMessage) -> None:
+        """Remove the delivered *message* from the queue"""
+        del self._messages[message.id]
+        self._set_state(message, DeliveryState.DELIVERED)
+        self._append({"id": message.id, "state": "delivered"})
+
+    def _fail(self, message: OutboxMessage, error: str) -> bool:
+        """Queue the *message* again after an unsuccessful attempt, or remove
+        it from the queue if it ran out of its attempts
+
+        :param message: The message which failed to be delivered
+        :param error: The description of the error
+        :return: ``True`` if the message is failed for good, or ``False`` \
+        if it's queued again
+        """
+        message.error = error
+        if message.attempts < self.max_attempts:
+            self._set_state(message, DeliveryState.QUEUED)
+            return False
+        LOGGER.error("Failed to deliver message %d: %s", message.id,
+                     message.error)
+        del self._messages[message.id]
+        self._set_state(message, DeliveryState.FAILED)
+        self._append({"id": message.id, "state": "failed",
+                      "error": message.error})
+        return True
+
+    def _requeue_in_flight(self) -> None:
+        """Queue the messages being sent again, so they're sent after the
+        failed message which was sent before them
+
+        Their responses are ignored, and these attempts don't count towards
+        their :obj:`max_attempts`.
+        """
+        in_flight = self._in_flight
+        self._in_flight = OrderedDict()
+        self._arrived.clear()
+        for message_id in in_flight:
+            message = self._messages[message_id]
+            message.attempts -= 1
+            self._set_state(message, DeliveryState.QUEUED)
+
+# pylint: enable=too-many-instance-attributes
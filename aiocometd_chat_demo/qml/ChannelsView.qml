@@ -4,6 +4,7 @@ import QtQuick.Controls 2.4
 import QtQuick.Layouts 1.4
 import ChannelsModel 1.0
 import ConversationModel 1.0
+import ChatDemo 1.0
 
 Pane {
     id: root
@@ -14,13 +15,68 @@ Pane {
     padding: 0
     background: Rectangle {color: root.palette.mid}
 
+    // make the channel named *name* the current channel
+    function selectChannel(name) {
+        filterField.text = ""
+        channelsView.currentIndex = channelsFilter.channelRow(name)
+    }
+
+    // call *update* and then select the current channel again if it's still
+    // listed
+    function keepCurrentChannel(update) {
+        var currentName = channelsView.currentItem ?
+            channelsView.currentItem.channelName : ""
+        update()
+        var row = channelsFilter.channelRow(currentName)
+        if (row >= 0) {
+            channelsView.currentIndex = row
+        }
+    }
+
+    ChannelsFilter {
+        id: channelsFilter
+        source_model: root.model
+    }
+
+    TextField {
+        id: filterField
+        anchors.left: parent.left
+        anchors.right: orderButton.left
+        anchors.top: parent.top
+        anchors.margins: 6
+        placeholderText: qsTr("Filter channels")
+        selectByMouse: true
+        onTextChanged: keepCurrentChannel(function() {
+            channelsFilter.filter = text
+        })
+    }
+
+    ToolButton {
+        id: orderButton
+        anchors.right: parent.right
+        anchors.verticalCenter: filterField.verticalCenter
+        anchors.rightMargin: 6
+        checkable: true
+        text: qsTr("Recent")
+        ToolTip.visible: hovered
+        ToolTip.text: qsTr("List the most recently active channels first")
+        onToggled: keepCurrentChannel(function() {
+            root.model.order = checked ? "activity" : "name"
+        })
+    }
+
     ListView {
         id: channelsView
-        anchors.fill: parent
+        anchors.left: parent.left
+        anchors.right: parent.right
+        anchors.top: filterField.bottom
+        anchors.bottom: parent.bottom
+        anchors.topMargin: 6
+        clip: true
         spacing: 0
         focus: true
         boundsBehavior: Flickable.StopAtBounds
-        model: root.model
+        model: channelsFilter
 
         ScrollBar.vertical: ScrollBar {}
 
@@ -28,23 +84,17 @@ Pane {
             id: delegateRoot
             color: ListView.isCurrentItem ? root.palette.highlight :
                 (hovering ? root.palette.dark : "transparent")
-            width: parent.width
-            height: itemText.height + 12
-            property bool hasUnreadMessages: false
+            width: channelsView.width
+            height: itemColumn.height + 12
+            property bool hasUnreadMessages: unreadCount > 0
             property bool hovering: false
-
-            Connections {
-                target: if (model.conversation) model.conversation
-                onRowsInserted: {
-                    if (!delegateRoot.ListView.isCurrentItem) {
-                        delegateRoot.hasUnreadMessages = true
-                    }
-                }
-            }
+            property string channelName: name ? name : ""
 
             ListView.onIsCurrentItemChanged: {
-                root.currentConversation = conversation
-                delegateRoot.hasUnreadMessages = false
+                if (ListView.isCurrentItem) {
+                    root.currentConversation = conversation
+                    root.model.active_channel = delegateRoot.channelName
+                }
             }
 
             RowLayout {
@@ -90,13 +140,41 @@ Pane {
                         }
                     ]
                 }
-                Text {
-                    id: itemText
+                Column {
+                    id: itemColumn
                     Layout.fillWidth: true
-                    color: root.palette.buttonText
-                    clip: true
-                    elide: Text.ElideRight
-                    text: name ? name: ""
+
+                    Text {
+                        id: itemText
+                        width: parent.width
+                        color: root.palette.buttonText
+                        clip: true
+                        elide: Text.ElideRight
+                        text: name ? name: ""
+                    }
+                    Text {
+                        width: parent.width
+                        visible: text.length > 0
+                        color: root.palette.buttonText
+                        opacity: 0.6
+                        font.pointSize: itemText.font.pointSize * 0.85
+                        clip: true
+                        elide: Text.ElideRight
+                        text: lastMessage ? lastMessage : ""
+                    }
+                }
+                Label {
+                    Layout.rightMargin: 6
+                    visible: delegateRoot.hasUnreadMessages
+                    color: root.palette.highlightedText
+                    text: unreadCount
+                    padding: 2
+                    leftPadding: 6
+                    rightPadding: 6
+                    background: Rectangle {
+                        radius: height / 2
+                        color: root.palette.highlight
+                    }
                 }
             }
 
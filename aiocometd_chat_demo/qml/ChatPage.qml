@@ -9,13 +9,34 @@ import ChatService 1.0
 
 Controls1.SplitView {
     property alias channelsModel: channelsView.model
-    property alias username: conversationView.username
     orientation: Qt.Horizontal
 
-    ChannelsView {
-        id: channelsView
+    ColumnLayout {
         width: 200
         Layout.minimumWidth: 100
+        spacing: 0
+
+        SearchView {
+            id: searchView
+            Layout.fillWidth: true
+            Layout.fillHeight: searching
+            model: channelsView.model ? channelsView.model.search_results
+                                      : null
+            onResultSelected: {
+                channelsView.selectChannel(channel)
+                if (channelsView.currentIndex >= 0) {
+                    conversationView.positionViewAtRow(row)
+                }
+                searchView.clear()
+            }
+        }
+
+        ChannelsView {
+            id: channelsView
+            Layout.fillWidth: true
+            Layout.fillHeight: true
+            visible: !searchView.searching
+        }
     }
 
     ConversationView {
@@ -7,9 +7,34 @@ import ConversationModel 1.0
 Pane {
     id: root
     property ConversationModel model
-    property string username: ""
     background: Rectangle {color: root.palette.window}
 
+    // the model estimates the heights of the messages with the metrics of
+    // the text, so the delegates don't have to be laid out to find their
+    // heights
+    function updateLayoutMetrics() {
+        if (root.model) {
+            root.model.setLayoutMetrics(conversationView.width - 12,
+                                        messageFontMetrics.height,
+                                        messageFontMetrics.averageCharacterWidth)
+        }
+    }
+
+    onModelChanged: updateLayoutMetrics()
+
+    FontMetrics {
+        id: messageFontMetrics
+        font: root.font
+        onFontChanged: root.updateLayoutMetrics()
+    }
+
+    function positionViewAtRow(row) {
+        if (row >= 0) {
+            conversationView.positionViewAtIndex(row, ListView.Center)
+            conversationView.currentIndex = row
+        }
+    }
+
     Page {
         anchors.fill: parent
 
@@ -40,7 +65,12 @@ Pane {
 
                 ScrollBar.vertical: ScrollBar { }
 
+                onWidthChanged: root.updateLayoutMetrics()
+
+                // the new rows are not animated while the messages arrive
+                // too fast, to keep up with the frame rate
                 add: Transition {
+                    enabled: !root.model || !root.model.degraded
                     NumberAnimation {
                         properties: "opacity";
                         from: 0; to: 1;
@@ -48,14 +78,22 @@ Pane {
                     }
                 }
 
-                delegate: MessageDelegate {
-                    username: root.username
+                delegate: MessageDelegate { }
+
+                // load the older messages when scrolled to the top
+                onAtYBeginningChanged: {
+                    if (atYBeginning && root.model) {
+                        root.model.loadHistory()
+                    }
                 }
 
-                onCountChanged: {
-                    var newIndex = count - 1
+                // scroll once after all the rows inserted in the same
+                // iteration of the event loop
+                onCountChanged: Qt.callLater(scrollToEnd)
+
+                function scrollToEnd() {
                     positionViewAtEnd()
-                    currentIndex = newIndex
+                    currentIndex = count - 1
                 }
             }
         }
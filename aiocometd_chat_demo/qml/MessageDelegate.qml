@@ -5,10 +5,22 @@ import QtQuick.Layouts 1.4
 
 Item {
     id: root
-    property string username
-    property bool sentMessage: model.sender == root.username
+    property bool sentMessage: isOwn
+    // the height laid out by the children, which is reported to the model
+    // so it's known before the next delegate of the message is created
+    readonly property real layoutHeight: textLayout.height + 18
     width: parent.width
-    height: childrenRect.height
+    height: estimatedHeight
+
+    function reportHeight() {
+        if (textLayout.height > 0 && Math.abs(layoutHeight - height) >= 1) {
+            root.ListView.view.model.setMeasuredHeight(index, layoutHeight)
+        }
+    }
+
+    onLayoutHeightChanged: reportHeight()
+    onHeightChanged: reportHeight()
+    Component.onCompleted: reportHeight()
 
     BorderImage {
         id: bubbleImage
@@ -44,9 +56,9 @@ Item {
                 font.bold: true
             }
             Label {
-                id: timeText
+                id: timeLabel
                 Layout.alignment: Qt.AlignBottom
-                text: Qt.formatTime(time)
+                text: timeText
                 font.pointSize: senderText.font.pointSize - 4
                 font.italic: true
             }
@@ -56,7 +68,8 @@ Item {
             leftPadding: sentMessage ? bubbleImage.horizontalPadding : 0
             Layout.maximumWidth: parent.width
             wrapMode: Text.WordWrap
-            text: contents ? contents : ""
+            textFormat: Text.PlainText
+            text: displayText
         }
     }
 }
\ No newline at end of file
@@ -0,0 +1,90 @@
+import QtQuick 2.11
+import QtQuick.Window 2.4
+import QtQuick.Controls 2.4
+import QtQuick.Layouts 1.4
+import SearchResultsModel 1.0
+
+Pane {
+    id: root
+    property SearchResultsModel model
+    property bool searching: searchField.text.length > 0
+    signal resultSelected(string channel, int row)
+
+    padding: 0
+    background: Rectangle {color: root.palette.mid}
+
+    function clear() {
+        searchField.text = ""
+    }
+
+    ColumnLayout {
+        anchors.fill: parent
+        spacing: 0
+
+        TextField {
+            id: searchField
+            Layout.fillWidth: true
+            Layout.margins: 6
+            placeholderText: qsTr("Search messages")
+            selectByMouse: true
+            onTextChanged: {
+                if (root.model) {
+                    root.model.query = text
+                }
+            }
+        }
+
+        ListView {
+            id: resultsView
+            Layout.fillWidth: true
+            Layout.fillHeight: true
+            visible: root.searching
+            clip: true
+            boundsBehavior: Flickable.StopAtBounds
+            model: root.searching ? root.model : null
+
+            ScrollBar.vertical: ScrollBar {}
+
+            delegate: Rectangle {
+                id: delegateRoot
+                property bool hovering: false
+                color: hovering ? root.palette.dark : "transparent"
+                width: resultsView.width
+                height: resultLayout.height + 12
+
+                ColumnLayout {
+                    id: resultLayout
+                    anchors.left: parent.left
+                    anchors.right: parent.right
+                    anchors.margins: 6
+                    anchors.verticalCenter: parent.verticalCenter
+                    spacing: 2
+
+                    Text {
+                        Layout.fillWidth: true
+                        elide: Text.ElideRight
+                        color: root.palette.buttonText
+                        opacity: 0.6
+                        font.pointSize: 8
+                        text: channel + " - " + sender + " - " +
+                              time.toLocaleTimeString(Locale.ShortFormat)
+                    }
+                    Text {
+                        Layout.fillWidth: true
+                        elide: Text.ElideRight
+                        color: root.palette.buttonText
+                        text: contents
+                    }
+                }
+
+                MouseArea {
+                    anchors.fill: parent
+                    hoverEnabled: true
+                    onEntered: delegateRoot.hovering = true
+                    onExited: delegateRoot.hovering = false
+                    onClicked: root.resultSelected(channel, row)
+                }
+            }
+        }
+    }
+}
@@ -14,6 +14,20 @@ ApplicationWindow {
         id: chatService
         username: connectionPage.username
         url: connectionPage.url
+        outbox_path: outboxPath
+        snapshot_path: snapshotPath
+        coalesce_updates: true
+        json_codec: "auto"
+        transport: "auto"
+        compression: true
+        onSnapshot_restored: {
+             // display the restored rooms while connecting in the background
+             connectionPage.username = username;
+             connectionPage.url = url;
+             swipeView.currentIndex = 1;
+             connectionPage.state = "connecting"
+             chatService.connect_()
+        }
         onConnected: {
              swipeView.currentIndex = 1;
              connectionPage.state = "connected"
@@ -40,10 +54,18 @@ ApplicationWindow {
             errorText: chatService.last_error
         }
 
-        ChatPage{
-            id: chatPage
-            channelsModel: chatService.channels_model
-            username: connectionPage.username
+        // the chat page is compiled in the background once the first
+        // connection starts, instead of delaying the first frame
+        Loader {
+            id: chatPageLoader
+            active: connectionPage.state !== ""
+            asynchronous: true
+            source: "ChatPage.qml"
+            onLoaded: {
+                item.channelsModel = Qt.binding(function() {
+                    return chatService.channels_model
+                })
+            }
         }
     }
 }
\ No newline at end of file
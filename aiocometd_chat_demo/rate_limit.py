@@ -0,0 +1,314 @@
+"""Client-side rate limiting of the published messages"""
+import asyncio
+import json
+from collections import deque
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Optional, Dict, List, Callable, Iterable, Deque
+
+from aiocometd_chat_demo.cometd import MessageResponse, JsonObject
+from aiocometd_chat_demo.exceptions import ApplicationException, \
+    RateLimiterFullError
+
+
+#: CometD service channel on which new members advertise themselves
+MEMBERS_SERVICE_CHANNEL = "/service/members"
+#: Function publishing data to a channel
+PublishFunction = Callable[[str, JsonObject], MessageResponse]
+
+
+class TokenBucket:
+    """Token bucket allowing *rate* operations per second on average, with
+    bursts of at most *capacity* operations"""
+
+    def __init__(self, rate: float, capacity: int,
+                 clock: Callable[[], float]) -> None:
+        """
+        :param rate: The number of tokens added to the bucket per second
+        :param capacity: The maximum number of tokens in the bucket
+        :param clock: Function returning the current time in seconds
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        """Add the tokens accumulated since the last update"""
+        now = self._clock()
+        self._tokens = min(float(self.capacity),
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        """The number of tokens currently in the bucket"""
+        self._refill()
+        return self._tokens
+
+    def delay(self) -> float:
+        """Time in seconds until a token becomes available, or ``0`` if
+        there is one already"""
+        missing = 1.0 - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    def consume(self) -> None:
+        """Take a token from the bucket"""
+        self._refill()
+        self._tokens -= 1.0
+
+
+@dataclass()
+class _QueuedMessage:
+    """A message waiting for the rate limits to allow its sending"""
+    #: The channel where the message is published
+    channel: str
+    #: The published data
+    data: JsonObject
+    #: The function publishing the message
+    publish: PublishFunction
+    #: The responses returned to the senders of the message
+    responses: List[MessageResponse] = field(default_factory=list)
+    #: The key of the message among the coalesced messages, or ``None`` if
+    #: the message can't be coalesced
+    coalescing_key: Optional[str] = None
+
+
+# pylint: disable=too-many-instance-attributes
+class RateLimiter:
+    """Limits the rate of the published messages with a global token bucket
+    and a token bucket for every channel
+
+    A message is published right away if both the global bucket and the
+    bucket of its channel have a token, and nothing is queued for its
+    channel. Otherwise it's queued until the buckets refill, instead of
+    being sent in a burst that the server would throttle. The queued
+    messages of a channel are sent in order, while the channels with queued
+    messages take turns, and a channel which has exhausted its own bucket
+    doesn't hold up the messages of other channels.
+
+    The messages of the *coalesced_channels* are merged while they're
+    queued: publishing the same data again to such a channel doesn't queue a
+    new message, and the responses of all the senders finish when the queued
+    message is delivered. By default this applies to the membership
+    announcements, which are repeated on every join and reconnect.
+
+    At most *max_queued* messages are queued, the responses of the messages
+    published while the queue is full finish with a
+    :obj:`~aiocometd_chat_demo.exceptions.RateLimiterFullError`.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, rate: Optional[float] = 10.0, burst: int = 10, *,
+                 channel_rate: Optional[float] = None,
+                 channel_burst: int = 5,
+                 coalesced_channels: Iterable[str] =
+                 (MEMBERS_SERVICE_CHANNEL,),
+                 max_queued: Optional[int] = 1000,
+                 loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        :param rate: The average number of messages published per second, \
+        or ``None`` to not limit the overall rate
+        :param burst: The maximum number of messages published at once
+        :param channel_rate: The average number of messages published per \
+        second to a single channel, or ``None`` to not limit the rate of \
+        the channels
+        :param channel_burst: The maximum number of messages published at \
+        once to a single channel
+        :param coalesced_channels: The channels whose identical queued \
+        messages are merged
+        :param max_queued: The maximum number of queued messages, or \
+        ``None`` to not limit the size of the queue
+        :param loop: Event :obj:`loop <asyncio.BaseEventLoop>` used to
+                     schedule the sending of the queued messages. If *loop*
+                     is ``None`` then :func:`asyncio.get_event_loop` is used
+                     to get the default event loop.
+        """
+        self._loop = loop or asyncio.get_event_loop()
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.coalesced_channels = frozenset(coalesced_channels)
+        self.max_queued = max_queued
+        #: The global bucket, or ``None`` if the overall rate is unlimited
+        self._bucket: Optional[TokenBucket] = None
+        if rate is not None:
+            self._bucket = TokenBucket(rate, burst, self._loop.time)
+        #: The buckets of the channels by the names of the channels
+        self._channel_buckets: Dict[str, TokenBucket] = {}
+        #: The queued messages of every channel in the order of publishing,
+        #: only the channels with queued messages are present
+        self._queues: Dict[str, Deque[_QueuedMessage]] = {}
+        #: The number of queued messages
+        self._queued_count = 0
+        #: The queued messages which can be coalesced by their keys
+        self._coalesced: Dict[str, _QueuedMessage] = {}
+        #: Handle of the scheduled sending of the queued messages
+        self._dispatch_handle: Optional[asyncio.TimerHandle] = None
+    # pylint: enable=too-many-arguments
+
+    def __len__(self) -> int:
+        """The number of queued messages"""
+        return self._queued_count
+
+    def _channel_bucket(self, channel: str) -> Optional[TokenBucket]:
+        """Get the bucket of the *channel*, or ``None`` if the rate of the
+        channels is unlimited"""
+        if self.channel_rate is None:
+            return None
+        bucket = self._channel_buckets.get(channel)
+        if bucket is None:
+            bucket = TokenBucket(self.channel_rate, self.channel_burst,
+                                 self._loop.time)
+            self._channel_buckets[channel] = bucket
+        return bucket
+
+    def _delay(self, channel: str) -> float:
+        """Time in seconds until a message can be published to the
+        *channel*"""
+        delays = [bucket.delay()
+                  for bucket in (self._bucket, self._channel_bucket(channel))
+                  if bucket is not None]
+        return max(delays, default=0.0)
+
+    def _consume(self, channel: str) -> None:
+        """Take the tokens of publishing a message to the *channel*"""
+        for bucket in (self._bucket, self._channel_bucket(channel)):
+            if bucket is not None:
+                bucket.consume()
+
+    def publish(self, channel: str, data: JsonObject,
+                publish: PublishFunction) -> MessageResponse:
+        """Publish *data* to the given *channel* with the *publish* function
+        when the rate limits allow it
+
+        :param channel: Name of the channel
+        :param data: Data to send to the server
+        :param publish: The function publishing the message
+        :return: The response associated with the message
+        """
+        if channel not in self._queues and self._delay(channel) == 0.0:
+            self._consume(channel)
+            return publish(channel, data)
+
+        response = MessageResponse()
+        coalescing_key = None
+        if channel in self.coalesced_channels:
+            coalescing_key = json.dumps([channel, data], sort_keys=True)
+            message = self._coalesced.get(coalescing_key)
+            if message is not None:
+                message.responses.append(response)
+                return response
+        if self.max_queued is not None and \
+                self._queued_count >= self.max_queued:
+            response.error = RateLimiterFullError(
+                f"The rate limiter is full, {self._queued_count} messages "
+                f"are waiting to be published."
+            )
+            self._loop.call_soon(self._emit_finished, response)
+            return response
+        message = _QueuedMessage(channel=channel, data=data, publish=publish,
+                                 responses=[response],
+                                 coalescing_key=coalescing_key)
+        self._queues.setdefault(channel, deque()).append(message)
+        self._queued_count += 1
+        if coalescing_key is not None:
+            self._coalesced[coalescing_key] = message
+        self._schedule()
+        return response
+
+    def clear(self, error: BaseException,
+              publish: Optional[PublishFunction] = None) -> None:
+        """Drop the queued messages and finish their responses with the
+        given *error*
+
+        :param error: The error of the dropped messages
+        :param publish: Drop only the messages queued with this publish \
+        function, or ``None`` to drop all the queued messages
+        """
+        if self._dispatch_handle is not None:
+            self._dispatch_handle.cancel()
+            self._dispatch_handle = None
+        queues = self._queues
+        self._queues = {}
+        self._queued_count = 0
+        self._coalesced = {}
+        for channel, queue in queues.items():
+            for message in queue:
+                if publish is not None and message.publish != publish:
+                    self._queues.setdefault(channel, deque()).append(message)
+                    self._queued_count += 1
+                    if message.coalescing_key is not None:
+                        self._coalesced[message.coalescing_key] = message
+                    continue
+                for response in message.responses:
+                    response.error = error
+                    response.finished.emit()
+        self._schedule()
+
+    def _schedule(self) -> None:
+        """Schedule the sending of the queued messages for the time when the
+        first of them can be sent"""
+        if self._dispatch_handle is not None or not self._queues:
+            return
+        delay = min(self._delay(channel) for channel in self._queues)
+        self._dispatch_handle = self._loop.call_later(delay, self._dispatch)
+
+    def _dispatch(self) -> None:
+        """Send the queued messages allowed by the rate limits
+
+        The first queued messages of the channels are sent in turns, until
+        the global bucket runs out of tokens or every channel is blocked.
+        """
+        self._dispatch_handle = None
+        ready_channels = deque(self._queues)
+        while ready_channels and (self._bucket is None or
+                                  self._bucket.delay() == 0.0):
+            channel = ready_channels.popleft()
+            queue = self._queues.get(channel)
+            if queue is None or self._delay(channel) > 0.0:
+                continue
+            message = queue.popleft()
+            self._queued_count -= 1
+            # the channel takes its next turn after the other channels
+            del self._queues[channel]
+            if queue:
+                self._queues[channel] = queue
+                ready_channels.append(channel)
+            if message.coalescing_key is not None:
+                del self._coalesced[message.coalescing_key]
+            self._consume(channel)
+            self._send(message)
+        self._schedule()
+
+    def _send(self, message: _QueuedMessage) -> None:
+        """Publish a queued *message* and forward the result to the
+        responses of its senders"""
+        try:
+            sent_response = message.publish(message.channel, message.data)
+        except ApplicationException as error:
+            # the client disconnected while the message was queued
+            for response in message.responses:
+                response.error = error
+                response.finished.emit()
+            return
+        sent_response.finished.connect(
+            partial(self._forward, sent_response, message.responses)
+        )
+
+    @staticmethod
+    def _emit_finished(response: MessageResponse) -> None:
+        """Emit the :obj:`~MessageResponse.finished` signal of the
+        *response*"""
+        response.finished.emit()
+
+    @staticmethod
+    def _forward(sent_response: MessageResponse,
+                 responses: List[MessageResponse]) -> None:
+        """Finish the *responses* with the result of the *sent_response*"""
+        for response in responses:
+            response.error = sent_response.error
+            response.result = sent_response.result
+            response.finished.emit()
+
+# pylint: enable=too-many-instance-attributes
@@ -0,0 +1,391 @@
+"""Full-text search of the chat conversations"""
+import heapq
+import re
+from bisect import bisect_left, insort
+from enum import IntEnum, unique
+from typing import NamedTuple, List, Dict, Set, Optional, ClassVar, Any, \
+    Iterable, Iterator, Callable
+from dataclasses import dataclass, field
+
+# pylint: disable=no-name-in-module,wrong-import-order
+from PyQt5.QtCore import (  # type: ignore
+    QAbstractListModel,
+    Qt,
+    QByteArray,
+    QModelIndex,
+    QDateTime,
+    pyqtSignal,
+    pyqtProperty
+)
+# pylint: enable=no-name-in-module,wrong-import-order
+
+from .conversation import ConversationModel, ChatMessage
+
+
+#: Pattern of the indexed words
+WORD_PATTERN = re.compile(r"\w+")
+#: The largest code point, appended to a prefix it creates the upper bound of
+#: the words starting with the prefix
+MAX_CHARACTER = "\U0010ffff"
+#: The number of removed documents relative to the number of indexed
+#: documents above which the removed documents are dropped from the postings
+#: lists
+COMPACTION_RATIO = 0.5
+
+
+def tokenize(text: str) -> List[str]:
+    """Split the *text* into case folded words
+
+    :param text: Arbitrary text
+    :return: The words of the text in their order of appearance
+    """
+    return WORD_PATTERN.findall(text.casefold())
+
+
+class SearchDocument(NamedTuple):
+    """An indexed message of a conversation"""
+    #: The name of the message's channel
+    channel_name: str
+    #: The type of the message's channel
+    channel_type: str
+    #: The conversation which contains the message
+    conversation: ConversationModel
+    #: The indexed message
+    message: ChatMessage
+
+
+class SearchIndex:
+    """Inverted index of chat messages supporting prefix and multi-term
+    queries
+
+    The index is maintained incrementally. Every added message gets a
+    document id in increasing order, and the postings list of every word
+    contains the ids of the documents in which the word occurs, so the
+    postings lists stay sorted without any extra work. The vocabulary is also
+    kept in sorted order to find the words starting with a prefix by
+    bisection.
+
+    The postings lists aren't updated when documents are removed, the removed
+    documents are skipped when the results of a query are collected. Once
+    the number of removed documents exceeds :obj:`COMPACTION_RATIO` of the
+    indexed documents, the postings lists are compacted, and the words which
+    no longer occur in any documents are removed from the vocabulary.
+    """
+
+    def __init__(self) -> None:
+        #: Indexed documents by their ids
+        self._documents: Dict[int, SearchDocument] = {}
+        #: The id of the next added document
+        self._next_id = 0
+        #: Number of removed documents whose ids can still be in the
+        #: postings lists
+        self._removed_count = 0
+        #: Ids of the documents in which the words occur
+        self._postings: Dict[str, List[int]] = {}
+        #: Sorted list of the indexed words
+        self._vocabulary: List[str] = []
+        #: Ids of the documents of the conversations by the id of the
+        #: conversation objects
+        self._conversation_documents: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        """The number of indexed documents"""
+        return len(self._documents)
+
+    def add(self, channel_name: str, channel_type: str,
+            conversation: ConversationModel, message: ChatMessage) -> int:
+        """Add the *message* of the *conversation* to the index
+
+        :param channel_name: The name of the message's channel
+        :param channel_type: The type of the message's channel
+        :param conversation: The conversation which contains the message
+        :param message: The message to index
+        :return: The id of the new document
+        """
+        document_id = self._next_id
+        self._next_id += 1
+        self._documents[document_id] = SearchDocument(
+            channel_name=channel_name,
+            channel_type=channel_type,
+            conversation=conversation,
+            message=message
+        )
+        self._conversation_documents.setdefault(id(conversation), []) \
+            .append(document_id)
+        for word in set(tokenize(message.contents)):
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = []
+                insort(self._vocabulary, word)
+            postings.append(document_id)
+        return document_id
+
+    def remove_conversation(self, conversation: ConversationModel) -> None:
+        """Remove all the messages of the *conversation* from the index
+
+        The postings lists are compacted if too many removed documents
+        accumulate in them.
+        :param conversation: A conversation with indexed messages
+        """
+        document_ids = self._conversation_documents.pop(id(conversation), [])
+        for document_id in document_ids:
+            del self._documents[document_id]
+        self._removed_count += len(document_ids)
+        if self._removed_count > COMPACTION_RATIO * len(self._documents):
+            self._compact()
+
+    def _compact(self) -> None:
+        """Remove the ids of the removed documents from the postings lists,
+        and the words which don't occur in any documents from the
+        vocabulary"""
+        documents = self._documents
+        postings_by_word: Dict[str, List[int]] = {}
+        for word, postings in self._postings.items():
+            postings = [document_id for document_id in postings
+                        if document_id in documents]
+            if postings:
+                postings_by_word[word] = postings
+        if len(postings_by_word) < len(self._vocabulary):
+            self._vocabulary = [word for word in self._vocabulary
+                                if word in postings_by_word]
+        self._postings = postings_by_word
+        self._removed_count = 0
+
+    def document(self, document_id: int) -> Optional[SearchDocument]:
+        """Get the document with the given *document_id*, or ``None`` if it's
+        removed"""
+        return self._documents.get(document_id)
+
+    def _prefix_postings(self, prefix: str) -> List[List[int]]:
+        """Get the postings lists of the words that start with the *prefix*
+        """
+        start = bisect_left(self._vocabulary, prefix)
+        end = bisect_left(self._vocabulary, prefix + MAX_CHARACTER, start)
+        return [self._postings[word] for word in self._vocabulary[start:end]]
+
+    def _prefix_matches(self, prefix: str) -> Set[int]:
+        """Get the ids of the documents containing any words that start with
+        the *prefix*"""
+        matches: Set[int] = set()
+        for postings in self._prefix_postings(prefix):
+            matches.update(postings)
+        return matches
+
+    def _recent_prefix_matches(self, prefix: str) -> Iterator[int]:
+        """Iterate over the ids of the documents containing any words that
+        start with the *prefix*, the most recent first
+
+        The sorted postings lists are merged lazily, so only as many
+        documents are visited as the number of consumed results.
+        """
+        previous = None
+        for document_id in heapq.merge(
+                *(reversed(postings)
+                  for postings in self._prefix_postings(prefix)),
+                reverse=True):
+            if document_id != previous:
+                previous = document_id
+                yield document_id
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[int]:
+        """Find the documents matching the *query*
+
+        Every word of the *query* is treated as a prefix, and a document
+        matches if it contains words starting with all of them.
+        :param query: Search query
+        :param limit: The maximum number of returned document ids
+        :return: Ids of the matching documents, the most recent first
+        """
+        prefixes = set(tokenize(query))
+        if not prefixes:
+            return []
+        if len(prefixes) == 1:
+            candidates: Iterable[int] = self._recent_prefix_matches(
+                prefixes.pop()
+            )
+        else:
+            matches: Optional[Set[int]] = None
+            # start with the longest prefixes, they probably match the least
+            # documents
+            for prefix in sorted(prefixes, key=len, reverse=True):
+                prefix_matches = self._prefix_matches(prefix)
+                if matches is None:
+                    matches = prefix_matches
+                else:
+                    matches &= prefix_matches
+                if not matches:
+                    return []
+            assert matches is not None
+            candidates = sorted(matches, reverse=True)
+        result = []
+        for document_id in candidates:
+            if document_id in self._documents:
+                result.append(document_id)
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+    def matches(self, document_id: int, query: str) -> bool:
+        """Check whether the document with the given *document_id* matches
+        the *query*"""
+        document = self._documents.get(document_id)
+        prefixes = set(tokenize(query))
+        if document is None or not prefixes:
+            return False
+        words = tokenize(document.message.contents)
+        return all(any(word.startswith(prefix) for word in words)
+                   for prefix in prefixes)
+
+
+@unique
+class SearchResultRole(IntEnum):
+    """Custom item role for the :obj:`SearchResultsModel`"""
+    #: Channel name role
+    CHANNEL = Qt.UserRole
+    #: Channel type role
+    CHANNEL_TYPE = Qt.UserRole + 1
+    #: The row of the message in its conversation
+    ROW = Qt.UserRole + 2
+    #: Message arrival time role
+    TIME = Qt.UserRole + 3
+    #: Message sender role
+    SENDER = Qt.UserRole + 4
+    #: Message contents role
+    CONTENTS = Qt.UserRole + 5
+
+
+@dataclass()
+class SearchResultsModel(QAbstractListModel):  # type: ignore
+    """The messages matching a search query, the most recent first
+
+    The results are updated when the query changes, or when new matching
+    messages are added to the index. This class can act as a list model of
+    results for item view classes, every result points to a message with its
+    channel name and the row of the message in the channel's conversation.
+    """
+    #: The searched index
+    _index: SearchIndex
+    #: The maximum number of results
+    limit: int = 100
+    #: Adds the incoming messages of a conversation which wait for the
+    #: next frame to the conversation, so the rows of the found messages
+    #: are known, or ``None`` if the messages are added right away
+    flush_conversation: Optional[Callable[[ConversationModel], None]] = \
+        field(default=None, repr=False)
+    #: The current search query
+    _query: str = field(default="", init=False)
+    #: Ids of the matching documents
+    _results: List[int] = field(default_factory=list, init=False,
+                                repr=False)
+    #: Custom item role names
+    _role_names: ClassVar[Dict[int, QByteArray]] = {
+        SearchResultRole.CHANNEL: QByteArray(b"channel"),
+        SearchResultRole.CHANNEL_TYPE: QByteArray(b"channelType"),
+        SearchResultRole.ROW: QByteArray(b"row"),
+        SearchResultRole.TIME: QByteArray(b"time"),
+        SearchResultRole.SENDER: QByteArray(b"sender"),
+        SearchResultRole.CONTENTS: QByteArray(b"contents"),
+    }
+    #: Signal emitted when the query changes
+    query_changed: ClassVar[pyqtSignal] = pyqtSignal(str)
+
+    def __post_init__(self) -> None:
+        super().__init__()
+
+    @pyqtProperty(str, notify=query_changed)  # type: ignore
+    def query(self) -> str:
+        """The current search query"""
+        return self._query
+
+    @query.setter  # type: ignore
+    def query(self, query: str) -> None:
+        """Set the search query and update the results
+
+        :param query: New search query
+        """
+        if query != self._query:
+            self._query = query
+            self.refresh()
+            self.query_changed.emit(query)
+
+    def refresh(self) -> None:
+        """Run the current query again"""
+        self.beginResetModel()
+        self._results = self._index.search(self._query, self.limit)
+        self.endResetModel()
+
+    def document_added(self, document_id: int) -> None:
+        """Insert the new document with the given *document_id* as the first
+        result if it matches the query"""
+        if not self._query or not self._index.matches(document_id,
+                                                      self._query):
+            return
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self._results.insert(0, document_id)  # pylint: disable=no-member
+        self.endInsertRows()
+        if len(self._results) > self.limit:
+            self.beginRemoveRows(QModelIndex(), self.limit,
+                                 len(self._results) - 1)
+            del self._results[self.limit:]
+            self.endRemoveRows()
+
+    # pylint: disable=invalid-name,unused-argument
+    def rowCount(self, parent: Optional[QModelIndex] = None) -> int:
+        """Returns the number of rows in the model
+
+        :param parent: Unused since this not a hierarchical model
+        :return: The number of rows in the model
+        """
+        return len(self._results)
+
+    def roleNames(self) -> Dict[int, QByteArray]:
+        """Returns the mapping between the custom item roles and their names
+
+        :return: Mapping between the custom item roles and their names
+        """
+        return self._role_names
+
+    # pylint: enable=invalid-name,unused-argument
+
+    # pylint: disable=too-many-return-statements
+    def data(self, index: QModelIndex, role: Optional[int] = None) -> Any:
+        """Return the data at the row of the given *index* and for the
+        specified *role*
+
+        :param index: Used for specifying the model's row, the column is \
+        ignored
+        :param role: Indicates which type of data the view requested
+        :return: The data the view requested at the specified *row* for the \
+        given *role*
+        """
+        document = None
+        if 0 <= index.row() < len(self._results):
+            # pylint: disable=unsubscriptable-object
+            document = self._index.document(self._results[index.row()])
+            # pylint: enable=unsubscriptable-object
+        if document is not None:
+            if role == SearchResultRole.CHANNEL:
+                return document.channel_name
+            if role == SearchResultRole.CHANNEL_TYPE:
+                return document.channel_type
+            if role == SearchResultRole.ROW:
+                return self._message_row(document)
+            if role == SearchResultRole.TIME:
+                return QDateTime(document.message.time)
+            if role == SearchResultRole.SENDER:
+                return document.message.sender
+            if role == SearchResultRole.CONTENTS:
+                return document.message.contents
+        return None
+
+    # pylint: enable=too-many-return-statements
+
+    def _message_row(self, document: SearchDocument) -> int:
+        """Find the row of the message of the *document* in its
+        conversation, after adding it to the conversation if it's still
+        buffered"""
+        row = document.conversation.message_row(document.message)
+        if row < 0 and self.flush_conversation is not None:
+            self.flush_conversation(document.conversation)
+            row = document.conversation.message_row(document.message)
+        return row
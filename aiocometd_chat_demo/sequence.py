@@ -0,0 +1,156 @@
+"""Tracking of the sequence numbers of the messages of a channel"""
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Tuple, Set, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:  # pragma: no cover
+    from aiocometd.typing import JsonObject
+
+
+def message_sequence(message: "JsonObject") -> Optional[int]:
+    """Get the sequence number assigned to the *message* by the server
+
+    :param message: A message received from the server
+    :return: The ``seq`` field of the message's ``ext`` object, or ``None`` \
+    if the message doesn't have one
+    """
+    ext = message.get("ext")
+    if not isinstance(ext, dict):
+        return None
+    sequence = ext.get("seq")
+    if not isinstance(sequence, int) or isinstance(sequence, bool):
+        return None
+    return sequence
+
+
+class SequenceTracker:
+    """Detects the duplicate and the missing messages of a channel by their
+    sequence numbers
+
+    The server numbers the messages of the channel consecutively. The
+    tracker remembers the sequence numbers of the last *capacity* received
+    messages in the order of their arrival, so a message received again, for
+    example after a reconnect or from a backlog fetch, is recognized as a
+    duplicate. A sequence number
+    skipped by a message marks the skipped numbers as missing, and they stay
+    missing until their messages arrive or they fall out of the window of the
+    last *capacity* sequence numbers.
+    """
+
+    def __init__(self, capacity: int = 1000) -> None:
+        """
+        :param capacity: The number of recent sequence numbers remembered
+        """
+        self.capacity = capacity
+        #: The recently received sequence numbers in the order of arrival
+        self._recent: Dict[int, None] = OrderedDict()
+        #: The missing sequence numbers
+        self._missing: Set[int] = set()
+        #: The missing sequence numbers in increasing order, which might
+        #: still contain the numbers whose messages arrived since then
+        self._missing_order: Deque[int] = deque()
+        #: The greatest received sequence number
+        self._last: Optional[int] = None
+
+    def __contains__(self, sequence: object) -> bool:
+        """Check whether the message with the given *sequence* number is
+        among the recently received messages"""
+        return sequence in self._recent
+
+    @property
+    def last(self) -> Optional[int]:
+        """The greatest received sequence number"""
+        return self._last
+
+    @property
+    def recent(self) -> List[int]:
+        """The recently received sequence numbers in the order of
+        arrival"""
+        return list(self._recent)
+
+    @property
+    def missing(self) -> List[int]:
+        """The missing sequence numbers in increasing order"""
+        return sorted(self._missing)
+
+    def missing_ranges(self, ranges: List[Tuple[int, int]]) \
+            -> List[Tuple[int, int]]:
+        """Get the parts of the *ranges* whose sequence numbers are still
+        missing
+
+        :param ranges: Inclusive (first, last) pairs of sequence numbers
+        :return: The consecutive runs of missing sequence numbers inside \
+        the *ranges* as inclusive (first, last) pairs
+        """
+        result: List[Tuple[int, int]] = []
+        for first, last in ranges:
+            start = None
+            for sequence in range(first, last + 2):
+                if sequence <= last and sequence in self._missing:
+                    if start is None:
+                        start = sequence
+                elif start is not None:
+                    result.append((start, sequence - 1))
+                    start = None
+        return result
+
+    def is_duplicate(self, sequence: int) -> bool:
+        """Check whether the message with the given *sequence* number was
+        already received
+
+        Messages older than the window of the remembered sequence numbers
+        are considered to be duplicates too.
+        """
+        if sequence in self._recent:
+            return True
+        return (self._last is not None and
+                sequence <= self._last - self.capacity and
+                sequence not in self._missing)
+
+    def add(self, sequence: int) -> List[Tuple[int, int]]:
+        """Record the arrival of the message with the given *sequence*
+        number
+
+        :param sequence: The sequence number of a message which is not a \
+        duplicate
+        :return: The newly detected ranges of missing sequence numbers as \
+        inclusive (first, last) pairs
+        """
+        self._recent[sequence] = None
+        if len(self._recent) > self.capacity:
+            self._recent.popitem(last=False)  # type: ignore
+        self._missing.discard(sequence)
+
+        gaps = []
+        if self._last is not None and sequence > self._last + 1:
+            # only the numbers inside the window can be tracked
+            first = max(self._last + 1, sequence - self.capacity)
+            gaps.append((first, sequence - 1))
+            self._missing.update(range(first, sequence))
+            # the new numbers are greater than all the earlier ones
+            self._missing_order.extend(range(first, sequence))
+        if self._last is None or sequence > self._last:
+            self._last = sequence
+            self._expire_missing()
+        return gaps
+
+    def remember(self, sequence: int) -> None:
+        """Record the *sequence* number of a message which arrived outside
+        of the channel, like from the history or from a snapshot, so it's
+        recognized as a duplicate if it arrives again
+
+        Unlike :obj:`add`, it doesn't look for gaps, and it doesn't change
+        the greatest received sequence number.
+        :param sequence: The sequence number of a message
+        """
+        self._recent[sequence] = None
+        if len(self._recent) > self.capacity:
+            self._recent.popitem(last=False)  # type: ignore
+        self._missing.discard(sequence)
+
+    def _expire_missing(self) -> None:
+        """Forget the missing sequence numbers which are out of the
+        window"""
+        assert self._last is not None
+        start = self._last - self.capacity
+        while self._missing_order and self._missing_order[0] <= start:
+            self._missing.discard(self._missing_order.popleft())
@@ -0,0 +1,167 @@
+"""Snapshots of the chat rooms for warm starts"""
+import json
+import logging
+import os
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional, List, Sequence
+
+from aiocometd_chat_demo.channels import ChannelsModel, ChannelType
+from aiocometd_chat_demo.conversation import ChatMessage
+
+
+LOGGER = logging.getLogger(__name__)
+#: The first bytes of the snapshot files
+SNAPSHOT_MAGIC = b"CHATSNAP"
+#: Version of the snapshot file format
+SNAPSHOT_VERSION = 1
+
+
+@dataclass()
+class ConversationSnapshot:
+    """The most recent messages of a conversation"""
+    #: The name of the conversation's channel
+    channel_name: str
+    #: The type of the conversation's channel
+    channel_type: ChannelType
+    #: The most recent messages in chronological order
+    messages: List[ChatMessage] = field(default_factory=list)
+
+
+@dataclass()
+class RoomSnapshot:
+    """The members and the conversations of a chat room"""
+    #: Name of the chat room
+    name: str
+    #: The names of the other members of the chat room
+    members: List[str] = field(default_factory=list)
+    #: The conversations of the chat room which have messages
+    conversations: List[ConversationSnapshot] = field(default_factory=list)
+    #: The sequence numbers of the recently received messages of the chat
+    #: room, which are recognized as duplicates after the restore
+    sequences: List[int] = field(default_factory=list)
+
+    @classmethod
+    def from_model(cls, name: str, model: ChannelsModel, tail_size: int,
+                   sequences: Sequence[int] = ()) -> "RoomSnapshot":
+        """Take a snapshot of the chat room whose channels are managed by
+        the *model*
+
+        :param name: Name of the chat room
+        :param model: The channels model of the chat room
+        :param tail_size: The maximum number of messages saved from every \
+        conversation
+        :param sequences: The sequence numbers of the recently received \
+        messages of the chat room
+        :return: The snapshot of the chat room
+        """
+        snapshot = cls(name=name, sequences=list(sequences))
+        for channel in [model.group_channel] + model.user_channels:
+            if channel.type == ChannelType.USER:
+                snapshot.members.append(channel.name)
+            messages = channel.conversation.tail(tail_size)
+            if messages:
+                snapshot.conversations.append(ConversationSnapshot(
+                    channel_name=channel.name,
+                    channel_type=channel.type,
+                    messages=messages
+                ))
+        return snapshot
+
+
+@dataclass()
+class Snapshot:
+    """The state of a chat service saved for a warm start"""
+    #: Username of the member whose chat rooms were saved
+    username: str
+    #: Url of the chat service
+    url: str
+    #: The joined chat rooms in the order of joining
+    rooms: List[RoomSnapshot] = field(default_factory=list)
+
+
+def _encode(snapshot: Snapshot) -> bytes:
+    """Serialize the *snapshot* into the compressed binary format"""
+    document = {
+        "username": snapshot.username,
+        "url": snapshot.url,
+        "rooms": [{
+            "name": room.name,
+            "members": room.members,
+            "conversations": [{
+                "name": conversation.channel_name,
+                "type": conversation.channel_type.value,
+                # the messages are stored as compact arrays
+                "messages": [[message.time.timestamp(), message.sender,
+                              message.contents]
+                             for message in conversation.messages]
+            } for conversation in room.conversations],
+            "sequences": room.sequences
+        } for room in snapshot.rooms]
+    }
+    text = json.dumps(document, separators=(",", ":"))
+    return (SNAPSHOT_MAGIC + bytes([SNAPSHOT_VERSION]) +
+            zlib.compress(text.encode("utf-8")))
+
+
+def _decode(data: bytes) -> Snapshot:
+    """Deserialize a snapshot from the compressed binary format
+
+    :raise ValueError: If the *data* is not a valid snapshot
+    """
+    header = SNAPSHOT_MAGIC + bytes([SNAPSHOT_VERSION])
+    if not data.startswith(header):
+        raise ValueError("Unknown snapshot format.")
+    try:
+        document = json.loads(zlib.decompress(data[len(header):]))
+        return Snapshot(username=document["username"],
+                        url=document["url"], rooms=[
+            RoomSnapshot(
+                name=room["name"],
+                members=list(room["members"]),
+                conversations=[ConversationSnapshot(
+                    channel_name=conversation["name"],
+                    channel_type=ChannelType(conversation["type"]),
+                    messages=[ChatMessage(
+                        time=datetime.fromtimestamp(timestamp),
+                        sender=sender,
+                        contents=contents
+                    ) for timestamp, sender, contents
+                              in conversation["messages"]]
+                ) for conversation in room["conversations"]],
+                # the snapshots saved before the sequence numbers were
+                # added don't have them
+                sequences=list(room.get("sequences", []))
+            ) for room in document["rooms"]
+        ])
+    except (zlib.error, KeyError, TypeError) as error:
+        raise ValueError(f"Invalid snapshot: {error!r}") from error
+
+
+def save_snapshot(snapshot: Snapshot, path: str) -> None:
+    """Save the *snapshot* to the file at *path*
+
+    The snapshot is written to a temporary file first, which then replaces
+    the file, so the previous snapshot survives a crash during the write.
+    """
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(_encode(snapshot))
+    os.replace(temporary_path, path)
+
+
+def load_snapshot(path: str) -> Optional[Snapshot]:
+    """Load the snapshot saved to the file at *path*
+
+    :return: The loaded snapshot, or ``None`` if the file doesn't exist or \
+    it's not a valid snapshot
+    """
+    try:
+        with open(path, "rb") as file:
+            return _decode(file.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as error:
+        LOGGER.warning("Failed to load the snapshot %s: %s", path, error)
+        return None
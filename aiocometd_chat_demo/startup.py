@@ -0,0 +1,67 @@
+"""Startup time profiling"""
+import logging
+import time
+from typing import List, Tuple, Callable, Optional, Any
+
+
+LOGGER = logging.getLogger(__name__)
+#: Time when the module was imported, the entry point imports it before the
+#: rest of the application's dependencies
+IMPORT_TIME = time.perf_counter()
+
+
+class StartupProfiler:
+    """Measures the duration of the consecutive phases of the startup
+
+    Every phase starts when the previous one ends, so the phases cover the
+    whole startup without gaps.
+    """
+
+    def __init__(self, start: Optional[float] = None,
+                 clock: Callable[[], float] = time.perf_counter) -> None:
+        """
+        :param start: The start time of the first phase, or ``None`` to \
+        start it now
+        :param clock: Function returning the current time in seconds
+        """
+        self._clock = clock
+        #: The start time of the first phase
+        self.start = clock() if start is None else start
+        #: The end time of the last phase
+        self._last = self.start
+        #: The names and the durations in seconds of the finished phases
+        self.phases: List[Tuple[str, float]] = []
+
+    @property
+    def total(self) -> float:
+        """The total duration of the finished phases in seconds"""
+        return self._last - self.start
+
+    def mark(self, name: str) -> None:
+        """Finish the phase called *name*
+
+        :param name: The name of the phase
+        """
+        now = self._clock()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def report(self) -> str:
+        """Get the breakdown of the startup time by phases"""
+        lines = ["Startup time:"]
+        for name, duration in self.phases + [("total", self.total)]:
+            lines.append(f"  {name:<16}{duration * 1000:10.1f} ms")
+        return "\n".join(lines)
+
+    def report_first_frame(self, window: Any) -> None:
+        """Finish the ``first_frame`` phase and log the report when the
+        *window* displays its first frame
+
+        :param window: The main window of the application
+        """
+        def on_frame_swapped() -> None:
+            window.frameSwapped.disconnect(on_frame_swapped)
+            self.mark("first_frame")
+            LOGGER.info(self.report())
+
+        window.frameSwapped.connect(on_frame_swapped)
@@ -0,0 +1,76 @@
+"""Selection and tuning of the transports of the CometD clients
+
+aiocometd handshakes with the long-polling transport, then it switches to the
+websocket transport if both the client and the server support it. The
+:obj:`TransportOptions` restrict the transports the client may use, and tune
+the websocket connections, which aiocometd creates with the fixed defaults
+of aiohttp otherwise.
+"""
+from dataclasses import dataclass
+from enum import Enum, unique
+from typing import List
+
+
+#: The maximum size of a received websocket message in bytes, the same as
+#: the default of aiohttp
+DEFAULT_MAX_MESSAGE_SIZE = 4 * 1024 * 1024
+#: The window size of the websocket compression as a power of two, the
+#: largest window supported by the permessage-deflate extension
+COMPRESSION_WINDOW_BITS = 15
+
+
+@unique
+class TransportType(str, Enum):
+    """The transports of the CometD clients
+
+    The values are the same as the connection types of the Bayeux protocol.
+    """
+    #: Use the websocket transport if the server supports it, otherwise the
+    #: long-polling transport
+    AUTO = "auto"
+    #: Use only the websocket transport
+    WEBSOCKET = "websocket"
+    #: Use only the long-polling transport
+    LONG_POLLING = "long-polling"
+
+
+@dataclass(frozen=True)
+class TransportOptions:
+    """The transport selection and tuning options of a CometD client"""
+    #: The transport used by the client
+    transport_type: TransportType = TransportType.AUTO
+    #: The maximum time of the handshake and the first connect request in
+    #: seconds
+    connect_timeout: float = 10.0
+    #: The time in seconds while the client keeps trying to restore a lost
+    #: connection before it gives up
+    connection_timeout: float = 10.0
+    #: The maximum size of a received websocket message in bytes, or ``0``
+    #: for no limit
+    max_message_size: int = DEFAULT_MAX_MESSAGE_SIZE
+    #: Whether the websocket messages are compressed, if the server
+    #: supports compression. The long-polling responses are compressed
+    #: by the servers regardless of this option.
+    compression: bool = False
+    #: Whether the client connects with the long-polling transport if it
+    #: fails to connect with the websocket transport
+    websocket_fallback: bool = True
+
+    @property
+    def transport_types(self) -> List[TransportType]:
+        """The transports the client may use in the order of preference"""
+        if self.transport_type == TransportType.AUTO:
+            return [TransportType.WEBSOCKET, TransportType.LONG_POLLING]
+        return [self.transport_type]
+
+    @property
+    def compression_window_bits(self) -> int:
+        """The window size of the websocket compression as a power of two,
+        or ``0`` if the messages aren't compressed"""
+        return COMPRESSION_WINDOW_BITS if self.compression else 0
+
+    def can_fall_back(self, transport_types: List[TransportType]) -> bool:
+        """Whether a client which failed to connect with the given
+        *transport_types* can try again with the long-polling transport"""
+        return (self.websocket_fallback and
+                transport_types != [TransportType.LONG_POLLING])
@@ -0,0 +1,6 @@
+"""Performance benchmarks of the chat client
+
+The benchmarks are not part of the unit tests, run them with::
+
+    $ python -m benchmarks
+"""
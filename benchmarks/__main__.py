@@ -0,0 +1,103 @@
+"""Run the benchmarks and compare the results with the baseline"""
+import argparse
+import importlib
+import json
+import os.path
+import pkgutil
+import sys
+from typing import Optional, Iterable
+
+import benchmarks
+from benchmarks import harness
+
+
+#: Path of the stored baseline results
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "baseline.json")
+
+
+def load_benchmarks() -> None:
+    """Import every ``bench_*`` module of the package to register their
+    benchmarks"""
+    for module in pkgutil.iter_modules(benchmarks.__path__):
+        if module.name.startswith("bench_"):
+            importlib.import_module(f"benchmarks.{module.name}")
+
+
+def report(name: str, result: harness.Result) -> None:
+    """Print the result of a benchmark"""
+    print(f"{name:<60} {harness.format_time(result.best):>10} "
+          f"(median {harness.format_time(result.median)})", flush=True)
+
+
+def main(args: Optional[Iterable[str]] = None) -> int:
+    """Run the selected benchmarks
+
+    :return: Exit status, non-zero if a regression was found
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Run the benchmarks and compare the results with the "
+                    "baseline"
+    )
+    parser.add_argument("patterns", nargs="*",
+                        help="shell-style patterns of the benchmark names "
+                             "to run (default: all)")
+    parser.add_argument("--output", "-o",
+                        help="save the results as JSON to this path")
+    parser.add_argument("--baseline", default=BASELINE_PATH,
+                        help="path of the baseline results")
+    parser.add_argument("--threshold", type=float,
+                        default=harness.DEFAULT_THRESHOLD,
+                        help="allowed slowdown ratio compared to the "
+                             "baseline (default: %(default)s)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store the results as the new baseline instead "
+                             "of comparing them")
+    parser.add_argument("--list", action="store_true",
+                        help="list the benchmarks without running them")
+    options = parser.parse_args(None if args is None else list(args))
+
+    load_benchmarks()
+    names = harness.select(options.patterns)
+    if options.list:
+        print("\n".join(names))
+        return 0
+
+    results = harness.run(names, report)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+
+    if options.save_baseline:
+        baseline = {}
+        if os.path.exists(options.baseline):
+            with open(options.baseline, encoding="utf-8") as file:
+                baseline = json.load(file)
+        # keep the results and thresholds of benchmarks that weren't run
+        baseline.update({key: value for key, value in results.items()
+                         if key != "benchmarks"})
+        baseline.setdefault("benchmarks", {}).update(results["benchmarks"])
+        with open(options.baseline, "w", encoding="utf-8") as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+            file.write("\n")
+        return 0
+
+    if not os.path.exists(options.baseline):
+        print(f"No baseline found at {options.baseline}")
+        return 0
+    with open(options.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    regressions = 0
+    print()
+    for comparison in harness.compare(results, baseline, options.threshold):
+        status = "REGRESSION" if comparison.is_regression else "ok"
+        regressions += comparison.is_regression
+        print(f"{comparison.name:<60} {comparison.ratio:>6.2f}x "
+              f"(threshold {1 + comparison.threshold:.2f}x) {status}")
+    print(f"\n{regressions} regression(s) found")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
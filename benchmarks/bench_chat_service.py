@@ -0,0 +1,62 @@
+"""Benchmarks of the chat service"""
+from functools import partial
+from typing import Callable, Any
+
+from aiocometd_chat_demo.chat_service import ChatService
+
+from benchmarks.harness import benchmark
+from benchmarks.bench_models import member_names
+
+
+#: Number of members in the chat room
+MEMBER_COUNT = 1_000
+#: Number of joined chat rooms
+ROOM_COUNTS = (1, 100)
+
+
+def create_service(room_count: int) -> ChatService:
+    """Create a chat service with *room_count* joined rooms, and with a
+    populated channels model in the default room"""
+    service = ChatService()
+    service.username = "me"
+    for index in range(1, room_count):
+        service.join_room(f"room{index}")
+    room = service.join_room(service._room_name)
+    service.channels_model = room.channels_model
+    service.channels_model.update_available_channels(
+        member_names(MEMBER_COUNT)
+    )
+    return service
+
+
+def message_received(message_type: str, room_count: int) \
+        -> Callable[[], Any]:
+    """Dispatch incoming messages of the given type"""
+    service = create_service(room_count)
+    peer = sorted(member_names(MEMBER_COUNT))[MEMBER_COUNT // 2]
+    if message_type == "group":
+        message = {
+            "channel": service._room_channel,
+            "data": {"user": peer, "chat": "message"}
+        }
+    elif message_type == "private":
+        message = {
+            "channel": service._room_channel,
+            "data": {"user": peer, "chat": "message", "scope": "private"}
+        }
+    else:
+        message = {
+            "channel": service._members_channel,
+            "data": sorted(member_names(MEMBER_COUNT)) + ["me"]
+        }
+    return partial(service.message_received, message)
+
+
+for _message_type in ("group", "private", "members"):
+    benchmark(f"chat_service.message_received[{_message_type}]")(
+        partial(message_received, _message_type, 1)
+    )
+for _room_count in ROOM_COUNTS[1:]:
+    benchmark(f"chat_service.message_received[group,{_room_count} rooms]")(
+        partial(message_received, "group", _room_count)
+    )
@@ -0,0 +1,106 @@
+"""Benchmarks of the delivery of the incoming messages across the signal
+boundary of the CometD client
+
+The :obj:`~aiocometd_chat_demo.cometd.CometdClient.message_received` signal
+is compared with signals of the same message declared with a ``dict`` and a
+``QVariantMap`` argument, on the large ``/members/<room>`` messages that
+carry the full member list of a room.
+"""
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Any
+
+# pylint: disable=no-name-in-module
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot  # type: ignore
+# pylint: enable=no-name-in-module
+
+from aiocometd_chat_demo.cometd import CometdClient, JsonObject
+
+from benchmarks.harness import benchmark
+from benchmarks.bench_models import member_names
+
+
+#: Number of members in the delivered member lists
+MEMBER_COUNTS = (1_000, 10_000)
+
+
+# pylint: disable=too-few-public-methods
+class _ReferenceSignals(QObject):  # type: ignore
+    """Signals declared with the argument types which are compared with the
+    signal of the client"""
+    #: A signal with a dict argument
+    dict_signal = pyqtSignal(dict)
+    #: A signal with a QVariantMap argument, which converts the message
+    variant_signal = pyqtSignal("QVariantMap")
+
+
+class _Receiver(QObject):  # type: ignore
+    """Receives the messages with slots matching the signals' types"""
+    message: JsonObject = {}
+
+    @pyqtSlot(object)
+    def on_object(self, message: JsonObject) -> None:
+        """Receive a message passed as a Python object"""
+        self.message = message
+
+    @pyqtSlot(dict)
+    def on_dict(self, message: JsonObject) -> None:
+        """Receive a message passed as a dict"""
+        self.message = message
+
+    @pyqtSlot("QVariantMap")
+    def on_variant(self, message: JsonObject) -> None:
+        """Receive a message passed as a QVariantMap"""
+        self.message = message
+
+# pylint: enable=too-few-public-methods
+
+
+@dataclass()
+class _Delivery:
+    """Delivers a message with a signal of an emitter connected to a
+    receiver, and keeps both of them alive, since the bound signal and the
+    connection don't"""
+    #: The object of the signal
+    emitter: QObject
+    #: The object of the connected slot
+    receiver: QObject
+    #: The emitted signal
+    signal: Any
+    #: The delivered message
+    message: JsonObject
+
+    def __call__(self) -> None:
+        self.signal.emit(self.message)
+
+
+def members_message(member_count: int) -> JsonObject:
+    """Create a ``/members/<room>`` message with *member_count* members"""
+    return {"channel": "/members/demo",
+            "data": sorted(member_names(member_count))}
+
+
+def emit_message(signal_type: str, member_count: int) -> Callable[[], Any]:
+    """Deliver a members message with a signal of the given type"""
+    if signal_type == "object":
+        emitter = CometdClient("url", [])
+        receiver = _Receiver(emitter)
+        signal = emitter.message_received
+        signal.connect(receiver.on_object)
+    else:
+        emitter = _ReferenceSignals()
+        receiver = _Receiver(emitter)
+        if signal_type == "dict":
+            signal = emitter.dict_signal
+            signal.connect(receiver.on_dict)
+        else:
+            signal = emitter.variant_signal
+            signal.connect(receiver.on_variant)
+    return _Delivery(emitter, receiver, signal, members_message(member_count))
+
+
+for _member_count in MEMBER_COUNTS:
+    for _signal_type in ("object", "dict", "qvariantmap"):
+        benchmark(f"cometd.message_received[{_signal_type},{_member_count}]")(
+            partial(emit_message, _signal_type, _member_count)
+        )
@@ -0,0 +1,74 @@
+"""Benchmarks of the JSON codecs with the payloads of the chat messages"""
+from functools import partial
+from typing import Callable, Any, Dict, List
+
+from aiocometd_chat_demo.json_codec import available_codecs
+
+from benchmarks.harness import benchmark
+
+
+#: The contents of the benchmarked chat messages by their names
+CONTENTS = {
+    "short": "Hello!",
+    "long": "Lorem ipsum dolor sit amet, ünïcödé ✓ " * 25,
+}
+#: Number of messages in a batched payload
+BATCH_SIZE = 20
+
+
+def publish_payload(scope: str, contents: str) -> List[Dict[str, Any]]:
+    """Create the payload of a message published by
+    ``ChatService.send_message`` in the given *scope*"""
+    if scope == "group":
+        channel = "/chat/demo"
+        data = {"user": "member000042", "chat": contents}
+    else:
+        channel = "/service/privatechat"
+        data = {"room": "/chat/demo", "user": "member000042",
+                "chat": contents, "peer": "member000043"}
+    return [{"channel": channel, "data": data, "id": "42",
+             "clientId": "31s1ciig5tfavemq2zdmsepmw8"}]
+
+
+def delivery_payload(contents: str) -> List[Dict[str, Any]]:
+    """Create the payload of a batch of chat messages delivered to the
+    clients by the server"""
+    return [{"channel": "/chat/demo",
+             "data": {"user": f"member{index:06d}", "chat": contents,
+                      "scope": "private" if index % 5 == 0 else "group"},
+             "ext": {"seq": index}}
+            for index in range(BATCH_SIZE)]
+
+
+#: The benchmarked payloads by their names
+PAYLOADS = {
+    f"{shape},{length}": factory(contents)
+    for length, contents in CONTENTS.items()
+    for shape, factory in (
+        ("group", partial(publish_payload, "group")),
+        ("private", partial(publish_payload, "private")),
+        ("delivery", delivery_payload),
+    )
+}
+
+
+def codec_dumps(dumps: Callable[[Any], str], payload: Any) \
+        -> Callable[[], Any]:
+    """Serialize the *payload*"""
+    return partial(dumps, payload)
+
+
+def codec_loads(loads: Callable[[str], Any], dumps: Callable[[Any], str],
+                payload: Any) -> Callable[[], Any]:
+    """Deserialize the serialized *payload*"""
+    return partial(loads, dumps(payload))
+
+
+for _name, _codec in available_codecs().items():
+    for _payload_name, _payload in PAYLOADS.items():
+        benchmark(f"json_codec.dumps[{_name},{_payload_name}]")(
+            partial(codec_dumps, _codec.dumps, _payload)
+        )
+        benchmark(f"json_codec.loads[{_name},{_payload_name}]")(
+            partial(codec_loads, _codec.loads, _codec.dumps, _payload)
+        )
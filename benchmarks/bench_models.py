@@ -0,0 +1,175 @@
+"""Benchmarks of the conversation and channels models"""
+from datetime import datetime
+from functools import partial
+from itertools import cycle, count
+from typing import Callable, Any, Set
+
+from PyQt5.QtCore import QModelIndex  # type: ignore
+
+from aiocometd_chat_demo.conversation import ConversationModel, ChatMessage, \
+    ItemRole
+from aiocometd_chat_demo.channels import ChannelsModel, ChannelType, \
+    ChannelOrder
+from aiocometd_chat_demo.channels_filter import ChannelsFilterModel
+
+from benchmarks.harness import benchmark
+
+
+#: Number of messages in the benchmarked conversations
+CONVERSATION_SIZES = (100, 10_000, 100_000)
+#: Number of members in the benchmarked channels models
+MEMBER_COUNTS = (1_000, 10_000, 100_000)
+#: The ratio of members replaced by a single members update
+CHURN_RATIOS = (0.001, 0.01, 0.1)
+#: Number of messages appended to a benchmarked conversation before it's
+#: trimmed back to its original size
+TRIM_INTERVAL = 100
+
+
+def create_message(index: int) -> ChatMessage:
+    """Create a chat message"""
+    return ChatMessage(time=datetime.now(), sender=f"user{index % 100}",
+                       contents=f"message {index}")
+
+
+def create_conversation(size: int) -> ConversationModel:
+    """Create a conversation model with *size* messages"""
+    model = ConversationModel("channel")
+    model.add_messages([create_message(index) for index in range(size)])
+    return model
+
+
+def trim_conversation(model: ConversationModel, size: int) -> None:
+    """Remove the messages of the *model* after its first *size* messages"""
+    model.beginRemoveRows(QModelIndex(), size, model.rowCount() - 1)
+    del model._messages[size:]
+    del model._times[size:]
+    model.endRemoveRows()
+
+
+def member_names(count: int, offset: int = 0) -> Set[str]:
+    """Create a set of *count* unique member names"""
+    return {f"member{index:06d}" for index in range(offset, offset + count)}
+
+
+def create_channels_model(member_count: int) -> ChannelsModel:
+    """Create a channels model with *member_count* user channels"""
+    model = ChannelsModel("group")
+    model.update_available_channels(member_names(member_count))
+    return model
+
+
+def conversation_add_incoming_message(size: int) -> Callable[[], Any]:
+    """Append messages to a conversation of the given *size*
+
+    The appended messages are removed after every :obj:`TRIM_INTERVAL`
+    messages, so the size of the conversation stays close to *size*.
+    """
+    model = create_conversation(size)
+    message = create_message(0)
+    appended = count(1)
+
+    def add_incoming_message() -> None:
+        model.add_incoming_message(message)
+        if next(appended) % TRIM_INTERVAL == 0:
+            trim_conversation(model, size)
+
+    return add_incoming_message
+
+
+def conversation_data(size: int, role: ItemRole) -> Callable[[], Any]:
+    """Query the *role* of a message in a conversation of the given *size*"""
+    model = create_conversation(size)
+    index = model.index(model.rowCount() // 2, 0)
+    return partial(model.data, index, role)
+
+
+def channels_update(member_count: int, churn: float) -> Callable[[], Any]:
+    """Replace the *churn* ratio of *member_count* members"""
+    model = create_channels_model(member_count)
+    changed = max(int(member_count * churn), 1)
+    # alternate between two sets of members which differ in *changed* names
+    current = member_names(member_count)
+    churned = member_names(member_count - changed) | \
+        member_names(changed, offset=member_count)
+    updates = cycle((churned, current))
+    return lambda: model.update_available_channels(next(updates))
+
+
+def channels_index(member_count: int) -> Callable[[], Any]:
+    """Look up user channels by name among *member_count* channels"""
+    model = create_channels_model(member_count)
+    names = cycle(sorted(member_names(member_count))[::97])
+    return lambda: model._channel_index(next(names))
+
+
+def channels_add_incoming_message(member_count: int,
+                                  channel_type: ChannelType) \
+        -> Callable[[], Any]:
+    """Route messages to channels of the given type among *member_count*
+    channels"""
+    model = create_channels_model(member_count)
+    message = create_message(0)
+    if channel_type == ChannelType.GROUP:
+        names = cycle(["group"])
+    else:
+        names = cycle(sorted(member_names(member_count))[::97])
+    return lambda: model.add_incoming_message(next(names), channel_type,
+                                              message)
+
+
+def channels_add_incoming_message_by_activity(member_count: int) \
+        -> Callable[[], Any]:
+    """Route messages to user channels among *member_count* channels in
+    activity order, moving the channel of every message to the top"""
+    model = create_channels_model(member_count)
+    model.order = ChannelOrder.ACTIVITY.value
+    message = create_message(0)
+    active_names = sorted(member_names(member_count))[::97]
+    # bring the active channels to the top like a long running session would
+    for name in active_names:
+        model.add_incoming_message(name, ChannelType.USER, message)
+    names = cycle(active_names)
+    return lambda: model.add_incoming_message(next(names), ChannelType.USER,
+                                              message)
+
+
+def channels_filter(member_count: int) -> Callable[[], Any]:
+    """Alternate the filter text of a filter model of *member_count*
+    channels, like when typing and deleting the last character"""
+    model = ChannelsFilterModel()
+    model.source_model = create_channels_model(member_count)
+    filters = cycle(("member0001", "member00012"))
+
+    def set_filter() -> None:
+        model.filter = next(filters)
+    return set_filter
+
+
+for _size in CONVERSATION_SIZES:
+    benchmark(f"conversation.add_incoming_message[{_size}]")(
+        partial(conversation_add_incoming_message, _size)
+    )
+    for _role in ItemRole:
+        benchmark(f"conversation.data[{_role.name.lower()},{_size}]")(
+            partial(conversation_data, _size, _role)
+        )
+
+for _count in MEMBER_COUNTS:
+    for _churn in CHURN_RATIOS:
+        benchmark(f"channels.update_available_channels[{_count},{_churn}]")(
+            partial(channels_update, _count, _churn)
+        )
+    benchmark(f"channels._channel_index[{_count}]")(
+        partial(channels_index, _count)
+    )
+    benchmark(f"channels_filter.filter[{_count}]")(
+        partial(channels_filter, _count)
+    )
+    for _type in ChannelType:
+        benchmark(f"channels.add_incoming_message[{_type.value},{_count}]")(
+            partial(channels_add_incoming_message, _count, _type)
+        )
+    benchmark(f"channels.add_incoming_message[activity,{_count}]")(
+        partial(channels_add_incoming_message_by_activity, _count)
+    )
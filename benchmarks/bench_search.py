@@ -0,0 +1,59 @@
+"""Benchmarks of the full-text search index"""
+import random
+from functools import partial
+from typing import Callable, Any
+
+from aiocometd_chat_demo.conversation import ConversationModel
+from aiocometd_chat_demo.search import SearchIndex
+
+from benchmarks.harness import benchmark
+from benchmarks.bench_models import create_message
+
+
+#: Number of indexed messages
+INDEX_SIZES = (10_000, 100_000)
+#: Benchmarked queries
+QUERIES = {
+    "word": "lorem",
+    "prefix": "lo",
+    "terms": "lorem ips dolor",
+}
+#: Words of the indexed messages
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do "
+         "eiusmod tempor incididunt ut labore et dolore magna aliqua "
+         "loremipsum lorentz lost long").split()
+
+
+def create_index(size: int) -> SearchIndex:
+    """Create an index of *size* messages with random words"""
+    rand = random.Random(0)
+    index = SearchIndex()
+    conversation = ConversationModel("channel")
+    for number in range(size):
+        message = create_message(number)._replace(
+            contents=" ".join(rand.choices(WORDS, k=8))
+        )
+        index.add("channel", "group", conversation, message)
+    return index
+
+
+def search(size: int, query: str) -> Callable[[], Any]:
+    """Search among *size* messages with the *query*"""
+    index = create_index(size)
+    return partial(index.search, query, 100)
+
+
+def add(size: int) -> Callable[[], Any]:
+    """Add messages to an index of the given *size*"""
+    index = create_index(size)
+    conversation = ConversationModel("channel")
+    message = create_message(0)._replace(contents=" ".join(WORDS[:8]))
+    return partial(index.add, "channel", "group", conversation, message)
+
+
+for _size in INDEX_SIZES:
+    benchmark(f"search.add[{_size}]")(partial(add, _size))
+    for _name, _query in QUERIES.items():
+        benchmark(f"search.search[{_name},{_size}]")(
+            partial(search, _size, _query)
+        )
@@ -0,0 +1,131 @@
+"""Benchmarks of the CometD transports against the in-process chat server
+
+Every operation runs the event loop until the published messages are
+delivered back to the publishing client. The ``latency`` benchmarks measure
+the round trip of a single message, the ``throughput`` benchmarks the round
+trip of a batch of messages published at once, so the throughput of a
+transport is the size of the batch divided by the measured time.
+"""
+import asyncio
+import atexit
+from contextlib import suppress
+from functools import partial
+from typing import Callable, Any, Dict, Optional
+
+from aiocometd_chat_demo.cometd import CometdClient, JsonObject
+from aiocometd_chat_demo.loadtest.server import LocalChatServer
+from aiocometd_chat_demo.transport_options import TransportOptions, \
+    TransportType
+
+from benchmarks.harness import benchmark
+
+
+#: The channel where the messages are published
+CHANNEL = "/chat/demo"
+#: The data of the published messages
+MESSAGE = {"user": "member000042",
+           "chat": "Lorem ipsum dolor sit amet, consectetur adipiscing. " * 4}
+#: Number of messages published at once in the throughput benchmarks
+BATCH_SIZE = 100
+#: The benchmarked transport options by their names
+TRANSPORTS = {
+    "websocket": TransportOptions(transport_type=TransportType.WEBSOCKET),
+    "websocket,compressed": TransportOptions(
+        transport_type=TransportType.WEBSOCKET, compression=True
+    ),
+    "long-polling": TransportOptions(
+        transport_type=TransportType.LONG_POLLING
+    ),
+}
+
+
+class _Session:
+    """A CometD client connected to the in-process server, both running on
+    an event loop of their own"""
+
+    def __init__(self, options: TransportOptions) -> None:
+        """
+        :param options: The transport options of the client
+        """
+        self.loop = asyncio.new_event_loop()
+        # the server's objects are bound to the default loop
+        asyncio.set_event_loop(self.loop)
+        self.server = LocalChatServer()
+        self.loop.run_until_complete(self.server.start())
+        self.client = CometdClient(self.server.url, [CHANNEL], self.loop,
+                                   transport_options=options)
+        self.client.message_received.connect(self._on_message)
+        #: Number of messages to receive before the round trip is finished
+        self._remaining = 0
+        #: Finished when the messages of the round trip are received
+        self._received: Optional["asyncio.Future[None]"] = None
+
+        connected = self.loop.create_future()
+        self.client.connected.connect(partial(connected.set_result, None))
+        self.client.connect_()
+        self.loop.run_until_complete(connected)
+
+    def _on_message(self, message: JsonObject) -> None:
+        if message["channel"] != CHANNEL or self._received is None:
+            return
+        self._remaining -= 1
+        if self._remaining == 0:
+            self._received.set_result(None)
+
+    def round_trip(self, count: int) -> None:
+        """Publish *count* messages and wait until they're delivered back"""
+        self._remaining = count
+        self._received = self.loop.create_future()
+        for _ in range(count):
+            self.client.publish(CHANNEL, MESSAGE)
+        self.loop.run_until_complete(self._received)
+        self._received = None
+
+    def close(self) -> None:
+        """Disconnect the client and stop the server"""
+        disconnected = self.loop.create_future()
+        self.client.disconnected.connect(
+            partial(disconnected.set_result, None)
+        )
+        self.client.disconnect_()
+        self.loop.run_until_complete(disconnected)
+        self.loop.run_until_complete(self.server.stop())
+        # the requests held by the server are abandoned
+        for task in asyncio.all_tasks(self.loop):
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                self.loop.run_until_complete(task)
+        self.loop.close()
+
+
+#: The connected sessions by the names of their transports
+_SESSIONS: Dict[str, _Session] = {}
+
+
+def get_session(transport: str) -> _Session:
+    """Get the connected session of the *transport*, which is shared by its
+    benchmarks"""
+    if transport not in _SESSIONS:
+        _SESSIONS[transport] = _Session(TRANSPORTS[transport])
+    return _SESSIONS[transport]
+
+
+@atexit.register
+def close_sessions() -> None:
+    """Close the sessions created by the benchmarks"""
+    while _SESSIONS:
+        _SESSIONS.popitem()[1].close()
+
+
+def round_trip(transport: str, count: int) -> Callable[[], Any]:
+    """Publish *count* messages and wait until they're delivered back"""
+    return partial(get_session(transport).round_trip, count)
+
+
+for _transport in TRANSPORTS:
+    benchmark(f"transport.latency[{_transport}]")(
+        partial(round_trip, _transport, 1)
+    )
+    benchmark(f"transport.throughput[{_transport},{BATCH_SIZE}]")(
+        partial(round_trip, _transport, BATCH_SIZE)
+    )
@@ -0,0 +1,157 @@
+"""Registration, measurement and comparison of benchmarks"""
+import fnmatch
+import platform
+import statistics
+import time
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Any, Iterable, Optional
+
+
+#: A function which prepares a benchmark and returns the operation to measure
+Setup = Callable[[], Callable[[], Any]]
+#: Registered benchmarks by name
+BENCHMARKS: Dict[str, Setup] = {}
+#: The minimum amount of time in seconds a single measurement should take
+MIN_MEASUREMENT_TIME = 0.1
+#: Number of measurements of every benchmark
+REPEAT = 7
+#: Default allowed slowdown ratio compared to the baseline
+DEFAULT_THRESHOLD = 0.5
+
+
+def benchmark(name: str) -> Callable[[Setup], Setup]:
+    """Register a benchmark with the given *name*
+
+    The decorated function is called once to prepare the benchmark, and it
+    should return the operation whose execution time is measured. Operations
+    can have side effects, they are called many times in a row.
+    """
+    def decorator(setup: Setup) -> Setup:
+        if name in BENCHMARKS:
+            raise ValueError(f"Benchmark {name!r} is already registered.")
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+
+@dataclass()
+class Result:
+    """The measured execution time of a benchmark"""
+    #: The best measured time of a single operation in seconds
+    best: float
+    #: The median of the measured times of a single operation in seconds
+    median: float
+    #: Number of operations executed in a single measurement
+    number: int
+
+
+def measure(operation: Callable[[], Any], repeat: int = REPEAT) -> Result:
+    """Measure the execution time of the *operation*
+
+    The number of operations in a single measurement is increased until the
+    measurement takes at least :obj:`MIN_MEASUREMENT_TIME` seconds.
+    """
+    def timed(number: int) -> float:
+        start = time.perf_counter()
+        for _ in range(number):
+            operation()
+        return time.perf_counter() - start
+
+    number = 1
+    while True:
+        elapsed = timed(number)
+        if elapsed >= MIN_MEASUREMENT_TIME:
+            break
+        number *= 10 if elapsed < MIN_MEASUREMENT_TIME / 10 else 2
+    times = [elapsed / number]
+    times.extend(timed(number) / number for _ in range(repeat - 1))
+    return Result(best=min(times), median=statistics.median(times),
+                  number=number)
+
+
+def select(patterns: Optional[Iterable[str]] = None) -> List[str]:
+    """Get the names of the registered benchmarks matching any of the
+    shell-style *patterns*, or all of them if no patterns are given"""
+    names = sorted(BENCHMARKS)
+    if not patterns:
+        return names
+    patterns = list(patterns)
+    return [name for name in names
+            if any(fnmatch.fnmatchcase(name, pattern)
+                   for pattern in patterns)]
+
+
+def run(names: Iterable[str],
+        report: Optional[Callable[[str, Result], None]] = None) \
+        -> Dict[str, Any]:
+    """Run the benchmarks with the given *names*
+
+    :param names: Names of registered benchmarks
+    :param report: Called with the name and result of every benchmark when \
+    it's finished
+    :return: JSON serializable results
+    """
+    results = {}
+    for name in names:
+        result = measure(BENCHMARKS[name]())
+        results[name] = asdict(result)
+        if report is not None:
+            report(name, result)
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": results
+    }
+
+
+@dataclass()
+class Comparison:
+    """A benchmark result compared with its baseline"""
+    #: Name of the benchmark
+    name: str
+    #: The best time of a single operation in the baseline
+    baseline: float
+    #: The best time of a single operation in the current results
+    current: float
+    #: The allowed slowdown ratio
+    threshold: float
+
+    @property
+    def ratio(self) -> float:
+        """The current time relative to the baseline"""
+        return self.current / self.baseline
+
+    @property
+    def is_regression(self) -> bool:
+        """Whether the benchmark got slower than the allowed threshold"""
+        return self.ratio > 1 + self.threshold
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any],
+            default_threshold: float = DEFAULT_THRESHOLD) -> List[Comparison]:
+    """Compare the *results* with the *baseline*
+
+    The baseline can override the threshold of individual benchmarks with a
+    ``thresholds`` mapping. Benchmarks missing from either side are skipped.
+    """
+    thresholds = baseline.get("thresholds", {})
+    comparisons = []
+    for name, result in sorted(results["benchmarks"].items()):
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            continue
+        comparisons.append(Comparison(
+            name=name,
+            baseline=base["best"],
+            current=result["best"],
+            threshold=thresholds.get(name, default_threshold)
+        ))
+    return comparisons
+
+
+def format_time(seconds: float) -> str:
+    """Format a duration with an appropriate unit"""
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
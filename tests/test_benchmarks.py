@@ -0,0 +1,93 @@
+import asyncio
+from unittest import TestCase, mock
+
+from benchmarks import harness, bench_models
+from benchmarks.__main__ import load_benchmarks
+from benchmarks.bench_transport import close_sessions
+
+
+class TestMeasure(TestCase):
+    @mock.patch("benchmarks.harness.MIN_MEASUREMENT_TIME", 0.0)
+    def test_measure(self):
+        operation = mock.MagicMock()
+
+        result = harness.measure(operation, repeat=3)
+
+        self.assertEqual(result.number, 1)
+        self.assertEqual(operation.call_count, 3)
+        self.assertLessEqual(result.best, result.median)
+
+
+class TestSelect(TestCase):
+    @mock.patch("benchmarks.harness.BENCHMARKS",
+                {"a.x": None, "a.y": None, "b.x": None})
+    def test_select(self):
+        self.assertEqual(harness.select(), ["a.x", "a.y", "b.x"])
+        self.assertEqual(harness.select(["a.*"]), ["a.x", "a.y"])
+        self.assertEqual(harness.select(["*.x", "a.y"]),
+                         ["a.x", "a.y", "b.x"])
+
+    @mock.patch("benchmarks.harness.BENCHMARKS", {})
+    def test_register_duplicate(self):
+        harness.benchmark("name")(mock.MagicMock())
+
+        with self.assertRaises(ValueError):
+            harness.benchmark("name")(mock.MagicMock())
+
+
+class TestCompare(TestCase):
+    def test_compare(self):
+        results = {"benchmarks": {
+            "fast": {"best": 1.0},
+            "slow": {"best": 2.0},
+            "tolerated": {"best": 2.0},
+            "new": {"best": 1.0}
+        }}
+        baseline = {
+            "benchmarks": {
+                "fast": {"best": 2.0},
+                "slow": {"best": 1.0},
+                "tolerated": {"best": 1.0}
+            },
+            "thresholds": {"tolerated": 1.5}
+        }
+
+        comparisons = harness.compare(results, baseline, 0.25)
+
+        self.assertEqual([(item.name, item.ratio, item.is_regression)
+                          for item in comparisons],
+                         [("fast", 0.5, False),
+                          ("slow", 2.0, True),
+                          ("tolerated", 2.0, False)])
+
+
+class TestSetups(TestCase):
+    def tearDown(self):
+        close_sessions()
+        asyncio.set_event_loop(asyncio.new_event_loop())
+
+    def test_setups(self):
+        load_benchmarks()
+        # the setups are registered with increasing sizes, run the smallest
+        # benchmark of every setup function
+        setups = {}
+        for name, setup in harness.BENCHMARKS.items():
+            setups.setdefault(getattr(setup, "func", setup), name)
+
+        for name in setups.values():
+            with self.subTest(name=name):
+                harness.BENCHMARKS[name]()()
+
+    def test_conversation_add_incoming_message_keeps_size(self):
+        model = bench_models.create_conversation(10)
+        with mock.patch("benchmarks.bench_models.create_conversation",
+                        return_value=model):
+            operation = bench_models.conversation_add_incoming_message(10)
+
+        for _ in range(bench_models.TRIM_INTERVAL - 1):
+            operation()
+        self.assertEqual(model.rowCount(), 10 + bench_models.TRIM_INTERVAL - 1)
+        operation()
+
+        self.assertEqual(model.rowCount(), 10)
+        self.assertEqual(len(model._times), 10)
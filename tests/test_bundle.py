@@ -0,0 +1,109 @@
+import hashlib
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from aiocometd_chat_demo.bundle import engine_cache_path, copy_sources, \
+    compile_qml, build_bundle, LOGGER as bundle_logger
+from aiocometd_chat_demo.exceptions import QmlCompilationError
+
+
+class TestBundle(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source_dir = os.path.join(self.directory.name, "qml")
+        self.bundle_dir = os.path.join(self.directory.name, "bundle")
+        self.cache_dir = os.path.join(self.directory.name, "cache")
+        os.makedirs(os.path.join(self.source_dir, "images"))
+        os.makedirs(os.path.join(self.cache_dir, "qmlcache"))
+        for name in ("main.qml", "Page.qml", "images/icon.svg", "notes.txt"):
+            with open(os.path.join(self.source_dir, name), "w") as file:
+                file.write(name)
+        os.utime(os.path.join(self.source_dir, "main.qml"), (1000, 1000))
+        patcher = mock.patch(
+            "aiocometd_chat_demo.bundle.QStandardPaths.writableLocation",
+            return_value=self.cache_dir
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_cache(self, path, data=b"compiled"):
+        with open(engine_cache_path(path), "wb") as file:
+            file.write(data)
+
+    def test_engine_cache_path(self):
+        path = os.path.join(self.source_dir, "main.qml")
+        name = hashlib.sha1(path.encode("utf-8")).hexdigest()
+
+        self.assertEqual(engine_cache_path(path),
+                         os.path.join(self.cache_dir, "qmlcache",
+                                      name + ".qmlc"))
+
+    def test_copy_sources(self):
+        os.makedirs(self.bundle_dir)
+        with open(os.path.join(self.bundle_dir, "old.qml"), "w"):
+            pass
+
+        result = copy_sources(self.source_dir, self.bundle_dir)
+
+        self.assertEqual(result, [os.path.join(self.bundle_dir, "Page.qml"),
+                                  os.path.join(self.bundle_dir, "main.qml")])
+        self.assertTrue(os.path.isfile(os.path.join(self.bundle_dir,
+                                                    "images", "icon.svg")))
+        self.assertFalse(os.path.exists(os.path.join(self.bundle_dir,
+                                                     "notes.txt")))
+        self.assertFalse(os.path.exists(os.path.join(self.bundle_dir,
+                                                     "old.qml")))
+        self.assertEqual(
+            os.path.getmtime(os.path.join(self.bundle_dir, "main.qml")), 1000
+        )
+
+    @mock.patch("aiocometd_chat_demo.bundle.QQmlComponent")
+    def test_compile_qml(self, component_cls):
+        component_cls.return_value.isError.return_value = False
+        path = os.path.join(self.source_dir, "main.qml")
+        self.write_cache(path)
+        engine = object()
+
+        self.assertTrue(compile_qml(engine, path))
+
+        self.assertIs(component_cls.call_args[0][0], engine)
+        self.assertEqual(component_cls.call_args[0][1].toLocalFile(), path)
+        with open(path + "c", "rb") as file:
+            self.assertEqual(file.read(), b"compiled")
+
+    @mock.patch("aiocometd_chat_demo.bundle.QQmlComponent")
+    def test_compile_qml_without_disk_cache(self, component_cls):
+        component_cls.return_value.isError.return_value = False
+        path = os.path.join(self.source_dir, "main.qml")
+
+        self.assertFalse(compile_qml(object(), path))
+
+        self.assertFalse(os.path.exists(path + "c"))
+
+    @mock.patch("aiocometd_chat_demo.bundle.QQmlComponent")
+    def test_compile_qml_error(self, component_cls):
+        component = component_cls.return_value
+        component.isError.return_value = True
+        error = mock.MagicMock()
+        error.toString.return_value = "main.qml:1 Syntax error"
+        component.errors.return_value = [error]
+
+        with self.assertRaisesRegex(QmlCompilationError, "Syntax error"):
+            compile_qml(object(), os.path.join(self.source_dir, "main.qml"))
+
+    @mock.patch("aiocometd_chat_demo.bundle.compile_qml")
+    def test_build_bundle(self, compile_qml_func):
+        compile_qml_func.side_effect = [True, False]
+        engine = object()
+
+        with self.assertLogs(bundle_logger, "WARNING"):
+            build_bundle(engine, self.source_dir, self.bundle_dir)
+
+        compile_qml_func.assert_has_calls([
+            mock.call(engine, os.path.join(self.bundle_dir, "Page.qml")),
+            mock.call(engine, os.path.join(self.bundle_dir, "main.qml")),
+        ])
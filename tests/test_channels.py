@@ -1,8 +1,13 @@
+from datetime import datetime, timedelta
+
 from asynctest import TestCase, mock
 from PyQt5.QtCore import Qt, QModelIndex
 
 from aiocometd_chat_demo.channels import ChannelsModel, ChannelItemRole, \
-    ChannelType, ChannelItem
+    ChannelType, ChannelItem, ChannelOrder, _ChannelList
+from aiocometd_chat_demo.coalescer import UpdateCoalescer
+from aiocometd_chat_demo.conversation import ChatMessage
+from aiocometd_chat_demo.search import SearchResultRole
 
 
 class TestChannelItem(TestCase):
@@ -13,6 +18,199 @@ class TestChannelItem(TestCase):
 
         self.assertTrue(channel1 < channel2 < channel3)
 
+    def test_record_message(self):
+        channel = ChannelItem(name="channel", type=ChannelType.USER)
+        message = ChatMessage(time=datetime.now(), sender="sender",
+                              contents="first line\nsecond line")
+
+        channel.record_message(message, unread=True)
+
+        self.assertIs(channel.last_message, message)
+        self.assertEqual(channel.last_message_preview, "first line")
+        self.assertEqual(channel.unread_count, 1)
+        self.assertEqual(channel.messages_per_minute, 1)
+
+    def test_record_read_message(self):
+        channel = ChannelItem(name="channel", type=ChannelType.USER)
+        message = ChatMessage(time=datetime.now(), sender="sender",
+                              contents="text")
+
+        channel.record_message(message, unread=False)
+
+        self.assertEqual(channel.unread_count, 0)
+
+    def test_record_older_message(self):
+        channel = ChannelItem(name="channel", type=ChannelType.USER)
+        now = datetime.now()
+        message1 = ChatMessage(time=now, sender="sender", contents="new")
+        message2 = ChatMessage(time=now - timedelta(seconds=1),
+                               sender="sender", contents="old")
+
+        channel.record_message(message1, unread=True)
+        channel.record_message(message2, unread=True)
+
+        self.assertIs(channel.last_message, message1)
+        self.assertEqual(channel.unread_count, 2)
+
+    def test_messages_per_minute_expires_old_messages(self):
+        channel = ChannelItem(name="channel", type=ChannelType.USER)
+        now = datetime.now()
+        for seconds in (90, 30, 0):
+            channel.record_message(
+                ChatMessage(time=now - timedelta(seconds=seconds),
+                            sender="sender", contents="text"),
+                unread=True
+            )
+
+        self.assertEqual(channel.messages_per_minute, 2)
+
+    def test_late_message_times_are_ordered(self):
+        channel = ChannelItem(name="channel", type=ChannelType.USER)
+        now = datetime.now()
+        for seconds in (50, 10, 55, 30):
+            channel.record_message(
+                ChatMessage(time=now - timedelta(seconds=seconds),
+                            sender="sender", contents="text"),
+                unread=True
+            )
+
+        self.assertEqual(list(channel._message_times),
+                         [now - timedelta(seconds=seconds)
+                          for seconds in (55, 50, 30, 10)])
+        self.assertTrue(channel.expire_message_times(
+            now - timedelta(seconds=40)
+        ))
+        self.assertEqual(channel.messages_per_minute, 2)
+
+    def test_expire_message_times(self):
+        channel = ChannelItem(name="channel", type=ChannelType.USER)
+        now = datetime.now()
+        channel.record_message(
+            ChatMessage(time=now - timedelta(seconds=30), sender="sender",
+                        contents="text"),
+            unread=True
+        )
+
+        self.assertFalse(channel.expire_message_times(
+            now - timedelta(seconds=40)
+        ))
+        self.assertTrue(channel.expire_message_times(now))
+        self.assertEqual(channel.messages_per_minute, 0)
+
+    def test_last_message_preview_without_messages(self):
+        channel = ChannelItem(name="channel", type=ChannelType.USER)
+
+        self.assertEqual(channel.last_message_preview, "")
+
+
+class TestChannelList(TestCase):
+    def setUp(self):
+        self.channels = _ChannelList(bucket_size=4)
+        self.items = [ChannelItem(name=str(index), type=ChannelType.USER)
+                      for index in range(50)]
+
+    def fill(self, indexes):
+        for index in indexes:
+            self.channels.insert(index, self.items[index])
+
+    def test_insert(self):
+        indexes = [(index * 17) % 50 for index in range(50)]
+
+        positions = [self.channels.insert(index, self.items[index])
+                     for index in indexes]
+
+        self.assertEqual(positions[:4], [0, 1, 2, 1])
+        self.assertEqual(len(self.channels), 50)
+        self.assertEqual(list(self.channels), self.items)
+        self.assertGreater(len(self.channels._keys), 1)
+
+    def test_index(self):
+        self.fill(range(0, 50, 2))
+
+        for key in range(-1, 51):
+            with self.subTest(key=key):
+                self.assertEqual(self.channels.index(key),
+                                 min(max(key + 1, 0) // 2, 25))
+
+    def test_getitem(self):
+        self.fill(range(50))
+
+        for position in range(50):
+            with self.subTest(position=position):
+                self.assertIs(self.channels[position], self.items[position])
+
+    def test_getitem_out_of_range(self):
+        self.fill(range(3))
+
+        with self.assertRaises(IndexError):
+            self.channels[3]
+        with self.assertRaises(IndexError):
+            self.channels[-1]
+
+    def test_pop(self):
+        self.fill(range(50))
+        expected = list(self.items)
+
+        positions = [49, 0, 20, 5, 5, 30] + [0] * 30 + list(range(13, -1, -1))
+        for position in positions:
+            with self.subTest(position=position):
+                self.assertIs(self.channels.pop(position),
+                              expected.pop(position))
+                self.assertEqual(list(self.channels), expected)
+                self.assertEqual(len(self.channels), len(expected))
+                for index, item in enumerate(expected):
+                    self.assertIs(self.channels[index], item)
+
+        self.assertEqual(self.channels._keys, [])
+
+    def test_pop_out_of_range(self):
+        with self.assertRaises(IndexError):
+            self.channels.pop(0)
+
+    def test_move_to_front(self):
+        self.fill(range(50))
+        expected = list(self.items)
+
+        for key, position in zip(range(-1, -7, -1), [30, 49, 0, 12, 12, 48]):
+            channel = self.channels.pop(position)
+            expected.insert(0, expected.pop(position))
+
+            self.assertEqual(self.channels.insert(key, channel), 0)
+            self.assertEqual(list(self.channels), expected)
+            self.assertEqual(self.channels.index(key), 0)
+
+    def test_move_to_front_method(self):
+        self.fill(range(50))
+        expected = list(self.items)
+
+        for key, position in zip(range(-1, -9, -1),
+                                 [2, 49, 0, 7, 3, 30, 12, 12]):
+            with self.subTest(position=position):
+                expected.insert(0, expected.pop(position))
+
+                self.channels.move_to_front(position, key)
+
+                self.assertEqual(list(self.channels), expected)
+                self.assertEqual(self.channels.index(key), 0)
+                for index, item in enumerate(expected):
+                    self.assertIs(self.channels[index], item)
+
+    def test_move_to_front_out_of_range(self):
+        self.fill(range(3))
+
+        with self.assertRaises(IndexError):
+            self.channels.move_to_front(3, -1)
+
+    def test_reset(self):
+        self.fill(range(10))
+
+        self.channels.reset(reversed(self.items), lambda item: item.name)
+
+        self.assertEqual(list(self.channels),
+                         sorted(self.items, key=lambda item: item.name))
+        self.assertIs(self.channels[49], self.items[9])
+        self.assertEqual(self.channels.index("10"), 2)
+
 
 class TestChannelsModel(TestCase):
     def setUp(self):
@@ -51,18 +249,7 @@ class TestChannelsModel(TestCase):
         self.assertEqual(self.model.roleNames(), self.model._role_names)
 
     def test_channel_index(self):
-        self.model._channels = [
-            ChannelItem("b", ChannelType.USER),
-            ChannelItem("c", ChannelType.USER),
-            ChannelItem("d", ChannelType.USER),
-            ChannelItem("e", ChannelType.USER),
-            ChannelItem("f", ChannelType.USER),
-            ChannelItem("g", ChannelType.USER),
-            ChannelItem("h", ChannelType.USER),
-            ChannelItem("i", ChannelType.USER),
-            ChannelItem("j", ChannelType.USER),
-            ChannelItem("k", ChannelType.USER),
-        ]
+        self.model.update_available_channels(set("bcdefghijk"))
         cases = (
             ("b", 0),
             ("c", 1),
@@ -83,12 +270,7 @@ class TestChannelsModel(TestCase):
                                  expected)
 
     def test_add_channel_inserts_channel_in_sorted_order(self):
-        self.model._channels = [
-            ChannelItem("a", ChannelType.USER),
-            ChannelItem("c", ChannelType.USER),
-            ChannelItem("d", ChannelType.USER),
-            ChannelItem("e", ChannelType.USER)
-        ]
+        self.model.update_available_channels({"a", "c", "d", "e"})
         self.model.message_sending_requested = mock.MagicMock()
         self.model.beginInsertRows = mock.MagicMock()
         self.model.endInsertRows = mock.MagicMock()
@@ -119,23 +301,45 @@ class TestChannelsModel(TestCase):
         )
 
     def test_remove_channel(self):
+        channel_name = "channel"
+        self.model.update_available_channels({channel_name})
         self.model.beginRemoveRows = mock.MagicMock()
         self.model.endRemoveRows = mock.MagicMock()
-        channel = mock.MagicMock()
-        channel_name = "channel"
-        self.model._channels = [channel]
+        channel = self.model._channels[0]
+        channel.conversation.disconnect = mock.MagicMock()
         index = 0
-        self.model._channel_index = mock.MagicMock(return_value=index)
 
         self.model._remove_channel(channel_name)
 
         self.model.beginRemoveRows.assert_called_with(
             QModelIndex(), index+1, index+1
         )
-        self.assertEqual(self.model._channels, [])
+        self.assertEqual(list(self.model._channels), [])
+        self.assertEqual(self.model._channel_index(channel_name), -1)
         channel.conversation.disconnect.assert_called()
         self.model.endRemoveRows.assert_called()
 
+    def test_remove_channel_removes_messages_from_search_results(self):
+        self.model.update_available_channels({"peer"})
+        message = ChatMessage(time=datetime.now(), sender="peer",
+                              contents="hello")
+        self.model.add_incoming_message("peer", ChannelType.USER, message)
+        self.model.search_results.query = "hel"
+        self.assertEqual(self.model.search_results.rowCount(), 1)
+
+        self.model.update_available_channels(set())
+
+        self.assertEqual(len(self.model.search_index), 0)
+        self.assertEqual(self.model.search_results.rowCount(), 0)
+
+    def test_channel_row(self):
+        self.model.update_available_channels({"a", "b"})
+
+        self.assertEqual(self.model.channel_row(self.group_channel_name), 0)
+        self.assertEqual(self.model.channel_row("a"), 1)
+        self.assertEqual(self.model.channel_row("b"), 2)
+        self.assertEqual(self.model.channel_row("c"), -1)
+
     def test_remove_channel_does_nothing_on_nonexistant_channel(self):
         self.model.beginRemoveRows = mock.MagicMock()
         self.model.endRemoveRows = mock.MagicMock()
@@ -146,17 +350,12 @@ class TestChannelsModel(TestCase):
         self.model._remove_channel("fake_channel")
 
         self.model.beginRemoveRows.assert_not_called()
-        self.assertEqual(self.model._channels, [channel])
+        self.assertEqual(list(self.model._channels), [channel])
         channel.conversation.disconnect.assert_not_called()
         self.model.endRemoveRows.assert_not_called()
 
     def test_update_available_channels(self):
-        self.model._channels = [
-            ChannelItem("a", ChannelType.USER),
-            ChannelItem("b", ChannelType.USER),
-            ChannelItem("c", ChannelType.USER),
-            ChannelItem("d", ChannelType.USER)
-        ]
+        self.model.update_available_channels({"a", "b", "c", "d"})
         updated_channel_names = {"c", "d", "e", "f"}
         self.model._add_channel = mock.MagicMock()
         self.model._remove_channel = mock.MagicMock()
@@ -173,14 +372,146 @@ class TestChannelsModel(TestCase):
     def test_add_incoming_message_on_group_channel(self):
         channel_name = "channel"
         channel_type = ChannelType.GROUP
-        message = object()
+        message = ChatMessage(time=datetime.now(), sender="sender",
+                              contents="text")
         self.model.group_channel.conversation.add_incoming_message \
             = mock.MagicMock()
+        self.model.search_index = mock.MagicMock()
+        self.model._search_results = mock.MagicMock()
 
         self.model.add_incoming_message(channel_name, channel_type, message)
 
         self.model.group_channel.conversation.add_incoming_message\
             .assert_called_with(message)
+        self.model.search_index.add.assert_called_with(
+            self.group_channel_name, ChannelType.GROUP.value,
+            self.model.group_channel.conversation, message
+        )
+        self.model._search_results.document_added.assert_called_with(
+            self.model.search_index.add.return_value
+        )
+        self.assertIs(self.model.group_channel.last_message, message)
+        self.assertEqual(self.model.group_channel.unread_count, 1)
+
+    def test_add_incoming_message_with_coalescer(self):
+        self.model.coalescer = mock.MagicMock()
+        message = ChatMessage(time=datetime.now(), sender="sender",
+                              contents="text")
+
+        self.model.add_incoming_message(self.group_channel_name,
+                                        ChannelType.GROUP, message)
+
+        self.model.coalescer.add.assert_called_with(
+            self.model.group_channel.conversation, message
+        )
+        self.assertEqual(self.model.group_channel.conversation.rowCount(), 0)
+        self.assertIs(self.model.group_channel.last_message, message)
+
+    def test_remove_channel_discards_coalesced_messages(self):
+        self.model.update_available_channels({"a"})
+        conversation = self.model.user_channels[0].conversation
+        self.model.coalescer = mock.MagicMock()
+
+        self.model.update_available_channels(set())
+
+        self.model.coalescer.discard.assert_called_with(conversation)
+
+    @mock.patch("aiocometd_chat_demo.channels.datetime")
+    def test_message_rates_updated_periodically(self, datetime_cls):
+        now = datetime.now()
+        datetime_cls.now.return_value = now
+        self.model.add_incoming_message(
+            self.group_channel_name, ChannelType.GROUP,
+            ChatMessage(time=now, sender="sender", contents="text")
+        )
+        self.assertIsNotNone(self.model._rate_update_handle)
+        self.model._rate_update_handle.cancel()
+        changed = mock.MagicMock()
+        self.model.dataChanged.connect(changed)
+
+        datetime_cls.now.return_value = now + timedelta(seconds=30)
+        self.model._update_rates()
+
+        changed.assert_not_called()
+        self.assertIsNotNone(self.model._rate_update_handle)
+        self.model._rate_update_handle.cancel()
+
+        datetime_cls.now.return_value = now + timedelta(minutes=1)
+        self.model._update_rates()
+
+        index, _, roles = changed.call_args[0]
+        self.assertEqual(index.row(), 0)
+        self.assertEqual(roles, [ChannelItemRole.MESSAGES_PER_MINUTE])
+        self.assertEqual(self.model.group_channel.messages_per_minute, 0)
+        self.assertIsNone(self.model._rate_update_handle)
+        self.assertEqual(self.model._rate_channels, {})
+
+    @mock.patch("aiocometd_chat_demo.channels.datetime")
+    def test_message_rates_of_user_channels_updated(self, datetime_cls):
+        now = datetime.now()
+        datetime_cls.now.return_value = now
+        self.model.update_available_channels({"a", "b", "c"})
+        self.model.add_incoming_message(
+            "b", ChannelType.USER,
+            ChatMessage(time=now, sender="b", contents="text")
+        )
+        self.model._rate_update_handle.cancel()
+        channel = self.model.user_channels[1]
+        self.assertEqual(self.model._rate_channels, {id(channel): channel})
+        changed = mock.MagicMock()
+        self.model.dataChanged.connect(changed)
+
+        datetime_cls.now.return_value = now + timedelta(minutes=1)
+        self.model._update_rates()
+
+        changed.assert_called_once()
+        index, _, roles = changed.call_args[0]
+        self.assertEqual(index.row(), 2)
+        self.assertEqual(roles, [ChannelItemRole.MESSAGES_PER_MINUTE])
+        self.assertEqual(self.model._rate_channels, {})
+
+    @mock.patch("aiocometd_chat_demo.channels.datetime")
+    def test_removed_channel_message_rate_not_updated(self, datetime_cls):
+        now = datetime.now()
+        datetime_cls.now.return_value = now
+        self.model.update_available_channels({"a"})
+        self.model.add_incoming_message(
+            "a", ChannelType.USER,
+            ChatMessage(time=now, sender="a", contents="text")
+        )
+        self.model._rate_update_handle.cancel()
+
+        self.model.update_available_channels(set())
+
+        self.assertEqual(self.model._rate_channels, {})
+
+    def test_discard_buffered_messages(self):
+        self.model.update_available_channels({"a"})
+        conversation = self.model.user_channels[0].conversation
+        self.model.coalescer = mock.MagicMock()
+
+        self.model.discard_buffered_messages()
+
+        self.model.coalescer.discard.assert_has_calls([
+            mock.call(self.model.group_channel.conversation),
+            mock.call(conversation)
+        ])
+
+    def test_search_result_row_of_coalesced_message(self):
+        self.model.coalescer = UpdateCoalescer(loop=self.loop)
+        self.model.add_incoming_message(
+            self.group_channel_name, ChannelType.GROUP,
+            ChatMessage(time=datetime.now(), sender="sender",
+                        contents="hello")
+        )
+        self.model.search_results.query = "hel"
+
+        row = self.model.search_results.data(
+            self.model.search_results.index(0, 0), SearchResultRole.ROW
+        )
+
+        self.assertEqual(row, 0)
+        self.assertEqual(self.model.group_channel.conversation.rowCount(), 1)
 
     def test_add_incoming_message_on_user_channel(self):
         channel_name = "channel"
@@ -189,10 +520,30 @@ class TestChannelsModel(TestCase):
         channel = mock.MagicMock()
         self.model._channels = [channel]
         self.model._channel_index = mock.MagicMock(return_value=0)
+        self.model.search_index = mock.MagicMock()
+        self.model._search_results = mock.MagicMock()
+        changed = mock.MagicMock()
+        self.model.dataChanged.connect(changed)
 
         self.model.add_incoming_message(channel_name, channel_type, message)
 
         channel.conversation.add_incoming_message.assert_called_with(message)
+        channel.record_message.assert_called_with(message, True)
+        changed.assert_called_once()
+        top_left, bottom_right, roles = changed.call_args[0]
+        self.assertEqual((top_left.row(), bottom_right.row()), (1, 1))
+        self.assertEqual(roles, [
+            ChannelItemRole.UNREAD_COUNT,
+            ChannelItemRole.LAST_MESSAGE,
+            ChannelItemRole.LAST_ACTIVITY,
+            ChannelItemRole.MESSAGES_PER_MINUTE
+        ])
+        self.model.search_index.add.assert_called_with(
+            channel.name, channel.type.value, channel.conversation, message
+        )
+        self.model._search_results.document_added.assert_called_with(
+            self.model.search_index.add.return_value
+        )
 
     def test_add_incoming_message_ignore_nonexistant_channel(self):
         channel_name = "channel"
@@ -210,6 +561,262 @@ class TestChannelsModel(TestCase):
         self.model.group_channel.conversation.add_incoming_message \
             .assert_not_called()
 
+    def test_add_incoming_message_on_active_channel(self):
+        message = ChatMessage(time=datetime.now(), sender="sender",
+                              contents="text")
+        self.model.active_channel = self.group_channel_name
+
+        self.model.add_incoming_message(self.group_channel_name,
+                                        ChannelType.GROUP, message)
+
+        self.assertEqual(self.model.group_channel.unread_count, 0)
+        self.assertIs(self.model.group_channel.last_message, message)
+
+    def test_mark_read(self):
+        self.model.update_available_channels({"user"})
+        channel = self.model._channels[0]
+        channel.unread_count = 3
+        changed = mock.MagicMock()
+        self.model.dataChanged.connect(changed)
+
+        self.model.mark_read("user")
+
+        self.assertEqual(channel.unread_count, 0)
+        changed.assert_called_once()
+        top_left, _, roles = changed.call_args[0]
+        self.assertEqual(top_left.row(), 1)
+        self.assertEqual(roles, [ChannelItemRole.UNREAD_COUNT])
+
+    def test_mark_read_without_unread_messages(self):
+        changed = mock.MagicMock()
+        self.model.dataChanged.connect(changed)
+
+        self.model.mark_read(self.group_channel_name)
+        self.model.mark_read("nonexistent")
+
+        changed.assert_not_called()
+
+    def test_set_active_channel(self):
+        self.model.group_channel.unread_count = 2
+        self.model.active_channel_changed = mock.MagicMock()
+
+        self.model.active_channel = self.group_channel_name
+
+        self.assertEqual(self.model.active_channel, self.group_channel_name)
+        self.assertEqual(self.model.group_channel.unread_count, 0)
+        self.model.active_channel_changed.emit.assert_called_with(
+            self.group_channel_name
+        )
+
+    def names(self):
+        return [self.model.data(self.model.index(row, 0),
+                                ChannelItemRole.NAME)
+                for row in range(self.model.rowCount())]
+
+    def send_message(self, channel_name):
+        message = ChatMessage(time=datetime.now(), sender=channel_name,
+                              contents="text")
+        self.model.add_incoming_message(channel_name, ChannelType.USER,
+                                        message)
+
+    def test_order_by_activity(self):
+        self.model.update_available_channels({"a", "b", "c"})
+        self.send_message("b")
+        self.model.order_changed = mock.MagicMock()
+
+        self.model.order = ChannelOrder.ACTIVITY.value
+
+        self.assertEqual(self.model.order, ChannelOrder.ACTIVITY.value)
+        self.assertEqual(self.names(), [self.group_channel_name,
+                                        "b", "a", "c"])
+        self.model.order_changed.emit.assert_called_with(
+            ChannelOrder.ACTIVITY.value
+        )
+
+    def test_order_by_name(self):
+        self.model.update_available_channels({"a", "b", "c"})
+        self.model.order = ChannelOrder.ACTIVITY.value
+        self.send_message("c")
+
+        self.model.order = ChannelOrder.NAME.value
+
+        self.assertEqual(self.names(), [self.group_channel_name,
+                                        "a", "b", "c"])
+        self.assertEqual(self.model.channel_row("c"), 3)
+
+    def test_incoming_message_moves_channel_to_front(self):
+        self.model.update_available_channels({"a", "b", "c"})
+        self.model.order = ChannelOrder.ACTIVITY.value
+        moved = mock.MagicMock()
+        self.model.rowsMoved.connect(moved)
+        changed = mock.MagicMock()
+        self.model.dataChanged.connect(changed)
+
+        self.send_message("c")
+
+        self.assertEqual(self.names(), [self.group_channel_name,
+                                        "c", "a", "b"])
+        moved.assert_called_once()
+        self.assertEqual(moved.call_args[0][1:3], (3, 3))
+        self.assertEqual(moved.call_args[0][4], 1)
+        self.assertEqual(changed.call_args[0][0].row(), 1)
+        for row, name in enumerate(["c", "a", "b"], 1):
+            self.assertEqual(self.model.channel_row(name), row)
+
+    def test_incoming_message_on_first_channel_isnt_moved(self):
+        self.model.update_available_channels({"a", "b"})
+        self.model.order = ChannelOrder.ACTIVITY.value
+        self.send_message("b")
+        moved = mock.MagicMock()
+        self.model.rowsMoved.connect(moved)
+
+        self.send_message("b")
+
+        moved.assert_not_called()
+        self.assertEqual(self.names(), [self.group_channel_name, "b", "a"])
+        self.assertEqual(self.model.channel_row("b"), 1)
+
+    def test_channels_added_in_activity_order(self):
+        self.model.update_available_channels({"b", "d"})
+        self.model.order = ChannelOrder.ACTIVITY.value
+        self.send_message("d")
+
+        self.model.update_available_channels({"b", "d", "a", "c"})
+
+        self.assertEqual(self.names(), [self.group_channel_name,
+                                        "d", "a", "b", "c"])
+
+    def test_history_requests_are_forwarded(self):
+        self.model.update_available_channels({"a"})
+        requested = mock.MagicMock()
+        self.model.history_requested.connect(requested)
+
+        self.model.group_channel.conversation.history_requested.emit()
+        self.model.conversation("a", ChannelType.USER) \
+            .history_requested.emit()
+
+        requested.assert_has_calls([
+            mock.call(self.group_channel_name, ChannelType.GROUP),
+            mock.call("a", ChannelType.USER)
+        ])
+
+    def test_enable_history(self):
+        self.model.update_available_channels({"a"})
+
+        self.model.enable_history()
+        self.model.update_available_channels({"a", "b"})
+
+        for name, channel_type in ((self.group_channel_name,
+                                    ChannelType.GROUP),
+                                   ("a", ChannelType.USER),
+                                   ("b", ChannelType.USER)):
+            with self.subTest(name=name):
+                self.assertTrue(
+                    self.model.conversation(name, channel_type)
+                    .canFetchMore()
+                )
+
+    def test_conversation(self):
+        self.model.update_available_channels({"a"})
+
+        self.assertIs(self.model.conversation("x", ChannelType.GROUP),
+                      self.model.group_channel.conversation)
+        self.assertIs(self.model.conversation("a", ChannelType.USER),
+                      self.model._channels[0].conversation)
+        self.assertIsNone(self.model.conversation("b", ChannelType.USER))
+
+    def test_add_history_page(self):
+        self.model.update_available_channels({"a"})
+        self.model.order = ChannelOrder.ACTIVITY.value
+        self.model.update_available_channels({"a", "b"})
+        self.model.enable_history()
+        changed = mock.MagicMock()
+        self.model.dataChanged.connect(changed)
+        time = datetime.now()
+        messages = [
+            ChatMessage(time=time - timedelta(seconds=2), sender="b",
+                        contents="first"),
+            ChatMessage(time=time - timedelta(seconds=1), sender="b",
+                        contents="second"),
+        ]
+        self.model.search_results.query = "second"
+
+        self.model.add_history_page("b", ChannelType.USER, messages, 42)
+
+        channel = self.model._channels_by_name["b"]
+        self.assertEqual(channel.conversation._messages, messages)
+        self.assertEqual(channel.conversation.history_cursor, 42)
+        self.assertIs(channel.last_message, messages[1])
+        self.assertEqual(channel.unread_count, 0)
+        self.assertEqual(channel.activity, 0)
+        self.assertEqual(self.model.channel_row("b"), 2)
+        changed.assert_called_once()
+        self.assertEqual(self.model.search_results.rowCount(), 1)
+
+    def test_add_history_page_keeps_newer_last_message(self):
+        last_message = ChatMessage(time=datetime.now(), sender="b",
+                                   contents="last")
+        self.model.add_incoming_message("group", ChannelType.GROUP,
+                                        last_message)
+        older = ChatMessage(time=last_message.time - timedelta(seconds=1),
+                            sender="b", contents="older")
+
+        self.model.add_history_page("group", ChannelType.GROUP, [older],
+                                    None)
+
+        self.assertIs(self.model.group_channel.last_message, last_message)
+        self.assertEqual(self.model.group_channel.conversation._messages,
+                         [older, last_message])
+
+    def test_add_history_page_ignores_nonexistant_channel(self):
+        self.model.add_history_page("x", ChannelType.USER, [], None)
+
+    def test_username(self):
+        self.model.update_available_channels({"a"})
+
+        self.model.username = "me"
+        self.model.update_available_channels({"a", "b"})
+
+        self.assertEqual(self.model.username, "me")
+        self.assertEqual(self.model.group_channel.conversation.username, "me")
+        for channel in self.model.user_channels:
+            self.assertEqual(channel.conversation.username, "me")
+
+    def test_user_channels(self):
+        self.model.update_available_channels({"a", "b"})
+
+        self.assertEqual([channel.name
+                          for channel in self.model.user_channels],
+                         ["a", "b"])
+
+    def test_add_messages(self):
+        self.model.update_available_channels({"a"})
+        time = datetime.now()
+        messages = [
+            ChatMessage(time=time - timedelta(seconds=1), sender="a",
+                        contents="first"),
+            ChatMessage(time=time, sender="a", contents="second"),
+        ]
+
+        self.model.add_messages("a", ChannelType.USER, messages)
+
+        channel = self.model._channels_by_name["a"]
+        self.assertEqual(channel.conversation._messages, messages)
+        self.assertIs(channel.last_message, messages[1])
+        self.assertEqual(channel.unread_count, 0)
+
+    def test_add_messages_ignores_nonexistant_channel(self):
+        self.model.add_messages("x", ChannelType.USER, [])
+
+    def test_history_page_failed(self):
+        self.model.enable_history()
+        conversation = self.model.group_channel.conversation
+        conversation.fetchMore()
+
+        self.model.history_page_failed("group", ChannelType.GROUP)
+
+        self.assertTrue(conversation.canFetchMore())
+
 
 class TestChannelsModelData(TestCase):
     channel1 = ChannelItem(name="one", type=ChannelType.USER)
@@ -241,6 +848,31 @@ class TestChannelsModelData(TestCase):
                 index = self.model.createIndex(row, column)
                 self.assertEqual(self.model.data(index, role), expected)
 
+    def test_data_summary_roles(self):
+        model = ChannelsModel(self.group_channel_name)
+        time = datetime(2018, 1, 2, 3, 4, 5)
+        message = ChatMessage(time=time, sender="sender", contents="text")
+        model.group_channel.record_message(message, unread=True)
+        index = model.createIndex(0, 0)
+
+        self.assertEqual(model.data(index, ChannelItemRole.UNREAD_COUNT), 1)
+        self.assertEqual(model.data(index, ChannelItemRole.LAST_MESSAGE),
+                         "text")
+        self.assertEqual(
+            model.data(index, ChannelItemRole.LAST_ACTIVITY).toPyDateTime(),
+            time
+        )
+        self.assertEqual(
+            model.data(index, ChannelItemRole.MESSAGES_PER_MINUTE), 0
+        )
+
+    def test_data_last_activity_without_messages(self):
+        index = self.model.createIndex(0, 0)
+
+        self.assertFalse(
+            self.model.data(index, ChannelItemRole.LAST_ACTIVITY).isValid()
+        )
+
     def test_data_return_none_for_invalid_index(self):
         cases = (
             (-1, 0, ChannelItemRole.NAME, None),
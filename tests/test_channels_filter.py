@@ -0,0 +1,171 @@
+from datetime import datetime
+
+from asynctest import TestCase, mock
+
+from aiocometd_chat_demo.channels import ChannelsModel, ChannelItemRole, \
+    ChannelOrder, ChannelType
+from aiocometd_chat_demo.conversation import ChatMessage
+from aiocometd_chat_demo.channels_filter import ChannelsFilterModel
+
+
+class TestChannelsFilterModel(TestCase):
+    def setUp(self):
+        self.source = ChannelsModel("group")
+        self.source.update_available_channels({"Bob", "bill", "Alice",
+                                               "carol"})
+        self.model = ChannelsFilterModel()
+        self.model.source_model = self.source
+
+    def names(self):
+        return [self.model.data(self.model.index(row, 0),
+                                ChannelItemRole.NAME)
+                for row in range(self.model.rowCount())]
+
+    def test_without_source_model(self):
+        model = ChannelsFilterModel()
+
+        self.assertEqual(model.rowCount(), 0)
+        self.assertIsNone(model.data(model.index(0, 0),
+                                     ChannelItemRole.NAME))
+
+    def test_without_filter(self):
+        self.assertEqual(self.names(),
+                         ["group", "Alice", "Bob", "bill", "carol"])
+
+    def test_filter_is_case_insensitive_prefix(self):
+        self.model.filter = "B"
+
+        self.assertEqual(self.model.filter, "B")
+        self.assertEqual(self.names(), ["group", "Bob", "bill"])
+
+    def test_filter_without_matches(self):
+        self.model.filter = "x"
+
+        self.assertEqual(self.names(), ["group"])
+
+    def test_clear_filter(self):
+        self.model.filter = "bo"
+
+        self.model.filter = ""
+
+        self.assertEqual(self.names(),
+                         ["group", "Alice", "Bob", "bill", "carol"])
+
+    def test_filter_change_emits_signal(self):
+        self.model.filter_changed = mock.MagicMock()
+
+        self.model.filter = "a"
+
+        self.model.filter_changed.emit.assert_called_with("a")
+
+    def test_added_channels(self):
+        self.model.filter = "b"
+        inserted = mock.MagicMock()
+        self.model.rowsInserted.connect(inserted)
+
+        self.source.update_available_channels({"Bob", "bill", "Alice",
+                                               "carol", "Ben", "dave"})
+
+        self.assertEqual(self.names(), ["group", "Ben", "Bob", "bill"])
+        inserted.assert_called_once()
+        self.assertEqual(inserted.call_args[0][1:], (1, 1))
+
+    def test_removed_channels(self):
+        self.model.filter = "b"
+        removed = mock.MagicMock()
+        self.model.rowsRemoved.connect(removed)
+
+        self.source.update_available_channels({"bill", "Alice"})
+
+        self.assertEqual(self.names(), ["group", "bill"])
+        removed.assert_called_once()
+        self.assertEqual(removed.call_args[0][1:], (1, 1))
+
+        self.model.filter = ""
+        self.assertEqual(self.names(), ["group", "Alice", "bill"])
+
+    def test_data_changed_forwarded_for_listed_rows(self):
+        self.model.filter = "c"
+        changed = mock.MagicMock()
+        self.model.dataChanged.connect(changed)
+
+        for name in ("carol", "Bob"):
+            row = self.source.channel_row(name)
+            index = self.source.index(row, 0)
+            self.source.dataChanged.emit(index, index, [])
+
+        changed.assert_called_once()
+        self.assertEqual(changed.call_args[0][0].row(), 1)
+
+    def test_channel_row(self):
+        self.model.filter = "b"
+
+        self.assertEqual(self.model.channel_row("group"), 0)
+        self.assertEqual(self.model.channel_row("Bob"), 1)
+        self.assertEqual(self.model.channel_row("bill"), 2)
+        self.assertEqual(self.model.channel_row("Alice"), -1)
+
+    def test_change_source_model(self):
+        source = ChannelsModel("other")
+        source.update_available_channels({"dave"})
+
+        self.model.source_model = source
+        self.source.update_available_channels({"erin"})
+
+        self.assertIs(self.model.source_model, source)
+        self.assertEqual(self.names(), ["other", "dave"])
+
+    def send_message(self, channel_name):
+        message = ChatMessage(time=datetime.now(), sender=channel_name,
+                              contents="text")
+        self.source.add_incoming_message(channel_name, ChannelType.USER,
+                                         message)
+
+    def test_source_in_activity_order(self):
+        self.source.order = ChannelOrder.ACTIVITY.value
+        self.send_message("bill")
+
+        self.model.filter = "b"
+
+        self.assertEqual(self.names(), ["group", "bill", "Bob"])
+        self.assertEqual(self.model.channel_row("Bob"), 2)
+
+    def test_moved_channels(self):
+        self.source.order = ChannelOrder.ACTIVITY.value
+        self.model.filter = "b"
+        moved = mock.MagicMock()
+        self.model.rowsMoved.connect(moved)
+
+        self.send_message("bill")
+
+        self.assertEqual(self.names(), ["group", "bill", "Bob"])
+        moved.assert_called_once()
+        self.assertEqual(moved.call_args[0][1:3], (2, 2))
+        self.assertEqual(moved.call_args[0][4], 1)
+        self.assertEqual(self.model.channel_row("bill"), 1)
+        self.assertEqual(self.model.channel_row("Bob"), 2)
+
+    def test_moved_channels_without_visible_change(self):
+        self.source.order = ChannelOrder.ACTIVITY.value
+        self.model.filter = "b"
+        moved = mock.MagicMock()
+        self.model.rowsMoved.connect(moved)
+
+        self.send_message("carol")
+        self.send_message("Bob")
+
+        moved.assert_not_called()
+        self.assertEqual(self.names(), ["group", "Bob", "bill"])
+
+    def test_added_channels_in_activity_order(self):
+        self.source.order = ChannelOrder.ACTIVITY.value
+        self.send_message("bill")
+        self.model.filter = "b"
+
+        self.source.update_available_channels({"Bob", "bill", "Alice",
+                                               "carol", "Ben"})
+
+        self.assertEqual(self.names(), ["group", "bill", "Ben", "Bob"])
+
+    def test_role_names(self):
+        self.assertEqual(self.model.roleNames(), self.source.roleNames())
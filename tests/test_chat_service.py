@@ -1,9 +1,47 @@
+import asyncio
+import os
+import tempfile
 from datetime import datetime
 
 from asynctest import TestCase, mock
 
 from aiocometd_chat_demo.chat_service import ChatService, ChannelsModel, \
-    LOGGER as chat_service_logger, ChatMessage, ChannelType
+    LOGGER as chat_service_logger, ChatMessage, ChannelType, ChatRoom, \
+    ClientState, MessageResponse
+from aiocometd_chat_demo.coalescer import UpdateCoalescer
+from aiocometd_chat_demo.connection_pool import ConnectionPool
+from aiocometd_chat_demo.conversation import ItemRole
+from aiocometd_chat_demo.json_codec import stdlib_codec, get_codec
+from aiocometd_chat_demo.outbox import Outbox, DeliveryState
+from aiocometd_chat_demo.rate_limit import RateLimiter
+from aiocometd_chat_demo.snapshot import Snapshot, RoomSnapshot, \
+    ConversationSnapshot, save_snapshot, load_snapshot
+from aiocometd_chat_demo.transport_options import TransportOptions, \
+    TransportType
+from aiocometd_chat_demo.loadtest.server import LocalChatServer
+
+
+class TestChatRoom(TestCase):
+    def test_init(self):
+        room = ChatRoom("room")
+
+        self.assertIsInstance(room.channels_model, ChannelsModel)
+        self.assertEqual(room.channels_model.group_channel_name, "room")
+        self.assertEqual(len(room.last_private_message_users), 0)
+
+    def test_channels(self):
+        room = ChatRoom("room")
+
+        self.assertEqual(room.room_channel, "/chat/room")
+        self.assertEqual(room.members_channel, "/members/room")
+
+    def test_private_message_queues_are_not_shared(self):
+        room = ChatRoom("room")
+        other_room = ChatRoom("room")
+
+        room.last_private_message_users.appendleft("user")
+
+        self.assertEqual(len(other_room.last_private_message_users), 0)
 
 
 class TestChatService(TestCase):
@@ -60,26 +98,24 @@ class TestChatService(TestCase):
         self.assertEqual(self.service._members_channel,
                          "/members/" + self.service._room_name)
 
-    @mock.patch("aiocometd_chat_demo.chat_service.ChannelsModel")
     @mock.patch("aiocometd_chat_demo.chat_service.CometdClient")
-    def test_connect(self, cometd_cls, channels_cls):
+    def test_connect(self, cometd_cls):
         cometd_client = mock.MagicMock()
         cometd_cls.return_value = cometd_client
-        channels_model = ChannelsModel("group_name")
-        channels_model.message_sending_requested = mock.MagicMock()
-        channels_cls.return_value = channels_model
         self.service.url = "url"
         self.service.username = "name"
 
         self.service.connect_()
 
-        channels_cls.assert_called_with(self.service._room_name)
-        channels_model.message_sending_requested.connect.assert_called_with(
-            self.service.send_message
-        )
+        room = self.service.room(self.service._room_name)
+        self.assertIs(self.service.channels_model, room.channels_model)
         cometd_cls.assert_called_with(
             self.service.url,
-            (self.service._members_channel, self.service._room_channel)
+            [self.service._members_channel, self.service._room_channel],
+            connection_pool=None,
+            rate_limiter=None,
+            json_codec=None,
+            transport_options=TransportOptions()
         )
         cometd_client.connected.connect.assert_called_with(
             self.service.on_connected
@@ -96,18 +132,469 @@ class TestChatService(TestCase):
         )
         cometd_client.connect_.assert_called()
 
+    @mock.patch("aiocometd_chat_demo.chat_service.CometdClient")
+    def test_connect_subscribes_to_joined_rooms(self, cometd_cls):
+        self.service.join_room("other")
+
+        self.service.connect_()
+
+        cometd_cls.assert_called_with(self.service.url, [
+            "/members/other", "/chat/other",
+            self.service._members_channel, self.service._room_channel
+        ], connection_pool=None, rate_limiter=None, json_codec=None,
+            transport_options=TransportOptions())
+        self.assertEqual(self.service.rooms,
+                         ["other", self.service._room_name])
+
+    @mock.patch("aiocometd_chat_demo.chat_service.CometdClient")
+    def test_connect_with_room_name(self, cometd_cls):
+        service = ChatService(room_name="other")
+
+        service.connect_()
+
+        self.assertEqual(service.rooms, ["other"])
+        self.assertIs(service.channels_model,
+                      service.room_channels_model("other"))
+        cometd_cls.assert_called_with(service.url, [
+            "/members/other", "/chat/other"
+        ], connection_pool=None, rate_limiter=None, json_codec=None,
+            transport_options=TransportOptions())
+
+    @mock.patch("aiocometd_chat_demo.chat_service.CometdClient")
+    def test_connect_with_connection_pool(self, cometd_cls):
+        pool = ConnectionPool()
+        service = ChatService(connection_pool=pool)
+
+        service.connect_()
+
+        self.assertIs(service.connection_pool, pool)
+        self.assertIs(cometd_cls.call_args[1]["connection_pool"], pool)
+
+    @mock.patch("aiocometd_chat_demo.chat_service.CometdClient")
+    def test_connect_with_rate_limiter(self, cometd_cls):
+        rate_limiter = RateLimiter(loop=self.loop)
+        service = ChatService(rate_limiter=rate_limiter)
+
+        service.connect_()
+
+        self.assertIs(service.rate_limiter, rate_limiter)
+        self.assertIs(cometd_cls.call_args[1]["rate_limiter"], rate_limiter)
+
+    @mock.patch("aiocometd_chat_demo.chat_service.CometdClient")
+    def test_connect_with_json_codec(self, cometd_cls):
+        codec = stdlib_codec()
+        service = ChatService(json_codec=codec)
+
+        service.connect_()
+
+        self.assertEqual(service.json_codec, codec.name)
+        self.assertIs(cometd_cls.call_args[1]["json_codec"], codec)
+
+    def test_json_codec(self):
+        self.service.json_codec_changed = mock.MagicMock()
+
+        self.service.json_codec = "json"
+        self.service.json_codec = "json"
+
+        self.assertEqual(self.service.json_codec, "json")
+        self.service.json_codec_changed.emit.assert_called_once_with("json")
+        self.service.json_codec = ""
+        self.assertEqual(self.service.json_codec, "")
+        self.assertIsNone(self.service._json_codec)
+
+    def test_json_codec_auto(self):
+        self.service.json_codec = "auto"
+
+        self.assertEqual(self.service.json_codec, get_codec().name)
+
+    @mock.patch("aiocometd_chat_demo.chat_service.CometdClient")
+    def test_connect_with_transport_options(self, cometd_cls):
+        options = TransportOptions(transport_type=TransportType.WEBSOCKET)
+        service = ChatService(transport_options=options)
+
+        service.connect_()
+
+        self.assertIs(service.transport_options, options)
+        self.assertIs(cometd_cls.call_args[1]["transport_options"], options)
+
+    def test_transport_options(self):
+        self.service.transport_options_changed = mock.MagicMock()
+
+        self.service.transport = "long-polling"
+        self.service.transport = "long-polling"
+        self.service.connect_timeout = 5.0
+        self.service.connection_timeout = 30.0
+        self.service.max_message_size = 0
+        self.service.compression = True
+        self.service.websocket_fallback = False
+
+        self.assertEqual(self.service.transport_options, TransportOptions(
+            transport_type=TransportType.LONG_POLLING,
+            connect_timeout=5.0,
+            connection_timeout=30.0,
+            max_message_size=0,
+            compression=True,
+            websocket_fallback=False
+        ))
+        self.assertEqual(self.service.transport, "long-polling")
+        self.assertEqual(self.service.connect_timeout, 5.0)
+        self.assertEqual(self.service.connection_timeout, 30.0)
+        self.assertEqual(self.service.max_message_size, 0)
+        self.assertTrue(self.service.compression)
+        self.assertFalse(self.service.websocket_fallback)
+        self.assertEqual(
+            self.service.transport_options_changed.emit.call_count, 6
+        )
+
+    def test_transport_invalid(self):
+        with self.assertRaises(ValueError):
+            self.service.transport = "carrier-pigeon"
+
+        self.assertEqual(self.service.transport, "auto")
+
+    def test_join_room(self):
+        self.service.rooms_changed = mock.MagicMock()
+
+        room = self.service.join_room("room")
+
+        self.assertEqual(room.name, "room")
+        self.assertIs(self.service.room("room"), room)
+        self.assertIs(self.service.room_channels_model("room"),
+                      room.channels_model)
+        self.assertEqual(self.service.rooms, ["room"])
+        self.service.rooms_changed.emit.assert_called()
+
+    def test_join_room_sets_username(self):
+        self.service.username = "user"
+
+        room = self.service.join_room("other")
+        self.service.username = "new_user"
+
+        self.assertEqual(room.channels_model.username, "new_user")
+
+    def test_join_room_sets_update_coalescer(self):
+        coalescer = UpdateCoalescer(loop=self.loop)
+        service = ChatService(update_coalescer=coalescer)
+
+        room = service.join_room("other")
+
+        self.assertIs(room.channels_model.coalescer, coalescer)
+
+    def test_coalesce_updates(self):
+        self.service.coalesce_updates_changed = mock.MagicMock()
+        room = self.service.join_room("other")
+
+        self.service.coalesce_updates = True
+
+        self.assertTrue(self.service.coalesce_updates)
+        self.assertIsInstance(self.service.update_coalescer, UpdateCoalescer)
+        self.assertIs(room.channels_model.coalescer,
+                      self.service.update_coalescer)
+        self.service.coalesce_updates_changed.emit.assert_called_with(True)
+
+    def test_disable_coalesce_updates_flushes_messages(self):
+        coalescer = mock.MagicMock()
+        self.service.update_coalescer = coalescer
+        room = self.service.join_room("other")
+
+        self.service.coalesce_updates = False
+
+        coalescer.flush.assert_called()
+        self.assertIsNone(self.service.update_coalescer)
+        self.assertIsNone(room.channels_model.coalescer)
+
+    def test_take_snapshot_flushes_coalesced_messages(self):
+        self.service.update_coalescer = mock.MagicMock()
+
+        self.service.take_snapshot()
+
+        self.service.update_coalescer.flush.assert_called()
+
+    def test_join_room_twice(self):
+        room = self.service.join_room("room")
+
+        self.assertIs(self.service.join_room("room"), room)
+        self.assertEqual(self.service.rooms, ["room"])
+
+    def test_join_room_while_connected(self):
+        client = mock.MagicMock()
+        client.state = ClientState.CONNECTED
+        self.service._client = client
+        self.service.username = "me"
+        response = client.subscribe.return_value
+
+        room = self.service.join_room("room")
+
+        client.subscribe.assert_has_calls([
+            mock.call(room.members_channel),
+            mock.call(room.room_channel)
+        ])
+        client.publish.assert_not_called()
+        response.finished.connect.call_args[0][0]()
+        client.publish.assert_called_with(
+            self.service._members_service_channel,
+            dict(user="me", room=room.room_channel)
+        )
+
+    def test_join_room_while_connecting(self):
+        client = mock.MagicMock()
+        client.state = ClientState.DISCONNECTED
+        self.service._client = client
+
+        room = self.service.join_room("room")
+
+        client.subscribe.assert_called_with(room.room_channel)
+        client.subscribe.return_value.finished.connect.assert_not_called()
+        client.publish.assert_not_called()
+
+    def test_join_room_forwards_message_sending_requests(self):
+        room = self.service.join_room("room")
+        self.service._client = mock.MagicMock()
+        self.service.username = "me"
+
+        room.channels_model.message_sending_requested.emit(
+            "room", ChannelType.GROUP, "contents"
+        )
+
+        self.service._client.publish.assert_called_with(
+            room.room_channel, dict(user="me", chat="contents")
+        )
+
+    def test_leave_room(self):
+        room = self.service.join_room("room")
+        client = mock.MagicMock()
+        self.service._client = client
+        self.service.rooms_changed = mock.MagicMock()
+
+        self.service.leave_room("room")
+
+        self.assertIsNone(self.service.room("room"))
+        self.assertIsNone(self.service.room_channels_model("room"))
+        self.assertEqual(self.service.rooms, [])
+        client.unsubscribe.assert_has_calls([
+            mock.call(room.room_channel),
+            mock.call(room.members_channel)
+        ])
+        self.service.rooms_changed.emit.assert_called()
+        self.service.message_received({
+            "channel": room.room_channel,
+            "data": dict(user="user", chat="contents")
+        })
+        self.assertEqual(self.service.last_error, "No joined chat rooms.")
+
+    def test_leave_room_discards_buffered_messages(self):
+        coalescer = UpdateCoalescer(loop=self.loop)
+        self.service.update_coalescer = coalescer
+        room = self.service.join_room("room")
+        room.channels_model.add_incoming_message(
+            "room", ChannelType.GROUP,
+            ChatMessage(sender="user", contents="contents",
+                        time=datetime.now())
+        )
+        self.assertEqual(len(coalescer), 1)
+
+        self.service.leave_room("room")
+
+        self.assertEqual(len(coalescer), 0)
+        self.assertEqual(coalescer._loads, {})
+
+    def test_leave_room_not_joined(self):
+        self.service.rooms_changed = mock.MagicMock()
+
+        self.service.leave_room("room")
+
+        self.service.rooms_changed.emit.assert_not_called()
+
+    def test_leave_default_room(self):
+        self.service.join_room(self.service._room_name)
+        expected_message = "Can't leave the default chat room."
+
+        with self.assertLogs(self.logger, "ERROR") as logs:
+            self.service.leave_room(self.service._room_name)
+
+        self.assertEqual(logs.output, [
+            f"ERROR:{self.logger_name}:{expected_message}"
+        ])
+        self.assertIsNotNone(self.service.room(self.service._room_name))
+
     def test_on_connected(self):
+        self.service.join_room(self.service._room_name)
+        self.service.join_room("other")
         self.service._client = mock.MagicMock()
         self.service.connected = mock.MagicMock()
 
         self.service.on_connected()
 
-        self.service._client.publish.assert_called_with(
-            self.service._members_service_channel,
-            dict(user=self.service.username, room=self.service._room_channel)
-        )
+        self.service._client.publish.assert_has_calls([
+            mock.call(self.service._members_service_channel,
+                      dict(user=self.service.username,
+                           room=self.service._room_channel)),
+            mock.call(self.service._members_service_channel,
+                      dict(user=self.service.username, room="/chat/other"))
+        ])
         self.service.connected.emit.assert_called()
 
+    def history_service(self):
+        service = ChatService(history_channel="/service/history",
+                              history_page_size=20)
+        service.username = "me"
+        service._client = mock.MagicMock()
+        service._client.state = ClientState.CONNECTED
+        room = service.join_room(service._room_name)
+        return service, room
+
+    def test_join_room_enables_history(self):
+        service, room = self.history_service()
+
+        self.assertTrue(
+            room.channels_model.group_channel.conversation.canFetchMore()
+        )
+        self.assertFalse(self.service.join_room("other").channels_model
+                         .group_channel.conversation.canFetchMore())
+
+    def test_on_connected_fetches_history(self):
+        service, room = self.history_service()
+        other_room = service.join_room("other")
+
+        service.on_connected()
+
+        service._client.publish.assert_has_calls([
+            mock.call("/service/history", {"room": room.room_channel,
+                                           "limit": 20, "before": None}),
+            mock.call("/service/history", {"room": other_room.room_channel,
+                                           "limit": 20, "before": None}),
+        ], any_order=True)
+
+    def test_fetch_history_of_user_channel(self):
+        service, room = self.history_service()
+        room.channels_model.update_available_channels({"peer"})
+        conversation = room.channels_model.conversation("peer",
+                                                        ChannelType.USER)
+
+        conversation.fetchMore()
+
+        service._client.publish.assert_called_once_with(
+            "/service/history",
+            {"room": room.room_channel, "limit": 20, "before": None,
+             "user": "me", "peer": "peer"}
+        )
+
+    def test_fetch_history_deferred_until_connected(self):
+        service, room = self.history_service()
+        service._client.state = ClientState.DISCONNECTED
+        conversation = room.channels_model.group_channel.conversation
+
+        conversation.fetchMore()
+
+        service._client.publish.assert_not_called()
+        service._client.state = ClientState.CONNECTED
+        service.on_connected()
+        history_calls = [call for call in service._client.publish.mock_calls
+                         if call[1][0] == "/service/history"]
+        self.assertEqual(len(history_calls), 1)
+        self.assertEqual(room.deferred_history, set())
+
+    def history_response(self, result=None, error=None):
+        response = MessageResponse()
+        response.result = result
+        response.error = error
+        return response
+
+    def test_on_history_page(self):
+        service, room = self.history_service()
+        room.sequence_tracker.add(3)
+        conversation = room.channels_model.group_channel.conversation
+        conversation.fetchMore()
+        messages = [
+            {"channel": room.room_channel,
+             "data": {"user": "peer", "chat": str(sequence)},
+             "ext": {"seq": sequence,
+                     "timestamp": 1500000000000 + sequence}}
+            for sequence in (1, 2, 3)
+        ]
+        response = self.history_response(
+            {"data": {"messages": messages, "cursor": 1}}
+        )
+
+        service._on_history_page(room, room.name, ChannelType.GROUP,
+                                 response)
+
+        self.assertEqual([conversation.data(conversation.index(row, 0),
+                                            ItemRole.CONTENTS)
+                          for row in range(conversation.rowCount())],
+                         ["1", "2"])
+        self.assertEqual(conversation.history_cursor, 1)
+        self.assertTrue(conversation.canFetchMore())
+        self.assertIn(1, room.sequence_tracker)
+        self.assertIn(2, room.sequence_tracker)
+
+    def test_on_history_page_after_restoring_snapshot(self):
+        service, room = self.history_service()
+        messages = [
+            {"channel": room.room_channel,
+             "data": {"user": "peer", "chat": str(sequence)},
+             "ext": {"seq": sequence,
+                     "timestamp": 1500000000000 + sequence}}
+            for sequence in (1, 2, 3)
+        ]
+        conversation = room.channels_model.group_channel.conversation
+        conversation.fetchMore()
+        service._on_history_page(room, room.name, ChannelType.GROUP,
+                                 self.history_response(
+                                     {"data": {"messages": messages[:2],
+                                               "cursor": None}}
+                                 ))
+        snapshot = service.take_snapshot()
+        restored_service, restored_room = self.history_service()
+        restored_service.restore_snapshot(snapshot)
+        restored_conversation = \
+            restored_room.channels_model.group_channel.conversation
+        restored_conversation.fetchMore()
+
+        restored_service._on_history_page(
+            restored_room, restored_room.name, ChannelType.GROUP,
+            self.history_response({"data": {"messages": messages,
+                                            "cursor": None}})
+        )
+
+        self.assertEqual([restored_conversation.data(
+            restored_conversation.index(row, 0), ItemRole.CONTENTS
+        ) for row in range(restored_conversation.rowCount())],
+                         ["1", "2", "3"])
+
+    def test_on_history_page_without_history_service(self):
+        service, room = self.history_service()
+        conversation = room.channels_model.group_channel.conversation
+        conversation.fetchMore()
+
+        service._on_history_page(room, room.name, ChannelType.GROUP,
+                                 self.history_response({"successful": True}))
+
+        self.assertFalse(conversation.canFetchMore())
+        self.assertEqual(conversation.rowCount(), 0)
+
+    def test_on_history_page_error(self):
+        service, room = self.history_service()
+        conversation = room.channels_model.group_channel.conversation
+        conversation.fetchMore()
+
+        with self.assertLogs(self.logger, "ERROR"):
+            service._on_history_page(
+                room, room.name, ChannelType.GROUP,
+                self.history_response(error=ValueError("error"))
+            )
+
+        self.assertTrue(conversation.canFetchMore())
+
+    def test_on_history_page_of_left_room(self):
+        service, room = self.history_service()
+        service.join_room("other")
+        other_room = service.room("other")
+        service.leave_room("other")
+
+        service._on_history_page(other_room, "other", ChannelType.GROUP,
+                                 self.history_response(error=ValueError()))
+
     def test_on_connected_sets_error_on_no_client(self):
         self.service._client = None
         expected_message = "Uninitialized _client attribute."
@@ -120,6 +607,169 @@ class TestChatService(TestCase):
         ])
         self.assertEqual(self.service.last_error, expected_message)
 
+    def test_on_connected_attaches_outbox(self):
+        self.service._client = mock.MagicMock()
+        self.service._outbox = mock.MagicMock()
+
+        self.service.on_connected()
+
+        self.service._outbox.attach.assert_called_with(self.service._client)
+
+    def test_on_disconnected_detaches_outbox(self):
+        self.service._client = mock.MagicMock()
+        self.service._outbox = mock.MagicMock()
+
+        self.service.on_disconnected()
+
+        self.service._outbox.detach.assert_called()
+
+    def test_on_disconnected_clears_queued_messages(self):
+        client = mock.MagicMock()
+        self.service._client = client
+
+        self.service.on_disconnected()
+
+        client.clear_queued_messages.assert_called()
+
+    @mock.patch("aiocometd_chat_demo.chat_service.CometdClient")
+    def test_connect_clears_queued_messages_of_replaced_client(self,
+                                                               cometd_cls):
+        old_client = mock.MagicMock()
+        self.service._client = old_client
+
+        self.service.connect_()
+
+        old_client.clear_queued_messages.assert_called()
+        self.assertIs(self.service._client, cometd_cls.return_value)
+
+    def test_set_outbox_while_connected(self):
+        client = mock.MagicMock()
+        client.state = ClientState.CONNECTED
+        self.service._client = client
+        old_outbox = mock.MagicMock()
+        self.service._outbox = old_outbox
+        outbox = mock.MagicMock()
+
+        self.service.outbox = outbox
+
+        old_outbox.detach.assert_called()
+        outbox.attach.assert_called_with(client)
+        self.assertIs(self.service.outbox, outbox)
+
+    def test_outbox_path(self):
+        self.service.outbox_path_changed = mock.MagicMock()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "outbox.jsonl")
+
+            self.service.outbox_path = path
+
+            self.assertEqual(self.service.outbox_path, path)
+            self.assertEqual(self.service.outbox.path, path)
+            self.service.outbox_path_changed.emit.assert_called_with(path)
+            self.service.outbox_path = ""
+            self.assertIsNone(self.service.outbox)
+            self.assertEqual(self.service.outbox_path, "")
+
+    def make_snapshot(self):
+        message = ChatMessage(time=datetime(2020, 1, 1), sender="a",
+                              contents="hello")
+        return Snapshot(username="user", url="url", rooms=[
+            RoomSnapshot(name=self.service._room_name, members=["a"],
+                         conversations=[
+                             ConversationSnapshot(self.service._room_name,
+                                                  ChannelType.GROUP,
+                                                  [message])
+                         ]),
+            RoomSnapshot(name="other"),
+        ])
+
+    async def test_snapshot_path_restores_snapshot(self):
+        self.service.snapshot_path_changed = mock.MagicMock()
+        restored = mock.MagicMock()
+        self.service.snapshot_restored.connect(restored)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "snapshot.bin")
+            save_snapshot(self.make_snapshot(), path)
+
+            self.service.snapshot_path = path
+            self.assertEqual(self.service.rooms, [])
+            await asyncio.sleep(0)
+
+            self.assertEqual(self.service.snapshot_path, path)
+            self.service.snapshot_path_changed.emit.assert_called_with(path)
+            self.assertEqual(self.service.rooms,
+                             [self.service._room_name, "other"])
+            channels_model = self.service.channels_model
+            self.assertIs(channels_model,
+                          self.service.room(self.service._room_name)
+                          .channels_model)
+            self.assertEqual(channels_model.channel_row("a"), 1)
+            self.assertEqual(channels_model.group_channel.conversation
+                             .tail(1)[0].contents, "hello")
+            restored.assert_called_with("user", "url")
+            self.service.snapshot_path = ""
+
+    async def test_snapshot_path_without_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.service.snapshot_path = os.path.join(directory, "x.bin")
+            await asyncio.sleep(0)
+
+            self.assertEqual(self.service.rooms, [])
+            self.service.snapshot_path = ""
+
+    def test_save_snapshot(self):
+        self.service.username = "user"
+        self.service.url = "url"
+        self.service.restore_snapshot(self.make_snapshot())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "snapshot.bin")
+            self.service._snapshot_path = path
+
+            self.service.save_snapshot()
+
+            self.assertEqual(load_snapshot(path), self.make_snapshot())
+
+    def test_save_snapshot_without_rooms(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "snapshot.bin")
+            self.service._snapshot_path = path
+
+            self.service.save_snapshot()
+
+            self.assertFalse(os.path.exists(path))
+
+    def test_on_disconnected_saves_snapshot(self):
+        self.service._client = mock.MagicMock()
+        self.service.join_room(self.service._room_name)
+        self.service.save_snapshot = mock.MagicMock()
+
+        self.service.on_disconnected()
+
+        self.service.save_snapshot.assert_called()
+
+    @mock.patch("aiocometd_chat_demo.chat_service.CometdClient")
+    def test_connect_keeps_restored_rooms(self, cometd_cls):
+        self.service.username = "user"
+        self.service.restore_snapshot(self.make_snapshot())
+        channels_model = self.service.channels_model
+
+        self.service.connect_()
+
+        self.assertIs(self.service.channels_model, channels_model)
+        self.assertEqual(self.service.rooms,
+                         [self.service._room_name, "other"])
+
+    @mock.patch("aiocometd_chat_demo.chat_service.CometdClient")
+    def test_connect_drops_rooms_restored_for_other_user(self, cometd_cls):
+        self.service.username = "other_user"
+        self.service.restore_snapshot(self.make_snapshot())
+        channels_model = self.service.channels_model
+
+        self.service.connect_()
+
+        self.assertIsNot(self.service.channels_model, channels_model)
+        self.assertEqual(self.service.rooms, [self.service._room_name])
+
     def test_disconnect(self):
         self.service._client = mock.MagicMock()
 
@@ -133,17 +783,51 @@ class TestChatService(TestCase):
     def test_on_disconnected(self):
         client = mock.MagicMock()
         self.service._client = client
+        room = self.service.join_room(self.service._room_name)
         channels_model = mock.MagicMock()
+        room.channels_model = channels_model
         self.service._channels_model = channels_model
         self.service.disconnected = mock.MagicMock()
 
+        room.last_private_message_users.append("peer")
+        room.backlog_ranges.append((1, 2))
+
         self.service.on_disconnected()
 
         client.disconnect.assert_called()
-        channels_model.disconnect.assert_called()
+        channels_model.disconnect.assert_not_called()
         self.service.disconnected.emit.assert_called()
         self.assertIsNone(self.service._client)
-        self.assertIsNone(self.service.channels_model)
+        self.assertIsNone(self.service.client)
+        self.assertIs(self.service.channels_model, channels_model)
+        self.assertIs(self.service.room(self.service._room_name), room)
+        self.assertEqual(list(room.last_private_message_users), [])
+        self.assertEqual(room.backlog_ranges, [])
+
+    def test_on_disconnected_keeps_coalesced_messages(self):
+        self.service._client = mock.MagicMock()
+        self.service.join_room(self.service._room_name)
+        coalescer = mock.MagicMock()
+        self.service.update_coalescer = coalescer
+
+        self.service.on_disconnected()
+
+        coalescer.clear.assert_not_called()
+        self.assertEqual(self.service.rooms, [self.service._room_name])
+
+    @mock.patch("aiocometd_chat_demo.chat_service.CometdClient")
+    def test_connect_drops_rooms_kept_for_other_user(self, cometd_cls):
+        self.service.username = "me"
+        self.service.connect_()
+        self.service.join_room("other")
+        channels_model = self.service.channels_model
+        self.service.on_disconnected()
+        self.service.username = "other_user"
+
+        self.service.connect_()
+
+        self.assertIsNot(self.service.channels_model, channels_model)
+        self.assertEqual(self.service.rooms, [self.service._room_name])
 
     def test_on_disconnected_sets_error_on_no_client(self):
         self.service._client = None
@@ -168,14 +852,31 @@ class TestChatService(TestCase):
         ])
         self.assertEqual(self.service.last_error, repr(error))
 
+    def test_message_received_drops_sent_private_message_without_peer(self):
+        self.service.username = "me"
+        room = self.join_room_with_mock_model(self.service._room_name)
+
+        with self.assertLogs(self.logger, "WARNING"):
+            self.service.message_received({
+                "channel": self.service._room_channel,
+                "data": dict(user="me", scope="private", chat="contents")
+            })
+
+        room.channels_model.add_incoming_message.assert_not_called()
+
+    def join_room_with_mock_model(self, name):
+        room = self.service.join_room(name)
+        room.channels_model = mock.MagicMock()
+        return room
+
     @mock.patch("aiocometd_chat_demo.chat_service.datetime")
     def test_message_received_on_chat_message(self, datetime_cls):
         self.service.username = "me"
         other_user = "user"
         datetime_cls.now.return_value = datetime.now()
-        channels_model = mock.MagicMock()
-        self.service._channels_model = channels_model
-        self.service._last_private_message_users.appendleft(other_user)
+        room = self.join_room_with_mock_model(self.service._room_name)
+        channels_model = room.channels_model
+        room.last_private_message_users.appendleft(other_user)
         cases = (
             ("group message", other_user, None, self.service._room_name,
              ChannelType.GROUP),
@@ -204,9 +905,73 @@ class TestChatService(TestCase):
                     message=chat_message
                 )
 
+    def chat_message(self, sequence, contents="contents", timestamp=None):
+        ext = {"seq": sequence}
+        if timestamp is not None:
+            ext["timestamp"] = timestamp
+        return {
+            "channel": self.service._room_channel,
+            "data": {"user": "user", "chat": contents},
+            "ext": ext
+        }
+
+    def test_message_received_uses_server_timestamp(self):
+        channels_model = self.join_room_with_mock_model(
+            self.service._room_name
+        ).channels_model
+
+        self.service.message_received(
+            self.chat_message(1, timestamp=1500000000000)
+        )
+
+        message = channels_model.add_incoming_message.call_args[1]["message"]
+        self.assertEqual(message.time, datetime.fromtimestamp(1500000000))
+
+    def test_message_received_drops_duplicates(self):
+        channels_model = self.join_room_with_mock_model(
+            self.service._room_name
+        ).channels_model
+
+        self.service.message_received(self.chat_message(1))
+        self.service.message_received(self.chat_message(2))
+        self.service.message_received(self.chat_message(1))
+
+        self.assertEqual(channels_model.add_incoming_message.call_count, 2)
+
+    async def test_message_received_requests_missing_messages(self):
+        room = self.join_room_with_mock_model(self.service._room_name)
+        self.service._client = mock.MagicMock()
+        self.service._client.state = ClientState.CONNECTED
+
+        self.service.message_received(self.chat_message(1))
+        self.service.message_received(self.chat_message(4))
+        self.service.message_received(self.chat_message(7))
+        self.service.message_received(self.chat_message(3))
+        await asyncio.sleep(0)
+
+        self.service._client.publish.assert_called_once_with(
+            "/service/backlog",
+            {"room": room.room_channel, "ranges": [[2, 2], [5, 6]]}
+        )
+        self.assertEqual(room.backlog_ranges, [])
+        self.assertEqual(room.channels_model.add_incoming_message.call_count,
+                         4)
+
+    async def test_missing_messages_not_requested_if_disconnected(self):
+        self.join_room_with_mock_model(self.service._room_name)
+        self.service._client = mock.MagicMock()
+        self.service._client.state = ClientState.DISCONNECTED
+
+        self.service.message_received(self.chat_message(1))
+        self.service.message_received(self.chat_message(3))
+        await asyncio.sleep(0)
+
+        self.service._client.publish.assert_not_called()
+
     def test_message_received_on_members_message(self):
-        channels_model = mock.MagicMock()
-        self.service._channels_model = channels_model
+        channels_model = self.join_room_with_mock_model(
+            self.service._room_name
+        ).channels_model
         other_user = "user"
         self.service.username = "me"
         cometd_message = {
@@ -220,9 +985,51 @@ class TestChatService(TestCase):
             set((other_user, ))
         )
 
+    def test_message_received_on_members_message_without_self(self):
+        channels_model = self.join_room_with_mock_model(
+            self.service._room_name
+        ).channels_model
+        other_user = "user"
+        self.service.username = "me"
+        cometd_message = {
+            "data": [other_user],
+            "channel": "/members/demo"
+        }
+
+        self.service.message_received(cometd_message)
+
+        channels_model.update_available_channels.assert_called_with(
+            set((other_user, ))
+        )
+
+    def test_message_received_routed_to_room(self):
+        default_room = self.join_room_with_mock_model(self.service._room_name)
+        other_room = self.join_room_with_mock_model("other")
+
+        self.service.message_received({
+            "channel": "/chat/other",
+            "data": dict(user="user", chat="contents")
+        })
+        self.service.message_received({
+            "channel": "/members/other",
+            "data": ["user"]
+        })
+
+        other_room.channels_model.add_incoming_message.assert_called_with(
+            channel_name="other",
+            channel_type=ChannelType.GROUP,
+            message=mock.ANY
+        )
+        other_room.channels_model.update_available_channels\
+            .assert_called_with({"user"})
+        default_room.channels_model.add_incoming_message.assert_not_called()
+        default_room.channels_model.update_available_channels\
+            .assert_not_called()
+
     def test_message_received_ignores_unrecognized_channels(self):
-        channels_model = mock.MagicMock()
-        self.service._channels_model = channels_model
+        channels_model = self.join_room_with_mock_model(
+            self.service._room_name
+        ).channels_model
         cometd_message = {
             "data": {},
             "channel": "/unrecognized_channel"
@@ -234,9 +1041,8 @@ class TestChatService(TestCase):
         channels_model.add_incoming_message.assert_not_called()
         self.assertEqual(self.service.last_error, "")
 
-    def test_message_received_sets_error_on_no_channels_model(self):
-        self.service._channels_model = None
-        expected_message = "Uninitialized channels_model attribute."
+    def test_message_received_sets_error_on_no_rooms(self):
+        expected_message = "No joined chat rooms."
 
         with self.assertLogs(self.logger, "ERROR") as logs:
             self.service.message_received({})
@@ -250,25 +1056,28 @@ class TestChatService(TestCase):
         self.service.username = "me"
         contents = "message contents"
         self.service._client = mock.MagicMock()
+        self.service.join_room(self.service._room_name)
 
-        self.service.send_message(self.service._room_name,
-                                  ChannelType.GROUP,
-                                  contents)
+        result = self.service.send_message(self.service._room_name,
+                                           ChannelType.GROUP,
+                                           contents)
 
         self.service._client.publish.assert_called_with(
             self.service._room_channel,
             dict(user=self.service.username, chat=contents)
         )
+        self.assertEqual(result, self.service._client.publish.return_value)
 
     def test_send_message_user_channel(self):
         self.service.username = "me"
         contents = "message contents"
         other_user = "user"
         self.service._client = mock.MagicMock()
+        room = self.service.join_room(self.service._room_name)
 
-        self.service.send_message(other_user,
-                                  ChannelType.USER,
-                                  contents)
+        result = self.service.send_message(other_user,
+                                           ChannelType.USER,
+                                           contents)
 
         self.service._client.publish.assert_called_with(
             "/service/privatechat",
@@ -279,15 +1088,451 @@ class TestChatService(TestCase):
                 peer=other_user
             )
         )
+        self.assertEqual(result, self.service._client.publish.return_value)
+        self.assertEqual(list(room.last_private_message_users),
+                         [other_user])
+
+    def test_send_message_to_other_room(self):
+        self.service.username = "me"
+        self.service._client = mock.MagicMock()
+        room = self.service.join_room("other")
+
+        self.service.send_message("user", ChannelType.USER, "contents",
+                                  room_name="other")
+
+        self.service._client.publish.assert_called_with(
+            "/service/privatechat",
+            dict(room=room.room_channel, user="me", chat="contents",
+                 peer="user")
+        )
+        self.assertEqual(list(room.last_private_message_users), ["user"])
+
+    def test_send_message_sets_error_on_unknown_room(self):
+        self.service._client = mock.MagicMock()
+        expected_message = "Not a joined chat room: 'other'."
+
+        with self.assertLogs(self.logger, "ERROR") as logs:
+            result = self.service.send_message("other", ChannelType.GROUP,
+                                               "contents", room_name="other")
+
+        self.assertIsNone(result)
+        self.assertEqual(logs.output, [
+            f"ERROR:{self.logger_name}:{expected_message}"
+        ])
+        self.service._client.publish.assert_not_called()
 
     def test_send_message_sets_error_on_no_client(self):
         self.service._client = None
         expected_message = "Uninitialized _client attribute."
 
         with self.assertLogs(self.logger, "ERROR") as logs:
-            self.service.send_message("user", ChannelType.USER, "contents")
+            result = self.service.send_message("user", ChannelType.USER,
+                                               "contents")
 
+        self.assertIsNone(result)
         self.assertEqual(logs.output, [
             f"ERROR:{self.logger_name}:{expected_message}"
         ])
         self.assertEqual(self.service.last_error, expected_message)
+
+    def test_send_message_with_outbox(self):
+        self.service.username = "me"
+        self.service._client = mock.MagicMock()
+        self.service._client.state = ClientState.DISCONNECTED
+        room = self.service.join_room(self.service._room_name)
+        self.service.outbox = Outbox(loop=self.loop)
+
+        result = self.service.send_message("user", ChannelType.USER,
+                                           "contents")
+
+        self.assertIsNone(result)
+        self.service._client.publish.assert_not_called()
+        message = self.service.outbox.messages[0]
+        self.assertEqual(message.channel, "/service/privatechat")
+        self.assertEqual(message.data, dict(room=room.room_channel,
+                                            user="me", chat="contents",
+                                            peer="user"))
+        # the peer is stored when the outbox sends the message
+        self.assertEqual(list(room.last_private_message_users), [])
+
+    def test_outbox_sending_private_message_stores_peer(self):
+        self.service.username = "me"
+        room = self.service.join_room(self.service._room_name)
+        self.service.outbox = Outbox(loop=self.loop)
+        self.service.send_message("user", ChannelType.USER, "contents")
+        message = self.service.outbox.messages[0]
+
+        self.service.outbox.message_state_changed.emit(
+            message.id, DeliveryState.SENDING
+        )
+
+        self.assertEqual(list(room.last_private_message_users), ["user"])
+        self.assertEqual(self.service._sending_private_messages,
+                         {message.id: (room, "user")})
+
+    def test_outbox_delivered_private_message_keeps_peer(self):
+        self.service.username = "me"
+        room = self.service.join_room(self.service._room_name)
+        self.service.outbox = Outbox(loop=self.loop)
+        self.service.send_message("user", ChannelType.USER, "contents")
+        message = self.service.outbox.messages[0]
+        self.service.outbox.message_state_changed.emit(
+            message.id, DeliveryState.SENDING
+        )
+
+        self.service.outbox.message_state_changed.emit(
+            message.id, DeliveryState.DELIVERED
+        )
+
+        self.assertEqual(list(room.last_private_message_users), ["user"])
+        self.assertEqual(self.service._sending_private_messages, {})
+
+    def test_outbox_requeued_private_message_removes_peer(self):
+        self.service.username = "me"
+        room = self.service.join_room(self.service._room_name)
+        self.service.outbox = Outbox(loop=self.loop)
+        self.service.send_message("user", ChannelType.USER, "contents")
+        message = self.service.outbox.messages[0]
+        self.service.outbox.message_state_changed.emit(
+            message.id, DeliveryState.SENDING
+        )
+
+        self.service.outbox.message_state_changed.emit(
+            message.id, DeliveryState.QUEUED
+        )
+
+        self.assertEqual(list(room.last_private_message_users), [])
+        self.assertEqual(self.service._sending_private_messages, {})
+
+    def test_outbox_sending_group_message_doesnt_store_peer(self):
+        self.service.username = "me"
+        room = self.service.join_room(self.service._room_name)
+        self.service.outbox = Outbox(loop=self.loop)
+        self.service.send_message(self.service._room_name, ChannelType.GROUP,
+                                  "contents")
+        message = self.service.outbox.messages[0]
+
+        self.service.outbox.message_state_changed.emit(
+            message.id, DeliveryState.SENDING
+        )
+
+        self.assertEqual(list(room.last_private_message_users), [])
+        self.assertEqual(self.service._sending_private_messages, {})
+
+    def test_replaced_outbox_is_disconnected(self):
+        old_outbox = Outbox(loop=self.loop)
+        self.service.outbox = old_outbox
+        self.service.outbox = Outbox(loop=self.loop)
+        room = self.service.join_room(self.service._room_name)
+        message = old_outbox.enqueue(
+            "/service/privatechat",
+            dict(room=room.room_channel, user="me", chat="contents",
+                 peer="user")
+        )
+
+        old_outbox.message_state_changed.emit(message.id,
+                                              DeliveryState.SENDING)
+
+        self.assertEqual(list(room.last_private_message_users), [])
+
+    def test_send_message_with_outbox_while_disconnected(self):
+        self.service.username = "me"
+        self.service._client = None
+        self.service.outbox = Outbox(loop=self.loop)
+
+        result = self.service.send_message("user", ChannelType.USER,
+                                           "contents")
+
+        self.assertIsNone(result)
+        self.assertEqual(self.service.last_error, "")
+        message = self.service.outbox.messages[0]
+        self.assertEqual(message.channel, "/service/privatechat")
+        self.assertEqual(message.data, dict(room="/chat/demo", user="me",
+                                            chat="contents", peer="user"))
+
+    def test_send_message_sets_error_on_full_outbox(self):
+        self.service._client = mock.MagicMock()
+        room = self.service.join_room(self.service._room_name)
+        self.service._outbox = Outbox(max_messages=0, loop=self.loop)
+
+        with self.assertLogs(self.logger, "ERROR"):
+            result = self.service.send_message("user", ChannelType.USER,
+                                               "contents")
+
+        self.assertIsNone(result)
+        self.assertIn("The outbox is full", self.service.last_error)
+        self.assertEqual(list(room.last_private_message_users), [])
+
+
+class TestChatServiceWithServer(TestCase):
+    async def wait_for(self, condition, timeout=5.0):
+        deadline = self.loop.time() + timeout
+        while not condition():
+            self.assertLess(self.loop.time(), deadline)
+            await asyncio.sleep(0.01)
+
+    async def test_rooms_share_connection(self):
+        async with LocalChatServer() as server:
+            service = ChatService()
+            service.url = server.url
+            service.username = "me"
+            connected = asyncio.Event()
+            service.connected.connect(connected.set)
+            service.connect_()
+            await asyncio.wait_for(connected.wait(), 5)
+
+            room = service.join_room("other")
+            await self.wait_for(
+                lambda: server.members("/chat/other") == ["me"]
+            )
+            server.publish("/chat/other", {"user": "peer", "chat": "hello"})
+            server.publish("/members/other", ["me", "peer"])
+            conversation = room.channels_model.group_channel.conversation
+            await self.wait_for(lambda: conversation.rowCount() == 1)
+            await self.wait_for(lambda: room.channels_model.rowCount() == 2)
+            self.assertEqual(server.client_count, 1)
+            self.assertEqual(server.members("/chat/demo"), ["me"])
+
+            service.leave_room("other")
+            service.disconnect_()
+            await self.wait_for(lambda: service.client is None)
+
+        self.assertEqual(service.rooms, [service._room_name])
+        self.assertEqual(service.last_error, "")
+
+    async def test_rooms_are_kept_across_reconnects(self):
+        async with LocalChatServer() as server:
+            service = ChatService()
+            service.url = server.url
+            service.username = "me"
+            connected = asyncio.Event()
+            service.connected.connect(connected.set)
+            service.connect_()
+            await asyncio.wait_for(connected.wait(), 5)
+            room = service.join_room("other")
+            await self.wait_for(
+                lambda: server.members("/chat/other") == ["me"]
+            )
+            channels_model = service.channels_model
+            service.disconnect_()
+            await self.wait_for(lambda: service.client is None)
+            self.assertEqual(service.rooms, [service._room_name, "other"])
+
+            connected.clear()
+            service.connect_()
+            await asyncio.wait_for(connected.wait(), 5)
+            await self.wait_for(
+                lambda: server.members("/chat/other") == ["me"]
+            )
+            server.publish("/chat/other", {"user": "peer", "chat": "hello"})
+
+            conversation = room.channels_model.group_channel.conversation
+            await self.wait_for(lambda: conversation.rowCount() == 1)
+            self.assertIs(service.room("other"), room)
+            self.assertIs(service.channels_model, channels_model)
+
+            service.disconnect_()
+            await self.wait_for(lambda: service.client is None)
+        self.assertEqual(service.last_error, "")
+
+    async def test_history_is_fetched_in_pages(self):
+        async with LocalChatServer() as server:
+            for index in range(5):
+                server.publish("/chat/demo",
+                               {"user": "peer", "chat": str(index)})
+            service = ChatService(history_channel="/service/history",
+                                  history_page_size=3)
+            service.url = server.url
+            service.username = "me"
+            connected = asyncio.Event()
+            service.connected.connect(connected.set)
+            service.connect_()
+            await asyncio.wait_for(connected.wait(), 5)
+            conversation = service.channels_model.group_channel.conversation
+            await self.wait_for(lambda: conversation.rowCount() == 3)
+            self.assertTrue(conversation.canFetchMore())
+
+            conversation.fetchMore()
+
+            await self.wait_for(lambda: conversation.rowCount() == 5)
+            contents = [conversation.data(conversation.index(row, 0),
+                                          ItemRole.CONTENTS)
+                        for row in range(conversation.rowCount())]
+            self.assertEqual(contents, ["0", "1", "2", "3", "4"])
+            self.assertFalse(conversation.canFetchMore())
+
+            service.disconnect_()
+            await self.wait_for(lambda: service.client is None)
+        self.assertEqual(service.last_error, "")
+
+    async def test_missing_messages_are_fetched_from_backlog(self):
+        async with LocalChatServer() as server:
+            service = ChatService()
+            service.url = server.url
+            service.username = "me"
+            connected = asyncio.Event()
+            service.connected.connect(connected.set)
+            service.connect_()
+            await asyncio.wait_for(connected.wait(), 5)
+            conversation = service.channels_model.group_channel.conversation
+            server.publish("/chat/demo", {"user": "peer", "chat": "1"})
+            await self.wait_for(lambda: conversation.rowCount() == 1)
+
+            # lose the next message on its way to the client
+            server.publish("/chat/demo", {"user": "peer", "chat": "2"})
+            for session in server._sessions.values():
+                session.queue.clear()
+            # the timestamps have millisecond resolution
+            await asyncio.sleep(0.01)
+            server.publish("/chat/demo", {"user": "peer", "chat": "3"})
+
+            await self.wait_for(lambda: conversation.rowCount() == 3)
+            contents = [conversation.data(conversation.index(row, 0),
+                                          ItemRole.CONTENTS)
+                        for row in range(conversation.rowCount())]
+            self.assertEqual(contents, ["1", "2", "3"])
+
+            service.disconnect_()
+            await self.wait_for(lambda: service.client is None)
+        self.assertEqual(service.last_error, "")
+
+    async def test_outbox_delivers_messages_sent_while_connecting(self):
+        async with LocalChatServer() as server:
+            service = ChatService()
+            service.url = server.url
+            service.username = "me"
+            service.outbox = Outbox(loop=self.loop)
+            service.connect_()
+
+            service.send_message(service._room_name, ChannelType.GROUP,
+                                 "first")
+            service.send_message(service._room_name, ChannelType.GROUP,
+                                 "second")
+
+            conversation = service.channels_model.group_channel.conversation
+            await self.wait_for(lambda: conversation.rowCount() == 2)
+            self.assertEqual(
+                [conversation.data(conversation.index(row, 0),
+                                   ItemRole.CONTENTS)
+                 for row in range(2)],
+                ["first", "second"]
+            )
+            self.assertEqual(len(service.outbox), 0)
+
+            service.disconnect_()
+            await self.wait_for(lambda: service.client is None)
+
+    async def test_outbox_delivers_messages_sent_while_disconnected(self):
+        async with LocalChatServer() as server:
+            service = ChatService()
+            service.url = server.url
+            service.username = "me"
+            service.outbox = Outbox(loop=self.loop)
+            connected = asyncio.Event()
+            service.connected.connect(connected.set)
+            service.connect_()
+            await asyncio.wait_for(connected.wait(), 5)
+            service.disconnect_()
+            await self.wait_for(lambda: service.client is None)
+
+            service.send_message(service._room_name, ChannelType.GROUP,
+                                 "while disconnected")
+            self.assertEqual(len(service.outbox), 1)
+            connected.clear()
+            service.connect_()
+            await asyncio.wait_for(connected.wait(), 5)
+
+            conversation = service.channels_model.group_channel.conversation
+            await self.wait_for(lambda: conversation.rowCount() == 1)
+            self.assertEqual(
+                conversation.data(conversation.index(0, 0),
+                                  ItemRole.CONTENTS),
+                "while disconnected"
+            )
+            await self.wait_for(lambda: len(service.outbox) == 0)
+
+            service.disconnect_()
+            await self.wait_for(lambda: service.client is None)
+        self.assertEqual(service.last_error, "")
+
+    async def test_outbox_restored_private_message_echo(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "outbox.jsonl")
+            service = ChatService()
+            service.username = "me"
+            service.outbox = Outbox(path, loop=self.loop)
+            service.send_message("peer", ChannelType.USER, "after restart")
+            service.outbox = None
+
+            async with LocalChatServer() as server:
+                peer = ChatService()
+                peer.url = server.url
+                peer.username = "peer"
+                peer.connect_()
+                await self.wait_for(
+                    lambda: server.members("/chat/demo") == ["peer"]
+                )
+                service = ChatService()
+                service.url = server.url
+                service.username = "me"
+                service.outbox = Outbox(path, loop=self.loop)
+                service.connect_()
+
+                await self.wait_for(
+                    lambda: service.channels_model is not None and
+                    service.channels_model.rowCount() == 2
+                )
+                await self.wait_for(lambda: len(service.outbox) == 0)
+                conversation = service.channels_model.conversation(
+                    "peer", ChannelType.USER
+                )
+                await self.wait_for(lambda: conversation.rowCount() == 1)
+                self.assertEqual(
+                    conversation.data(conversation.index(0, 0),
+                                      ItemRole.CONTENTS),
+                    "after restart"
+                )
+
+                service.disconnect_()
+                peer.disconnect_()
+                await self.wait_for(lambda: service.client is None and
+                                    peer.client is None)
+                service.outbox = None
+            self.assertEqual(service.last_error, "")
+
+    async def test_sessions_share_connection_pool(self):
+        pool = ConnectionPool()
+        async with LocalChatServer() as server:
+            services = []
+            for username in ("first", "second"):
+                service = ChatService(connection_pool=pool)
+                service.url = server.url
+                service.username = username
+                service.connect_()
+                services.append(service)
+            await self.wait_for(
+                lambda: server.members("/chat/demo") == ["first", "second"]
+            )
+            server.publish("/chat/demo", {"user": "peer", "chat": "hello"})
+            for service in services:
+                conversation = service.channels_model.group_channel \
+                    .conversation
+                await self.wait_for(lambda: conversation.rowCount() == 1)
+
+            self.assertIsNot(services[0].channels_model,
+                             services[1].channels_model)
+            self.assertEqual(server.client_count, 2)
+            self.assertEqual(pool.session_count, 2)
+
+            for service in services:
+                service.disconnect_()
+            await self.wait_for(
+                lambda: all(service.client is None
+                            for service in services)
+            )
+            self.assertFalse(pool.closed)
+            await pool.close()
+
+        self.assertTrue(pool.closed)
+        for service in services:
+            self.assertEqual(service.last_error, "")
@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta
+
+from asynctest import TestCase, mock
+
+from aiocometd_chat_demo.coalescer import UpdateCoalescer
+from aiocometd_chat_demo.conversation import ConversationModel, ChatMessage
+
+
+class TestUpdateCoalescer(TestCase):
+    def setUp(self):
+        self.time = 100.0
+        self.event_loop = mock.MagicMock()
+        self.event_loop.time = lambda: self.time
+        self.coalescer = UpdateCoalescer(frame_interval=0.02,
+                                         degraded_rate=10.0, load_window=1.0,
+                                         loop=self.event_loop)
+        self.conversation = ConversationModel("channel")
+        self.start = datetime(2020, 1, 1)
+
+    def message(self, index):
+        return ChatMessage(time=self.start + timedelta(seconds=index),
+                           sender="sender", contents=str(index))
+
+    def release(self):
+        """Run the scheduled release of the coalescer"""
+        delay, callback = self.event_loop.call_later.call_args[0]
+        self.event_loop.call_later.reset_mock()
+        self.time += delay
+        callback()
+        return delay
+
+    def test_buffers_messages_until_release(self):
+        self.coalescer.add(self.conversation, self.message(0))
+        self.coalescer.add(self.conversation, self.message(1))
+
+        self.assertEqual(self.conversation.rowCount(), 0)
+        self.assertEqual(len(self.coalescer), 2)
+        self.event_loop.call_later.assert_called_once()
+
+        self.release()
+
+        self.assertEqual(self.conversation.rowCount(), 2)
+        self.assertEqual(len(self.coalescer), 0)
+
+    def test_inserts_batch_with_single_insertion(self):
+        inserted = mock.MagicMock()
+        self.conversation.rowsInserted.connect(inserted)
+        for index in range(5):
+            self.coalescer.add(self.conversation, self.message(index))
+
+        self.release()
+
+        inserted.assert_called_once()
+        self.assertEqual(inserted.call_args[0][1:], (0, 4))
+
+    def test_first_release_is_not_delayed(self):
+        self.coalescer.add(self.conversation, self.message(0))
+
+        self.assertEqual(self.release(), 0.0)
+
+    def test_releases_at_most_once_per_frame(self):
+        self.coalescer.add(self.conversation, self.message(0))
+        self.release()
+        self.time += 0.005
+
+        self.coalescer.add(self.conversation, self.message(1))
+
+        self.assertAlmostEqual(self.release(), 0.015)
+
+    def test_releases_every_conversation(self):
+        other = ConversationModel("other")
+        self.coalescer.add(self.conversation, self.message(0))
+        self.coalescer.add(other, self.message(1))
+
+        self.release()
+
+        self.assertEqual(self.conversation.rowCount(), 1)
+        self.assertEqual(other.rowCount(), 1)
+
+    def test_flush(self):
+        self.coalescer.add(self.conversation, self.message(0))
+        handle = self.event_loop.call_later.return_value
+
+        self.coalescer.flush()
+
+        handle.cancel.assert_called()
+        self.assertEqual(self.conversation.rowCount(), 1)
+
+    def test_flush_conversation(self):
+        other = ConversationModel("other")
+        self.coalescer.add(self.conversation, self.message(0))
+        self.coalescer.add(other, self.message(1))
+
+        self.coalescer.flush_conversation(self.conversation)
+
+        self.assertEqual(self.conversation.rowCount(), 1)
+        self.assertEqual(other.rowCount(), 0)
+        self.assertEqual(len(self.coalescer), 1)
+        self.release()
+        self.assertEqual(self.conversation.rowCount(), 1)
+        self.assertEqual(other.rowCount(), 1)
+
+    def test_flush_conversation_without_messages(self):
+        self.coalescer.flush_conversation(self.conversation)
+
+        self.assertEqual(self.conversation.rowCount(), 0)
+
+    def test_discard(self):
+        self.coalescer.add(self.conversation, self.message(0))
+
+        self.coalescer.discard(self.conversation)
+        self.release()
+
+        self.assertEqual(self.conversation.rowCount(), 0)
+
+    def test_clear(self):
+        self.coalescer.add(self.conversation, self.message(0))
+        handle = self.event_loop.call_later.return_value
+
+        self.coalescer.clear()
+
+        handle.cancel.assert_called()
+        self.assertEqual(len(self.coalescer), 0)
+
+    def test_degraded_under_sustained_load(self):
+        for index in range(10):
+            self.coalescer.add(self.conversation, self.message(index))
+            self.assertFalse(self.conversation.degraded)
+            self.release()
+
+        self.assertTrue(self.conversation.degraded)
+
+    def test_not_degraded_after_load_drops(self):
+        for index in range(10):
+            self.coalescer.add(self.conversation, self.message(index))
+            self.release()
+        self.assertTrue(self.conversation.degraded)
+
+        # the load check is scheduled since nothing else is released
+        self.release()
+
+        self.assertFalse(self.conversation.degraded)
+        self.assertEqual(self.coalescer._loads, {})
+        self.event_loop.call_later.assert_not_called()
+
+    def test_stays_degraded_above_half_rate(self):
+        for index in range(10):
+            self.coalescer.add(self.conversation, self.message(index))
+            self.release()
+        self.time += 0.5
+
+        for index in range(10, 16):
+            self.coalescer.add(self.conversation, self.message(index))
+            self.coalescer.flush()
+
+        self.assertTrue(self.conversation.degraded)
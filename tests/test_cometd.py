@@ -1,10 +1,24 @@
+import asyncio
 import concurrent.futures
 
+from aiocometd.constants import ConnectionType
+from aiocometd.exceptions import TransportError
 from asynctest import TestCase, mock
 
 from aiocometd_chat_demo.cometd import CometdClient, ClientState, \
     MessageResponse, run_coro
+from aiocometd_chat_demo.connection_pool import ConnectionPool, \
+    CURRENT_POOL, POOLED_TRANSPORT_CLASSES
 from aiocometd_chat_demo.exceptions import InvalidStateError
+from aiocometd_chat_demo.json_codec import stdlib_codec
+from aiocometd_chat_demo.loadtest.server import LocalChatServer
+from aiocometd_chat_demo.transport_options import TransportOptions, \
+    TransportType
+
+
+#: The connection types of the aiocometd clients with the default options
+DEFAULT_CONNECTION_TYPES = [ConnectionType.WEBSOCKET,
+                            ConnectionType.LONG_POLLING]
 
 
 class TestCometdClient(TestCase):
@@ -19,6 +33,17 @@ class TestCometdClient(TestCase):
                 yield item
         return iterator
 
+    def test_message_received_passes_python_object(self):
+        message = {"channel": "/members/demo",
+                   "data": ["member1", "member2"], "ext": {"key": object()}}
+        received = []
+        self.client.message_received.connect(received.append)
+
+        self.client.message_received.emit(message)
+
+        self.assertEqual(len(received), 1)
+        self.assertIs(received[0], message)
+
     def test_init(self):
         self.assertEqual(self.client._url, self.url)
         self.assertEqual(self.client._subscriptions, self.subscriptions)
@@ -76,7 +101,7 @@ class TestCometdClient(TestCase):
                                     "Uninitialized _connect_task attribute."):
             self.client.disconnect_()
 
-    @mock.patch("aiocometd_chat_demo.cometd.aiocometd.Client")
+    @mock.patch("aiocometd_chat_demo.connection_pool.PooledClient")
     async def test__connect(self, client_cls):
         client = mock.MagicMock()
         client_cls.return_value = client
@@ -91,7 +116,10 @@ class TestCometdClient(TestCase):
 
         await cometd_client._connect()
 
-        client_cls.assert_called_with(self.url, loop=loop)
+        client_cls.assert_called_with(
+            self.url, DEFAULT_CONNECTION_TYPES, connection_timeout=10.0,
+            loop=loop, transport_classes=POOLED_TRANSPORT_CLASSES
+        )
         client.__aenter__.assert_called()
         client.subscribe.assert_has_calls([
             mock.call(channel) for channel in self.subscriptions
@@ -102,7 +130,7 @@ class TestCometdClient(TestCase):
         ])
         self.assertEqual(cometd_client.state, ClientState.DISCONNECTED)
 
-    @mock.patch("aiocometd_chat_demo.cometd.aiocometd.Client")
+    @mock.patch("aiocometd_chat_demo.connection_pool.PooledClient")
     async def test__connect_retruns_if_cancelled(self, client_cls):
         client = mock.MagicMock()
         client_cls.return_value = client
@@ -118,13 +146,237 @@ class TestCometdClient(TestCase):
 
         await cometd_client._connect()
 
-        client_cls.assert_called_with(self.url, loop=loop)
+        client_cls.assert_called_with(
+            self.url, DEFAULT_CONNECTION_TYPES, connection_timeout=10.0,
+            loop=loop, transport_classes=POOLED_TRANSPORT_CLASSES
+        )
         client.__aenter__.assert_called()
         client.subscribe.assert_has_calls([
             mock.call(channel) for channel in self.subscriptions
         ])
         self.assertEqual(cometd_client.state, ClientState.DISCONNECTED)
 
+    @mock.patch("aiocometd_chat_demo.connection_pool.PooledClient")
+    async def test__connect_with_connection_pool(self, client_cls):
+        client = mock.MagicMock()
+        client_cls.return_value = client
+        pools = []
+        client.__aenter__ = mock.CoroutineMock(
+            side_effect=lambda _: pools.append(CURRENT_POOL.get()) or client
+        )
+        client.__aexit__ = mock.CoroutineMock()
+        client.subscribe = mock.CoroutineMock()
+        client.__aiter__ = self.make_async_iterator([])
+        pool = ConnectionPool()
+        loop = mock.MagicMock()
+        cometd_client = CometdClient(self.url, self.subscriptions, loop,
+                                     connection_pool=pool)
+
+        await self.loop.create_task(cometd_client._connect())
+
+        client_cls.assert_called_with(
+            self.url, DEFAULT_CONNECTION_TYPES, connection_timeout=10.0,
+            loop=loop, json_dumps=pool.json_dumps, json_loads=pool.json_loads,
+            transport_classes=POOLED_TRANSPORT_CLASSES
+        )
+        self.assertEqual(pools, [pool])
+        self.assertIsNone(CURRENT_POOL.get())
+
+    @mock.patch("aiocometd_chat_demo.connection_pool.PooledClient")
+    async def test__connect_with_json_codec(self, client_cls):
+        client = mock.MagicMock()
+        client_cls.return_value = client
+        client.__aenter__ = mock.CoroutineMock(return_value=client)
+        client.__aexit__ = mock.CoroutineMock()
+        client.subscribe = mock.CoroutineMock()
+        client.__aiter__ = self.make_async_iterator([])
+        codec = stdlib_codec()
+        loop = mock.MagicMock()
+        cometd_client = CometdClient(self.url, self.subscriptions, loop,
+                                     connection_pool=ConnectionPool(),
+                                     json_codec=codec)
+
+        await self.loop.create_task(cometd_client._connect())
+
+        self.assertIs(cometd_client.json_codec, codec)
+        client_cls.assert_called_with(
+            self.url, DEFAULT_CONNECTION_TYPES, connection_timeout=10.0,
+            loop=loop, json_dumps=codec.dumps, json_loads=codec.loads,
+            transport_classes=POOLED_TRANSPORT_CLASSES
+        )
+
+    def mock_client_cls(self, client_cls, errors=()):
+        """Make the clients created by *client_cls* fail to open with the
+        *errors* one after the other, then open successfully, a ``None``
+        error hangs until it's timed out"""
+        errors = list(errors)
+        client = mock.MagicMock()
+
+        async def enter(*args):
+            if errors:
+                error = errors.pop(0)
+                if error is None:
+                    # the client doesn't open in time
+                    await asyncio.sleep(1)
+                raise error
+            return client
+        client.__aenter__ = mock.CoroutineMock(side_effect=enter)
+        client.__aexit__ = mock.CoroutineMock(return_value=False)
+        client.subscribe = mock.CoroutineMock()
+        client.__aiter__ = self.make_async_iterator([])
+        client._transport = None
+        client_cls.return_value = client
+        return client
+
+    @mock.patch("aiocometd_chat_demo.connection_pool.PooledClient")
+    async def test__connect_with_transport_options(self, client_cls):
+        self.mock_client_cls(client_cls)
+        options = TransportOptions(transport_type=TransportType.WEBSOCKET,
+                                   connection_timeout=30.0)
+        loop = mock.MagicMock()
+        cometd_client = CometdClient(self.url, self.subscriptions, loop,
+                                     transport_options=options)
+
+        await cometd_client._connect()
+
+        self.assertIs(cometd_client.transport_options, options)
+        client_cls.assert_called_with(
+            self.url, [ConnectionType.WEBSOCKET], connection_timeout=30.0,
+            loop=loop, transport_classes=POOLED_TRANSPORT_CLASSES
+        )
+
+    @mock.patch("aiocometd_chat_demo.connection_pool.PooledClient")
+    async def test__connect_falls_back_to_long_polling(self, client_cls):
+        self.mock_client_cls(client_cls, [TransportError("error")])
+        loop = mock.MagicMock()
+        cometd_client = CometdClient(self.url, self.subscriptions, loop)
+
+        await cometd_client._connect()
+
+        self.assertEqual(client_cls.call_args_list, [
+            mock.call(self.url, DEFAULT_CONNECTION_TYPES,
+                      connection_timeout=10.0, loop=loop,
+                      transport_classes=POOLED_TRANSPORT_CLASSES),
+            mock.call(self.url, [ConnectionType.LONG_POLLING],
+                      connection_timeout=10.0, loop=loop,
+                      transport_classes=POOLED_TRANSPORT_CLASSES),
+        ])
+        self.assertTrue(cometd_client._websocket_failed)
+
+        # the websocket transport isn't tried again on reconnect
+        client_cls.reset_mock()
+        await cometd_client._connect()
+
+        client_cls.assert_called_once_with(
+            self.url, [ConnectionType.LONG_POLLING],
+            connection_timeout=10.0, loop=loop,
+            transport_classes=POOLED_TRANSPORT_CLASSES
+        )
+
+    @mock.patch("aiocometd_chat_demo.connection_pool.PooledClient")
+    async def test__connect_falls_back_on_timeout(self, client_cls):
+        self.mock_client_cls(client_cls, [None])
+        options = TransportOptions(connect_timeout=0.01)
+        cometd_client = CometdClient(self.url, self.subscriptions,
+                                     mock.MagicMock(),
+                                     transport_options=options)
+
+        await cometd_client._connect()
+
+        self.assertEqual(client_cls.call_args[0][1],
+                         [ConnectionType.LONG_POLLING])
+
+    @mock.patch("aiocometd_chat_demo.connection_pool.PooledClient")
+    async def test__connect_closes_transport_on_timeout(self, client_cls):
+        client = self.mock_client_cls(client_cls, [None])
+        transport = mock.MagicMock()
+        transport.close = mock.CoroutineMock()
+        client._transport = transport
+        options = TransportOptions(connect_timeout=0.01,
+                                   websocket_fallback=False)
+        cometd_client = CometdClient(self.url, self.subscriptions,
+                                     mock.MagicMock(),
+                                     transport_options=options)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await cometd_client._connect()
+
+        transport.close.assert_awaited()
+
+    @mock.patch("aiocometd_chat_demo.connection_pool.PooledClient")
+    async def test__connect_without_fallback(self, client_cls):
+        self.mock_client_cls(client_cls, [TransportError("error")])
+        options = TransportOptions(websocket_fallback=False)
+        cometd_client = CometdClient(self.url, self.subscriptions,
+                                     mock.MagicMock(),
+                                     transport_options=options)
+
+        with self.assertRaises(TransportError):
+            await cometd_client._connect()
+
+        client_cls.assert_called_once()
+        self.assertFalse(cometd_client._websocket_failed)
+
+    @mock.patch("aiocometd_chat_demo.connection_pool.PooledClient")
+    async def test__connect_long_polling_fails(self, client_cls):
+        self.mock_client_cls(client_cls, [TransportError("first"),
+                                          TransportError("second")])
+        cometd_client = CometdClient(self.url, self.subscriptions,
+                                     mock.MagicMock())
+
+        with self.assertRaisesRegex(TransportError, "second"):
+            await cometd_client._connect()
+
+        self.assertEqual(client_cls.call_count, 2)
+        self.assertFalse(cometd_client._websocket_failed)
+
+    @mock.patch("aiocometd_chat_demo.connection_pool.PooledClient")
+    async def test__connect_restores_subscriptions(self, client_cls):
+        client = mock.MagicMock()
+        client_cls.return_value = client
+        client.__aenter__ = mock.CoroutineMock(return_value=client)
+        client.__aexit__ = mock.CoroutineMock()
+        client.__aiter__ = self.make_async_iterator([])
+        loop = mock.MagicMock()
+        cometd_client = CometdClient(self.url, self.subscriptions, loop)
+        response = cometd_client.subscribe("channel3")
+        finished = mock.MagicMock()
+        response.finished.connect(finished)
+
+        # unsubscribe from the next channel while the first one is subscribed
+        async def subscribe(channel):
+            if channel == "channel1":
+                cometd_client.unsubscribe("channel2")
+        client.subscribe = mock.CoroutineMock(side_effect=subscribe)
+        client.unsubscribe = mock.MagicMock()
+
+        with mock.patch("aiocometd_chat_demo.cometd.run_coro"):
+            await cometd_client._connect()
+
+        self.assertEqual(client.subscribe.mock_calls, [
+            mock.call("channel1"), mock.call("channel3")
+        ])
+        client.unsubscribe.assert_called_with("channel2")
+        finished.assert_called()
+        self.assertEqual(cometd_client._pending_responses, {})
+        self.assertEqual(cometd_client.subscriptions,
+                         ["channel1", "channel3"])
+
+    @mock.patch("aiocometd_chat_demo.connection_pool.PooledClient")
+    async def test__connect_clears_client_on_error(self, client_cls):
+        client = mock.MagicMock()
+        client_cls.return_value = client
+        client.__aenter__ = mock.CoroutineMock(return_value=client)
+        client.__aexit__ = mock.CoroutineMock(return_value=False)
+        client.subscribe = mock.CoroutineMock(side_effect=ValueError())
+        cometd_client = CometdClient(self.url, self.subscriptions,
+                                     mock.MagicMock())
+
+        with self.assertRaises(ValueError):
+            await cometd_client._connect()
+
+        self.assertIsNone(cometd_client._client)
+
     def test_on_connect_done_does_nothing_on_normal_return(self):
         future = mock.MagicMock()
         future.exception.return_value = None
@@ -160,6 +412,22 @@ class TestCometdClient(TestCase):
             future.exception.return_value
         )
 
+    def test_on_connect_done_finishes_pending_responses_on_exception(self):
+        future = mock.MagicMock()
+        future.exception.return_value = ValueError()
+        self.client.error = mock.MagicMock()
+        response = self.client.subscribe("channel3")
+        finished = mock.MagicMock()
+        response.finished.connect(finished)
+
+        self.client._on_connect_done(future)
+
+        self.assertIs(response.error, future.exception.return_value)
+        finished.assert_called()
+        self.assertEqual(self.client._pending_responses, {})
+        self.assertEqual(self.client.subscriptions,
+                         self.subscriptions + ["channel3"])
+
     @mock.patch("aiocometd_chat_demo.cometd.partial")
     @mock.patch("aiocometd_chat_demo.cometd.run_coro")
     def test_publish(self, run_coro, partial_func):
@@ -197,6 +465,176 @@ class TestCometdClient(TestCase):
                                     "Uninitialized _client attribute."):
             self.client.publish(channel, message)
 
+    def test_publish_with_rate_limiter(self):
+        rate_limiter = mock.MagicMock()
+        client = CometdClient(self.url, self.subscriptions, self.loop,
+                              rate_limiter=rate_limiter)
+        client._client = mock.MagicMock()
+        client._state = ClientState.CONNECTED
+
+        response = client.publish("channel", {"key": "value"})
+
+        self.assertIs(client.rate_limiter, rate_limiter)
+        rate_limiter.publish.assert_called_with("channel", {"key": "value"},
+                                                client._publish)
+        self.assertIs(response, rate_limiter.publish.return_value)
+
+    def test_clear_queued_messages(self):
+        rate_limiter = mock.MagicMock()
+        client = CometdClient(self.url, self.subscriptions, self.loop,
+                              rate_limiter=rate_limiter)
+
+        client.clear_queued_messages()
+
+        error, publish = rate_limiter.clear.call_args[0]
+        self.assertIsInstance(error, InvalidStateError)
+        self.assertEqual(publish, client._publish)
+
+    def test_clear_queued_messages_without_rate_limiter(self):
+        client = CometdClient(self.url, self.subscriptions, self.loop)
+
+        client.clear_queued_messages()
+
+    def test_publish_with_rate_limiter_error_if_not_connected(self):
+        rate_limiter = mock.MagicMock()
+        client = CometdClient(self.url, self.subscriptions, self.loop,
+                              rate_limiter=rate_limiter)
+
+        with self.assertRaisesRegex(InvalidStateError,
+                                    "Can't send messages in a non-connected "
+                                    "state."):
+            client.publish("channel", {})
+
+        rate_limiter.publish.assert_not_called()
+
+    @mock.patch("aiocometd_chat_demo.cometd.partial")
+    @mock.patch("aiocometd_chat_demo.cometd.run_coro")
+    def test_subscribe(self, run_coro, partial_func):
+        channel = "channel3"
+        self.client._client = mock.MagicMock()
+        self.client._state = ClientState.CONNECTED
+
+        response = self.client.subscribe(channel)
+
+        self.assertIsInstance(response, MessageResponse)
+        self.assertEqual(self.client._subscriptions,
+                         self.subscriptions + [channel])
+        self.client._client.subscribe.assert_called_with(channel)
+        partial_func.assert_called_with(self.client._on_publish_done,
+                                        response)
+        run_coro.assert_called_with(
+            self.client._client.subscribe.return_value,
+            partial_func.return_value,
+            self.loop
+        )
+
+    @mock.patch("aiocometd_chat_demo.cometd.run_coro")
+    def test_subscribe_if_not_connected(self, run_coro):
+        channel = "channel3"
+
+        response = self.client.subscribe(channel)
+
+        self.assertIsInstance(response, MessageResponse)
+        self.assertEqual(self.client.subscriptions,
+                         self.subscriptions + [channel])
+        self.assertEqual(self.client._pending_responses,
+                         {channel: [response]})
+        run_coro.assert_not_called()
+
+    @mock.patch("aiocometd_chat_demo.cometd.run_coro")
+    async def test_subscribe_to_subscribed_channel(self, run_coro):
+        self.client._client = mock.MagicMock()
+        self.client._state = ClientState.CONNECTED
+
+        response = self.client.subscribe(self.subscriptions[0])
+        finished = mock.MagicMock()
+        response.finished.connect(finished)
+        await asyncio.sleep(0)
+
+        finished.assert_called()
+        self.assertEqual(self.client.subscriptions, self.subscriptions)
+        run_coro.assert_not_called()
+
+    @mock.patch("aiocometd_chat_demo.cometd.partial")
+    @mock.patch("aiocometd_chat_demo.cometd.run_coro")
+    def test_subscribe_while_connecting(self, run_coro, partial_func):
+        channel = "channel3"
+        self.client._client = mock.MagicMock()
+
+        response = self.client.subscribe(channel)
+
+        self.assertIsInstance(response, MessageResponse)
+        self.assertEqual(self.client._pending_responses, {})
+        self.client._client.subscribe.assert_called_with(channel)
+        run_coro.assert_called_with(
+            self.client._client.subscribe.return_value,
+            partial_func.return_value,
+            self.loop
+        )
+
+    @mock.patch("aiocometd_chat_demo.cometd.partial")
+    @mock.patch("aiocometd_chat_demo.cometd.run_coro")
+    def test_unsubscribe(self, run_coro, partial_func):
+        channel = self.subscriptions[0]
+        self.client._client = mock.MagicMock()
+        self.client._state = ClientState.CONNECTED
+
+        response = self.client.unsubscribe(channel)
+
+        self.assertIsInstance(response, MessageResponse)
+        self.assertEqual(self.client._subscriptions, self.subscriptions[1:])
+        self.client._client.unsubscribe.assert_called_with(channel)
+        run_coro.assert_called_with(
+            self.client._client.unsubscribe.return_value,
+            partial_func.return_value,
+            self.loop
+        )
+
+    @mock.patch("aiocometd_chat_demo.cometd.run_coro")
+    async def test_unsubscribe_if_not_connected(self, run_coro):
+        response = self.client.unsubscribe(self.subscriptions[0])
+        finished = mock.MagicMock()
+        response.finished.connect(finished)
+        await asyncio.sleep(0)
+
+        finished.assert_called()
+        self.assertEqual(self.client.subscriptions, self.subscriptions[1:])
+        run_coro.assert_not_called()
+
+    @mock.patch("aiocometd_chat_demo.cometd.run_coro")
+    async def test_unsubscribe_cancels_pending_subscription(self, run_coro):
+        subscribe_response = self.client.subscribe("channel3")
+        finished = mock.MagicMock()
+        subscribe_response.finished.connect(finished)
+
+        self.client.unsubscribe("channel3")
+        await asyncio.sleep(0)
+
+        finished.assert_called()
+        self.assertIsNone(subscribe_response.error)
+        self.assertEqual(self.client.subscriptions, self.subscriptions)
+        self.assertEqual(self.client._pending_responses, {})
+        run_coro.assert_not_called()
+
+    @mock.patch("aiocometd_chat_demo.cometd.run_coro")
+    async def test_unsubscribe_from_unsubscribed_channel(self, run_coro):
+        self.client._client = mock.MagicMock()
+        self.client._state = ClientState.CONNECTED
+
+        response = self.client.unsubscribe("channel3")
+        finished = mock.MagicMock()
+        response.finished.connect(finished)
+        await asyncio.sleep(0)
+
+        finished.assert_called()
+        self.assertEqual(self.client.subscriptions, self.subscriptions)
+        run_coro.assert_not_called()
+
+    def test_send_subscription_request_error_if_client_not_initialized(self):
+        with self.assertRaisesRegex(InvalidStateError,
+                                    "Uninitialized _client attribute."):
+            self.client._send_subscription_request("channel3", True)
+
     def test__on_publish_done_on_normal_return(self):
         future = mock.MagicMock()
         future.exception.return_value = None
@@ -309,3 +747,75 @@ class TestRunCoro(TestCase):
         self.assertEqual(result, future)
         asyncio_mod.run_coroutine_threadsafe.assert_called_with(coro, loop)
         future.add_done_callback.assert_called_with(callback)
+
+
+class TestCometdClientWithServer(TestCase):
+    async def wait_for(self, condition, timeout=5.0):
+        deadline = self.loop.time() + timeout
+        while not condition():
+            self.assertLess(self.loop.time(), deadline)
+            await asyncio.sleep(0.01)
+
+    async def test_subscriptions_restored_on_reconnect(self):
+        async with LocalChatServer() as server:
+            client = CometdClient(server.url, ["/chat/demo"], self.loop)
+            messages = []
+            client.message_received.connect(messages.append)
+            client.connect_()
+            await self.wait_for(
+                lambda: client.state == ClientState.CONNECTED
+            )
+
+            response = client.subscribe("/chat/other")
+            finished = mock.MagicMock()
+            response.finished.connect(finished)
+            await self.wait_for(lambda: finished.called)
+            server.publish("/chat/other", {"chat": "first"})
+            await self.wait_for(lambda: len(messages) == 1)
+
+            client.disconnect_()
+            await self.wait_for(
+                lambda: client.state == ClientState.DISCONNECTED
+            )
+            client.connect_()
+            await self.wait_for(
+                lambda: client.state == ClientState.CONNECTED
+            )
+            server.publish("/chat/other", {"chat": "second"})
+            await self.wait_for(lambda: len(messages) == 2)
+
+            self.assertIsNone(response.error)
+            self.assertEqual([message["data"]["chat"]
+                              for message in messages],
+                             ["first", "second"])
+            self.assertEqual(client.subscriptions,
+                             ["/chat/demo", "/chat/other"])
+            client.disconnect_()
+            await self.wait_for(
+                lambda: client.state == ClientState.DISCONNECTED
+            )
+
+    async def test_transports(self):
+        async with LocalChatServer() as server:
+            for transport_type in (TransportType.WEBSOCKET,
+                                   TransportType.LONG_POLLING):
+                options = TransportOptions(transport_type=transport_type,
+                                           compression=True)
+                client = CometdClient(server.url, ["/chat/demo"], self.loop,
+                                      transport_options=options)
+                messages = []
+                client.message_received.connect(messages.append)
+                client.connect_()
+                await self.wait_for(
+                    lambda: client.state == ClientState.CONNECTED
+                )
+
+                server.publish("/chat/demo", {"chat": "x" * 1000})
+                await self.wait_for(lambda: len(messages) == 1)
+
+                self.assertEqual(client._client.connection_type.value,
+                                 transport_type.value)
+                client.disconnect_()
+                await self.wait_for(
+                    lambda: client.state == ClientState.DISCONNECTED
+                )
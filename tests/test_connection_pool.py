@@ -0,0 +1,177 @@
+import contextvars
+
+from asynctest import TestCase, mock
+from aiocometd.constants import ConnectionType
+from aiocometd.transports import create_transport
+from aiocometd.transports.long_polling import LongPollingTransport
+from aiocometd.transports.websocket import WebSocketTransport
+
+from aiocometd_chat_demo.connection_pool import ConnectionPool, \
+    CURRENT_POOL, CURRENT_TRANSPORT_OPTIONS, PooledLongPollingTransport, \
+    PooledWebSocketTransport, PooledClient, POOLED_TRANSPORT_CLASSES
+from aiocometd_chat_demo.json_codec import JsonCodec
+from aiocometd_chat_demo.transport_options import TransportOptions
+
+
+class TestConnectionPool(TestCase):
+    def setUp(self):
+        self.pool = ConnectionPool(limit=10, limit_per_host=5)
+
+    async def tearDown(self):
+        await self.pool.close()
+
+    def test_json(self):
+        text = self.pool.json_dumps({"key": [1, "value"]})
+
+        self.assertEqual(self.pool.json_loads(text), {"key": [1, "value"]})
+
+    def test_json_codec(self):
+        codec = JsonCodec(name="fake", dumps=mock.MagicMock(return_value="{}"),
+                          loads=mock.MagicMock(return_value={}))
+        pool = ConnectionPool(json_codec=codec)
+
+        self.assertEqual(pool.json_dumps({}), "{}")
+        self.assertEqual(pool.json_loads("{}"), {})
+        codec.dumps.assert_called_with({})
+        codec.loads.assert_called_with("{}")
+
+    async def test_create_session(self):
+        first = self.pool.create_session()
+        second = self.pool.create_session()
+
+        self.assertIs(first.connector, second.connector)
+        self.assertFalse(first.connector_owner)
+        self.assertEqual(first.connector.limit, 10)
+        self.assertEqual(first.connector.limit_per_host, 5)
+        self.assertEqual(self.pool.session_count, 2)
+        await first.close()
+        await second.close()
+
+    async def test_close(self):
+        session = self.pool.create_session()
+        await session.close()
+        self.assertFalse(self.pool.closed)
+
+        await self.pool.close()
+
+        self.assertTrue(self.pool.closed)
+
+    async def test_create_session_after_close(self):
+        session = self.pool.create_session()
+        await self.pool.close()
+
+        new_session = self.pool.create_session()
+
+        self.assertFalse(self.pool.closed)
+        self.assertIsNot(new_session.connector, session.connector)
+        await session.close()
+        await new_session.close()
+
+
+class TestPooledTransports(TestCase):
+    def create_transport(self, connection_type):
+        return POOLED_TRANSPORT_CLASSES[connection_type](
+            url="url", incoming_queue=mock.MagicMock(), loop=self.loop
+        )
+
+    def test_not_registered(self):
+        self.assertIs(
+            type(create_transport(ConnectionType.LONG_POLLING, url="url",
+                                  incoming_queue=mock.MagicMock(),
+                                  loop=self.loop)),
+            LongPollingTransport
+        )
+        self.assertIs(
+            type(create_transport(ConnectionType.WEBSOCKET, url="url",
+                                  incoming_queue=mock.MagicMock(),
+                                  loop=self.loop)),
+            WebSocketTransport
+        )
+
+    def test_client_creates_pooled_transports(self):
+        client = PooledClient("url",
+                              transport_classes=POOLED_TRANSPORT_CLASSES,
+                              loop=self.loop)
+
+        self.assertIsInstance(
+            client._create_transport(ConnectionType.LONG_POLLING, url="url",
+                                     incoming_queue=mock.MagicMock(),
+                                     loop=self.loop),
+            PooledLongPollingTransport
+        )
+        self.assertIsInstance(
+            client._create_transport(ConnectionType.WEBSOCKET, url="url",
+                                     incoming_queue=mock.MagicMock(),
+                                     loop=self.loop),
+            PooledWebSocketTransport
+        )
+
+    def test_client_falls_back_to_registered_transports(self):
+        client = PooledClient("url", transport_classes={}, loop=self.loop)
+
+        self.assertIs(
+            type(client._create_transport(ConnectionType.LONG_POLLING,
+                                          url="url",
+                                          incoming_queue=mock.MagicMock(),
+                                          loop=self.loop)),
+            LongPollingTransport
+        )
+
+    async def test_session_of_current_pool(self):
+        pool = ConnectionPool()
+        transport = self.create_transport(ConnectionType.LONG_POLLING)
+
+        async def get_session():
+            CURRENT_POOL.set(pool)
+            return await transport._get_http_session()
+        session = await self.loop.create_task(get_session())
+
+        self.assertFalse(session.connector_owner)
+        self.assertEqual(pool.session_count, 1)
+        self.assertIsNone(contextvars.copy_context().get(CURRENT_POOL))
+        # the graceful shutdown of the connections isn't awaited
+        transport._HTTP_SESSION_CLOSE_TIMEOUT = 10
+        start = self.loop.time()
+        await transport.close()
+        self.assertLess(self.loop.time() - start, 1)
+        self.assertTrue(session.closed)
+        self.assertFalse(pool.closed)
+        await pool.close()
+
+    async def test_session_without_pool(self):
+        transport = self.create_transport(ConnectionType.LONG_POLLING)
+        transport._HTTP_SESSION_CLOSE_TIMEOUT = 0
+
+        session = await transport._get_http_session()
+
+        self.assertTrue(session.connector_owner)
+        await transport.close()
+        self.assertTrue(session.closed)
+
+    async def test_socket_with_transport_options(self):
+        transport = self.create_transport(ConnectionType.WEBSOCKET)
+        transport._socket_factory = mock.CoroutineMock()
+        options = TransportOptions(max_message_size=1024, compression=True)
+
+        async def get_socket():
+            CURRENT_TRANSPORT_OPTIONS.set(options)
+            return await transport._get_socket({"key": "value"})
+        socket = await self.loop.create_task(get_socket())
+
+        self.assertIs(socket, transport._socket_factory.return_value)
+        transport._socket_factory.assert_called_with(
+            "url", ssl=None, headers={"key": "value"},
+            receive_timeout=transport.request_timeout, autoping=True,
+            compress=15, max_msg_size=1024
+        )
+
+    async def test_socket_without_transport_options(self):
+        transport = self.create_transport(ConnectionType.WEBSOCKET)
+        transport._socket_factory = mock.CoroutineMock()
+
+        await transport._get_socket({})
+
+        transport._socket_factory.assert_called_with(
+            "url", ssl=None, headers={},
+            receive_timeout=transport.request_timeout, autoping=True
+        )
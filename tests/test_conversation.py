@@ -1,10 +1,10 @@
 from datetime import datetime, timedelta
 
 from asynctest import TestCase, mock
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QDateTime, QLocale
 
 from aiocometd_chat_demo.conversation import ConversationModel, ChatMessage, \
-    ItemRole
+    ItemRole, MessageDisplay, MessageLayout, BUBBLE_PADDING
 
 
 class TestConversationModel(TestCase):
@@ -31,6 +31,15 @@ class TestConversationModel(TestCase):
     def test_role_names(self):
         self.assertEqual(self.model.roleNames(), self.model._role_names)
 
+    def test_degraded(self):
+        self.model.degraded_changed = mock.MagicMock()
+
+        self.model.degraded = True
+        self.model.degraded = True
+
+        self.assertTrue(self.model.degraded)
+        self.model.degraded_changed.emit.assert_called_once_with(True)
+
     def test_send_message(self):
         self.model.message_sending_requested = mock.MagicMock()
         contents = "text"
@@ -50,6 +59,189 @@ class TestConversationModel(TestCase):
 
         self.assertEqual(self.model._messages, [message])
 
+    def test_add_late_incoming_message(self):
+        inserted = mock.MagicMock()
+        self.model.rowsInserted.connect(inserted)
+        time = datetime.now()
+        messages = [
+            ChatMessage(time=time + timedelta(seconds=offset), sender="john",
+                        contents=str(offset))
+            for offset in (0, 2, 2, 4)
+        ]
+        for message in messages:
+            self.model.add_incoming_message(message)
+        late = ChatMessage(time=time + timedelta(seconds=2), sender="jane",
+                           contents="late")
+
+        self.model.add_incoming_message(late)
+
+        self.assertEqual(self.model._messages,
+                         messages[:3] + [late] + messages[3:])
+        self.assertEqual(inserted.call_args[0][1:], (3, 3))
+        self.assertEqual(self.model.message_row(late), 3)
+
+    def make_messages(self, *offsets):
+        time = datetime(2020, 1, 1)
+        return [ChatMessage(time=time + timedelta(seconds=offset),
+                            sender="john", contents=str(offset))
+                for offset in offsets]
+
+    def test_add_messages_prepends_older_messages(self):
+        self.model.add_messages(self.make_messages(5, 6))
+        inserted = mock.MagicMock()
+        self.model.rowsInserted.connect(inserted)
+        older = self.make_messages(3, 1, 2)
+
+        self.model.add_messages(older)
+
+        self.assertEqual([message.contents
+                          for message in self.model._messages],
+                         ["1", "2", "3", "5", "6"])
+        inserted.assert_called_once()
+        self.assertEqual(inserted.call_args[0][1:], (0, 2))
+
+    def test_add_messages_appends_newer_messages(self):
+        self.model.add_messages(self.make_messages(1))
+        inserted = mock.MagicMock()
+        self.model.rowsInserted.connect(inserted)
+
+        self.model.add_messages(self.make_messages(2, 3))
+
+        self.assertEqual([message.contents
+                          for message in self.model._messages],
+                         ["1", "2", "3"])
+        inserted.assert_called_once()
+        self.assertEqual(inserted.call_args[0][1:], (1, 2))
+
+    def test_add_messages_interleaved(self):
+        self.model.add_messages(self.make_messages(2, 4))
+        inserted = mock.MagicMock()
+        self.model.rowsInserted.connect(inserted)
+
+        self.model.add_messages(self.make_messages(1, 3))
+
+        self.assertEqual([message.contents
+                          for message in self.model._messages],
+                         ["1", "2", "3", "4"])
+        self.assertEqual(inserted.call_count, 2)
+
+    def test_times_follow_messages(self):
+        self.model.add_messages(self.make_messages(4, 6))
+        self.model.add_messages(self.make_messages(1, 2))
+        self.model.add_messages(self.make_messages(3, 5, 7))
+
+        self.assertEqual(self.model._times,
+                         [message.time for message in self.model._messages])
+
+    def test_add_no_messages(self):
+        inserted = mock.MagicMock()
+        self.model.rowsInserted.connect(inserted)
+
+        self.model.add_messages([])
+
+        inserted.assert_not_called()
+
+    def test_tail(self):
+        self.model.add_messages(self.make_messages(1, 2, 3))
+
+        self.assertEqual([message.contents
+                          for message in self.model.tail(2)], ["2", "3"])
+        self.assertEqual(len(self.model.tail(10)), 3)
+        self.assertEqual(self.model.tail(0), [])
+
+    def test_history_disabled_by_default(self):
+        self.model.history_requested = mock.MagicMock()
+
+        self.model.fetchMore()
+
+        self.assertFalse(self.model.canFetchMore())
+        self.model.history_requested.emit.assert_not_called()
+
+    def test_fetch_more(self):
+        self.model.history_requested = mock.MagicMock()
+        self.model.enable_history()
+        self.assertTrue(self.model.canFetchMore())
+
+        self.model.fetchMore()
+        self.model.load_history()
+
+        self.model.history_requested.emit.assert_called_once_with()
+        self.assertFalse(self.model.canFetchMore())
+        self.assertIsNone(self.model.history_cursor)
+
+    def test_add_history_page(self):
+        self.model.enable_history()
+        self.model.fetchMore()
+        messages = self.make_messages(1, 2)
+
+        self.model.add_history_page(messages, 10)
+
+        self.assertEqual(self.model._messages, messages)
+        self.assertEqual(self.model.history_cursor, 10)
+        self.assertTrue(self.model.canFetchMore())
+
+    def test_add_last_history_page(self):
+        self.model.enable_history()
+        self.model.fetchMore()
+
+        self.model.add_history_page(self.make_messages(1), None)
+
+        self.assertFalse(self.model.canFetchMore())
+
+    def test_history_page_failed(self):
+        self.model.enable_history()
+        self.model.fetchMore()
+
+        self.model.history_page_failed()
+
+        self.assertTrue(self.model.canFetchMore())
+
+    def test_message_row(self):
+        time = datetime.now()
+        messages = [
+            ChatMessage(time=time, sender="john", contents="a"),
+            ChatMessage(time=time + timedelta(seconds=1), sender="john",
+                        contents="b"),
+            ChatMessage(time=time + timedelta(seconds=1), sender="john",
+                        contents="b"),
+            ChatMessage(time=time + timedelta(seconds=2), sender="john",
+                        contents="c"),
+        ]
+        self.model.add_messages(messages)
+
+        for row, message in enumerate(messages):
+            with self.subTest(row=row):
+                self.assertEqual(self.model.message_row(message), row)
+        self.assertEqual(self.model.message_row(
+            ChatMessage(time=time, sender="john", contents="a")
+        ), -1)
+
+
+class TestMessageLayout(TestCase):
+    def setUp(self):
+        self.layout = MessageLayout(width=100.0, line_height=10.0,
+                                    character_width=10.0)
+
+    def test_estimated_height(self):
+        cases = (
+            ("", 2),
+            ("a" * 10, 2),
+            ("a" * 11, 3),
+            ("a" * 25, 4),
+            ("a\n\nb", 4),
+        )
+
+        for text, lines in cases:
+            with self.subTest(text=text, lines=lines):
+                self.assertEqual(self.layout.estimated_height(text),
+                                 lines * 10.0 + BUBBLE_PADDING)
+
+    def test_estimated_height_narrower_than_a_character(self):
+        layout = self.layout._replace(width=5.0)
+
+        self.assertEqual(layout.estimated_height("abc"),
+                         4 * 10.0 + BUBBLE_PADDING)
+
 
 class TestConversationModelData(TestCase):
     message1 = ChatMessage(time=datetime.now(), sender="john", contents="hi")
@@ -76,6 +268,121 @@ class TestConversationModelData(TestCase):
                 index = self.model.createIndex(row, column)
                 self.assertEqual(self.model.data(index, role), expected)
 
+    def test_data_display_roles(self):
+        self.model.username = "john"
+        time_text = QLocale().toString(QDateTime(self.message1.time).time(),
+                                       QLocale.ShortFormat)
+        cases = (
+            (0, ItemRole.IS_OWN, True),
+            (1, ItemRole.IS_OWN, False),
+            (0, ItemRole.TIME_TEXT, time_text),
+            (0, ItemRole.DISPLAY_TEXT, "hi"),
+        )
+
+        for row, role, expected in cases:
+            with self.subTest(row=row, role=role, expected=expected):
+                index = self.model.createIndex(row, 0)
+                self.assertEqual(self.model.data(index, role), expected)
+
+    def test_message_display_is_cached(self):
+        with mock.patch.object(MessageDisplay, "from_message",
+                               wraps=MessageDisplay.from_message) \
+                as from_message:
+            first = self.model.message_display(self.message1)
+            second = self.model.message_display(self.message1)
+
+        from_message.assert_called_once_with(self.message1)
+        self.assertIs(first, second)
+
+    def test_display_text_is_sanitized(self):
+        message = ChatMessage(time=datetime.now(), sender="john",
+                              contents="a\x00b\r\nc\td\u202ee\u200df")
+
+        display = MessageDisplay.from_message(message)
+
+        self.assertEqual(display.text, "ab\nc\tde\u200df")
+
+    def test_estimated_height_role(self):
+        self.model.set_layout_metrics(100.0, 10.0, 10.0)
+        index = self.model.createIndex(0, 0)
+
+        self.assertEqual(self.model.data(index, ItemRole.ESTIMATED_HEIGHT),
+                         20.0 + BUBBLE_PADDING)
+
+    def test_estimated_height_is_cached(self):
+        with mock.patch.object(MessageLayout, "estimated_height",
+                               return_value=50.0) as estimated_height:
+            self.model.message_height(self.message1)
+            height = self.model.message_height(self.message1)
+
+        estimated_height.assert_called_once_with("hi")
+        self.assertEqual(height, 50.0)
+
+    def test_set_layout_metrics(self):
+        self.model.set_measured_height(0, 200.0)
+        changed = mock.MagicMock()
+        self.model.dataChanged.connect(changed)
+
+        self.model.set_layout_metrics(100.0, 10.0, 10.0)
+
+        self.assertEqual(self.model.message_height(self.message1),
+                         20.0 + BUBBLE_PADDING)
+        changed.assert_called_once()
+        top_left, bottom_right, roles = changed.call_args[0]
+        self.assertEqual((top_left.row(), bottom_right.row()), (0, 1))
+        self.assertEqual(roles, [ItemRole.ESTIMATED_HEIGHT])
+
+    def test_set_layout_metrics_ignores_unchanged_or_empty_layout(self):
+        self.model.set_layout_metrics(100.0, 10.0, 10.0)
+        changed = mock.MagicMock()
+        self.model.dataChanged.connect(changed)
+
+        self.model.set_layout_metrics(100.0, 10.0, 10.0)
+        self.model.set_layout_metrics(0.0, 10.0, 10.0)
+
+        changed.assert_not_called()
+
+    def test_set_measured_height(self):
+        changed = mock.MagicMock()
+        self.model.dataChanged.connect(changed)
+
+        self.model.set_measured_height(1, 120.0)
+        self.model.set_measured_height(1, 120.0)
+
+        self.assertEqual(self.model.message_height(self.message2), 120.0)
+        changed.assert_called_once()
+        top_left, bottom_right, roles = changed.call_args[0]
+        self.assertEqual((top_left.row(), bottom_right.row()), (1, 1))
+        self.assertEqual(roles, [ItemRole.ESTIMATED_HEIGHT])
+
+    def test_set_measured_height_ignores_invalid_row(self):
+        self.model.set_measured_height(2, 120.0)
+
+        self.assertEqual(self.model._heights, {})
+
+    def test_username(self):
+        changed = mock.MagicMock()
+        self.model.dataChanged.connect(changed)
+        self.model.username_changed = mock.MagicMock()
+
+        self.model.username = "james"
+
+        self.assertEqual(self.model.username, "james")
+        self.model.username_changed.emit.assert_called_with("james")
+        changed.assert_called_once()
+        top_left, bottom_right, roles = changed.call_args[0]
+        self.assertEqual((top_left.row(), bottom_right.row()), (0, 1))
+        self.assertEqual(roles, [ItemRole.IS_OWN])
+
+    def test_username_unchanged(self):
+        self.model.username = "james"
+        changed = mock.MagicMock()
+        self.model.dataChanged.connect(changed)
+
+        self.model.username = "james"
+
+        changed.assert_not_called()
+
     def test_data_return_none_for_invalid_index(self):
         cases = (
             (-1, 0, ItemRole.TIME, None),
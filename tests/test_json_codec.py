@@ -0,0 +1,90 @@
+import sys
+
+from asynctest import TestCase, mock
+
+from aiocometd_chat_demo.json_codec import get_codec, stdlib_codec, \
+    orjson_codec, ujson_codec, available_codecs, STDLIB_CODEC, AUTO_CODEC
+
+
+#: An object exercising the JSON types of the CometD messages
+DOCUMENT = {
+    "channel": "/chat/demo",
+    "data": {"user": "János", "chat": "❤ \"quoted\"\n"},
+    "ext": {"seq": 42},
+    "successful": True,
+    "advice": None,
+    "members": ["a", "b"],
+    "interval": 0.5
+}
+
+
+def mock_module(name, dumps=None, loads=None):
+    """Make a fake module called *name* importable, return the module and
+    the patcher of the imported modules"""
+    module = mock.MagicMock()
+    module.dumps = dumps or mock.MagicMock(return_value="{}")
+    module.loads = loads or mock.MagicMock(return_value={})
+    return module, mock.patch.dict(sys.modules, {name: module})
+
+
+class TestCodecs(TestCase):
+    def test_stdlib_codec(self):
+        codec = stdlib_codec()
+
+        text = codec.dumps(DOCUMENT)
+
+        self.assertEqual(codec.name, STDLIB_CODEC)
+        self.assertIsInstance(text, str)
+        self.assertNotIn(", ", text)
+        self.assertEqual(codec.loads(text), DOCUMENT)
+
+    def test_orjson_codec_decodes_bytes(self):
+        _, patcher = mock_module("orjson",
+                                 dumps=mock.MagicMock(return_value=b"{}"))
+        with patcher:
+            codec = orjson_codec()
+
+            self.assertEqual(codec.name, "orjson")
+            self.assertEqual(codec.dumps({}), "{}")
+
+    def test_ujson_codec_keeps_non_ascii_characters(self):
+        module, patcher = mock_module("ujson")
+        with patcher:
+            codec = ujson_codec()
+            codec.dumps({})
+
+        self.assertEqual(codec.name, "ujson")
+        module.dumps.assert_called_with({}, ensure_ascii=False)
+
+    def test_codecs_round_trip(self):
+        for name, codec in available_codecs().items():
+            with self.subTest(name=name):
+                self.assertEqual(codec.loads(codec.dumps(DOCUMENT)),
+                                 DOCUMENT)
+
+
+class TestGetCodec(TestCase):
+    @mock.patch.dict(sys.modules, {"orjson": None, "ujson": None})
+    def test_auto_falls_back_to_stdlib(self):
+        self.assertEqual(get_codec(AUTO_CODEC).name, STDLIB_CODEC)
+        self.assertEqual(list(available_codecs()), [STDLIB_CODEC])
+
+    @mock.patch.dict(sys.modules, {"orjson": None})
+    def test_auto_prefers_faster_codecs(self):
+        _, patcher = mock_module("ujson")
+        with patcher:
+            self.assertEqual(get_codec().name, "ujson")
+
+    def test_named_codec(self):
+        self.assertEqual(get_codec(STDLIB_CODEC).name, STDLIB_CODEC)
+
+    @mock.patch.dict(sys.modules, {"orjson": None})
+    def test_named_codec_not_installed(self):
+        with self.assertLogs("aiocometd_chat_demo.json_codec", "WARNING"):
+            codec = get_codec("orjson")
+
+        self.assertEqual(codec.name, STDLIB_CODEC)
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            get_codec("yaml")
@@ -0,0 +1,68 @@
+from unittest import TestCase, mock
+
+from aiocometd_chat_demo.loadtest.driver import split_scenario, LoadDriver, \
+    _run_worker
+from aiocometd_chat_demo.loadtest.generator import LoadScenario, \
+    LoadStatistics
+
+
+class TestSplitScenario(TestCase):
+    def test_split(self):
+        scenario = LoadScenario(users=10, join_rate=20, seed=5)
+
+        shards = split_scenario(scenario, 3)
+
+        self.assertEqual([shard.users for shard in shards], [4, 3, 3])
+        self.assertEqual([shard.join_rate for shard in shards], [8, 6, 6])
+        self.assertEqual([shard.username_prefix for shard in shards],
+                         ["user0-", "user1-", "user2-"])
+        self.assertEqual([shard.seed for shard in shards], [5, 6, 7])
+
+    def test_split_more_workers_than_users(self):
+        scenario = LoadScenario(users=2)
+
+        shards = split_scenario(scenario, 8)
+
+        self.assertEqual([shard.users for shard in shards], [1, 1])
+        self.assertEqual([shard.seed for shard in shards], [None, None])
+
+    def test_split_without_users(self):
+        shards = split_scenario(LoadScenario(users=0), 4)
+
+        self.assertEqual([shard.users for shard in shards], [0])
+
+
+class TestRunWorker(TestCase):
+    @mock.patch("aiocometd_chat_demo.loadtest.driver.LoadGenerator")
+    def test_reports_failures(self, generator_cls):
+        generator_cls.return_value.run = mock.MagicMock(
+            side_effect=ValueError("message")
+        )
+        connection = mock.MagicMock()
+
+        with self.assertLogs("aiocometd_chat_demo.loadtest.driver", "ERROR"):
+            _run_worker(LoadScenario(users=3), connection)
+
+        statistics = connection.send.call_args[0][0]
+        self.assertEqual(statistics.users, 3)
+        self.assertEqual(statistics.error_count, 1)
+        self.assertEqual(statistics.errors, {repr(ValueError("message")): 1})
+        connection.close.assert_called()
+
+
+class TestLoadDriver(TestCase):
+    def test_run_with_local_server(self):
+        scenario = LoadScenario(users=4, join_rate=100, message_rate=10,
+                                duration=1.0, seed=0)
+        driver = LoadDriver(scenario, workers=2)
+
+        statistics = driver.run()
+
+        self.assertIsInstance(statistics, LoadStatistics)
+        self.assertEqual(statistics.users, 4)
+        self.assertEqual(statistics.connected_users, 4)
+        self.assertGreater(statistics.sent_count, 0)
+        self.assertEqual(statistics.error_count, 0)
+        # group messages are received by every user, including the ones
+        # running in the other worker
+        self.assertGreater(statistics.received_count, statistics.sent_count)
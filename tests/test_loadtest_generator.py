@@ -0,0 +1,183 @@
+from array import array
+
+from asynctest import TestCase, mock
+
+from aiocometd_chat_demo.loadtest.generator import LoadStatistics, \
+    LoadScenario, LoadGenerator, SimulatedUser, scenario_from_arguments, \
+    create_argument_parser
+from aiocometd_chat_demo.channels import ChannelType
+from aiocometd_chat_demo.exceptions import InvalidStateError
+
+
+class TestLoadStatistics(TestCase):
+    def test_merge(self):
+        stats1 = LoadStatistics(users=1, connected_users=1, sent_count=2,
+                                received_count=3, lost_count=1,
+                                error_count=1, duration=5.0,
+                                latencies=array("d", [0.1]))
+        stats1.errors["error"] = 1
+        stats2 = LoadStatistics(users=2, connected_users=1, sent_count=4,
+                                received_count=6, lost_count=0,
+                                error_count=2, duration=6.0,
+                                latencies=array("d", [0.2, 0.3]))
+        stats2.errors["error"] = 2
+
+        stats1.merge(stats2)
+
+        self.assertEqual(stats1.users, 3)
+        self.assertEqual(stats1.connected_users, 2)
+        self.assertEqual(stats1.sent_count, 6)
+        self.assertEqual(stats1.received_count, 9)
+        self.assertEqual(stats1.lost_count, 1)
+        self.assertEqual(stats1.error_count, 3)
+        self.assertEqual(stats1.duration, 6.0)
+        self.assertEqual(list(stats1.latencies), [0.1, 0.2, 0.3])
+        self.assertEqual(stats1.errors["error"], 3)
+
+    def test_rates(self):
+        stats = LoadStatistics(sent_count=10, received_count=40,
+                               error_count=1, lost_count=1, duration=2.0)
+
+        self.assertEqual(stats.send_rate, 5.0)
+        self.assertEqual(stats.receive_rate, 20.0)
+        self.assertEqual(stats.error_rate, 0.2)
+
+    def test_rates_without_data(self):
+        stats = LoadStatistics()
+
+        self.assertEqual(stats.send_rate, 0.0)
+        self.assertEqual(stats.receive_rate, 0.0)
+        self.assertEqual(stats.error_rate, 0.0)
+
+    def test_latency_percentiles(self):
+        stats = LoadStatistics(latencies=array("d", range(100, 0, -1)))
+
+        result = stats.latency_percentiles((0, 50, 99, 100))
+
+        self.assertEqual(result, {0: 1, 50: 50, 99: 99, 100: 100})
+
+    def test_latency_percentiles_without_data(self):
+        self.assertEqual(LoadStatistics().latency_percentiles((50,)), {})
+
+    def test_format_report(self):
+        stats = LoadStatistics(users=2, connected_users=1, sent_count=1,
+                               duration=1.0, latencies=array("d", [0.5]))
+        stats.errors["some error"] = 1
+
+        report = stats.format_report()
+
+        self.assertIn("1/2 connected", report)
+        self.assertIn("500.00 ms", report)
+        self.assertIn("some error", report)
+
+
+class TestSimulatedUser(TestCase):
+    def setUp(self):
+        self.statistics = LoadStatistics()
+        self.user = SimulatedUser("john", "url", self.statistics)
+        room = self.user.join_room(self.user._room_name)
+        room.channels_model = mock.MagicMock()
+        self.user._channels_model = room.channels_model
+
+    def test_message_received_measures_own_messages(self):
+        self.user._pending["1"] = self.loop.time()
+
+        self.user.message_received({
+            "channel": self.user._room_channel,
+            "data": {"user": "john", "chat": "1 xxx"}
+        })
+
+        self.assertEqual(self.statistics.received_count, 1)
+        self.assertEqual(len(self.statistics.latencies), 1)
+        self.assertEqual(self.user.pending_count, 0)
+        self.user.channels_model.add_incoming_message.assert_called()
+
+    def test_message_received_ignores_others_messages(self):
+        self.user._pending["1"] = self.loop.time()
+
+        self.user.message_received({
+            "channel": self.user._room_channel,
+            "data": {"user": "jane", "chat": "1 xxx"}
+        })
+
+        self.assertEqual(self.statistics.received_count, 1)
+        self.assertEqual(len(self.statistics.latencies), 0)
+        self.assertEqual(self.user.pending_count, 1)
+
+    def test_send_chat_message_to_group(self):
+        self.user.send_message = mock.MagicMock()
+
+        self.user.send_chat_message(None, 10)
+
+        self.user.send_message.assert_called_with(
+            self.user._room_name, ChannelType.GROUP, "0 xxxxxxxx"
+        )
+        self.assertEqual(self.statistics.sent_count, 1)
+        self.assertEqual(self.user.pending_count, 1)
+
+    def test_send_chat_message_to_peer(self):
+        self.user.send_message = mock.MagicMock()
+
+        self.user.send_chat_message("jane", 1)
+
+        self.user.send_message.assert_called_with(
+            "jane", ChannelType.USER, "0 "
+        )
+
+    def test_send_chat_message_counts_errors(self):
+        self.user.send_message = mock.MagicMock(
+            side_effect=InvalidStateError("message")
+        )
+
+        self.user.send_chat_message(None, 10)
+
+        self.assertEqual(self.statistics.sent_count, 0)
+        self.assertEqual(self.statistics.error_count, 1)
+
+    def test_on_publish_finished_counts_errors(self):
+        self.user._pending["1"] = self.loop.time()
+        response = mock.MagicMock()
+        response.error = ValueError()
+
+        self.user._on_publish_finished(response, "1")
+
+        self.assertEqual(self.statistics.error_count, 1)
+        self.assertEqual(self.user.pending_count, 0)
+
+    def test_error_signal_counted(self):
+        self.user.last_error = "error"
+
+        self.assertEqual(self.statistics.error_count, 1)
+        self.assertEqual(self.statistics.errors["error"], 1)
+
+
+class TestLoadGenerator(TestCase):
+    async def test_run_against_local_server(self):
+        scenario = LoadScenario(users=3, join_rate=100, message_rate=20,
+                                private_ratio=0.5, duration=1.0, seed=0)
+        generator = LoadGenerator(scenario)
+
+        statistics = await generator.run()
+
+        self.assertEqual(statistics.users, 3)
+        self.assertEqual(statistics.connected_users, 3)
+        self.assertGreater(statistics.sent_count, 0)
+        self.assertEqual(statistics.error_count, 0)
+        self.assertEqual(statistics.lost_count, 0)
+        self.assertEqual(len(statistics.latencies), statistics.sent_count)
+        self.assertGreaterEqual(statistics.received_count,
+                                statistics.sent_count)
+
+    def test_scenario_from_arguments(self):
+        options = create_argument_parser().parse_args([
+            "--url", "url", "--users", "5", "--join-rate", "2",
+            "--message-rate", "3", "--private-ratio", "0.5",
+            "--message-size", "20", "--duration", "7", "--seed", "1"
+        ])
+
+        scenario = scenario_from_arguments(options)
+
+        self.assertEqual(scenario, LoadScenario(
+            url="url", users=5, join_rate=2, message_rate=3,
+            private_ratio=0.5, message_size=20, duration=7, seed=1
+        ))
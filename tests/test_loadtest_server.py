@@ -0,0 +1,264 @@
+import asyncio
+
+import aiocometd
+from aiocometd import ConnectionType
+from asynctest import TestCase
+
+from aiocometd_chat_demo.loadtest.server import LocalChatServer
+from aiocometd_chat_demo.cometd import CometdClient, ClientState
+from aiocometd_chat_demo.chat_service import ChatService
+
+
+class TestLocalChatServer(TestCase):
+    async def setUp(self):
+        self.server = LocalChatServer(connect_timeout=1, max_interval=2)
+        await self.server.start()
+        self.room = "/chat/demo"
+        self.members_channel = "/members/demo"
+
+    async def tearDown(self):
+        await self.server.stop()
+
+    async def receive(self, client):
+        return await asyncio.wait_for(client.receive(), 5)
+
+    async def test_url(self):
+        self.assertRegex(self.server.url,
+                         r"^http://127\.0\.0\.1:[1-9][0-9]*/cometd$")
+
+    async def test_publish_and_receive(self):
+        for connection_type in ConnectionType:
+            with self.subTest(connection_type=connection_type):
+                async with aiocometd.Client(self.server.url,
+                                            connection_type) as client:
+                    await client.subscribe(self.room)
+                    data = {"user": "john", "chat": "hi"}
+
+                    await client.publish(self.room, data)
+
+                    self.assertEqual(client.connection_type, connection_type)
+                    message = await self.receive(client)
+                    self.assertEqual(message["channel"], self.room)
+                    self.assertEqual(message["data"], data)
+
+    async def test_wildcard_subscriptions(self):
+        async with aiocometd.Client(self.server.url) as client:
+            await client.subscribe("/chat/*")
+            await client.subscribe("/**")
+
+            self.server.publish(self.room, "data")
+
+            message = await self.receive(client)
+            self.assertEqual(message["channel"], self.room)
+            self.assertEqual(message["data"], "data")
+            self.assertFalse(client.has_pending_messages)
+
+    async def test_forbidden_subscription_subscribes_nothing(self):
+        async with aiocometd.Client(self.server.url):
+            session, = self.server._sessions.values()
+            message = {"channel": "/meta/subscribe", "id": "1",
+                       "subscription": [self.room, "/meta/connect"]}
+
+            reply = self.server._subscribe(session, message)
+
+            self.assertFalse(reply["successful"])
+            self.assertEqual(reply["error"], "403::Forbidden channel")
+            self.assertEqual(session.subscriptions, set())
+            self.assertNotIn(session.client_id,
+                             self.server._subscribers[self.room])
+
+    async def test_room_messages_are_numbered(self):
+        async with aiocometd.Client(self.server.url) as client:
+            await client.subscribe(self.room)
+            await client.subscribe("/chat/other")
+
+            self.server.publish(self.room, "first")
+            self.server.publish("/chat/other", "other")
+            self.server.publish(self.room, "second")
+
+            messages = [await self.receive(client) for _ in range(3)]
+            self.assertEqual([(message["channel"], message["ext"]["seq"])
+                              for message in messages],
+                             [(self.room, 1), ("/chat/other", 1),
+                              (self.room, 2)])
+            self.assertIsInstance(messages[0]["ext"]["timestamp"], int)
+
+    async def test_history(self):
+        for index in range(1, 6):
+            self.server.publish(self.room, index)
+        async with aiocometd.Client(self.server.url) as client:
+            first_page = await client.publish("/service/history", {
+                "room": self.room, "limit": 3
+            })
+            second_page = await client.publish("/service/history", {
+                "room": self.room, "limit": 3,
+                "before": first_page["data"]["cursor"]
+            })
+
+        self.assertEqual([message["data"]
+                          for message in first_page["data"]["messages"]],
+                         [3, 4, 5])
+        self.assertEqual(first_page["data"]["cursor"], 3)
+        self.assertEqual([message["data"]
+                          for message in second_page["data"]["messages"]],
+                         [1, 2])
+        self.assertIsNone(second_page["data"]["cursor"])
+
+    async def test_private_history(self):
+        async with aiocometd.Client(self.server.url) as client1, \
+                aiocometd.Client(self.server.url) as client2:
+            for client, user in ((client1, "john"), (client2, "jane")):
+                await client.publish("/service/members",
+                                     {"user": user, "room": self.room})
+            await client1.publish("/service/privatechat", {
+                "room": self.room, "user": "john", "chat": "hi",
+                "peer": "jane"
+            })
+
+            page = await client2.publish("/service/history", {
+                "room": self.room, "user": "jane", "peer": "john"
+            })
+            other_page = await client2.publish("/service/history", {
+                "room": self.room, "user": "jane", "peer": "bob"
+            })
+
+        self.assertEqual([message["data"]["chat"]
+                          for message in page["data"]["messages"]], ["hi"])
+        self.assertIsNone(page["data"]["cursor"])
+        self.assertEqual(other_page["data"]["messages"], [])
+
+    async def test_backlog(self):
+        server = LocalChatServer(history_size=3)
+        await server.start()
+        try:
+            for index in range(1, 6):
+                server.publish(self.room, index)
+            async with aiocometd.Client(server.url) as client:
+                await client.publish("/service/backlog", {
+                    "room": self.room, "ranges": [[1, 2], [4, 5]]
+                })
+
+                messages = [await self.receive(client) for _ in range(2)]
+                self.assertEqual([message["data"] for message in messages],
+                                 [4, 5])
+                self.assertEqual([message["ext"]["seq"]
+                                  for message in messages], [4, 5])
+                self.assertFalse(client.has_pending_messages)
+        finally:
+            await server.stop()
+
+    async def test_members_broadcast(self):
+        async with aiocometd.Client(self.server.url) as client1, \
+                aiocometd.Client(self.server.url) as client2:
+            await client1.subscribe(self.members_channel)
+
+            await client1.publish("/service/members",
+                                  {"user": "john", "room": self.room})
+            await client2.publish("/service/members",
+                                  {"user": "jane", "room": self.room})
+
+            self.assertEqual(await self.receive(client1),
+                             {"channel": self.members_channel,
+                              "data": ["john"]})
+            self.assertEqual(await self.receive(client1),
+                             {"channel": self.members_channel,
+                              "data": ["john", "jane"]})
+
+        self.assertEqual(self.server.members(self.room), [])
+        self.assertEqual(self.server.client_count, 0)
+
+    async def test_private_chat(self):
+        async with aiocometd.Client(self.server.url) as client1, \
+                aiocometd.Client(self.server.url) as client2, \
+                aiocometd.Client(self.server.url) as client3:
+            for client, user in ((client1, "john"), (client2, "jane"),
+                                 (client3, "jack")):
+                await client.subscribe(self.room)
+                await client.publish("/service/members",
+                                     {"user": user, "room": self.room})
+
+            await client1.publish("/service/privatechat", {
+                "room": self.room,
+                "user": "john",
+                "chat": "hi",
+                "peer": "jane"
+            })
+
+            expected = {
+                "channel": self.room,
+                "data": {"user": "john", "chat": "hi", "scope": "private"}
+            }
+            self.assertEqual(await self.receive(client1), expected)
+            self.assertEqual(await self.receive(client2), expected)
+            await asyncio.sleep(0.1)
+            self.assertFalse(client3.has_pending_messages)
+
+    async def test_expired_sessions_leave_the_rooms(self):
+        client = aiocometd.Client(self.server.url,
+                                  ConnectionType.LONG_POLLING)
+        await client.open()
+        await client.publish("/service/members",
+                             {"user": "john", "room": self.room})
+        # stop the client without sending a disconnect message
+        await client._transport._stop_connect_task()
+        await client._transport.close()
+
+        await asyncio.sleep(3)
+
+        self.assertEqual(self.server.members(self.room), [])
+
+    async def test_disconnect_answers_held_connect(self):
+        async with aiocometd.Client(self.server.url,
+                                    ConnectionType.LONG_POLLING) as client:
+            session = self.server._sessions[client._transport.client_id]
+            while not session.pending_connects:
+                await asyncio.sleep(0.01)
+            start = self.loop.time()
+
+        while session.pending_connects:
+            await asyncio.sleep(0.01)
+        # the connect timeout of the server is 1 second
+        self.assertLess(self.loop.time() - start, 0.5)
+
+    async def test_cometd_client_end_to_end(self):
+        client = CometdClient(self.server.url, [self.room], self.loop)
+        received = asyncio.Queue()
+        connected = asyncio.Event()
+        client.message_received.connect(received.put_nowait)
+        client.connected.connect(connected.set)
+
+        client.connect_()
+        await asyncio.wait_for(connected.wait(), 5)
+        response = client.publish(self.room, {"user": "john", "chat": "hi"})
+        message = await asyncio.wait_for(received.get(), 5)
+        client.disconnect_()
+        while client.state == ClientState.CONNECTED:
+            await asyncio.sleep(0.01)
+
+        self.assertEqual(message["data"], {"user": "john", "chat": "hi"})
+        self.assertIsNone(response.error)
+        self.assertTrue(response.result["successful"])
+        self.assertEqual(client.state, ClientState.DISCONNECTED)
+
+    async def test_chat_service_end_to_end(self):
+        service = ChatService()
+        service.url = self.server.url
+        service.username = "john"
+        connected = asyncio.Event()
+        service.connected.connect(connected.set)
+
+        service.connect_()
+        await asyncio.wait_for(connected.wait(), 5)
+        async with aiocometd.Client(self.server.url) as client:
+            await client.publish("/service/members",
+                                 {"user": "jane", "room": self.room})
+            await client.publish(self.room, {"user": "jane", "chat": "hi"})
+            conversation = service.channels_model.group_channel.conversation
+            while not conversation.rowCount():
+                await asyncio.sleep(0.01)
+            model = service.channels_model
+            self.assertEqual(model.rowCount(), 2)
+            self.assertEqual(conversation._messages[0].contents, "hi")
+        service.disconnect_()
+        while service.client is not None:
+            await asyncio.sleep(0.01)
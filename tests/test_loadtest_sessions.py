@@ -0,0 +1,55 @@
+from collections import Counter
+
+from asynctest import TestCase
+
+from aiocometd_chat_demo.loadtest.sessions import SessionsReport, \
+    measure_sessions, create_argument_parser
+from aiocometd_chat_demo.loadtest.soak import MemorySample
+
+
+class TestSessionsReport(TestCase):
+    def setUp(self):
+        self.report = SessionsReport(
+            session_count=4,
+            shared_pool=True,
+            baseline=MemorySample(elapsed=0, traced_memory=1024,
+                                  qobjects=Counter(A=2)),
+            connected=MemorySample(elapsed=1, traced_memory=5120,
+                                   qobjects=Counter(A=6, B=4))
+        )
+
+    def test_per_session(self):
+        self.assertEqual(self.report.memory_per_session, 1024)
+        self.assertEqual(self.report.qobjects_per_session, 2)
+
+    def test_per_session_without_sessions(self):
+        self.report.session_count = 0
+
+        self.assertEqual(self.report.memory_per_session, 0)
+        self.assertEqual(self.report.qobjects_per_session, 0)
+
+    def test_format_report(self):
+        text = self.report.format_report()
+
+        self.assertIn("4 sessions, shared connection pool:", text)
+        self.assertIn("memory per session:   1.0 KiB", text)
+        self.assertIn("QObjects per session: 2.0", text)
+
+
+class TestMeasureSessions(TestCase):
+    async def test_measure_sessions(self):
+        for shared_pool in (False, True):
+            report = await measure_sessions(3, shared_pool, room_size=2)
+
+            self.assertEqual(report.session_count, 3)
+            self.assertEqual(report.shared_pool, shared_pool)
+            self.assertGreater(report.memory_per_session, 0)
+
+    def test_argument_parser(self):
+        options = create_argument_parser().parse_args([
+            "--sessions", "5", "--room-size", "2"
+        ])
+
+        self.assertEqual(options.sessions, 5)
+        self.assertEqual(options.room_size, 2)
+        self.assertIsNone(options.url)
@@ -0,0 +1,104 @@
+from collections import Counter
+
+from asynctest import TestCase, mock
+
+from aiocometd_chat_demo.loadtest.soak import SoakScenario, SoakReport, \
+    SoakTest, MemorySample, take_sample, count_qobjects, \
+    create_argument_parser
+from aiocometd_chat_demo.channels import ChannelsModel
+
+
+class TestMemorySample(TestCase):
+    def test_qobject_count(self):
+        sample = MemorySample(elapsed=0, traced_memory=0,
+                              qobjects=Counter(A=2, B=3))
+
+        self.assertEqual(sample.qobject_count, 5)
+
+    def test_count_qobjects(self):
+        model = ChannelsModel("group")
+
+        counts = count_qobjects()
+
+        self.assertGreaterEqual(counts["ChannelsModel"], 1)
+        self.assertGreaterEqual(counts["ConversationModel"], 1)
+        del model
+
+    @mock.patch("aiocometd_chat_demo.loadtest.soak.count_qobjects")
+    @mock.patch("aiocometd_chat_demo.loadtest.soak.tracemalloc")
+    @mock.patch("aiocometd_chat_demo.loadtest.soak.gc")
+    def test_take_sample(self, gc, tracemalloc, count_qobjects_func):
+        tracemalloc.get_traced_memory.return_value = (100, 200)
+        count_qobjects_func.return_value = Counter(A=1)
+
+        sample = take_sample(5.0)
+
+        gc.collect.assert_called()
+        self.assertEqual(sample, MemorySample(elapsed=5.0, traced_memory=100,
+                                              qobjects=Counter(A=1)))
+
+
+class TestSoakReport(TestCase):
+    def test_growth(self):
+        report = SoakReport(samples=[
+            MemorySample(elapsed=0, traced_memory=100,
+                         qobjects=Counter(A=2, B=3)),
+            MemorySample(elapsed=1, traced_memory=150,
+                         qobjects=Counter(A=4, B=1)),
+        ])
+
+        self.assertEqual(report.memory_growth, 50)
+        self.assertEqual(report.qobject_growth, Counter(A=2))
+
+    def test_growth_without_samples(self):
+        report = SoakReport()
+
+        self.assertEqual(report.memory_growth, 0)
+        self.assertEqual(report.qobject_growth, Counter())
+
+    def test_format_report(self):
+        report = SoakReport(published_count=10, reconnect_count=2, samples=[
+            MemorySample(elapsed=0, traced_memory=1024,
+                         qobjects=Counter(A=1)),
+            MemorySample(elapsed=5, traced_memory=3072,
+                         qobjects=Counter(A=3)),
+        ])
+
+        text = report.format_report()
+
+        self.assertIn("published:        10", text)
+        self.assertIn("reconnects:       2", text)
+        self.assertIn("memory growth:    2.0 KiB", text)
+        self.assertIn("A: +2", text)
+
+
+class TestSoakTest(TestCase):
+    async def test_run(self):
+        scenario = SoakScenario(duration=2.0, warmup=0.5, peers=5,
+                                group_message_rate=20,
+                                private_message_rate=10, send_rate=10,
+                                churn_rate=5, reconnect_interval=0.5,
+                                sample_interval=0.5, top=3, seed=0)
+        soak_test = SoakTest(scenario)
+
+        report = await soak_test.run()
+
+        self.assertGreater(report.published_count, 0)
+        self.assertGreater(report.sent_count, 0)
+        self.assertGreater(report.churn_count, 0)
+        self.assertGreater(report.reconnect_count, 0)
+        self.assertEqual(report.error_count, 0)
+        self.assertGreaterEqual(len(report.samples), 2)
+        self.assertLessEqual(len(report.growth), 3)
+        self.assertIsNone(soak_test.service.client)
+
+    def test_argument_parser(self):
+        options = create_argument_parser().parse_args([
+            "--duration", "10", "--peers", "3", "--reconnect-interval", "0"
+        ])
+
+        scenario = SoakScenario(**vars(options))
+
+        self.assertEqual(scenario.duration, 10)
+        self.assertEqual(scenario.peers, 3)
+        self.assertEqual(scenario.reconnect_interval, 0)
@@ -1,9 +1,13 @@
+import os
+import tempfile
 from unittest import TestCase, mock
 
 import aiocometd_chat_demo.__main__ as main
 from aiocometd_chat_demo.chat_service import ChatService
 from aiocometd_chat_demo.channels import ChannelsModel
+from aiocometd_chat_demo.channels_filter import ChannelsFilterModel
 from aiocometd_chat_demo.conversation import ConversationModel
+from aiocometd_chat_demo.search import SearchResultsModel
 from aiocometd_chat_demo._metadata import VERSION, AUTHOR, AUTHOR_EMAIL, URL
 
 
@@ -15,6 +19,7 @@ class TestMain(TestCase):
 
         register_type.assert_has_calls([
             mock.call(ConversationModel, "ChatDemo", 1, 0, "Conversation"),
+            mock.call(ChannelsFilterModel, "ChatDemo", 1, 0, "ChannelsFilter"),
             mock.call(ChatService, "ChatService", 1, 0, "ChatService")
         ], any_order=True)
         register_uncreatable_type.assert_has_calls([
@@ -23,9 +28,38 @@ class TestMain(TestCase):
                       "ChannelsModel can't be created in QML!"),
             mock.call(ConversationModel, "ConversationModel", 1, 0,
                       "ConversationModel",
-                      "ConversationModel can't be created in QML!")
+                      "ConversationModel can't be created in QML!"),
+            mock.call(SearchResultsModel, "SearchResultsModel", 1, 0,
+                      "SearchResultsModel",
+                      "SearchResultsModel can't be created in QML!")
         ], any_order=True)
 
+    @mock.patch("aiocometd_chat_demo.__main__.os.makedirs")
+    @mock.patch("aiocometd_chat_demo.__main__.QStandardPaths")
+    def test_get_outbox_path(self, standard_paths, makedirs):
+        standard_paths.writableLocation.return_value = "/data"
+
+        result = main.get_outbox_path()
+
+        standard_paths.writableLocation.assert_called_with(
+            standard_paths.AppDataLocation
+        )
+        makedirs.assert_called_with("/data", exist_ok=True)
+        self.assertEqual(result, os.path.join("/data", main.OUTBOX_FILE))
+
+    @mock.patch("aiocometd_chat_demo.__main__.os.makedirs")
+    @mock.patch("aiocometd_chat_demo.__main__.QStandardPaths")
+    def test_get_snapshot_path(self, standard_paths, makedirs):
+        standard_paths.writableLocation.return_value = "/data"
+
+        result = main.get_snapshot_path()
+
+        makedirs.assert_called_with("/data", exist_ok=True)
+        self.assertEqual(result, os.path.join("/data", main.SNAPSHOT_FILE))
+
+    @mock.patch("aiocometd_chat_demo.__main__.get_main_qml_path")
+    @mock.patch("aiocometd_chat_demo.__main__.get_snapshot_path")
+    @mock.patch("aiocometd_chat_demo.__main__.get_outbox_path")
     @mock.patch("aiocometd_chat_demo.__main__.sys")
     @mock.patch("aiocometd_chat_demo.__main__.QQmlApplicationEngine")
     @mock.patch("aiocometd_chat_demo.__main__.register_types")
@@ -34,7 +68,8 @@ class TestMain(TestCase):
     @mock.patch("aiocometd_chat_demo.__main__.QGuiApplication")
     @mock.patch("aiocometd_chat_demo.__main__.logging")
     def test_main(self, logging_mod, gui_app_cls, event_loop_cls, asyncio_mod,
-                  register_types_func, engine_cls, sys_mod):
+                  register_types_func, engine_cls, sys_mod, get_outbox_path,
+                  get_snapshot_path, get_main_qml_path):
         sys_mod.argv = []
         gui_app = mock.MagicMock()
         gui_app_cls.return_value = gui_app
@@ -43,8 +78,9 @@ class TestMain(TestCase):
         engine = engine_cls.return_value
         root_context = engine.rootContext.return_value
 
-        main.main()
+        status = main.main()
 
+        self.assertEqual(status, 0)
         logging_mod.basicConfig.assert_called_with(level=logging_mod.INFO)
         gui_app_cls.assert_called_with(["--style", main.QUICK_CONTROLS2_STYLE])
         event_loop_cls.assert_called_with(gui_app)
@@ -56,8 +92,120 @@ class TestMain(TestCase):
             mock.call("author", AUTHOR),
             mock.call("authorEmail", AUTHOR_EMAIL),
             mock.call("projectUrl", URL),
+            mock.call("outboxPath", get_outbox_path.return_value),
+            mock.call("snapshotPath", get_snapshot_path.return_value),
         ], any_order=True)
-        engine.load.assert_called_with(main.MAIN_QML_PATH)
+        get_main_qml_path.assert_called_with(True)
+        engine.load.assert_called_with(get_main_qml_path.return_value)
         event_loop.__enter__.assert_called()
         event_loop.__exit__.assert_called()
         event_loop.run_forever.assert_called()
+
+    @mock.patch("aiocometd_chat_demo.__main__.StartupProfiler")
+    @mock.patch("aiocometd_chat_demo.__main__.get_main_qml_path")
+    @mock.patch("aiocometd_chat_demo.__main__.get_snapshot_path")
+    @mock.patch("aiocometd_chat_demo.__main__.get_outbox_path")
+    @mock.patch("aiocometd_chat_demo.__main__.sys")
+    @mock.patch("aiocometd_chat_demo.__main__.QQmlApplicationEngine")
+    @mock.patch("aiocometd_chat_demo.__main__.register_types")
+    @mock.patch("aiocometd_chat_demo.__main__.asyncio")
+    @mock.patch("aiocometd_chat_demo.__main__.QEventLoop")
+    @mock.patch("aiocometd_chat_demo.__main__.QGuiApplication")
+    @mock.patch("aiocometd_chat_demo.__main__.logging")
+    def test_main_qml_load_error(self, logging_mod, gui_app_cls,
+                                 event_loop_cls, asyncio_mod,
+                                 register_types_func, engine_cls, sys_mod,
+                                 get_outbox_path, get_snapshot_path,
+                                 get_main_qml_path, profiler_cls):
+        sys_mod.argv = ["app", main.PROFILE_STARTUP_OPTION]
+        engine = engine_cls.return_value
+        engine.rootObjects.return_value = []
+        event_loop = event_loop_cls.return_value
+        profiler = profiler_cls.return_value
+
+        with self.assertLogs(main.LOGGER, "ERROR"):
+            status = main.main()
+
+        self.assertEqual(status, 1)
+        profiler.report_first_frame.assert_not_called()
+        event_loop.run_forever.assert_not_called()
+
+    @mock.patch("aiocometd_chat_demo.__main__.StartupProfiler")
+    @mock.patch("aiocometd_chat_demo.__main__.get_main_qml_path")
+    @mock.patch("aiocometd_chat_demo.__main__.get_snapshot_path")
+    @mock.patch("aiocometd_chat_demo.__main__.get_outbox_path")
+    @mock.patch("aiocometd_chat_demo.__main__.sys")
+    @mock.patch("aiocometd_chat_demo.__main__.QQmlApplicationEngine")
+    @mock.patch("aiocometd_chat_demo.__main__.register_types")
+    @mock.patch("aiocometd_chat_demo.__main__.asyncio")
+    @mock.patch("aiocometd_chat_demo.__main__.QEventLoop")
+    @mock.patch("aiocometd_chat_demo.__main__.QGuiApplication")
+    @mock.patch("aiocometd_chat_demo.__main__.logging")
+    def test_main_profile_startup(self, logging_mod, gui_app_cls,
+                                  event_loop_cls, asyncio_mod,
+                                  register_types_func, engine_cls, sys_mod,
+                                  get_outbox_path, get_snapshot_path,
+                                  get_main_qml_path, profiler_cls):
+        sys_mod.argv = ["app", main.PROFILE_STARTUP_OPTION]
+        engine = engine_cls.return_value
+        window = mock.MagicMock()
+        engine.rootObjects.return_value = [window]
+        profiler = profiler_cls.return_value
+
+        main.main()
+
+        gui_app_cls.assert_called_with(["app", "--style",
+                                        main.QUICK_CONTROLS2_STYLE])
+        profiler_cls.assert_called_with(main.IMPORT_TIME)
+        profiler.mark.assert_has_calls([
+            mock.call("imports"),
+            mock.call("application"),
+            mock.call("register_types"),
+            mock.call("qml"),
+        ])
+        profiler.report_first_frame.assert_called_with(window)
+
+    @mock.patch("aiocometd_chat_demo.__main__.build_bundle")
+    @mock.patch("aiocometd_chat_demo.__main__.sys")
+    @mock.patch("aiocometd_chat_demo.__main__.QQmlApplicationEngine")
+    @mock.patch("aiocometd_chat_demo.__main__.register_types")
+    @mock.patch("aiocometd_chat_demo.__main__.asyncio")
+    @mock.patch("aiocometd_chat_demo.__main__.QEventLoop")
+    @mock.patch("aiocometd_chat_demo.__main__.QGuiApplication")
+    @mock.patch("aiocometd_chat_demo.__main__.logging")
+    def test_main_build_qml_bundle(self, logging_mod, gui_app_cls,
+                                   event_loop_cls, asyncio_mod,
+                                   register_types_func, engine_cls, sys_mod,
+                                   build_bundle_func):
+        sys_mod.argv = ["app", main.BUILD_QML_BUNDLE_OPTION]
+        engine = engine_cls.return_value
+        event_loop = event_loop_cls.return_value
+
+        main.main()
+
+        gui_app_cls.assert_called_with(["app", "--style",
+                                        main.QUICK_CONTROLS2_STYLE])
+        register_types_func.assert_called()
+        build_bundle_func.assert_called_with(engine, main.QML_DIR,
+                                             main.QML_BUNDLE_DIR)
+        engine.load.assert_not_called()
+        event_loop.run_forever.assert_not_called()
+
+    def test_get_main_qml_path_from_bundle(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, main.MAIN_QML_FILE)
+            with open(path, "w"):
+                pass
+
+            with mock.patch("aiocometd_chat_demo.__main__.QML_BUNDLE_DIR",
+                            directory):
+                self.assertEqual(main.get_main_qml_path(), path)
+                self.assertEqual(main.get_main_qml_path(False),
+                                 main.MAIN_QML_PATH)
+
+    def test_get_main_qml_path_without_bundle(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch("aiocometd_chat_demo.__main__.QML_BUNDLE_DIR",
+                            directory):
+                self.assertEqual(main.get_main_qml_path(),
+                                 main.MAIN_QML_PATH)
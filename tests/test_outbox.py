@@ -0,0 +1,255 @@
+import asyncio
+import json
+import os
+import tempfile
+
+from asynctest import TestCase, mock
+
+from aiocometd_chat_demo.cometd import ClientState, MessageResponse
+from aiocometd_chat_demo.exceptions import OutboxFullError
+from aiocometd_chat_demo.outbox import Outbox, OutboxMessage, DeliveryState
+
+
+class TestOutbox(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "outbox.jsonl")
+        self.outbox = Outbox(self.path, batch_size=2, max_attempts=2,
+                             retry_interval=0, loop=self.loop)
+        self.client = mock.MagicMock()
+        self.client.state = ClientState.CONNECTED
+        self.responses = []
+        self.client.publish.side_effect = self.publish
+
+    def tearDown(self):
+        self.outbox.close()
+        self.directory.cleanup()
+
+    def publish(self, channel, data):
+        response = MessageResponse()
+        self.responses.append(response)
+        return response
+
+    def finish(self, response, error=None):
+        response.error = error
+        response.finished.emit()
+
+    def records(self):
+        with open(self.path, encoding="utf-8") as file:
+            return [json.loads(line) for line in file]
+
+    def test_enqueue_without_client(self):
+        message = self.outbox.enqueue("/chat/demo", {"chat": "text"})
+
+        self.assertEqual(message, OutboxMessage(id=1, channel="/chat/demo",
+                                                data={"chat": "text"}))
+        self.assertEqual(len(self.outbox), 1)
+        self.assertEqual(self.outbox.message(1), message)
+        self.assertEqual(self.records(), [
+            {"id": 1, "channel": "/chat/demo", "data": {"chat": "text"}}
+        ])
+
+    def test_enqueue_error_if_full(self):
+        self.outbox.max_messages = 1
+        self.outbox.enqueue("/chat/demo", {"chat": "first"})
+
+        with self.assertRaisesRegex(OutboxFullError, "The outbox is full"):
+            self.outbox.enqueue("/chat/demo", {"chat": "second"})
+
+        self.assertEqual(len(self.outbox), 1)
+
+    def test_attach_sends_batches_in_order(self):
+        for index in range(3):
+            self.outbox.enqueue("/chat/demo", {"chat": index})
+
+        self.outbox.attach(self.client)
+
+        self.assertEqual(self.client.publish.mock_calls, [
+            mock.call("/chat/demo", {"chat": 0}),
+            mock.call("/chat/demo", {"chat": 1}),
+        ])
+        self.assertEqual([message.state for message in self.outbox.messages],
+                         [DeliveryState.SENDING, DeliveryState.SENDING,
+                          DeliveryState.QUEUED])
+        self.finish(self.responses[0])
+        self.client.publish.assert_called_with("/chat/demo", {"chat": 1})
+        self.finish(self.responses[1])
+        self.client.publish.assert_called_with("/chat/demo", {"chat": 2})
+
+    def test_enqueue_sends_if_attached(self):
+        self.outbox.attach(self.client)
+        state_changed = mock.MagicMock()
+        self.outbox.message_state_changed.connect(state_changed)
+
+        message = self.outbox.enqueue("/chat/demo", {"chat": "text"})
+        self.finish(self.responses[0])
+
+        self.assertEqual(message.state, DeliveryState.DELIVERED)
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(len(self.outbox), 0)
+        self.assertEqual(state_changed.mock_calls, [
+            mock.call(1, DeliveryState.SENDING),
+            mock.call(1, DeliveryState.DELIVERED),
+        ])
+        self.assertEqual(self.records()[1], {"id": 1, "state": "delivered"})
+
+    def test_not_sent_if_client_not_connected(self):
+        self.client.state = ClientState.DISCONNECTED
+        self.outbox.attach(self.client)
+
+        self.outbox.enqueue("/chat/demo", {"chat": "text"})
+
+        self.client.publish.assert_not_called()
+
+    async def test_retry_failed_messages(self):
+        self.outbox.attach(self.client)
+        message = self.outbox.enqueue("/chat/demo", {"chat": "text"})
+
+        self.finish(self.responses[0], ValueError("error"))
+
+        self.assertEqual(message.state, DeliveryState.QUEUED)
+        self.assertEqual(message.error, "error")
+        self.assertEqual(self.client.publish.call_count, 1)
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.client.publish.call_count, 2)
+        self.assertEqual(message.state, DeliveryState.SENDING)
+
+    async def test_fail_after_max_attempts(self):
+        self.outbox.attach(self.client)
+        message = self.outbox.enqueue("/chat/demo", {"chat": "text"})
+        self.finish(self.responses[0], ValueError("error"))
+        await asyncio.sleep(0.01)
+
+        self.finish(self.responses[1], ValueError("error"))
+
+        self.assertEqual(message.state, DeliveryState.FAILED)
+        self.assertEqual(message.attempts, 2)
+        self.assertEqual(len(self.outbox), 0)
+        self.assertEqual(self.records()[-1],
+                         {"id": 1, "state": "failed", "error": "error"})
+
+    async def test_failed_message_keeps_order_of_batch(self):
+        self.outbox.max_attempts = 3
+        first = self.outbox.enqueue("/chat/demo", {"chat": 0})
+        second = self.outbox.enqueue("/chat/demo", {"chat": 1})
+        self.outbox.attach(self.client)
+
+        self.finish(self.responses[1])
+        self.assertEqual(second.state, DeliveryState.SENDING)
+        self.finish(self.responses[0], ValueError("error"))
+
+        self.assertEqual(first.state, DeliveryState.QUEUED)
+        self.assertEqual(second.state, DeliveryState.QUEUED)
+        self.assertEqual(len(self.outbox), 2)
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.client.publish.mock_calls, [
+            mock.call("/chat/demo", {"chat": 0}),
+            mock.call("/chat/demo", {"chat": 1}),
+            mock.call("/chat/demo", {"chat": 0}),
+            mock.call("/chat/demo", {"chat": 1}),
+        ])
+        self.assertEqual((first.attempts, second.attempts), (2, 1))
+        self.finish(self.responses[2])
+        self.finish(self.responses[3])
+        self.assertEqual(first.state, DeliveryState.DELIVERED)
+        self.assertEqual(second.state, DeliveryState.DELIVERED)
+
+    async def test_later_messages_of_batch_not_delivered_before_failed(self):
+        self.outbox.enqueue("/chat/demo", {"chat": 0})
+        self.outbox.enqueue("/chat/demo", {"chat": 1})
+        self.outbox.attach(self.client)
+        state_changed = mock.MagicMock()
+        self.outbox.message_state_changed.connect(state_changed)
+
+        self.finish(self.responses[0], ValueError("error"))
+        self.finish(self.responses[1])
+
+        self.assertEqual(state_changed.mock_calls, [
+            mock.call(1, DeliveryState.QUEUED),
+            mock.call(2, DeliveryState.QUEUED),
+        ])
+        await asyncio.sleep(0.01)
+        self.finish(self.responses[2])
+        self.finish(self.responses[3])
+        self.assertEqual(state_changed.mock_calls[-2:], [
+            mock.call(1, DeliveryState.DELIVERED),
+            mock.call(2, DeliveryState.DELIVERED),
+        ])
+
+    async def test_permanently_failed_message_doesnt_resend_batch(self):
+        self.outbox.max_attempts = 1
+        first = self.outbox.enqueue("/chat/demo", {"chat": 0})
+        second = self.outbox.enqueue("/chat/demo", {"chat": 1})
+        self.outbox.attach(self.client)
+
+        self.finish(self.responses[0], ValueError("error"))
+        self.finish(self.responses[1])
+
+        self.assertEqual(first.state, DeliveryState.FAILED)
+        self.assertEqual(second.state, DeliveryState.DELIVERED)
+        self.assertEqual(self.client.publish.call_count, 2)
+
+    def test_detach_queues_messages_in_flight(self):
+        self.outbox.attach(self.client)
+        message = self.outbox.enqueue("/chat/demo", {"chat": "text"})
+
+        self.outbox.detach()
+        self.finish(self.responses[0])
+
+        self.assertEqual(message.state, DeliveryState.QUEUED)
+        self.outbox.attach(self.client)
+        self.assertEqual(self.client.publish.call_count, 2)
+        self.assertEqual(message.state, DeliveryState.SENDING)
+
+    def test_detach_cancels_retry(self):
+        self.outbox.attach(self.client)
+        self.outbox.enqueue("/chat/demo", {"chat": "text"})
+        self.finish(self.responses[0], ValueError("error"))
+        handle = self.outbox._retry_handle
+
+        self.outbox.detach()
+
+        self.assertTrue(handle._cancelled)
+        self.assertIsNone(self.outbox._retry_handle)
+
+    def test_restore_undelivered_messages(self):
+        self.outbox.attach(self.client)
+        self.outbox.enqueue("/chat/demo", {"chat": 0})
+        self.finish(self.responses[0])
+        self.outbox.detach()
+        self.outbox.enqueue("/chat/demo", {"chat": 1})
+        self.outbox.enqueue("/chat/demo", {"chat": 2})
+        self.outbox.close()
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write('{"id": 4, "chan')
+
+        outbox = Outbox(self.path)
+
+        self.assertEqual([(message.id, message.data)
+                          for message in outbox.messages],
+                         [(2, {"chat": 1}), (3, {"chat": 2})])
+        self.assertEqual(outbox.enqueue("/chat/demo", {"chat": 3}).id, 4)
+        self.assertEqual(len(self.records()), 3)
+        outbox.close()
+
+    def test_compact_long_file(self):
+        self.outbox.max_messages = 2
+        self.outbox.attach(self.client)
+        self.outbox.enqueue("/chat/demo", {"chat": 0})
+        self.outbox.enqueue("/chat/demo", {"chat": 1})
+        self.finish(self.responses[0])
+
+        self.outbox.enqueue("/chat/demo", {"chat": 2})
+
+        self.assertEqual(self.records(), [
+            {"id": 2, "channel": "/chat/demo", "data": {"chat": 1}},
+            {"id": 3, "channel": "/chat/demo", "data": {"chat": 2}},
+        ])
+
+    def test_in_memory(self):
+        outbox = Outbox(loop=self.loop)
+
+        outbox.enqueue("/chat/demo", {"chat": "text"})
+
+        self.assertEqual(len(outbox), 1)
+        self.assertFalse(os.path.exists(self.path))
@@ -0,0 +1,289 @@
+import asyncio
+
+from asynctest import TestCase, mock
+
+from aiocometd_chat_demo.cometd import MessageResponse
+from aiocometd_chat_demo.exceptions import InvalidStateError, \
+    RateLimiterFullError
+from aiocometd_chat_demo.rate_limit import TokenBucket, RateLimiter, \
+    MEMBERS_SERVICE_CHANNEL
+
+
+class TestTokenBucket(TestCase):
+    def setUp(self):
+        self.time = 0.0
+        self.bucket = TokenBucket(2.0, 3, lambda: self.time)
+
+    def test_starts_full(self):
+        self.assertEqual(self.bucket.tokens, 3.0)
+        self.assertEqual(self.bucket.delay(), 0.0)
+
+    def test_consume(self):
+        for _ in range(3):
+            self.bucket.consume()
+
+        self.assertEqual(self.bucket.tokens, 0.0)
+        self.assertEqual(self.bucket.delay(), 0.5)
+
+    def test_refill(self):
+        for _ in range(3):
+            self.bucket.consume()
+
+        self.time = 0.75
+
+        self.assertEqual(self.bucket.tokens, 1.5)
+        self.assertEqual(self.bucket.delay(), 0.0)
+
+    def test_refill_up_to_capacity(self):
+        self.bucket.consume()
+
+        self.time = 10.0
+
+        self.assertEqual(self.bucket.tokens, 3.0)
+
+
+class TestRateLimiter(TestCase):
+    def setUp(self):
+        self.sent = []
+        self.responses = []
+
+    def publish(self, channel, data):
+        self.sent.append((channel, data))
+        response = MessageResponse()
+        self.responses.append(response)
+        return response
+
+    async def wait_until_sent(self, count, timeout=1.0):
+        deadline = self.loop.time() + timeout
+        while len(self.sent) < count and self.loop.time() < deadline:
+            await asyncio.sleep(0.005)
+
+    def test_publishes_right_away_within_burst(self):
+        limiter = RateLimiter(rate=10.0, burst=2, loop=self.loop)
+
+        first = limiter.publish("/chat/a", {"n": 1}, self.publish)
+        second = limiter.publish("/chat/a", {"n": 2}, self.publish)
+
+        self.assertEqual(self.sent, [("/chat/a", {"n": 1}),
+                                     ("/chat/a", {"n": 2})])
+        self.assertEqual([first, second], self.responses)
+        self.assertEqual(len(limiter), 0)
+
+    def test_unlimited(self):
+        limiter = RateLimiter(rate=None, loop=self.loop)
+
+        for index in range(100):
+            limiter.publish("/chat/a", {"n": index}, self.publish)
+
+        self.assertEqual(len(self.sent), 100)
+
+    async def test_queues_excess_messages(self):
+        limiter = RateLimiter(rate=100.0, burst=1, loop=self.loop)
+        limiter.publish("/chat/a", {"n": 1}, self.publish)
+
+        response = limiter.publish("/chat/a", {"n": 2}, self.publish)
+
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(len(limiter), 1)
+        self.assertNotIn(response, self.responses)
+        await self.wait_until_sent(2)
+        self.assertEqual(self.sent[1], ("/chat/a", {"n": 2}))
+        self.assertEqual(len(limiter), 0)
+
+    async def test_keeps_order_of_channel(self):
+        limiter = RateLimiter(rate=200.0, burst=1, loop=self.loop)
+
+        for index in range(5):
+            limiter.publish("/chat/a", {"n": index}, self.publish)
+
+        await self.wait_until_sent(5)
+        self.assertEqual([data["n"] for _, data in self.sent],
+                         list(range(5)))
+
+    async def test_channel_limit_does_not_block_other_channels(self):
+        limiter = RateLimiter(rate=None, channel_rate=1.0, channel_burst=1,
+                              loop=self.loop)
+        limiter.publish("/chat/a", {"n": 1}, self.publish)
+        limiter.publish("/chat/a", {"n": 2}, self.publish)
+
+        limiter.publish("/chat/b", {"n": 3}, self.publish)
+
+        self.assertEqual(self.sent, [("/chat/a", {"n": 1}),
+                                     ("/chat/b", {"n": 3})])
+        self.assertEqual(len(limiter), 1)
+        limiter.clear(InvalidStateError())
+
+    async def test_forwards_result(self):
+        limiter = RateLimiter(rate=100.0, burst=1, loop=self.loop)
+        limiter.publish("/chat/a", {"n": 1}, self.publish)
+        response = limiter.publish("/chat/a", {"n": 2}, self.publish)
+        finished = mock.MagicMock()
+        response.finished.connect(finished)
+        await self.wait_until_sent(2)
+
+        self.responses[1].result = {"successful": True}
+        self.responses[1].finished.emit()
+
+        finished.assert_called_once()
+        self.assertEqual(response.result, {"successful": True})
+        self.assertIsNone(response.error)
+
+    async def test_coalesces_membership_announcements(self):
+        limiter = RateLimiter(rate=100.0, burst=1, loop=self.loop)
+        limiter.publish("/chat/a", {"n": 1}, self.publish)
+        announcement = {"user": "user", "room": "/chat/a"}
+
+        first = limiter.publish(MEMBERS_SERVICE_CHANNEL, announcement,
+                                self.publish)
+        second = limiter.publish(MEMBERS_SERVICE_CHANNEL, dict(announcement),
+                                 self.publish)
+        other = limiter.publish(MEMBERS_SERVICE_CHANNEL,
+                                {"user": "user", "room": "/chat/b"},
+                                self.publish)
+
+        self.assertEqual(len(limiter), 2)
+        await self.wait_until_sent(3)
+        self.assertEqual(self.sent[1:], [
+            (MEMBERS_SERVICE_CHANNEL, announcement),
+            (MEMBERS_SERVICE_CHANNEL, {"user": "user", "room": "/chat/b"})
+        ])
+        first_finished = mock.MagicMock()
+        first.finished.connect(first_finished)
+        second_finished = mock.MagicMock()
+        second.finished.connect(second_finished)
+        self.responses[1].finished.emit()
+        first_finished.assert_called_once()
+        second_finished.assert_called_once()
+        self.assertIsNot(other, first)
+
+    async def test_does_not_coalesce_other_channels(self):
+        limiter = RateLimiter(rate=100.0, burst=1, loop=self.loop)
+        limiter.publish("/chat/a", {"n": 1}, self.publish)
+
+        limiter.publish("/chat/a", {"n": 2}, self.publish)
+        limiter.publish("/chat/a", {"n": 2}, self.publish)
+
+        self.assertEqual(len(limiter), 2)
+        await self.wait_until_sent(3)
+
+    async def test_sends_channels_in_turns(self):
+        limiter = RateLimiter(rate=200.0, burst=1, loop=self.loop)
+        limiter.publish("/chat/a", {"n": 0}, self.publish)
+        for index in range(1, 4):
+            limiter.publish("/chat/a", {"n": index}, self.publish)
+        limiter.publish("/chat/b", {"n": 4}, self.publish)
+
+        await self.wait_until_sent(5)
+
+        self.assertEqual([data["n"] for _, data in self.sent],
+                         [0, 1, 4, 2, 3])
+        self.assertEqual(len(limiter), 0)
+        self.assertEqual(limiter._queues, {})
+
+    async def test_fails_messages_if_full(self):
+        limiter = RateLimiter(rate=1.0, burst=1, max_queued=2,
+                              loop=self.loop)
+        limiter.publish("/chat/a", {"n": 0}, self.publish)
+        limiter.publish("/chat/a", {"n": 1}, self.publish)
+        limiter.publish("/chat/b", {"n": 2}, self.publish)
+
+        response = limiter.publish("/chat/a", {"n": 3}, self.publish)
+        finished = mock.MagicMock()
+        response.finished.connect(finished)
+
+        self.assertEqual(len(limiter), 2)
+        self.assertIsInstance(response.error, RateLimiterFullError)
+        await asyncio.sleep(0)
+        finished.assert_called_once()
+        limiter.clear(InvalidStateError())
+
+    async def test_coalesces_messages_if_full(self):
+        limiter = RateLimiter(rate=1.0, burst=1, max_queued=1,
+                              loop=self.loop)
+        limiter.publish("/chat/a", {"n": 0}, self.publish)
+        announcement = {"user": "user", "room": "/chat/a"}
+        first = limiter.publish(MEMBERS_SERVICE_CHANNEL, announcement,
+                                self.publish)
+
+        second = limiter.publish(MEMBERS_SERVICE_CHANNEL, announcement,
+                                 self.publish)
+
+        self.assertEqual(len(limiter), 1)
+        self.assertIsNone(second.error)
+        error = InvalidStateError()
+        limiter.clear(error)
+        self.assertIs(first.error, error)
+        self.assertIs(second.error, error)
+
+    def test_unlimited_queue(self):
+        limiter = RateLimiter(rate=1.0, burst=1, max_queued=None,
+                              loop=self.loop)
+
+        for index in range(2000):
+            limiter.publish("/chat/a", {"n": index}, self.publish)
+
+        self.assertEqual(len(limiter), 1999)
+        limiter.clear(InvalidStateError())
+
+    async def test_publish_error_of_queued_message(self):
+        limiter = RateLimiter(rate=100.0, burst=1, loop=self.loop)
+        limiter.publish("/chat/a", {"n": 1}, self.publish)
+        error = InvalidStateError("disconnected")
+        publish = mock.MagicMock(side_effect=error)
+        response = limiter.publish("/chat/a", {"n": 2}, publish)
+        finished = mock.MagicMock()
+        response.finished.connect(finished)
+
+        await asyncio.sleep(0.05)
+
+        publish.assert_called_with("/chat/a", {"n": 2})
+        finished.assert_called_once()
+        self.assertIs(response.error, error)
+
+    async def test_clear(self):
+        limiter = RateLimiter(rate=1.0, burst=1, loop=self.loop)
+        limiter.publish("/chat/a", {"n": 1}, self.publish)
+        response = limiter.publish("/chat/a", {"n": 2}, self.publish)
+        finished = mock.MagicMock()
+        response.finished.connect(finished)
+        error = InvalidStateError()
+
+        limiter.clear(error)
+
+        self.assertEqual(len(limiter), 0)
+        finished.assert_called_once()
+        self.assertIs(response.error, error)
+        self.assertIsNone(limiter._dispatch_handle)
+
+    async def test_clear_messages_of_publish_function(self):
+        limiter = RateLimiter(rate=1.0, burst=1, loop=self.loop)
+        other_publish = mock.MagicMock()
+        limiter.publish("/chat/a", {"n": 1}, self.publish)
+        response = limiter.publish("/chat/a", {"n": 2}, self.publish)
+        other_response = limiter.publish("/chat/a", {"n": 3}, other_publish)
+        error = InvalidStateError()
+
+        limiter.clear(error, self.publish)
+
+        self.assertEqual(len(limiter), 1)
+        self.assertIs(response.error, error)
+        self.assertIsNone(other_response.error)
+        self.assertIsNotNone(limiter._dispatch_handle)
+
+    async def test_clear_keeps_coalescing_other_messages(self):
+        limiter = RateLimiter(rate=1.0, burst=1, loop=self.loop)
+        other_publish = mock.MagicMock()
+        limiter.publish("/chat/a", {"n": 1}, self.publish)
+        limiter.publish(MEMBERS_SERVICE_CHANNEL, {"n": 2}, self.publish)
+        first = limiter.publish(MEMBERS_SERVICE_CHANNEL, {"n": 3},
+                                other_publish)
+        limiter.clear(InvalidStateError(), self.publish)
+
+        second = limiter.publish(MEMBERS_SERVICE_CHANNEL, {"n": 3},
+                                 other_publish)
+
+        self.assertEqual(len(limiter), 1)
+        error = InvalidStateError()
+        limiter.clear(error)
+        self.assertIs(first.error, error)
+        self.assertIs(second.error, error)
@@ -0,0 +1,215 @@
+from datetime import datetime, timedelta
+
+from asynctest import TestCase, mock
+from PyQt5.QtCore import QModelIndex
+
+from aiocometd_chat_demo.search import SearchIndex, SearchResultsModel, \
+    SearchResultRole, tokenize
+from aiocometd_chat_demo.conversation import ConversationModel, ChatMessage
+
+
+def create_message(contents, offset=0):
+    return ChatMessage(time=datetime(2018, 1, 1) + timedelta(seconds=offset),
+                       sender="john", contents=contents)
+
+
+class TestTokenize(TestCase):
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Hello, World! it's 2018"),
+                         ["hello", "world", "it", "s", "2018"])
+
+
+class TestSearchIndex(TestCase):
+    def setUp(self):
+        self.index = SearchIndex()
+        self.conversation1 = ConversationModel("group")
+        self.conversation2 = ConversationModel("peer")
+        self.contents = ["Hello world", "hello there", "Help wanted",
+                         "world peace"]
+        for offset, contents in enumerate(self.contents):
+            conversation = (self.conversation1 if offset % 2 == 0
+                            else self.conversation2)
+            self.index.add(conversation.channel, "group", conversation,
+                           create_message(contents, offset))
+
+    def test_len(self):
+        self.assertEqual(len(self.index), 4)
+
+    def test_document(self):
+        document = self.index.document(1)
+
+        self.assertEqual(document.channel_name, "peer")
+        self.assertIs(document.conversation, self.conversation2)
+        self.assertEqual(document.message.contents, "hello there")
+
+    def test_search_word(self):
+        self.assertEqual(self.index.search("world"), [3, 0])
+
+    def test_search_prefix(self):
+        self.assertEqual(self.index.search("hel"), [2, 1, 0])
+
+    def test_search_prefix_matching_multiple_words_of_document(self):
+        self.index.add("group", "group", self.conversation1,
+                       create_message("help hello", 10))
+
+        self.assertEqual(self.index.search("hel"), [4, 2, 1, 0])
+
+    def test_search_multiple_terms(self):
+        self.assertEqual(self.index.search("HELLO wor"), [0])
+
+    def test_search_without_matches(self):
+        self.assertEqual(self.index.search("hello peace"), [])
+        self.assertEqual(self.index.search("missing"), [])
+
+    def test_search_empty_query(self):
+        self.assertEqual(self.index.search(" ,. "), [])
+
+    def test_search_limit(self):
+        self.assertEqual(self.index.search("hel", limit=2), [2, 1])
+
+    def test_remove_conversation(self):
+        self.index.remove_conversation(self.conversation1)
+
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.index.search("hel"), [1])
+        self.assertIsNone(self.index.document(0))
+
+    def test_remove_conversation_compacts_postings(self):
+        self.index.remove_conversation(self.conversation1)
+
+        self.assertEqual(self.index._postings, {
+            "hello": [1],
+            "there": [1],
+            "world": [3],
+            "peace": [3]
+        })
+        self.assertEqual(self.index._vocabulary,
+                         ["hello", "peace", "there", "world"])
+        self.assertEqual(self.index._removed_count, 0)
+
+    def test_remove_conversation_without_compaction(self):
+        conversation = ConversationModel("other")
+        self.index.add("other", "group", conversation,
+                       create_message("other", 10))
+
+        self.index.remove_conversation(conversation)
+
+        self.assertEqual(self.index._postings["other"], [4])
+        self.assertIn("other", self.index._vocabulary)
+        self.assertEqual(self.index._removed_count, 1)
+        self.assertEqual(self.index.search("oth"), [])
+
+    def test_add_after_compaction(self):
+        self.index.remove_conversation(self.conversation1)
+
+        document_id = self.index.add("group", "group", self.conversation1,
+                                     create_message("help", 10))
+
+        self.assertEqual(document_id, 4)
+        self.assertEqual(self.index.search("hel"), [4, 1])
+        self.assertEqual(self.index.document(4).message.contents, "help")
+
+    def test_matches(self):
+        self.assertTrue(self.index.matches(0, "wor hel"))
+        self.assertFalse(self.index.matches(1, "wor hel"))
+        self.assertFalse(self.index.matches(0, ""))
+
+
+class TestSearchResultsModel(TestCase):
+    def setUp(self):
+        self.index = SearchIndex()
+        self.conversation = ConversationModel("group")
+        self.model = SearchResultsModel(self.index, limit=2)
+
+    def add_message(self, contents):
+        message = create_message(contents, self.conversation.rowCount())
+        self.conversation.add_incoming_message(message)
+        document_id = self.index.add("group", "group", self.conversation,
+                                     message)
+        self.model.document_added(document_id)
+        return message
+
+    def test_query(self):
+        self.add_message("first message")
+        self.add_message("second message")
+        self.add_message("third")
+        self.model.query_changed = mock.MagicMock()
+
+        self.model.query = "mess"
+
+        self.assertEqual(self.model.query, "mess")
+        self.assertEqual(self.model.rowCount(), 2)
+        self.model.query_changed.emit.assert_called_with("mess")
+
+    def test_document_added_inserts_matching_document(self):
+        self.model.query = "message"
+        self.add_message("first message")
+        self.add_message("other")
+
+        self.assertEqual(self.model._results, [0])
+
+    def test_document_added_respects_limit(self):
+        self.model.query = "message"
+        for _ in range(3):
+            self.add_message("message")
+
+        self.assertEqual(self.model._results, [2, 1])
+
+    def test_document_added_without_query(self):
+        self.add_message("message")
+
+        self.assertEqual(self.model.rowCount(), 0)
+
+    def test_row_of_buffered_message(self):
+        message = create_message("message", 0)
+        document_id = self.index.add("group", "group", self.conversation,
+                                     message)
+        self.model.flush_conversation = mock.MagicMock(
+            side_effect=lambda conversation:
+            conversation.add_incoming_message(message)
+        )
+        self.model.query = "message"
+
+        row = self.model.data(self.model.index(0, 0), SearchResultRole.ROW)
+
+        self.assertEqual(document_id, 0)
+        self.model.flush_conversation.assert_called_with(self.conversation)
+        self.assertEqual(row, 0)
+
+    def test_row_of_inserted_message_doesnt_flush(self):
+        self.add_message("message")
+        self.model.flush_conversation = mock.MagicMock()
+        self.model.query = "message"
+
+        row = self.model.data(self.model.index(0, 0), SearchResultRole.ROW)
+
+        self.assertEqual(row, 0)
+        self.model.flush_conversation.assert_not_called()
+
+    def test_data(self):
+        self.add_message("first message")
+        message = self.add_message("second message")
+        self.model.query = "second"
+        index = self.model.index(0, 0)
+
+        self.assertEqual(self.model.data(index, SearchResultRole.CHANNEL),
+                         "group")
+        self.assertEqual(
+            self.model.data(index, SearchResultRole.CHANNEL_TYPE), "group"
+        )
+        self.assertEqual(self.model.data(index, SearchResultRole.ROW), 1)
+        self.assertEqual(
+            self.model.data(index, SearchResultRole.TIME).toPyDateTime(),
+            message.time
+        )
+        self.assertEqual(self.model.data(index, SearchResultRole.SENDER),
+                         "john")
+        self.assertEqual(self.model.data(index, SearchResultRole.CONTENTS),
+                         "second message")
+
+    def test_data_return_none_for_invalid_index(self):
+        self.assertIsNone(self.model.data(QModelIndex(),
+                                          SearchResultRole.CHANNEL))
+
+    def test_role_names(self):
+        self.assertEqual(self.model.roleNames(), self.model._role_names)
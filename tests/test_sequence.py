@@ -0,0 +1,115 @@
+from unittest import TestCase
+
+from aiocometd_chat_demo.sequence import SequenceTracker, message_sequence
+
+
+class TestMessageSequence(TestCase):
+    def test_sequence(self):
+        self.assertEqual(message_sequence({"ext": {"seq": 5}}), 5)
+
+    def test_without_sequence(self):
+        for message in ({}, {"ext": None}, {"ext": {}},
+                        {"ext": {"seq": "5"}}, {"ext": {"seq": True}}):
+            with self.subTest(message=message):
+                self.assertIsNone(message_sequence(message))
+
+
+class TestSequenceTracker(TestCase):
+    def setUp(self):
+        self.tracker = SequenceTracker(capacity=10)
+
+    def test_consecutive(self):
+        for sequence in range(1, 5):
+            self.assertFalse(self.tracker.is_duplicate(sequence))
+            self.assertEqual(self.tracker.add(sequence), [])
+
+        self.assertEqual(self.tracker.last, 4)
+        self.assertEqual(self.tracker.missing, [])
+
+    def test_first_sequence_is_not_a_gap(self):
+        self.assertEqual(self.tracker.add(42), [])
+
+    def test_duplicate(self):
+        self.tracker.add(1)
+        self.tracker.add(2)
+
+        self.assertTrue(self.tracker.is_duplicate(1))
+        self.assertTrue(self.tracker.is_duplicate(2))
+        self.assertFalse(self.tracker.is_duplicate(3))
+
+    def test_gap(self):
+        self.tracker.add(1)
+
+        self.assertEqual(self.tracker.add(5), [(2, 4)])
+        self.assertEqual(self.tracker.missing, [2, 3, 4])
+        self.assertFalse(self.tracker.is_duplicate(3))
+
+    def test_late_arrival_fills_gap(self):
+        self.tracker.add(1)
+        self.tracker.add(5)
+
+        self.assertEqual(self.tracker.add(3), [])
+
+        self.assertEqual(self.tracker.missing, [2, 4])
+        self.assertEqual(self.tracker.last, 5)
+        self.assertTrue(self.tracker.is_duplicate(3))
+
+    def test_gap_larger_than_capacity(self):
+        self.tracker.add(1)
+
+        self.assertEqual(self.tracker.add(100), [(90, 99)])
+        self.assertTrue(self.tracker.is_duplicate(50))
+
+    def test_missing_expire(self):
+        self.tracker.add(1)
+        self.tracker.add(3)
+
+        self.tracker.add(20)
+
+        self.assertNotIn(2, self.tracker.missing)
+        self.assertTrue(self.tracker.is_duplicate(2))
+
+    def test_expired_missing_are_forgotten(self):
+        self.tracker.add(1)
+        self.tracker.add(5)
+        self.tracker.add(3)
+
+        self.tracker.add(30)
+
+        self.assertEqual(self.tracker.missing, list(range(21, 30)))
+        self.assertEqual(list(self.tracker._missing_order),
+                         list(range(21, 30)))
+
+    def test_recent_sequences_are_bounded(self):
+        for sequence in range(1, 31):
+            self.tracker.add(sequence)
+
+        self.assertEqual(len(self.tracker._recent), 10)
+
+    def test_recent(self):
+        self.tracker.add(3)
+        self.tracker.add(1)
+
+        self.assertEqual(self.tracker.recent, [3, 1])
+
+    def test_remember(self):
+        self.tracker.add(1)
+        self.tracker.add(5)
+
+        self.tracker.remember(3)
+        self.tracker.remember(100)
+
+        self.assertIn(3, self.tracker)
+        self.assertIn(100, self.tracker)
+        self.assertEqual(self.tracker.missing, [2, 4])
+        self.assertEqual(self.tracker.last, 5)
+
+    def test_missing_ranges(self):
+        self.tracker.add(1)
+        self.tracker.add(10)
+        self.tracker.add(4)
+        self.tracker.add(5)
+
+        self.assertEqual(self.tracker.missing_ranges([(2, 9)]),
+                         [(2, 3), (6, 9)])
+        self.assertEqual(self.tracker.missing_ranges([(4, 5)]), [])
@@ -0,0 +1,84 @@
+import os
+import tempfile
+from datetime import datetime
+from unittest import TestCase
+
+from aiocometd_chat_demo.channels import ChannelsModel, ChannelType
+from aiocometd_chat_demo.conversation import ChatMessage
+from aiocometd_chat_demo.snapshot import Snapshot, RoomSnapshot, \
+    ConversationSnapshot, save_snapshot, load_snapshot, SNAPSHOT_MAGIC, \
+    LOGGER as snapshot_logger
+
+
+class TestRoomSnapshot(TestCase):
+    def test_from_model(self):
+        model = ChannelsModel("room")
+        model.update_available_channels({"a", "b"})
+        messages = [
+            ChatMessage(time=datetime(2020, 1, 1, 0, 0, second),
+                        sender="a", contents=str(second))
+            for second in range(3)
+        ]
+        model.add_messages("room", ChannelType.GROUP, messages)
+        model.add_messages("a", ChannelType.USER, messages[:1])
+
+        snapshot = RoomSnapshot.from_model("room", model, 2, [1, 2])
+
+        self.assertEqual(snapshot.name, "room")
+        self.assertEqual(snapshot.sequences, [1, 2])
+        self.assertEqual(snapshot.members, ["a", "b"])
+        self.assertEqual(snapshot.conversations, [
+            ConversationSnapshot("room", ChannelType.GROUP, messages[1:]),
+            ConversationSnapshot("a", ChannelType.USER, messages[:1]),
+        ])
+
+
+class TestSnapshotFile(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "snapshot.bin")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        message = ChatMessage(time=datetime(2020, 1, 1, 12, 30, 15, 250000),
+                              sender="a", contents="hello")
+        snapshot = Snapshot(username="user", url="http://localhost/", rooms=[
+            RoomSnapshot(name="room", members=["a"], conversations=[
+                ConversationSnapshot("room", ChannelType.GROUP, [message]),
+                ConversationSnapshot("a", ChannelType.USER, [message]),
+            ], sequences=[4, 2, 3]),
+            RoomSnapshot(name="other"),
+        ])
+
+        save_snapshot(snapshot, self.path)
+
+        self.assertEqual(load_snapshot(self.path), snapshot)
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+    def test_file_is_compressed(self):
+        message = ChatMessage(time=datetime.now(), sender="a",
+                              contents="hello " * 1000)
+        snapshot = Snapshot(username="user", url="url", rooms=[
+            RoomSnapshot(name="room", conversations=[
+                ConversationSnapshot("room", ChannelType.GROUP, [message])
+            ])
+        ])
+
+        save_snapshot(snapshot, self.path)
+
+        self.assertLess(os.path.getsize(self.path), 1000)
+
+    def test_load_missing_file(self):
+        self.assertIsNone(load_snapshot(self.path))
+
+    def test_load_invalid_file(self):
+        for data in (b"garbage", SNAPSHOT_MAGIC + b"\x01garbage",
+                     SNAPSHOT_MAGIC + b"\x02"):
+            with self.subTest(data=data):
+                with open(self.path, "wb") as file:
+                    file.write(data)
+
+                with self.assertLogs(snapshot_logger, "WARNING"):
+                    self.assertIsNone(load_snapshot(self.path))
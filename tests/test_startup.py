@@ -0,0 +1,50 @@
+from unittest import TestCase, mock
+
+from aiocometd_chat_demo.startup import StartupProfiler, \
+    LOGGER as startup_logger
+
+
+class TestStartupProfiler(TestCase):
+    def setUp(self):
+        self.time = 1.0
+        self.profiler = StartupProfiler(clock=lambda: self.time)
+
+    def test_init_with_start_time(self):
+        profiler = StartupProfiler(0.5, clock=lambda: self.time)
+
+        profiler.mark("imports")
+
+        self.assertEqual(profiler.phases, [("imports", 0.5)])
+
+    def test_mark(self):
+        self.time = 1.25
+        self.profiler.mark("first")
+        self.time = 2.0
+        self.profiler.mark("second")
+
+        self.assertEqual(self.profiler.phases, [("first", 0.25),
+                                                ("second", 0.75)])
+        self.assertEqual(self.profiler.total, 1.0)
+
+    def test_report(self):
+        self.time = 1.25
+        self.profiler.mark("imports")
+
+        self.assertEqual(self.profiler.report().splitlines(), [
+            "Startup time:",
+            "  imports              250.0 ms",
+            "  total                250.0 ms",
+        ])
+
+    def test_report_first_frame(self):
+        window = mock.MagicMock()
+        self.profiler.report_first_frame(window)
+        callback = window.frameSwapped.connect.call_args[0][0]
+        self.time = 1.5
+
+        with self.assertLogs(startup_logger, "INFO") as logs:
+            callback()
+
+        window.frameSwapped.disconnect.assert_called_with(callback)
+        self.assertEqual(self.profiler.phases, [("first_frame", 0.5)])
+        self.assertIn("first_frame", logs.output[0])
@@ -0,0 +1,35 @@
+from unittest import TestCase
+
+from aiocometd_chat_demo.transport_options import TransportOptions, \
+    TransportType
+
+
+class TestTransportOptions(TestCase):
+    def test_transport_types_auto(self):
+        options = TransportOptions()
+
+        self.assertEqual(options.transport_types,
+                         [TransportType.WEBSOCKET, TransportType.LONG_POLLING])
+
+    def test_transport_types_single(self):
+        options = TransportOptions(transport_type=TransportType.WEBSOCKET)
+
+        self.assertEqual(options.transport_types, [TransportType.WEBSOCKET])
+
+    def test_compression_window_bits(self):
+        self.assertEqual(TransportOptions().compression_window_bits, 0)
+        self.assertEqual(
+            TransportOptions(compression=True).compression_window_bits, 15
+        )
+
+    def test_can_fall_back(self):
+        options = TransportOptions()
+
+        self.assertTrue(options.can_fall_back([TransportType.WEBSOCKET]))
+        self.assertTrue(options.can_fall_back(options.transport_types))
+        self.assertFalse(options.can_fall_back([TransportType.LONG_POLLING]))
+
+    def test_can_fall_back_disabled(self):
+        options = TransportOptions(websocket_fallback=False)
+
+        self.assertFalse(options.can_fall_back([TransportType.WEBSOCKET]))